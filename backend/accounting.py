@@ -7,18 +7,22 @@ from sqlalchemy import func
 from backend.models import (
     Bill,
     BillPayment,
-    BankbookEntry,
-    CashbookEntry,
     Ledger,
     LedgerGroup,
     Party,
-    PartyReceipt,
     Purchase,
-    PurchasePayment,
     PurchaseReturn,
-    ReceiptBillAdjustment,
     Voucher,
     VoucherEntry,
+    debtor_key,
+)
+from backend.ledger_registry import (
+    LedgerRef,
+    lookup_group,
+    lookup_ledger,
+    lookup_party_ledger,
+    remember_group,
+    remember_ledger,
 )
 
 
@@ -122,40 +126,83 @@ def _ensure_ledger(
     return row
 
 
-def ensure_accounting_setup(session) -> Dict[str, Ledger]:
-    groups: Dict[str, LedgerGroup] = {}
-    for system_key, (name, nature) in SYSTEM_GROUPS.items():
-        groups[system_key] = _ensure_group(session, system_key=system_key, name=name, nature=nature)
+def _ledger_ref(row: Ledger) -> LedgerRef:
+    return LedgerRef(
+        id=int(row.id),
+        name=str(row.name or ""),
+        group_id=int(row.group_id),
+        system_key=row.system_key,
+        party_id=int(row.party_id) if row.party_id is not None else None,
+    )
+
+
+def _system_group_id(session, system_key: str) -> int:
+    group_id = lookup_group(session, system_key)
+    if group_id is None:
+        name, nature = SYSTEM_GROUPS[system_key]
+        group_id = int(_ensure_group(session, system_key=system_key, name=name, nature=nature).id)
+        remember_group(session, system_key, group_id)
+    return group_id
+
+
+def ensure_accounting_setup(session) -> Dict[str, LedgerRef]:
+    """Return the system ledgers by key, creating any missing chart rows.
 
-    ledgers: Dict[str, Ledger] = {}
+    Served from the ledger registry once warm; only a cold registry touches
+    the ledgergroup/ledger tables.
+    """
+    ledgers: Dict[str, LedgerRef] = {}
+    for system_key in SYSTEM_GROUPS:
+        _system_group_id(session, system_key)
     for system_key, (name, group_key) in SYSTEM_LEDGERS.items():
-        ledgers[system_key] = _ensure_ledger(
-            session,
-            system_key=system_key,
-            name=name,
-            group_id=int(groups[group_key].id),
-            is_system=True,
-        )
+        ref = lookup_ledger(session, system_key)
+        if ref is None:
+            ref = _ledger_ref(
+                _ensure_ledger(
+                    session,
+                    system_key=system_key,
+                    name=name,
+                    group_id=_system_group_id(session, group_key),
+                    is_system=True,
+                )
+            )
+            remember_ledger(session, ref)
+        ledgers[system_key] = ref
     return ledgers
 
 
-def ensure_party_ledger(session, party: Party) -> Ledger:
-    groups = ensure_accounting_setup(session)
+def ensure_party_ledger(session, party: Party) -> LedgerRef:
+    ref = lookup_party_ledger(session, int(party.id))
+    if ref is not None:
+        return ref
+    ensure_accounting_setup(session)
     if str(party.party_group or "").upper() == "SUNDRY_CREDITOR":
-        group = session.exec(select(LedgerGroup).where(LedgerGroup.system_key == "SUNDRY_CREDITORS")).first()
+        group_id = _system_group_id(session, "SUNDRY_CREDITORS")
     else:
-        group = session.exec(select(LedgerGroup).where(LedgerGroup.system_key == "SUNDRY_DEBTORS")).first()
-    return _ensure_ledger(
-        session,
-        system_key=None,
-        name=str(party.name or "").strip() or f"Party {party.id}",
-        group_id=int(group.id),
-        party_id=int(party.id),
-        is_system=False,
+        group_id = _system_group_id(session, "SUNDRY_DEBTORS")
+    ref = _ledger_ref(
+        _ensure_ledger(
+            session,
+            system_key=None,
+            name=str(party.name or "").strip() or f"Party {party.id}",
+            group_id=group_id,
+            party_id=int(party.id),
+            is_system=False,
+        )
     )
+    remember_ledger(session, ref)
+    return ref
+
+
+def warm_ledger_registry(session) -> None:
+    """Load the whole chart into the ledger registry (run once on startup)."""
+    ensure_accounting_setup(session)
+    for row in session.exec(select(Ledger).where(Ledger.party_id.isnot(None)).order_by(Ledger.id.desc())).all():
+        remember_ledger(session, _ledger_ref(row))
+    session.commit()
 
 
-def resolve_bill_party_ledger(session, bill: Bill) -> Optional[Ledger]:
+def resolve_bill_party_ledger(session, bill: Bill) -> Optional[LedgerRef]:
     party_id = int(getattr(bill, "party_id", 0) or 0)
     if party_id > 0:
         party = session.get(Party, party_id)
@@ -173,18 +220,12 @@ def resolve_bill_party_ledger(session, bill: Bill) -> Optional[Ledger]:
         if party:
             return ensure_party_ledger(session, party)
 
-    notes = str(bill.notes or "").strip()
-    lower = notes.lower()
-    if lower.startswith("customer:"):
-        first_lines = notes.split("|", 1)[0].splitlines()
-        first = first_lines[0] if first_lines else ""
-        customer_name = first.split(":", 1)[1].strip() if ":" in first else ""
-        if not customer_name:
-            return None
+    name_key = debtor_key(bill.notes)
+    if name_key:
         party = session.exec(
             select(Party).where(
                 Party.party_group == "SUNDRY_DEBTOR",
-                func.lower(func.trim(func.coalesce(Party.name, ""))) == customer_name.lower(),
+                Party.name_key == name_key,
             )
         ).first()
         if party:
@@ -194,6 +235,89 @@ def resolve_bill_party_ledger(session, bill: Bill) -> Optional[Ledger]:
     return None
 
 
+_VOUCHER_PREFETCH_KEY = "voucher_prefetch"
+
+
+def prefetch_vouchers(session, source_types: List[str], source_ids: List[int]) -> Dict[tuple, Voucher]:
+    """Load the vouchers and entries for a batch of sources in two queries.
+
+    The next ``upsert_voucher`` call for each (source_type, source_id) is served
+    from this cache instead of selecting its own rows.
+    """
+    cache = session.info.setdefault(_VOUCHER_PREFETCH_KEY, {})
+    if not source_ids:
+        return {}
+    vouchers = session.exec(
+        select(Voucher).where(Voucher.source_type.in_(source_types), Voucher.source_id.in_(source_ids))
+    ).all()
+    entries_by_voucher: Dict[int, List[VoucherEntry]] = {int(v.id): [] for v in vouchers}
+    if vouchers:
+        for entry in session.exec(
+            select(VoucherEntry)
+            .where(VoucherEntry.voucher_id.in_(list(entries_by_voucher)))
+            .order_by(VoucherEntry.voucher_id, VoucherEntry.sort_order, VoucherEntry.id)
+        ).all():
+            entries_by_voucher[int(entry.voucher_id)].append(entry)
+    for source_type in source_types:
+        for source_id in source_ids:
+            cache[(source_type, int(source_id))] = None
+    found: Dict[tuple, Voucher] = {}
+    for voucher in vouchers:
+        key = (voucher.source_type, int(voucher.source_id))
+        cache[key] = (voucher, entries_by_voucher[int(voucher.id)])
+        found[key] = voucher
+    return found
+
+
+def clear_voucher_prefetch(session) -> None:
+    session.info.pop(_VOUCHER_PREFETCH_KEY, None)
+
+
+def _line_values(line: PostingLine) -> tuple:
+    return (int(line["ledger_id"]), str(line["entry_type"]).upper(), round2(line["amount"]), line.get("narration"))
+
+
+def _entry_values(entry: VoucherEntry) -> tuple:
+    return (int(entry.ledger_id), str(entry.entry_type).upper(), round2(entry.amount), entry.narration)
+
+
+def _sync_voucher_entries(session, voucher_id: int, entries: List[VoucherEntry], lines: List[PostingLine], ts: str) -> bool:
+    """Make the stored entries equal ``lines`` position by position.
+
+    Matching rows are left alone, differing rows are updated in place, and
+    only the surplus is inserted or deleted. Returns whether anything changed.
+    """
+    changed = False
+    for idx, line in enumerate(lines, start=1):
+        ledger_id, entry_type, amount, narration = _line_values(line)
+        if idx <= len(entries):
+            entry = entries[idx - 1]
+            if _entry_values(entry) == (ledger_id, entry_type, amount, narration) and entry.sort_order == idx:
+                continue
+            entry.ledger_id = ledger_id
+            entry.entry_type = entry_type
+            entry.amount = amount
+            entry.narration = narration
+            entry.sort_order = idx
+        else:
+            entry = VoucherEntry(
+                voucher_id=voucher_id,
+                ledger_id=ledger_id,
+                entry_type=entry_type,
+                amount=amount,
+                narration=narration,
+                sort_order=idx,
+                created_at=ts,
+            )
+        session.add(entry)
+        changed = True
+    surplus = [int(entry.id) for entry in entries[len(lines):]]
+    if surplus:
+        session.exec(delete(VoucherEntry).where(VoucherEntry.id.in_(surplus)))
+        changed = True
+    return changed
+
+
 def upsert_voucher(
     session,
     *,
@@ -206,52 +330,65 @@ def upsert_voucher(
     total_amount: float,
     lines: List[PostingLine],
 ) -> Voucher:
-    voucher = session.exec(
-        select(Voucher).where(Voucher.source_type == source_type, Voucher.source_id == source_id)
-    ).first()
+    """Create or update the voucher of one source document.
+
+    Only what differs is written: an identical voucher is returned untouched
+    (``updated_at`` included) and a changed one gets in-place entry updates
+    plus any inserts/deletes for a different line count.
+    """
+    cached = session.info.get(_VOUCHER_PREFETCH_KEY, {}).pop((source_type, int(source_id)), False)
+    if cached is False:
+        voucher = session.exec(
+            select(Voucher).where(Voucher.source_type == source_type, Voucher.source_id == source_id)
+        ).first()
+        entries = None
+    else:
+        voucher, entries = cached if cached else (None, None)
     ts = now_ts()
     if voucher:
-        voucher.voucher_type = voucher_type
-        voucher.voucher_no = voucher_no
-        voucher.voucher_date = voucher_date
-        voucher.narration = narration
-        voucher.total_amount = round2(total_amount)
-        voucher.is_deleted = False
-        voucher.deleted_at = None
-        voucher.updated_at = ts
-        session.add(voucher)
-        session.flush()
-        session.exec(delete(VoucherEntry).where(VoucherEntry.voucher_id == voucher.id))
-        session.flush()
-    else:
-        voucher = Voucher(
-            voucher_type=voucher_type,
-            source_type=source_type,
-            source_id=source_id,
-            voucher_no=voucher_no,
-            voucher_date=voucher_date,
-            narration=narration,
-            total_amount=round2(total_amount),
-            is_deleted=False,
-            deleted_at=None,
-            created_at=ts,
-            updated_at=ts,
-        )
-        session.add(voucher)
-        session.flush()
-
-    for idx, line in enumerate(lines, start=1):
-        session.add(
-            VoucherEntry(
-                voucher_id=int(voucher.id),
-                ledger_id=int(line["ledger_id"]),
-                entry_type=str(line["entry_type"]).upper(),
-                amount=round2(line["amount"]),
-                narration=line.get("narration"),
-                sort_order=idx,
-                created_at=ts,
-            )
-        )
+        if entries is None:
+            entries = session.exec(
+                select(VoucherEntry)
+                .where(VoucherEntry.voucher_id == voucher.id)
+                .order_by(VoucherEntry.sort_order, VoucherEntry.id)
+            ).all()
+        header = {
+            "voucher_type": voucher_type,
+            "voucher_no": voucher_no,
+            "voucher_date": voucher_date,
+            "narration": narration,
+            "total_amount": round2(total_amount),
+            "is_deleted": False,
+            "deleted_at": None,
+        }
+        header_changed = False
+        for field, value in header.items():
+            if getattr(voucher, field) != value:
+                setattr(voucher, field, value)
+                header_changed = True
+        entries_changed = _sync_voucher_entries(session, int(voucher.id), list(entries), lines, ts)
+        if header_changed or entries_changed:
+            voucher.updated_at = ts
+            session.add(voucher)
+            session.flush()
+        return voucher
+
+    voucher = Voucher(
+        voucher_type=voucher_type,
+        source_type=source_type,
+        source_id=source_id,
+        voucher_no=voucher_no,
+        voucher_date=voucher_date,
+        narration=narration,
+        total_amount=round2(total_amount),
+        is_deleted=False,
+        deleted_at=None,
+        created_at=ts,
+        updated_at=ts,
+    )
+    session.add(voucher)
+    session.flush()
+    _sync_voucher_entries(session, int(voucher.id), [], lines, ts)
     session.flush()
     return voucher
 
@@ -260,8 +397,8 @@ def mark_voucher_deleted(session, *, source_type: str, source_id: int) -> Option
     voucher = session.exec(
         select(Voucher).where(Voucher.source_type == source_type, Voucher.source_id == source_id)
     ).first()
-    if not voucher:
-        return None
+    if not voucher or voucher.is_deleted:
+        return voucher
     voucher.is_deleted = True
     voucher.deleted_at = now_ts()
     voucher.updated_at = voucher.deleted_at
@@ -270,16 +407,22 @@ def mark_voucher_deleted(session, *, source_type: str, source_id: int) -> Option
     return voucher
 
 
-def post_sales_voucher(session, bill: Bill) -> Voucher:
+def post_sales_voucher(session, bill: Bill, payments: Optional[List[BillPayment]] = None) -> Voucher:
+    """Post the sales voucher of ``bill``.
+
+    ``payments`` are the bill's live BillPayment rows when the caller has
+    already loaded them; otherwise they are selected here.
+    """
     ledgers = ensure_accounting_setup(session)
     lines: List[PostingLine] = []
     total = round2(getattr(bill, "total_amount", 0.0))
-    payments = session.exec(
-        select(BillPayment).where(
-            BillPayment.bill_id == bill.id,
-            BillPayment.is_deleted == False,  # noqa: E712
-        )
-    ).all()
+    if payments is None:
+        payments = session.exec(
+            select(BillPayment).where(
+                BillPayment.bill_id == bill.id,
+                BillPayment.is_deleted == False,  # noqa: E712
+            )
+        ).all()
     auto_payments = [
         payment
         for payment in payments
@@ -577,16 +720,39 @@ def post_bill_payment_voucher(
     )
 
 
+def deleted_voucher(session, *, source_type: str, source_id: int) -> Optional[Voucher]:
+    """The source's voucher if it is already marked deleted, else None.
+
+    Re-posting a deleted source whose voucher is already deleted would first
+    revive the voucher in ``upsert_voucher`` and then delete it again, so
+    callers skip the post when this returns a voucher.
+    """
+    voucher = session.exec(
+        select(Voucher).where(Voucher.source_type == source_type, Voucher.source_id == source_id)
+    ).first()
+    return voucher if voucher is not None and voucher.is_deleted else None
+
+
 def sync_bill_vouchers(session, bill: Bill) -> Voucher:
+    if bool(getattr(bill, "is_deleted", False)):
+        voucher = deleted_voucher(session, source_type="BILL", source_id=int(bill.id))
+        if voucher is not None:
+            return voucher
+    voucher = post_sales_voucher(session, bill)
     if bool(getattr(bill, "is_deleted", False)):
         mark_voucher_deleted(session, source_type="BILL", source_id=int(bill.id))
-    return post_sales_voucher(session, bill)
+    return voucher
 
 
 def sync_purchase_vouchers(session, purchase: Purchase, party: Party) -> Voucher:
+    if bool(getattr(purchase, "is_deleted", False)):
+        voucher = deleted_voucher(session, source_type="PURCHASE", source_id=int(purchase.id))
+        if voucher is not None:
+            return voucher
+    voucher = post_purchase_voucher(session, purchase, party)
     if bool(getattr(purchase, "is_deleted", False)):
         mark_voucher_deleted(session, source_type="PURCHASE", source_id=int(purchase.id))
-    return post_purchase_voucher(session, purchase, party)
+    return voucher
 
 
 def sync_suspense_book_voucher(session, row, *, book: str) -> Optional[Voucher]:
@@ -637,109 +803,3 @@ def sync_suspense_book_voucher(session, row, *, book: str) -> Optional[Voucher]:
         total_amount=voucher_total,
         lines=lines,
     )
-
-
-def sync_existing_vouchers(session) -> None:
-    ensure_accounting_setup(session)
-
-    party_map = {
-        int(p.id): p
-        for p in session.exec(select(Party)).all()
-        if p.id is not None
-    }
-    receipt_adjustment_payment_ids = {
-        int(row.bill_payment_id)
-        for row in session.exec(select(ReceiptBillAdjustment)).all()
-        if row.bill_payment_id is not None
-    }
-
-    for bill in session.exec(select(Bill)).all():
-        post_sales_voucher(session, bill)
-        if bool(getattr(bill, "is_deleted", False)):
-            mark_voucher_deleted(session, source_type="BILL", source_id=int(bill.id or 0))
-
-    for purchase in session.exec(select(Purchase)).all():
-        party = party_map.get(int(purchase.party_id or 0))
-        if not party:
-            continue
-        post_purchase_voucher(session, purchase, party)
-        if bool(getattr(purchase, "is_deleted", False)):
-            mark_voucher_deleted(session, source_type="PURCHASE", source_id=int(purchase.id or 0))
-
-    for purchase_return in session.exec(select(PurchaseReturn)).all():
-        party = party_map.get(int(purchase_return.party_id or 0))
-        if not party or round2(purchase_return.total_amount) <= 0:
-            continue
-        post_purchase_return_voucher(session, purchase_return, party)
-        if bool(getattr(purchase_return, "is_deleted", False)):
-            mark_voucher_deleted(session, source_type="PURCHASE_RETURN", source_id=int(purchase_return.id or 0))
-
-    for payment in session.exec(select(PurchasePayment)).all():
-        purchase = session.get(Purchase, payment.purchase_id) if int(payment.purchase_id or 0) > 0 else None
-        party_id = int(purchase.party_id or 0) if purchase else int(getattr(payment, "party_id", 0) or 0)
-        party = party_map.get(party_id)
-        if not party:
-            continue
-        post_purchase_payment_voucher(
-            session,
-            purchase,
-            party,
-            int(payment.id or 0),
-            float(payment.amount or 0),
-            bool(payment.is_writeoff),
-            payment.note,
-            payment.paid_at,
-            float(getattr(payment, "cash_amount", 0) or 0),
-            float(getattr(payment, "online_amount", 0) or 0),
-            getattr(payment, "bank_mode", None),
-            float(getattr(payment, "txn_charges", 0) or 0),
-            getattr(payment, "transaction_id", None),
-        )
-        if bool(getattr(payment, "is_deleted", False)) or bool(getattr(purchase, "is_deleted", False)):
-            source_type = "PURCHASE_WRITEOFF" if bool(payment.is_writeoff) else "PURCHASE_PAYMENT"
-            mark_voucher_deleted(session, source_type=source_type, source_id=int(payment.id or 0))
-
-    for receipt in session.exec(select(PartyReceipt)).all():
-        party = party_map.get(int(receipt.party_id or 0))
-        if not party:
-            continue
-        post_party_receipt_voucher(
-            session,
-            int(receipt.id or 0),
-            party,
-            receipt.received_at,
-            float(receipt.total_amount or 0),
-            float(receipt.cash_amount or 0),
-            float(receipt.online_amount or 0),
-            receipt.note,
-        )
-        if bool(getattr(receipt, "is_deleted", False)):
-            mark_voucher_deleted(session, source_type="PARTY_RECEIPT", source_id=int(receipt.id or 0))
-
-    for payment in session.exec(select(BillPayment)).all():
-        if int(payment.id or 0) in receipt_adjustment_payment_ids:
-            continue
-        note = str(payment.note or "").strip().lower()
-        if note == "auto: payment at bill creation":
-            continue
-        bill = session.get(Bill, payment.bill_id)
-        if not bill:
-            continue
-        post_bill_payment_voucher(
-            session,
-            bill,
-            int(payment.id or 0),
-            payment.received_at,
-            float(payment.cash_amount or 0),
-            float(payment.online_amount or 0),
-            float(getattr(payment, "writeoff_amount", 0) or 0),
-            bool(getattr(payment, "is_writeoff", False)),
-            payment.note,
-        )
-        if bool(getattr(payment, "is_deleted", False)) or bool(getattr(bill, "is_deleted", False)):
-            mark_voucher_deleted(session, source_type="BILL_PAYMENT", source_id=int(payment.id or 0))
-
-    for row in session.exec(select(CashbookEntry)).all():
-        sync_suspense_book_voucher(session, row, book="CASHBOOK")
-    for row in session.exec(select(BankbookEntry)).all():
-        sync_suspense_book_voucher(session, row, book="BANKBOOK")
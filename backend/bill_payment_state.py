@@ -0,0 +1,170 @@
+"""Consistency check between a bill's stored payment state and its payments.
+
+A bill's payment_cash, payment_online, paid_amount, writeoff_amount,
+payment_status, is_credit and paid_at are written by the payment writes
+(receive, edit, undo, recover, receipt apply and receipt edits), each through
+``recalculate_bill_payment_state``. Reads trust those columns.
+
+``payment_state_drift`` recomputes what they should be for a page of bills
+from one grouped BillPayment query and returns the bills that disagree.
+``start_payment_state_check`` runs it over every bill once at startup in a
+daemon thread and logs what it finds. Nothing here writes; editing, undoing or
+re-receiving a payment on a drifted bill repairs it.
+"""
+
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import case, func
+from sqlmodel import Session, select
+
+from backend.accounting import round2
+from backend.inventory_lot_sync import IN_CHUNK_SIZE
+from backend.models import Bill, BillPayment
+
+logger = logging.getLogger("accounting.payment_state")
+
+BATCH_SIZE = 500
+
+
+def _f(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _payment_totals(session, bill_ids: List[int]) -> Dict[int, tuple]:
+    writeoff = func.coalesce(BillPayment.is_writeoff, False) == True  # noqa: E712
+    rows = session.exec(
+        select(
+            BillPayment.bill_id,
+            func.sum(case((writeoff, 0.0), else_=func.coalesce(BillPayment.cash_amount, 0.0))),
+            func.sum(case((writeoff, 0.0), else_=func.coalesce(BillPayment.online_amount, 0.0))),
+            func.sum(case((writeoff, func.coalesce(BillPayment.writeoff_amount, 0.0)), else_=0.0)),
+            func.max(BillPayment.received_at),
+        )
+        .where(BillPayment.bill_id.in_(bill_ids))
+        .where(BillPayment.is_deleted == False)  # noqa: E712
+        .group_by(BillPayment.bill_id)
+    ).all()
+    return {int(row[0]): tuple(row[1:]) for row in rows}
+
+
+def _expected_state(bill: Bill, totals: Optional[tuple]) -> Dict[str, Any]:
+    # Mirrors recalculate_bill_payment_state in backend.routers.billing.
+    cash, online, writeoff, latest_received = totals or (0.0, 0.0, 0.0, None)
+    cash, online, writeoff = round2(_f(cash)), round2(_f(online)), round2(_f(writeoff))
+    paid = round2(cash + online)
+    total = round2(_f(bill.total_amount))
+    covered = round2(paid + writeoff)
+    if total <= 0:
+        status, is_credit, paid_at = "PAID", False, bill.paid_at or getattr(bill, "date_time", None)
+    elif covered <= 0:
+        status, is_credit, paid_at = "UNPAID", True, None
+    elif covered + 0.0001 < total:
+        # Bill create/edit stamp a part-paid bill with its date while a later
+        # recalculation clears it; both are valid, so paid_at is not checked here.
+        status, is_credit, paid_at = "PARTIAL", True, bill.paid_at
+    else:
+        status, is_credit, paid_at = "PAID", False, latest_received or None
+    return {
+        "payment_cash": cash,
+        "payment_online": online,
+        "paid_amount": paid,
+        "writeoff_amount": writeoff,
+        "payment_status": status,
+        "is_credit": is_credit,
+        "paid_at": paid_at,
+    }
+
+
+def _stored_state(bill: Bill) -> Dict[str, Any]:
+    return {
+        "payment_cash": round2(_f(getattr(bill, "payment_cash", 0.0))),
+        "payment_online": round2(_f(getattr(bill, "payment_online", 0.0))),
+        "paid_amount": round2(_f(getattr(bill, "paid_amount", 0.0))),
+        "writeoff_amount": round2(_f(getattr(bill, "writeoff_amount", 0.0))),
+        "payment_status": str(getattr(bill, "payment_status", "") or ""),
+        "is_credit": bool(getattr(bill, "is_credit", False)),
+        "paid_at": getattr(bill, "paid_at", None),
+    }
+
+
+def payment_state_drift(session, bills: List[Bill]) -> List[Dict[str, Any]]:
+    """Bills whose stored payment columns differ from their active payments.
+
+    Each entry is ``{"bill_id", "stored", "expected"}`` with only the columns
+    that differ. ``bills`` may hold at most ``IN_CHUNK_SIZE`` rows.
+    """
+    if not bills:
+        return []
+    totals = _payment_totals(session, [int(bill.id) for bill in bills])
+    out: List[Dict[str, Any]] = []
+    for bill in bills:
+        stored = _stored_state(bill)
+        expected = _expected_state(bill, totals.get(int(bill.id)))
+        fields = [name for name in expected if stored[name] != expected[name]]
+        if fields:
+            out.append(
+                {
+                    "bill_id": int(bill.id),
+                    "stored": {name: stored[name] for name in fields},
+                    "expected": {name: expected[name] for name in fields},
+                }
+            )
+    return out
+
+
+def scan_payment_state_page(session, *, after_id: int = 0, batch_size: int = BATCH_SIZE) -> Dict[str, Any]:
+    """Check the next ``batch_size`` live bills after ``after_id``."""
+    bills = session.exec(
+        select(Bill)
+        .where(Bill.id > after_id)
+        .where(Bill.is_deleted == False)  # noqa: E712
+        .order_by(Bill.id.asc())
+        .limit(min(batch_size, IN_CHUNK_SIZE))
+    ).all()
+    return {
+        "bills": payment_state_drift(session, bills),
+        "scanned_bills": len(bills),
+        "next_after_id": int(bills[-1].id) if len(bills) == min(batch_size, IN_CHUNK_SIZE) else None,
+    }
+
+
+def run_payment_state_check(engine, *, batch_size: int = BATCH_SIZE) -> int:
+    """Scan every live bill and log the ones that drifted; returns how many did."""
+    drifted = 0
+    after_id: Optional[int] = 0
+    while after_id is not None:
+        with Session(engine) as session:
+            page = scan_payment_state_page(session, after_id=after_id, batch_size=batch_size)
+        for row in page["bills"]:
+            logger.warning(
+                "Bill %s payment state drifted: stored %s, payments say %s",
+                row["bill_id"],
+                row["stored"],
+                row["expected"],
+            )
+        drifted += len(page["bills"])
+        after_id = page["next_after_id"]
+    if drifted:
+        logger.warning("Payment state check: %s bills disagree with their payments", drifted)
+    else:
+        logger.info("Payment state check: every bill matches its payments")
+    return drifted
+
+
+def _run_quietly(engine) -> None:
+    try:
+        run_payment_state_check(engine)
+    except Exception:
+        logger.exception("Payment state check failed")
+
+
+def start_payment_state_check(engine) -> threading.Thread:
+    """Run ``run_payment_state_check`` once in a daemon thread."""
+    thread = threading.Thread(target=_run_quietly, args=(engine,), name="payment-state-check", daemon=True)
+    thread.start()
+    return thread
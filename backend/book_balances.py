@@ -0,0 +1,221 @@
+"""Day-by-day cash and bank positions behind the cashbook and bankbook views.
+
+A ``BookDayBalance`` row stores, for one book (CASH or BANK) and one calendar
+day, the opening balance, the day's receipts/withdrawals/expenses/charges and
+the closing balance. Rows run contiguously from the first day with any
+activity up to the last refresh, so a day's opening is simply the previous
+day's closing unless an OPENING entry on that day resets it.
+
+SQLite triggers on every table that moves cash or bank money delete the rows
+from the changed date onward, and ``refresh_book_balances`` (run on startup)
+writes the closed days that are missing. Days after the last stored row are
+folded on the fly from one grouped query per book, so a stale or empty table
+only costs a longer tail, never a wrong balance.
+"""
+
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlmodel import select
+
+from backend.cash_flow_aggregates import BANK_FLOWS, CASH_FLOWS, combine, flow_components, flow_totals_by_day
+from backend.models import BankbookEntry, BookDayBalance, CashbookEntry
+
+BOOKS = ("CASH", "BANK")
+DAY_END = "T23:59:59.999999"
+FLOW_KEYS = ("receipts", "withdrawals", "expenses", "charges")
+
+_FLOWS = {"CASH": CASH_FLOWS, "BANK": BANK_FLOWS}
+_BOOK_TABLES = {"CASH": CashbookEntry, "BANK": BankbookEntry}
+
+
+def _bounds(ts, start_day: Optional[str], end_day: Optional[str]) -> list:
+    conditions = []
+    if start_day:
+        conditions.append(ts >= f"{start_day}T00:00:00")
+    if end_day:
+        conditions.append(ts <= f"{end_day}{DAY_END}")
+    return conditions
+
+
+def _daily_flows(session, book: str, start_day: Optional[str], end_day: Optional[str]) -> Dict[str, dict]:
+    flows = _FLOWS[book]
+    by_day = flow_totals_by_day(
+        session,
+        flow_components(flows),
+        start_iso=f"{start_day}T00:00:00" if start_day else None,
+        end_iso=f"{end_day}{DAY_END}" if end_day else None,
+    )
+    out: Dict[str, dict] = {}
+    for day, totals in by_day.items():
+        figures = combine(totals, flows)
+        out[day] = {**{key: figures[key] for key in FLOW_KEYS}, "entry_count": figures["entries"]}
+    return out
+
+
+def _anchors(session, book: str, start_day: Optional[str], end_day: Optional[str]) -> Dict[str, float]:
+    # The last OPENING entry of a day resets that day's opening balance.
+    table = _BOOK_TABLES[book]
+    rows = session.exec(
+        select(table.created_at, table.amount)
+        .where(table.entry_type == "OPENING")
+        .where(*_bounds(table.created_at, start_day, end_day))
+        .order_by(table.created_at, table.id)
+    ).all()
+    return {str(created_at)[:10]: float(amount or 0) for created_at, amount in rows}
+
+
+def _fold(book: str, start_day: str, end_day: str, opening: float, flows: Dict[str, dict], anchors: Dict[str, float]):
+    day = date.fromisoformat(start_day)
+    end = date.fromisoformat(end_day)
+    while day <= end:
+        key = day.isoformat()
+        values = flows.get(key) or {**{k: 0.0 for k in FLOW_KEYS}, "entry_count": 0}
+        if key in anchors:
+            opening = anchors[key]
+        closing = round(opening + values["receipts"] - values["withdrawals"] - values["expenses"] - values["charges"], 2)
+        yield {"book": book, "balance_date": key, "opening_balance": round(opening, 2), **values, "closing_balance": closing}
+        opening = closing
+        day += timedelta(days=1)
+
+
+def _row_dict(row: BookDayBalance) -> dict:
+    return {
+        "book": row.book,
+        "balance_date": row.balance_date,
+        "opening_balance": float(row.opening_balance or 0),
+        **{key: float(getattr(row, key) or 0) for key in FLOW_KEYS},
+        "entry_count": int(row.entry_count or 0),
+        "closing_balance": float(row.closing_balance or 0),
+    }
+
+
+def _tail(session, book: str, last: Optional[BookDayBalance], end_day: str) -> List[dict]:
+    """Fold the days after ``last`` (or from the first activity) through ``end_day``."""
+    if last is not None:
+        start_day = (date.fromisoformat(last.balance_date) + timedelta(days=1)).isoformat()
+        if start_day > end_day:
+            return []
+        opening = float(last.closing_balance or 0)
+        flows = _daily_flows(session, book, start_day, end_day)
+    else:
+        opening = 0.0
+        flows = _daily_flows(session, book, None, end_day)
+        if not flows:
+            return []
+        start_day = min(flows)
+    anchors = _anchors(session, book, start_day, end_day)
+    return list(_fold(book, start_day, end_day, opening, flows, anchors))
+
+
+def _last_row(session, book: str) -> Optional[BookDayBalance]:
+    return session.exec(
+        select(BookDayBalance)
+        .where(BookDayBalance.book == book)
+        .order_by(BookDayBalance.balance_date.desc())
+        .limit(1)
+    ).first()
+
+
+def book_days(session, book: str, days: Iterable[str]) -> Dict[str, dict]:
+    """Opening, flows and closing for each requested ``YYYY-MM-DD`` of one book.
+
+    Stored rows answer the days they cover; later days come from a single
+    grouped tail query, whatever the number of days requested.
+    """
+    wanted = sorted(set(days))
+    if not wanted:
+        return {}
+    stored = {
+        row.balance_date: _row_dict(row)
+        for row in session.exec(
+            select(BookDayBalance)
+            .where(BookDayBalance.book == book)
+            .where(BookDayBalance.balance_date >= wanted[0])
+            .where(BookDayBalance.balance_date <= wanted[-1])
+        ).all()
+    }
+    last = _last_row(session, book)
+    tail = {row["balance_date"]: row for row in _tail(session, book, last, wanted[-1])}
+
+    out: Dict[str, dict] = {}
+    for day in wanted:
+        row = stored.get(day) or tail.get(day)
+        if row is None:
+            # Before the first day with any activity.
+            row = {"book": book, "balance_date": day, "opening_balance": 0.0, **{k: 0.0 for k in FLOW_KEYS}}
+            row.update(entry_count=0, closing_balance=0.0)
+        out[day] = row
+    return out
+
+
+def refresh_book_balances(session, today: Optional[date] = None) -> int:
+    """Write the missing day rows of both books up to yesterday."""
+    through = ((today or date.today()) - timedelta(days=1)).isoformat()
+    written = 0
+    for book in BOOKS:
+        for values in _tail(session, book, _last_row(session, book), through):
+            session.add(BookDayBalance(**values))
+            written += 1
+    session.commit()
+    return written
+
+
+def _drop_from(day_sql: str) -> str:
+    return f"DELETE FROM bookdaybalance WHERE balance_date >= {day_sql};"
+
+
+# (trigger name, table, expression for the row's day)
+_DATED_TABLES = [
+    ("cashbookentry", "cashbookentry", "SUBSTR({ref}.created_at, 1, 10)"),
+    ("bankbookentry", "bankbookentry", "SUBSTR({ref}.created_at, 1, 10)"),
+    ("billpayment", "billpayment", "SUBSTR({ref}.received_at, 1, 10)"),
+    ("partyreceipt", "partyreceipt", "SUBSTR({ref}.received_at, 1, 10)"),
+    ("exchangerecord", "exchangerecord", "SUBSTR({ref}.created_at, 1, 10)"),
+    ("purchasereturn", "purchasereturn", "{ref}.return_date"),
+    ("return", '"return"', "SUBSTR({ref}.date_time, 1, 10)"),
+    ("purchasepayment", "purchasepayment", "SUBSTR({ref}.paid_at, 1, 10)"),
+    (
+        "receiptbilladjustment",
+        "receiptbilladjustment",
+        "(SELECT SUBSTR(bp.received_at, 1, 10) FROM billpayment bp WHERE bp.id = {ref}.bill_payment_id)",
+    ),
+]
+
+# Flag changes on a parent row move money on its children's days.
+_RECEIPT_PAYMENT_DAYS = (
+    "(SELECT MIN(SUBSTR(bp.received_at, 1, 10)) FROM receiptbilladjustment a "
+    "JOIN billpayment bp ON bp.id = a.bill_payment_id WHERE a.receipt_id = {ref}.id)"
+)
+_PARENT_TABLES = [
+    ("bill", "bill", "(SELECT MIN(SUBSTR(bp.received_at, 1, 10)) FROM billpayment bp WHERE bp.bill_id = {ref}.id)"),
+    ("purchase", "purchase", "(SELECT MIN(SUBSTR(pp.paid_at, 1, 10)) FROM purchasepayment pp WHERE pp.purchase_id = {ref}.id)"),
+    ("partyreceipt_adjusted", "partyreceipt", _RECEIPT_PAYMENT_DAYS),
+]
+
+
+def _triggers() -> List[str]:
+    ddl = []
+    for name, table, day in _DATED_TABLES:
+        ddl += [
+            f"CREATE TRIGGER IF NOT EXISTS book_balance_{name}_ai AFTER INSERT ON {table} "
+            f"BEGIN {_drop_from(day.format(ref='new'))} END",
+            f"CREATE TRIGGER IF NOT EXISTS book_balance_{name}_ad AFTER DELETE ON {table} "
+            f"BEGIN {_drop_from(day.format(ref='old'))} END",
+            f"CREATE TRIGGER IF NOT EXISTS book_balance_{name}_au AFTER UPDATE ON {table} "
+            f"BEGIN {_drop_from(day.format(ref='old'))} {_drop_from(day.format(ref='new'))} END",
+        ]
+    for name, table, days in _PARENT_TABLES:
+        ddl += [
+            f"CREATE TRIGGER IF NOT EXISTS book_balance_{name}_au AFTER UPDATE OF is_deleted ON {table} "
+            f"BEGIN {_drop_from(days.format(ref='new'))} END",
+            f"CREATE TRIGGER IF NOT EXISTS book_balance_{name}_ad AFTER DELETE ON {table} "
+            f"BEGIN {_drop_from(days.format(ref='old'))} END",
+        ]
+    return ddl
+
+
+def install_book_balance_triggers(conn) -> None:
+    for ddl in _triggers():
+        conn.execute(text(ddl))
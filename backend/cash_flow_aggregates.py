@@ -0,0 +1,311 @@
+"""Cash and bank money movements summed in SQL, per component and date range.
+
+Every place that moves money in or out of the cash or bank book is one named
+component (``bill_payment_cash``, ``purchase_online``, ``bank_deposit_in`` …).
+``flow_totals`` sums any set of components over a date range with a single
+grouped UNION ALL query, and ``flow_totals_by_day`` does the same per day.
+Payments settled through a live customer receipt and payments against a
+deleted purchase are excluded with correlated (NOT) EXISTS sub-queries instead
+of id sets loaded into Python.
+
+``CASH_FLOWS`` and ``BANK_FLOWS`` say which components make up each book's
+receipts, withdrawals, expenses, charges and entry count; ``combine`` folds a
+component total dict into those figures. The cashbook and bankbook routers and
+``backend.book_balances`` all build on these.
+"""
+
+from typing import Callable, Dict, Iterable, Optional
+
+from sqlalchemy import case, func, literal, or_, union_all
+from sqlmodel import select
+
+from backend.models import (
+    BankbookEntry,
+    Bill,
+    BillPayment,
+    CashbookEntry,
+    ExchangeRecord,
+    PartyReceipt,
+    Purchase,
+    PurchasePayment,
+    PurchaseReturn,
+    ReceiptBillAdjustment,
+    Return,
+)
+
+RECEIPT_TYPES = ("RECEIPT", "LOAN_REPAYMENT")
+WITHDRAWAL_TYPES = ("WITHDRAWAL", "CONTRA", "LOAN")
+
+
+def _num(value):
+    return func.coalesce(value, 0)
+
+
+def _bounds(ts, start_iso: Optional[str], end_iso: Optional[str]) -> list:
+    conditions = []
+    if start_iso:
+        conditions.append(ts >= start_iso)
+    if end_iso:
+        conditions.append(ts <= end_iso)
+    return conditions
+
+
+def _day(ts):
+    return func.substr(ts, 1, 10)
+
+
+def _rows(component, day, amount):
+    if isinstance(component, str):
+        component = literal(component)
+    return select(component.label("component"), day.label("day"), amount.label("amount"))
+
+
+def _book_entries(table, prefix: str):
+    # One pass classifies every book row as <prefix>_opening/_receipt/_withdrawal/_expense.
+    def build(start_iso, end_iso):
+        entry_type = func.upper(func.coalesce(table.entry_type, ""))
+        component = case(
+            (entry_type == "OPENING", literal(f"{prefix}_opening")),
+            (entry_type.in_(RECEIPT_TYPES), literal(f"{prefix}_receipt")),
+            (entry_type.in_(WITHDRAWAL_TYPES), literal(f"{prefix}_withdrawal")),
+            else_=literal(f"{prefix}_expense"),
+        )
+        return _rows(component, _day(table.created_at), _num(table.amount)).where(*_bounds(table.created_at, start_iso, end_iso))
+
+    return build
+
+
+def _book_entry_count(table, prefix: str):
+    def build(start_iso, end_iso):
+        return _rows(f"{prefix}_entries", _day(table.created_at), literal(1)).where(*_bounds(table.created_at, start_iso, end_iso))
+
+    return build
+
+
+def _bankbook_charges(start_iso, end_iso):
+    return _rows("bankbook_charges", _day(BankbookEntry.created_at), _num(BankbookEntry.txn_charges)).where(
+        *_bounds(BankbookEntry.created_at, start_iso, end_iso)
+    )
+
+
+def _bank_deposits(start_iso, end_iso):
+    # BANK_DEPOSIT bank entries mirror into the cashbook with the direction reversed.
+    entry_type = func.upper(func.coalesce(BankbookEntry.entry_type, ""))
+    component = case(
+        (entry_type == "RECEIPT", literal("bank_deposit_out")),
+        (entry_type.in_(("WITHDRAWAL", "CONTRA")), literal("bank_deposit_in")),
+        else_=literal("bank_deposit_other"),
+    )
+    return (
+        _rows(component, _day(BankbookEntry.created_at), _num(BankbookEntry.amount))
+        .where(BankbookEntry.mode == "BANK_DEPOSIT")
+        .where(*_bounds(BankbookEntry.created_at, start_iso, end_iso))
+    )
+
+
+def _cashbook_contra(start_iso, end_iso):
+    return (
+        _rows("cashbook_contra", _day(CashbookEntry.created_at), _num(CashbookEntry.amount))
+        .where(CashbookEntry.entry_type == "CONTRA")
+        .where(*_bounds(CashbookEntry.created_at, start_iso, end_iso))
+    )
+
+
+def _bill_payments(name: str, column):
+    def build(start_iso, end_iso):
+        # Payments settled through a live customer receipt are counted on the receipt.
+        via_receipt = (
+            select(ReceiptBillAdjustment.id)
+            .join(PartyReceipt, PartyReceipt.id == ReceiptBillAdjustment.receipt_id)
+            .where(ReceiptBillAdjustment.bill_payment_id == BillPayment.id)
+            .where(PartyReceipt.is_deleted == False)  # noqa: E712
+            .exists()
+        )
+        return (
+            _rows(name, _day(BillPayment.received_at), _num(column))
+            .join(Bill, Bill.id == BillPayment.bill_id)
+            .where(Bill.is_deleted == False)  # noqa: E712
+            .where(BillPayment.is_deleted == False)  # noqa: E712
+            .where(~via_receipt)
+            .where(*_bounds(BillPayment.received_at, start_iso, end_iso))
+        )
+
+    return build
+
+
+def _party_receipts(name: str, column):
+    def build(start_iso, end_iso):
+        return (
+            _rows(name, _day(PartyReceipt.received_at), _num(column))
+            .where(PartyReceipt.is_deleted == False)  # noqa: E712
+            .where(*_bounds(PartyReceipt.received_at, start_iso, end_iso))
+        )
+
+    return build
+
+
+def _exchanges(name: str, column):
+    def build(start_iso, end_iso):
+        return _rows(name, _day(ExchangeRecord.created_at), _num(column)).where(
+            *_bounds(ExchangeRecord.created_at, start_iso, end_iso)
+        )
+
+    return build
+
+
+def _returns(name: str, column):
+    def build(start_iso, end_iso):
+        return _rows(name, _day(Return.date_time), _num(column)).where(*_bounds(Return.date_time, start_iso, end_iso))
+
+    return build
+
+
+def _purchase_returns(name: str, column):
+    def build(start_iso, end_iso):
+        return (
+            _rows(name, PurchaseReturn.return_date, _num(column))
+            .where(PurchaseReturn.is_deleted == False)  # noqa: E712
+            .where(*_bounds(PurchaseReturn.return_date, start_iso and start_iso[:10], end_iso and end_iso[:10]))
+        )
+
+    return build
+
+
+def _purchase_payments(name: str, amount: Callable):
+    def build(start_iso, end_iso):
+        # Payments against a deleted (or missing) purchase no longer move money.
+        live_purchase = or_(
+            func.coalesce(PurchasePayment.purchase_id, 0) <= 0,
+            select(Purchase.id)
+            .where(Purchase.id == PurchasePayment.purchase_id)
+            .where(Purchase.is_deleted == False)  # noqa: E712
+            .exists(),
+        )
+        return (
+            _rows(name, _day(PurchasePayment.paid_at), amount())
+            .where(PurchasePayment.is_deleted == False)  # noqa: E712
+            .where(PurchasePayment.is_writeoff == False)  # noqa: E712
+            .where(live_purchase)
+            .where(*_bounds(PurchasePayment.paid_at, start_iso, end_iso))
+        )
+
+    return build
+
+
+def _purchase_charges():
+    online = _num(PurchasePayment.online_amount)
+    return case((online > 0, _num(PurchasePayment.txn_charges)), else_=0.0)
+
+
+_cashbook_entries = _book_entries(CashbookEntry, "cashbook")
+_bankbook_entries = _book_entries(BankbookEntry, "bankbook")
+
+# component name -> branch builder(start_iso, end_iso); a builder may emit several components.
+_BRANCHES: Dict[str, Callable] = {
+    **{f"cashbook_{kind}": _cashbook_entries for kind in ("opening", "receipt", "withdrawal", "expense")},
+    **{f"bankbook_{kind}": _bankbook_entries for kind in ("opening", "receipt", "withdrawal", "expense")},
+    "cashbook_entries": _book_entry_count(CashbookEntry, "cashbook"),
+    "bankbook_entries": _book_entry_count(BankbookEntry, "bankbook"),
+    "bankbook_charges": _bankbook_charges,
+    **{name: _bank_deposits for name in ("bank_deposit_in", "bank_deposit_out", "bank_deposit_other")},
+    "cashbook_contra": _cashbook_contra,
+    "bill_payment_cash": _bill_payments("bill_payment_cash", BillPayment.cash_amount),
+    "bill_payment_online": _bill_payments("bill_payment_online", BillPayment.online_amount),
+    "party_receipt_cash": _party_receipts("party_receipt_cash", PartyReceipt.cash_amount),
+    "party_receipt_online": _party_receipts("party_receipt_online", PartyReceipt.online_amount),
+    "exchange_cash_in": _exchanges("exchange_cash_in", ExchangeRecord.payment_cash),
+    "exchange_online_in": _exchanges("exchange_online_in", ExchangeRecord.payment_online),
+    "exchange_online_out": _exchanges("exchange_online_out", ExchangeRecord.refund_online),
+    "return_cash": _returns("return_cash", Return.refund_cash),
+    "return_online": _returns("return_online", Return.refund_online),
+    "purchase_return_cash": _purchase_returns("purchase_return_cash", PurchaseReturn.refund_cash),
+    "purchase_return_online": _purchase_returns("purchase_return_online", PurchaseReturn.refund_online),
+    "purchase_cash": _purchase_payments("purchase_cash", lambda: _num(PurchasePayment.cash_amount)),
+    "purchase_online": _purchase_payments("purchase_online", lambda: _num(PurchasePayment.online_amount)),
+    "purchase_charges": _purchase_payments("purchase_charges", _purchase_charges),
+}
+
+CASH_FLOWS = {
+    "receipts": (
+        "cashbook_receipt",
+        "bill_payment_cash",
+        "party_receipt_cash",
+        "exchange_cash_in",
+        "purchase_return_cash",
+        "bank_deposit_in",
+    ),
+    "withdrawals": ("cashbook_withdrawal", "return_cash", "purchase_cash", "bank_deposit_out"),
+    "expenses": ("cashbook_expense", "bank_deposit_other"),
+    "charges": (),
+    "entries": ("cashbook_entries",),
+}
+
+BANK_FLOWS = {
+    "receipts": (
+        "bankbook_receipt",
+        "bill_payment_online",
+        "party_receipt_online",
+        "exchange_online_in",
+        "purchase_return_online",
+        "cashbook_contra",
+    ),
+    "withdrawals": ("bankbook_withdrawal", "return_online", "purchase_online", "exchange_online_out"),
+    "expenses": ("bankbook_expense",),
+    "charges": ("bankbook_charges", "purchase_charges"),
+    "entries": ("bankbook_entries",),
+}
+
+
+def flow_components(flows: Dict[str, Iterable[str]]) -> set:
+    return {name for names in flows.values() for name in names}
+
+
+def _grouped(session, components: Iterable[str], start_iso, end_iso, *, by_day: bool):
+    builders = []
+    for name in sorted(set(components)):
+        builder = _BRANCHES[name]
+        if builder not in builders:
+            builders.append(builder)
+    if not builders:
+        return []
+    flows = union_all(*[build(start_iso, end_iso) for build in builders]).subquery("cash_flows")
+    keys = [flows.c.component] + ([flows.c.day] if by_day else [])
+    stmt = select(*keys, func.sum(flows.c.amount)).group_by(*keys)
+    if by_day:
+        stmt = stmt.where(flows.c.day.is_not(None))
+    return session.exec(stmt).all()
+
+
+def flow_totals(
+    session,
+    components: Iterable[str],
+    *,
+    start_iso: Optional[str] = None,
+    end_iso: Optional[str] = None,
+) -> Dict[str, float]:
+    """Total of each component between two ISO timestamps (either may be open)."""
+    totals = {name: 0.0 for name in components}
+    for component, amount in _grouped(session, totals, start_iso, end_iso, by_day=False):
+        totals[component] = round(float(amount or 0), 2)
+    return totals
+
+
+def flow_totals_by_day(
+    session,
+    components: Iterable[str],
+    *,
+    start_iso: Optional[str] = None,
+    end_iso: Optional[str] = None,
+) -> Dict[str, Dict[str, float]]:
+    """``{YYYY-MM-DD: {component: total}}`` for the days that have any rows."""
+    out: Dict[str, Dict[str, float]] = {}
+    for component, day, amount in _grouped(session, components, start_iso, end_iso, by_day=True):
+        out.setdefault(str(day), {})[component] = round(float(amount or 0), 2)
+    return out
+
+
+def combine(totals: Dict[str, float], flows: Dict[str, Iterable[str]]) -> Dict[str, float]:
+    """Book figures (receipts, withdrawals, expenses, charges, entries) from component totals."""
+    out = {key: round(sum(float(totals.get(name) or 0) for name in names), 2) for key, names in flows.items()}
+    out["entries"] = int(out.get("entries") or 0)
+    return out
@@ -0,0 +1,157 @@
+"""Keep every customer's SUNDRY_DEBTOR party in step with the customer record.
+
+Bills, receipts and the debtor ledger hang off the Party; the customer screens
+edit the Customer. ``link_customer_party`` is called wherever a customer is
+created, edited or merged, and ``backfill_customer_parties`` repairs a whole
+database once (migration 14), so party reads never reconcile the two tables.
+"""
+
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import func
+from sqlmodel import select
+
+from backend.models import Customer, Party
+
+
+def _now_ts() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _clean(value: Optional[str]) -> Optional[str]:
+    text = " ".join(str(value or "").split())
+    return text or None
+
+
+def _clean_phone(value: Optional[str]) -> Optional[str]:
+    return "".join(ch for ch in str(value or "") if ch.isdigit()) or None
+
+
+def link_customer_party(session, customer: Customer) -> Party:
+    """Return the customer's debtor party, creating or refreshing it as needed.
+
+    Matches on ``legacy_customer_id`` first, then adopts an unlinked debtor of
+    the same name. The caller commits.
+    """
+    party = session.exec(
+        select(Party)
+        .where(
+            Party.party_group == "SUNDRY_DEBTOR",
+            Party.legacy_customer_id == int(customer.id or 0),
+        )
+        .order_by(Party.id.asc())
+    ).first()
+    now = _now_ts()
+    if party:
+        changed = False
+        if not party.is_active:
+            party.is_active = True
+            changed = True
+        if party.name != customer.name:
+            party.name = customer.name
+            changed = True
+        if party.phone != customer.phone:
+            party.phone = customer.phone
+            changed = True
+        if party.address_line != customer.address_line:
+            party.address_line = customer.address_line
+            changed = True
+        if changed:
+            party.updated_at = now
+            session.add(party)
+            session.flush()
+        return party
+
+    party = session.exec(
+        select(Party)
+        .where(
+            Party.party_group == "SUNDRY_DEBTOR",
+            func.lower(func.trim(func.coalesce(Party.name, ""))) == (_clean(customer.name) or "").lower(),
+        )
+        .order_by(Party.id.asc())
+    ).first()
+    if party:
+        party.legacy_customer_id = int(customer.id or 0)
+        party.is_active = True
+        party.updated_at = now
+        session.add(party)
+        session.flush()
+        return party
+
+    party = Party(
+        name=_clean(customer.name) or f"Customer #{customer.id}",
+        party_group="SUNDRY_DEBTOR",
+        phone=customer.phone,
+        address_line=customer.address_line,
+        opening_balance=0.0,
+        opening_balance_type="DR",
+        legacy_customer_id=int(customer.id or 0),
+        is_active=True,
+        created_at=now,
+        updated_at=now,
+    )
+    session.add(party)
+    session.flush()
+    return party
+
+
+def backfill_customer_parties(session) -> int:
+    """Link or create the debtor party of every active customer; returns rows written.
+
+    Two table reads and in-memory matching, so it stays cheap on large
+    customer lists. Archived customers are left alone: a customer merged away
+    keeps its party unlinked.
+    """
+    customers = session.exec(
+        select(Customer).where(Customer.is_active == True).order_by(Customer.id.asc())  # noqa: E712
+    ).all()
+    parties = session.exec(
+        select(Party).where(Party.party_group == "SUNDRY_DEBTOR").order_by(Party.id.asc())
+    ).all()
+    by_customer: Dict[int, Party] = {}
+    by_name: Dict[str, Party] = {}
+    for party in parties:
+        if party.legacy_customer_id is not None:
+            by_customer.setdefault(int(party.legacy_customer_id), party)
+        by_name.setdefault((_clean(party.name) or "").lower(), party)
+
+    ts = _now_ts()
+    written = 0
+    for customer in customers:
+        name = _clean(customer.name)
+        if not name:
+            continue
+        party = by_customer.get(int(customer.id)) or by_name.get(name.lower())
+        phone = _clean_phone(customer.phone)
+        address = _clean(customer.address_line)
+        if party is None:
+            party = Party(
+                name=name,
+                party_group="SUNDRY_DEBTOR",
+                phone=phone,
+                address_line=address,
+                opening_balance=0.0,
+                opening_balance_type="DR",
+                legacy_customer_id=int(customer.id),
+                is_active=True,
+                created_at=ts,
+                updated_at=ts,
+            )
+            by_customer[int(customer.id)] = by_name[name.lower()] = party
+        elif (int(party.legacy_customer_id or 0), _clean(party.name), _clean_phone(party.phone), _clean(party.address_line)) == (
+            int(customer.id),
+            name,
+            phone,
+            address,
+        ):
+            continue
+        else:
+            by_customer[int(customer.id)] = party
+            party.legacy_customer_id = int(customer.id)
+            party.name, party.phone, party.address_line = name, phone, address
+            party.updated_at = ts
+        session.add(party)
+        written += 1
+    session.commit()
+    return written
@@ -0,0 +1,559 @@
+"""Day book rows for every source document as one set-based query.
+
+Each source table (bills, receipts, purchases, cashbook, ...) contributes a
+SELECT with the same twelve columns; the branches are joined with UNION ALL
+and the type, search and deleted filters run inside SQLite. The summary totals
+and one keyset page ordered by (ts, source_type, source_id) descending come
+back from the same statement, so a month-long range never materializes more
+than ``limit`` row objects in Python.
+"""
+
+from typing import List, Optional, Tuple
+
+from sqlalchemy import String, and_, case, cast, exists, func, literal, or_, tuple_, true, union_all
+from sqlmodel import select
+
+from backend.models import (
+    Bill,
+    BillPayment,
+    CashbookEntry,
+    ExchangeRecord,
+    PackOpenEvent,
+    Party,
+    PartyReceipt,
+    Purchase,
+    PurchasePayment,
+    PurchaseReturn,
+    ReceiptBillAdjustment,
+    Return,
+    Voucher,
+)
+
+COLUMNS = (
+    "ts",
+    "voucher_type",
+    "source_type",
+    "source_id",
+    "voucher_no",
+    "party_name",
+    "narration",
+    "amount",
+    "cash_amount",
+    "online_amount",
+    "status",
+    "is_deleted",
+)
+
+SUMMARY_TOTALS = {
+    "sales_total": ("SALE",),
+    "purchase_total": ("PURCHASE",),
+    "journal_total": ("JOURNAL",),
+    "receipt_total": ("RECEIPT",),
+    "payment_total": ("PAYMENT",),
+    "return_total": ("RETURN", "PURCHASE_RETURN"),
+    "exchange_total": ("EXCHANGE",),
+    "expense_total": ("EXPENSE",),
+    "withdrawal_total": ("WITHDRAWAL",),
+    "writeoff_total": ("WRITE_OFF",),
+}
+
+_WS = " \t\r\n"
+
+
+def _txt(value):
+    return cast(value, String)
+
+
+def _or(value, fallback):
+    # Python's ``value or fallback`` for nullable text columns.
+    return func.coalesce(func.nullif(value, ""), fallback)
+
+
+def _money(value):
+    return func.round(func.coalesce(value, 0), 2)
+
+
+def _round2(x: float) -> float:
+    return float(f"{float(x or 0):.2f}")
+
+
+def _flag(value):
+    return func.coalesce(value, 0) != 0
+
+
+def _note_party(notes):
+    # SQL twin of the "Customer: <name> | ..." parsing used for bill notes.
+    raw = func.trim(func.coalesce(notes, ""), _WS)
+    first = func.substr(raw, 1, func.instr(raw + "|", "|") - 1)
+    first = func.substr(first, 1, func.instr(first + "\n", "\n") - 1)
+    first = func.substr(first, 1, func.instr(first + "\r", "\r") - 1)
+    name = func.nullif(func.trim(func.substr(first, func.instr(first, ":") + 1), _WS), "")
+    return case((func.lower(raw).like("customer:%"), name), else_=None)
+
+
+def _party_name(party_id):
+    party = Party.__table__.alias()
+    return (
+        select(func.trim(party.c.name, _WS))
+        .where(party.c.id == party_id)
+        .scalar_subquery()
+    )
+
+
+def _row(**columns):
+    return [columns[name].label(name) for name in COLUMNS]
+
+
+def _deleted(flag, deleted_filter: str):
+    if deleted_filter == "active":
+        return ~flag
+    if deleted_filter == "deleted":
+        return flag
+    return true()
+
+
+def _bills(start_iso, end_iso, deleted_filter):
+    return select(*_row(
+        ts=Bill.date_time,
+        voucher_type=literal("SALE"),
+        source_type=literal("BILL"),
+        source_id=Bill.id,
+        voucher_no=literal("S-") + _txt(Bill.id),
+        party_name=_note_party(Bill.notes),
+        narration=_or(Bill.notes, literal("Sales bill #") + _txt(Bill.id)),
+        amount=_money(Bill.total_amount),
+        cash_amount=_money(Bill.payment_cash),
+        online_amount=_money(Bill.payment_online),
+        status=Bill.payment_status,
+        is_deleted=_flag(Bill.is_deleted),
+    )).where(
+        Bill.date_time >= start_iso,
+        Bill.date_time <= end_iso,
+        _deleted(_flag(Bill.is_deleted), deleted_filter),
+    )
+
+
+def _bill_payments(start_iso, end_iso, deleted_filter):
+    writeoff = _flag(BillPayment.is_writeoff)
+    is_deleted = or_(_flag(BillPayment.is_deleted), _flag(Bill.is_deleted))
+    bill_no = _txt(BillPayment.bill_id)
+    return (
+        select(*_row(
+            ts=BillPayment.received_at,
+            voucher_type=case((writeoff, "WRITE_OFF"), else_="RECEIPT"),
+            source_type=literal("BILL_PAYMENT"),
+            source_id=BillPayment.id,
+            voucher_no=case((writeoff, "BW-"), else_="BR-") + _txt(BillPayment.id),
+            party_name=_note_party(Bill.notes),
+            narration=_or(
+                BillPayment.note,
+                case(
+                    (writeoff, literal("Write-off against bill #") + bill_no),
+                    else_=literal("Receipt against bill #") + bill_no,
+                ),
+            ),
+            amount=case(
+                (writeoff, _money(BillPayment.writeoff_amount)),
+                else_=_money(func.coalesce(BillPayment.cash_amount, 0) + func.coalesce(BillPayment.online_amount, 0)),
+            ),
+            cash_amount=case((writeoff, 0.0), else_=_money(BillPayment.cash_amount)),
+            online_amount=case((writeoff, 0.0), else_=_money(BillPayment.online_amount)),
+            status=case((is_deleted, "DELETED"), else_=Bill.payment_status),
+            is_deleted=is_deleted,
+        ))
+        .join(Bill, Bill.id == BillPayment.bill_id)
+        .where(
+            BillPayment.received_at >= start_iso,
+            BillPayment.received_at <= end_iso,
+            _deleted(_flag(BillPayment.is_deleted), deleted_filter),
+            _deleted(is_deleted, deleted_filter),
+            func.lower(func.trim(func.coalesce(BillPayment.note, ""), _WS)) != "auto: payment at bill creation",
+            ~exists().where(ReceiptBillAdjustment.bill_payment_id == BillPayment.id),
+        )
+    )
+
+
+def _purchases(start_iso, end_iso, deleted_filter):
+    return select(*_row(
+        ts=Purchase.created_at,
+        voucher_type=literal("PURCHASE"),
+        source_type=literal("PURCHASE"),
+        source_id=Purchase.id,
+        voucher_no=literal("P-") + _txt(Purchase.id),
+        party_name=_party_name(Purchase.party_id),
+        narration=_or(Purchase.notes, literal("Purchase invoice ") + Purchase.invoice_number),
+        amount=_money(Purchase.total_amount),
+        cash_amount=literal(0.0),
+        online_amount=literal(0.0),
+        status=Purchase.payment_status,
+        is_deleted=_flag(Purchase.is_deleted),
+    )).where(
+        Purchase.created_at >= start_iso,
+        Purchase.created_at <= end_iso,
+        _deleted(_flag(Purchase.is_deleted), deleted_filter),
+    )
+
+
+def _purchase_returns(start_date, end_date, deleted_filter):
+    is_deleted = _flag(PurchaseReturn.is_deleted)
+    return select(*_row(
+        ts=PurchaseReturn.return_date + "T00:00:00",
+        voucher_type=literal("PURCHASE_RETURN"),
+        source_type=literal("PURCHASE_RETURN"),
+        source_id=PurchaseReturn.id,
+        voucher_no=PurchaseReturn.return_number,
+        party_name=_party_name(PurchaseReturn.party_id),
+        narration=_or(PurchaseReturn.notes, literal("Purchase return ") + PurchaseReturn.return_number),
+        amount=_money(PurchaseReturn.total_amount),
+        cash_amount=_money(PurchaseReturn.refund_cash),
+        online_amount=_money(PurchaseReturn.refund_online),
+        status=case((is_deleted, "DELETED"), else_="POSTED"),
+        is_deleted=is_deleted,
+    )).where(
+        PurchaseReturn.return_date >= start_date,
+        PurchaseReturn.return_date <= end_date,
+        _deleted(is_deleted, deleted_filter),
+    )
+
+
+def _journals(start_date, end_date, deleted_filter):
+    is_deleted = _flag(Voucher.is_deleted)
+    return select(*_row(
+        ts=Voucher.voucher_date + "T00:00:00",
+        voucher_type=literal("JOURNAL"),
+        source_type=literal("MANUAL_JOURNAL"),
+        source_id=Voucher.id,
+        voucher_no=Voucher.voucher_no,
+        party_name=literal(None, String),
+        narration=_or(Voucher.narration, "Journal entry"),
+        amount=_money(Voucher.total_amount),
+        cash_amount=literal(0.0),
+        online_amount=literal(0.0),
+        status=case((is_deleted, "DELETED"), else_="POSTED"),
+        is_deleted=is_deleted,
+    )).where(
+        Voucher.voucher_type == "JOURNAL",
+        Voucher.source_type == "MANUAL_JOURNAL",
+        Voucher.voucher_date >= start_date,
+        Voucher.voucher_date <= end_date,
+        _deleted(is_deleted, deleted_filter),
+    )
+
+
+def _purchase_payment_rows(start_iso, end_iso, deleted_filter, *, charges: bool):
+    has_purchase = Purchase.id.is_not(None)
+    party_id = case(
+        (has_purchase, func.coalesce(Purchase.party_id, 0)),
+        else_=func.coalesce(PurchasePayment.party_id, 0),
+    )
+    writeoff = _flag(PurchasePayment.is_writeoff)
+    is_deleted = or_(_flag(PurchasePayment.is_deleted), _flag(Purchase.is_deleted))
+    txn_suffix = case(
+        (func.coalesce(PurchasePayment.transaction_id, "") != "", literal(" | Txn ") + PurchasePayment.transaction_id),
+        else_="",
+    )
+    if charges:
+        bank_charges = _money(PurchasePayment.txn_charges)
+        columns = _row(
+            ts=PurchasePayment.paid_at,
+            voucher_type=literal("EXPENSE"),
+            source_type=literal("PURCHASE_PAYMENT_CHARGE"),
+            source_id=PurchasePayment.id,
+            voucher_no=literal("PBC-") + _txt(PurchasePayment.id),
+            party_name=_party_name(party_id),
+            narration=_or(
+                PurchasePayment.note,
+                case(
+                    (has_purchase, literal("Bank charges for purchase ") + Purchase.invoice_number),
+                    else_="Bank charges for supplier payment",
+                ),
+            ) + txn_suffix,
+            amount=bank_charges,
+            cash_amount=literal(0.0),
+            online_amount=bank_charges,
+            status=case((is_deleted, "DELETED"), else_="POSTED"),
+            is_deleted=is_deleted,
+        )
+    else:
+        columns = _row(
+            ts=PurchasePayment.paid_at,
+            voucher_type=case((writeoff, "WRITE_OFF"), else_="PAYMENT"),
+            source_type=literal("PURCHASE_PAYMENT"),
+            source_id=PurchasePayment.id,
+            voucher_no=literal("PP-") + _txt(PurchasePayment.id),
+            party_name=_party_name(party_id),
+            narration=_or(
+                PurchasePayment.note,
+                case(
+                    (has_purchase, literal("Payment for purchase ") + Purchase.invoice_number),
+                    else_="Supplier payment without purchase",
+                ),
+            ) + txn_suffix,
+            amount=_money(PurchasePayment.amount),
+            cash_amount=case((writeoff, 0.0), else_=_money(PurchasePayment.cash_amount)),
+            online_amount=case((writeoff, 0.0), else_=_money(PurchasePayment.online_amount)),
+            status=case((is_deleted, "DELETED"), (has_purchase, Purchase.payment_status), else_="PAID"),
+            is_deleted=is_deleted,
+        )
+    stmt = (
+        select(*columns)
+        .outerjoin(Purchase, and_(PurchasePayment.purchase_id > 0, Purchase.id == PurchasePayment.purchase_id))
+        .where(
+            PurchasePayment.paid_at >= start_iso,
+            PurchasePayment.paid_at <= end_iso,
+            party_id != 0,
+            _deleted(_flag(PurchasePayment.is_deleted), deleted_filter),
+            _deleted(is_deleted, deleted_filter),
+        )
+    )
+    if charges:
+        stmt = stmt.where(
+            ~writeoff,
+            _money(PurchasePayment.txn_charges) > 0,
+            func.coalesce(PurchasePayment.online_amount, 0) > 0,
+        )
+    return stmt
+
+
+def _party_receipts(start_iso, end_iso, deleted_filter):
+    return select(*_row(
+        ts=PartyReceipt.received_at,
+        voucher_type=literal("RECEIPT"),
+        source_type=literal("PARTY_RECEIPT"),
+        source_id=PartyReceipt.id,
+        voucher_no=literal("R-") + _txt(PartyReceipt.id),
+        party_name=_party_name(PartyReceipt.party_id),
+        narration=_or(PartyReceipt.note, "Customer receipt"),
+        amount=_money(PartyReceipt.total_amount),
+        cash_amount=_money(PartyReceipt.cash_amount),
+        online_amount=_money(PartyReceipt.online_amount),
+        status=case((_money(PartyReceipt.unallocated_amount) > 0, "ON_ACCOUNT"), else_="ADJUSTED"),
+        is_deleted=_flag(PartyReceipt.is_deleted),
+    )).where(
+        PartyReceipt.received_at >= start_iso,
+        PartyReceipt.received_at <= end_iso,
+        _deleted(_flag(PartyReceipt.is_deleted), deleted_filter),
+    )
+
+
+def _returns(start_iso, end_iso, _deleted_filter):
+    return select(*_row(
+        ts=Return.date_time,
+        voucher_type=literal("RETURN"),
+        source_type=literal("RETURN"),
+        source_id=Return.id,
+        voucher_no=literal("RET-") + _txt(Return.id),
+        party_name=literal(None, String),
+        narration=_or(
+            Return.notes,
+            case(
+                (_flag(Return.source_bill_id), literal("Return against bill #") + _txt(Return.source_bill_id)),
+                else_="Return",
+            ),
+        ),
+        amount=_money(Return.subtotal_return),
+        cash_amount=_money(Return.refund_cash),
+        online_amount=_money(Return.refund_online),
+        status=literal(None, String),
+        is_deleted=literal(False),
+    )).where(Return.date_time >= start_iso, Return.date_time <= end_iso)
+
+
+def _exchanges(start_iso, end_iso, _deleted_filter):
+    return select(*_row(
+        ts=ExchangeRecord.created_at,
+        voucher_type=literal("EXCHANGE"),
+        source_type=literal("EXCHANGE"),
+        source_id=ExchangeRecord.id,
+        voucher_no=literal("EX-") + _txt(ExchangeRecord.id),
+        party_name=literal(None, String),
+        narration=_or(
+            ExchangeRecord.notes,
+            case(
+                (
+                    _flag(ExchangeRecord.source_bill_id),
+                    literal("Exchange against bill #") + _txt(ExchangeRecord.source_bill_id),
+                ),
+                else_="Exchange",
+            ),
+        ),
+        amount=case(
+            (_flag(ExchangeRecord.net_due), _money(func.abs(ExchangeRecord.net_due))),
+            else_=_money(ExchangeRecord.theoretical_net),
+        ),
+        cash_amount=_money(func.coalesce(ExchangeRecord.payment_cash, 0) + func.coalesce(ExchangeRecord.refund_cash, 0)),
+        online_amount=_money(
+            func.coalesce(ExchangeRecord.payment_online, 0) + func.coalesce(ExchangeRecord.refund_online, 0)
+        ),
+        status=literal(None, String),
+        is_deleted=literal(False),
+    )).where(ExchangeRecord.created_at >= start_iso, ExchangeRecord.created_at <= end_iso)
+
+
+def _cashbook(start_iso, end_iso, _deleted_filter):
+    entry_type = func.upper(func.coalesce(CashbookEntry.entry_type, ""))
+    return select(*_row(
+        ts=CashbookEntry.created_at,
+        voucher_type=entry_type,
+        source_type=literal("CASHBOOK"),
+        source_id=CashbookEntry.id,
+        voucher_no=literal("CB-") + _txt(CashbookEntry.id),
+        party_name=literal(None, String),
+        narration=_or(CashbookEntry.note, literal("Cashbook ") + func.lower(entry_type)),
+        amount=_money(CashbookEntry.amount),
+        cash_amount=case((entry_type == "RECEIPT", _money(CashbookEntry.amount)), else_=0.0),
+        online_amount=literal(0.0),
+        status=literal(None, String),
+        is_deleted=literal(False),
+    )).where(CashbookEntry.created_at >= start_iso, CashbookEntry.created_at <= end_iso)
+
+
+def _pack_opens(start_iso, end_iso, _deleted_filter):
+    return select(*_row(
+        ts=PackOpenEvent.created_at,
+        voucher_type=literal("STOCK_JOURNAL"),
+        source_type=literal("PACK_OPEN"),
+        source_id=PackOpenEvent.id,
+        voucher_no=literal("SJ-") + _txt(PackOpenEvent.id),
+        party_name=literal(None, String),
+        narration=_or(
+            PackOpenEvent.note,
+            literal("Opened ")
+            + _txt(PackOpenEvent.packs_opened)
+            + " pack(s) into "
+            + _txt(PackOpenEvent.loose_units_created)
+            + " loose units",
+        ),
+        amount=_money(PackOpenEvent.loose_units_created),
+        cash_amount=literal(0.0),
+        online_amount=literal(0.0),
+        status=literal(None, String),
+        is_deleted=literal(False),
+    )).where(PackOpenEvent.created_at >= start_iso, PackOpenEvent.created_at <= end_iso)
+
+
+# (builder, date bounds it filters on, voucher types it can emit; None = any)
+_SOURCES = [
+    (_bills, "iso", {"SALE"}),
+    (_bill_payments, "iso", {"RECEIPT", "WRITE_OFF"}),
+    (_purchases, "iso", {"PURCHASE"}),
+    (_purchase_returns, "date", {"PURCHASE_RETURN"}),
+    (_journals, "date", {"JOURNAL"}),
+    (lambda s, e, d: _purchase_payment_rows(s, e, d, charges=False), "iso", {"PAYMENT", "WRITE_OFF"}),
+    (lambda s, e, d: _purchase_payment_rows(s, e, d, charges=True), "iso", {"EXPENSE"}),
+    (_party_receipts, "iso", {"RECEIPT"}),
+    (_returns, "iso", {"RETURN"}),
+    (_exchanges, "iso", {"EXCHANGE"}),
+    (_cashbook, "iso", None),
+    (_pack_opens, "iso", {"STOCK_JOURNAL"}),
+]
+
+
+def encode_cursor(row: dict) -> str:
+    return f"{row['ts']}|{row['source_type']}|{row['source_id']}"
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str, int]:
+    ts, source_type, source_id = str(cursor).rsplit("|", 2)
+    return ts, source_type, int(source_id)
+
+
+def daybook_page(
+    session,
+    *,
+    start_date: str,
+    end_date: str,
+    voucher_type: Optional[str] = None,
+    q: str = "",
+    deleted_filter: str = "active",
+    include_stock_journal: bool = True,
+    cursor: Optional[Tuple[str, str, int]] = None,
+    limit: int = 200,
+) -> Tuple[List[dict], dict, Optional[str]]:
+    """One page of day book rows (newest first), the summary and the next cursor.
+
+    ``cursor`` is the (ts, source_type, source_id) of the last row already
+    shown; the page continues strictly after it in the descending order.
+    """
+    start_iso = f"{start_date}T00:00:00"
+    end_iso = f"{end_date}T23:59:59"
+    branches = []
+    for build, bounds, types in _SOURCES:
+        if build is _pack_opens and not include_stock_journal:
+            continue
+        if voucher_type and types is not None and voucher_type not in types:
+            continue
+        if bounds == "date":
+            branches.append(build(start_date, end_date, deleted_filter))
+        else:
+            branches.append(build(start_iso, end_iso, deleted_filter))
+
+    empty_summary = {"total_rows": 0, "stock_journal_count": 0, **{key: 0.0 for key in SUMMARY_TOTALS}}
+    if not branches:
+        return [], empty_summary, None
+
+    rows = union_all(*branches).subquery("daybook_rows")
+    conditions = []
+    if voucher_type:
+        conditions.append(rows.c.voucher_type == voucher_type)
+    if q:
+        haystack = func.lower(
+            func.coalesce(rows.c.voucher_no, "")
+            + " | "
+            + func.coalesce(rows.c.party_name, "")
+            + " | "
+            + func.coalesce(rows.c.narration, "")
+            + " | "
+            + func.coalesce(rows.c.source_type, "")
+            + " | "
+            + func.coalesce(rows.c.voucher_type, "")
+        )
+        conditions.append(func.instr(haystack, q) > 0)
+    filtered = select(rows).where(*conditions).cte("daybook")
+
+    summary = select(
+        func.count().label("total_rows"),
+        func.coalesce(
+            func.sum(case((filtered.c.voucher_type == "STOCK_JOURNAL", 1), else_=0)), 0
+        ).label("stock_journal_count"),
+        *[
+            func.coalesce(
+                func.sum(case((filtered.c.voucher_type.in_(types), filtered.c.amount), else_=0)), 0
+            ).label(key)
+            for key, types in SUMMARY_TOTALS.items()
+        ],
+    ).subquery("summary")
+
+    order = (filtered.c.ts, filtered.c.source_type, filtered.c.source_id)
+    page_stmt = select(filtered)
+    if cursor is not None:
+        page_stmt = page_stmt.where(tuple_(*order) < tuple_(*cursor))
+    page = page_stmt.order_by(*[col.desc() for col in order]).limit(limit + 1).subquery("page")
+
+    stmt = (
+        select(summary, page)
+        .select_from(summary.outerjoin(page, true()))
+        .order_by(page.c.ts.desc(), page.c.source_type.desc(), page.c.source_id.desc())
+    )
+    result = session.exec(stmt).mappings().all()
+
+    summary_out = dict(empty_summary)
+    page_rows: List[dict] = []
+    for record in result:
+        summary_out = {key: record[key] for key in empty_summary}
+        if record["source_id"] is None:
+            continue
+        row = {name: record[name] for name in COLUMNS}
+        row["source_id"] = int(row["source_id"])
+        row["is_deleted"] = bool(row["is_deleted"])
+        page_rows.append(row)
+    for key in SUMMARY_TOTALS:
+        summary_out[key] = _round2(summary_out[key])
+    summary_out["total_rows"] = int(summary_out["total_rows"] or 0)
+    summary_out["stock_journal_count"] = int(summary_out["stock_journal_count"] or 0)
+
+    next_cursor = None
+    if len(page_rows) > limit:
+        page_rows = page_rows[:limit]
+        next_cursor = encode_cursor(page_rows[-1])
+    return page_rows, summary_out, next_cursor
@@ -7,8 +7,8 @@ import re
 import shutil
 import sqlite3
 import sys
-from sqlmodel import create_engine, Session, SQLModel
-from sqlalchemy import text
+from sqlmodel import create_engine, Session
+from sqlalchemy import event, text
 
 BASE_DIR = Path(__file__).resolve().parent.parent   # project root (medical-inventory/)
 
@@ -39,13 +39,105 @@ def _resolve_db_file() -> Path:
 DB_FILE = _resolve_db_file()
 DB_FILE.parent.mkdir(parents=True, exist_ok=True)
 
+
+def _env_setting(name: str, default: str) -> str:
+    value = os.environ.get(f"MEDICAL_SHOP_DB_{name}")
+    return str(value).strip() if value is not None and str(value).strip() else default
+
+
+def _resolve_sqlite_pragmas() -> dict:
+    """Per-connection PRAGMAs, overridable with MEDICAL_SHOP_DB_<NAME> env vars.
+
+    WAL lets report readers run alongside the billing writer instead of blocking
+    it, and busy_timeout makes a second writer wait rather than fail instantly.
+    """
+    return {
+        "journal_mode": _env_setting("JOURNAL_MODE", "WAL").upper(),
+        "synchronous": _env_setting("SYNCHRONOUS", "NORMAL").upper(),
+        "busy_timeout": int(_env_setting("BUSY_TIMEOUT_MS", "15000")),
+        # Negative cache_size is in KiB rather than pages.
+        "cache_size": -abs(int(_env_setting("CACHE_SIZE_KB", "65536"))),
+        "mmap_size": int(_env_setting("MMAP_SIZE", str(256 * 1024 * 1024))),
+        "temp_store": _env_setting("TEMP_STORE", "MEMORY").upper(),
+        "foreign_keys": _env_setting("FOREIGN_KEYS", "ON").upper(),
+    }
+
+
+SQLITE_PRAGMAS = _resolve_sqlite_pragmas()
+
 engine = create_engine(
     f"sqlite:///{DB_FILE}",
     echo=False,
-    connect_args={"check_same_thread": False},
+    connect_args={
+        "check_same_thread": False,
+        "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000,
+    },
+)
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas: dict | None = None) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in (pragmas or SQLITE_PRAGMAS).items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
+
+
+@event.listens_for(engine, "connect")
+def _on_sqlite_connect(dbapi_connection, _connection_record) -> None:
+    apply_sqlite_pragmas(dbapi_connection)
+
+
+# Report endpoints read through a separate read-only engine so heavy queries
+# never hold the write lock and get their own pool instead of competing with
+# billing for connections. Journal mode and synchronous are file/writer
+# properties, so only reader-relevant PRAGMAs are applied here.
+READ_POOL_SIZE = int(_env_setting("READ_POOL_SIZE", "8"))
+READ_SQLITE_PRAGMAS = {
+    "busy_timeout": SQLITE_PRAGMAS["busy_timeout"],
+    "cache_size": SQLITE_PRAGMAS["cache_size"],
+    "mmap_size": SQLITE_PRAGMAS["mmap_size"],
+    "temp_store": SQLITE_PRAGMAS["temp_store"],
+    "query_only": "ON",
+}
+
+read_engine = create_engine(
+    f"sqlite:///file:{DB_FILE.as_posix()}?mode=ro&uri=true",
+    echo=False,
+    connect_args={
+        "check_same_thread": False,
+        "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000,
+    },
+    pool_size=READ_POOL_SIZE,
+    max_overflow=READ_POOL_SIZE,
 )
 
 
+@event.listens_for(read_engine, "connect")
+def _on_sqlite_read_connect(dbapi_connection, _connection_record) -> None:
+    apply_sqlite_pragmas(dbapi_connection, READ_SQLITE_PRAGMAS)
+
+
+def read_sqlite_runtime(session, pragmas: dict | None = None) -> dict:
+    """Return the PRAGMA values actually in effect on ``session``'s connection."""
+    active = {}
+    for name in (pragmas or SQLITE_PRAGMAS):
+        row = session.exec(text(f"PRAGMA {name}")).first()
+        active[name] = row[0] if row else None
+    return active
+
+
+def begin_immediate(session) -> None:
+    """Open ``session``'s transaction with SQLite's write lock already held.
+
+    pysqlite only issues BEGIN before the first write, so reads before it run
+    outside any transaction; a writer that reads, then writes what it read,
+    calls this first so no other commit can land in between.
+    """
+    session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+
+
 def _now_ts() -> str:
     return datetime.now().isoformat(timespec="seconds")
 
@@ -3979,13 +4071,19 @@ def migrate_db():
             session.commit()
 
 # Register SQLModel table metadata even when backend.db is imported outside main.py.
+# Table creation and migrate_db() are no longer run on import; they are steps in
+# backend.migrations, applied at API startup or ahead of deploy via the CLI.
 from backend import models as _models  # noqa: F401,E402
 
-SQLModel.metadata.create_all(engine)
-migrate_db()
-
 @contextmanager
 def get_session():
     # IMPORTANT: stop expiring objects after commit
     with Session(engine, expire_on_commit=False) as session:
         yield session
+
+
+@contextmanager
+def get_read_session():
+    # Read-only (mode=ro + query_only) session for reports; any write raises.
+    with Session(read_engine, expire_on_commit=False, autoflush=False) as session:
+        yield session
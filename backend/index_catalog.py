@@ -0,0 +1,158 @@
+"""Declarative list of the indexes the hot query paths rely on.
+
+``REQUIRED_INDEXES`` is the single place to add an index. The migration layer
+applies it with ``apply_index_catalog`` and ``/settings/db-health`` reports any
+index that is missing or cannot be built yet (its table or columns are absent)
+plus the query plans of ``HOT_QUERY_PROBES`` that still fall back to a full
+table scan.
+"""
+
+from typing import List, NamedTuple, Tuple
+
+from sqlalchemy import text
+
+
+class IndexSpec(NamedTuple):
+    name: str
+    table: str
+    columns: Tuple[str, ...]
+    unique: bool = False
+
+    def create_sql(self) -> str:
+        unique = "UNIQUE " if self.unique else ""
+        cols = ", ".join(self.columns)
+        return f'CREATE {unique}INDEX IF NOT EXISTS {self.name} ON "{self.table}" ({cols})'
+
+
+REQUIRED_INDEXES: List[IndexSpec] = [
+    # (name+brand) group lookups: archive rules, default visibility, product filters.
+    IndexSpec("ix_item_name_brand_key", "item", ("name_key", "brand_key")),
+    IndexSpec("ix_item_brand_key", "item", ("brand_key",)),
+    # Dashboard expiry counts range-scan batches by expiry date.
+    IndexSpec("ix_item_expiry_date", "item", ("expiry_date",)),
+    IndexSpec("ix_product_name_brand_key", "product", ("name_key", "brand_key")),
+    IndexSpec("ix_product_brand_key", "product", ("brand_key",)),
+    # Bill lines and payments are read for every bill render / return check.
+    IndexSpec("ix_billitem_bill_id", "billitem", ("bill_id",)),
+    IndexSpec("ix_billitem_item_id", "billitem", ("item_id",)),
+    IndexSpec("ix_billpayment_bill_id", "billpayment", ("bill_id",)),
+    IndexSpec("ix_bill_date_time", "bill", ("date_time",)),
+    # Debtor ledgers: bills whose note names the customer (see models.debtor_key).
+    IndexSpec("ix_bill_debtor_key", "bill", ("debtor_key",)),
+    # Sales returns / exchanges looked up by their source bill.
+    IndexSpec("ix_return_source_bill_id", "return", ("source_bill_id",)),
+    IndexSpec("ix_return_date_time", "return", ("date_time",)),
+    IndexSpec("ix_returnitem_return_id", "returnitem", ("return_id",)),
+    IndexSpec("ix_returnitem_item_id", "returnitem", ("item_id",)),
+    IndexSpec("ix_exchangerecord_source_bill_id", "exchangerecord", ("source_bill_id",)),
+    # Purchases.
+    IndexSpec("ix_purchaseitem_purchase_id", "purchaseitem", ("purchase_id",)),
+    IndexSpec("ix_purchasepayment_purchase_id", "purchasepayment", ("purchase_id",)),
+    IndexSpec("ix_purchasereturn_purchase_id", "purchasereturn", ("purchase_id",)),
+    # Stock ledger: per-item history in time order and lookups by source document.
+    IndexSpec("ix_stockmovement_item_ts", "stockmovement", ("item_id", "ts")),
+    IndexSpec("ix_stockmovement_ref", "stockmovement", ("ref_type", "ref_id")),
+    IndexSpec("ix_inventorylot_legacy_item_id", "inventorylot", ("legacy_item_id",)),
+    # Accounting: vouchers are upserted by their business source row.
+    IndexSpec("ix_voucher_source", "voucher", ("source_type", "source_id")),
+    IndexSpec("ix_voucherentry_voucher_id", "voucherentry", ("voucher_id",)),
+    IndexSpec("ix_receiptbilladjustment_bill_payment_id", "receiptbilladjustment", ("bill_payment_id",)),
+]
+
+
+# Representative statements from hot endpoints. Parameters are dummy values;
+# only the plan shape matters.
+HOT_QUERY_PROBES: List[Tuple[str, str]] = [
+    ("item_group_batches", "SELECT * FROM item WHERE name_key = 'dolo 650' AND brand_key = 'micro'"),
+    ("items_for_brand", "SELECT * FROM item WHERE brand_key = 'micro'"),
+    ("items_expiring_before", "SELECT id FROM item WHERE expiry_date <= '2026-03-01'"),
+    ("products_for_brand", "SELECT * FROM product WHERE brand_key = 'micro' ORDER BY name_key"),
+    ("bill_items_for_bill", "SELECT * FROM billitem WHERE bill_id = 1"),
+    ("bill_lines_for_item", "SELECT * FROM billitem WHERE item_id = 1"),
+    ("debtor_bills", "SELECT id FROM bill WHERE party_id = 1 OR customer_id = 1 OR debtor_key = 'asha rao'"),
+    ("bills_in_date_range", "SELECT id FROM bill WHERE date_time >= '2026-01-01T00:00:00' AND date_time <= '2026-01-31T23:59:59'"),
+    ("returns_for_bill", 'SELECT * FROM "return" WHERE source_bill_id = 1'),
+    ("return_items_for_return", "SELECT * FROM returnitem WHERE return_id = 1"),
+    ("exchanges_for_bill", "SELECT return_id FROM exchangerecord WHERE source_bill_id = 1"),
+    ("purchase_items_for_purchase", "SELECT * FROM purchaseitem WHERE purchase_id = 1"),
+    ("item_ledger_history", "SELECT * FROM stockmovement WHERE item_id = 1 ORDER BY ts DESC"),
+    ("movements_for_document", "SELECT * FROM stockmovement WHERE ref_type = 'BILL' AND ref_id = 1"),
+    ("voucher_by_source", "SELECT id FROM voucher WHERE source_type = 'SALE' AND source_id = 1"),
+    ("voucher_entries", "SELECT * FROM voucherentry WHERE voucher_id = 1"),
+]
+
+
+def _existing_index_names(conn) -> set:
+    rows = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).all()
+    return {str(row[0]) for row in rows}
+
+
+def _existing_tables(conn) -> set:
+    rows = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'")).all()
+    return {str(row[0]) for row in rows}
+
+
+def _table_columns(conn, table: str) -> set:
+    return {str(row[1]) for row in conn.execute(text(f'PRAGMA table_info("{table}")')).all()}
+
+
+def _catalog_status(conn) -> Tuple[List[IndexSpec], List[IndexSpec]]:
+    names = _existing_index_names(conn)
+    tables = _existing_tables(conn)
+    columns = {}
+    missing, skipped = [], []
+    for spec in REQUIRED_INDEXES:
+        if spec.name in names:
+            continue
+        if spec.table not in tables:
+            skipped.append(spec)
+            continue
+        if spec.table not in columns:
+            columns[spec.table] = _table_columns(conn, spec.table)
+        (missing if set(spec.columns) <= columns[spec.table] else skipped).append(spec)
+    return missing, skipped
+
+
+def missing_indexes(conn) -> List[IndexSpec]:
+    # Specs whose table or columns a later migration step has yet to add are
+    # left out; that step's catalog re-run picks them up.
+    return _catalog_status(conn)[0]
+
+
+def unbuildable_indexes(conn) -> List[IndexSpec]:
+    """Absent specs whose table or columns do not exist yet, so cannot be created."""
+    return _catalog_status(conn)[1]
+
+
+def apply_index_catalog(conn) -> List[str]:
+    """Create every missing catalog index; returns the names created."""
+    created = []
+    for spec in missing_indexes(conn):
+        conn.execute(text(spec.create_sql()))
+        created.append(spec.name)
+    if created:
+        conn.execute(text("PRAGMA optimize"))
+    return created
+
+
+def _is_full_scan(detail: str) -> bool:
+    # "SCAN billitem" is a table scan; "SCAN t USING (COVERING) INDEX ..." is not.
+    upper = detail.upper()
+    return upper.startswith("SCAN ") and "USING" not in upper
+
+
+def explain_hot_queries(conn) -> List[dict]:
+    out = []
+    for name, sql in HOT_QUERY_PROBES:
+        try:
+            plan = [str(row[3]) for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()]
+        except Exception as exc:  # table missing on a partially migrated DB
+            out.append({"name": name, "sql": sql, "plan": [], "full_scan": False, "error": str(exc)})
+            continue
+        out.append({
+            "name": name,
+            "sql": sql,
+            "plan": plan,
+            "full_scan": any(_is_full_scan(detail) for detail in plan),
+        })
+    return out
@@ -0,0 +1,117 @@
+"""Per-group stock rollup behind the inventory dashboard.
+
+``inventorygroupstock`` holds one row per (name_key, brand_key) item group.
+SQLite triggers on ``item`` recompute the affected group rows whenever a
+batch is added, removed, renamed, archived or its stock/expiry changes, so
+the rollup commits in the same transaction as the bill, return, purchase,
+audit or pack-open that moved the stock, whichever code path wrote it.
+
+A group's visible batches follow ``_apply_default_visibility``: the
+non-archived ones, or every batch when all of them are archived.
+"""
+
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy import case, func, or_, text
+from sqlmodel import select
+
+from backend.models import InventoryGroupStock, Item
+
+_ACTIVE = "COALESCE(is_archived, 0) = 0"
+_EXPIRY = "NULLIF(TRIM(COALESCE(expiry_date, '')), '')"
+
+_GROUP_ROW_SQL = f"""
+    SELECT name_key,
+           brand_key,
+           COUNT(*),
+           SUM(CASE WHEN {_ACTIVE} THEN 1 ELSE 0 END),
+           COALESCE(SUM(stock), 0),
+           COALESCE(SUM(CASE WHEN {_ACTIVE} THEN stock ELSE 0 END), 0),
+           CASE WHEN SUM(CASE WHEN {_ACTIVE} THEN 1 ELSE 0 END) > 0
+                THEN MIN(CASE WHEN {_ACTIVE} THEN {_EXPIRY} END)
+                ELSE MIN({_EXPIRY})
+           END
+    FROM item
+"""
+
+_COLUMNS = "name_key, brand_key, batch_count, active_batch_count, total_stock, active_stock, earliest_expiry"
+
+
+def _refresh_group_sql(ref: str) -> str:
+    # ref is "new" or "old" inside a trigger body.
+    key = f"name_key = {ref}.name_key AND brand_key = {ref}.brand_key"
+    return (
+        f"DELETE FROM inventorygroupstock WHERE {key}; "
+        f"INSERT INTO inventorygroupstock ({_COLUMNS}) "
+        f"{_GROUP_ROW_SQL} WHERE {key} AND name_key != '' GROUP BY name_key, brand_key;"
+    )
+
+
+_TRIGGERS = [
+    f"CREATE TRIGGER IF NOT EXISTS item_group_stock_ai AFTER INSERT ON item BEGIN {_refresh_group_sql('new')} END",
+    f"CREATE TRIGGER IF NOT EXISTS item_group_stock_ad AFTER DELETE ON item BEGIN {_refresh_group_sql('old')} END",
+    "CREATE TRIGGER IF NOT EXISTS item_group_stock_au "
+    "AFTER UPDATE OF name_key, brand_key, stock, is_archived, expiry_date ON item "
+    f"BEGIN {_refresh_group_sql('old')} {_refresh_group_sql('new')} END",
+]
+
+
+def install_group_stock_triggers(conn) -> None:
+    for ddl in _TRIGGERS:
+        conn.execute(text(ddl))
+
+
+def rebuild_group_stock(conn) -> None:
+    conn.execute(text("DELETE FROM inventorygroupstock"))
+    conn.execute(text(
+        f"INSERT INTO inventorygroupstock ({_COLUMNS}) "
+        f"{_GROUP_ROW_SQL} WHERE name_key != '' GROUP BY name_key, brand_key"
+    ))
+
+
+def dashboard_totals(session, *, low_stock_threshold: int, expiry_window_days: int, today: Optional[date] = None) -> dict:
+    today = today or date.today()
+    group = InventoryGroupStock
+    visible_stock = case((group.active_batch_count > 0, group.active_stock), else_=group.total_stock)
+    totals = session.exec(
+        select(
+            func.count(),
+            func.coalesce(func.sum(visible_stock), 0),
+            func.coalesce(func.sum(case((visible_stock > 0, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((visible_stock <= low_stock_threshold, 1), else_=0)), 0),
+        )
+    ).one()
+
+    # Expiry counts depend on today and the window, so they are counted per
+    # visible batch over the expiry_date index instead of being stored.
+    today_text = today.isoformat()
+    window_end = (today + timedelta(days=expiry_window_days)).isoformat()
+    window_next = (today + timedelta(days=expiry_window_days + 1)).isoformat()
+    expiry = func.substr(func.trim(Item.expiry_date), 1, 10)
+    expiry_counts = session.exec(
+        select(
+            func.coalesce(func.sum(case((expiry < today_text, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((expiry >= today_text, 1), else_=0)), 0),
+        )
+        .select_from(Item)
+        .join(group, (group.name_key == Item.name_key) & (group.brand_key == Item.brand_key))
+        # The raw bound keeps the expiry_date range scan; every value whose
+        # trimmed date is in the window (padded or with a time) sorts below it.
+        .where(Item.expiry_date < window_next)
+        .where(expiry <= window_end)
+        .where(expiry.op("GLOB")("[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]"))
+        .where(or_(Item.is_archived == False, Item.is_archived.is_(None), group.active_batch_count == 0))  # noqa: E712
+    ).one()
+
+    types_all = int(totals[0] or 0)
+    available = int(totals[2] or 0)
+    return {
+        "inventory_total_qty": int(totals[1] or 0),
+        "inventory_total_types_all": types_all,
+        "inventory_available_types": available,
+        "zero_stock_types_count": types_all - available,
+        "low_stock_count": int(totals[3] or 0),
+        "expiring_soon_count": int(expiry_counts[1] or 0),
+        "expired_count": int(expiry_counts[0] or 0),
+    }
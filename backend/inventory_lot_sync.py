@@ -1,6 +1,7 @@
 from datetime import datetime
-from typing import Optional
+from typing import Dict, Iterable, List, Optional
 
+from sqlalchemy import func, update
 from sqlmodel import select
 
 from backend.models import InventoryLot, Item, Product
@@ -23,10 +24,55 @@ def item_stock_kind(session, item: Item) -> str:
     return "loose" if lot and lot.opened_from_lot_id is not None else "sealed"
 
 
+# Stay well under SQLite's bound-parameter limit on older client builds (999).
+IN_CHUNK_SIZE = 900
+
+
+def chunked(values: Iterable[int], size: int = IN_CHUNK_SIZE) -> Iterable[List[int]]:
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
 def item_stock_meta(session, item_id: int) -> dict:
     item = session.get(Item, int(item_id)) if item_id else None
     lot = get_lot_for_item(session, int(item_id)) if item else None
     product = session.get(Product, int(item.product_id)) if item and item.product_id else None
+    return item_stock_meta_from(lot, product)
+
+
+def first_lots_for_items(session, item_ids: Iterable[int]) -> Dict[int, InventoryLot]:
+    """Batched ``get_lot_for_item``: the lowest-id lot per legacy item id."""
+    lots: Dict[int, InventoryLot] = {}
+    for chunk in chunked(sorted({int(x) for x in item_ids if x})):
+        for lot in session.exec(
+            select(InventoryLot)
+            .where(InventoryLot.legacy_item_id.in_(chunk))
+            .order_by(InventoryLot.id.asc())
+        ).all():
+            lots.setdefault(int(lot.legacy_item_id), lot)
+    return lots
+
+
+def item_stock_meta_map(session, items: Iterable[Item]) -> Dict[int, dict]:
+    """Batched ``item_stock_meta`` for already-loaded items, keyed by item id."""
+    items = [item for item in items if item is not None and item.id]
+    lots = first_lots_for_items(session, [int(item.id) for item in items])
+    product_ids = sorted({int(item.product_id) for item in items if item.product_id})
+    products: Dict[int, Product] = {}
+    for chunk in chunked(product_ids):
+        for product in session.exec(select(Product).where(Product.id.in_(chunk))).all():
+            products[int(product.id)] = product
+    return {
+        int(item.id): item_stock_meta_from(
+            lots.get(int(item.id)),
+            products.get(int(item.product_id)) if item.product_id else None,
+        )
+        for item in items
+    }
+
+
+def item_stock_meta_from(lot: Optional[InventoryLot], product: Optional[Product]) -> dict:
     is_loose = bool(lot and lot.opened_from_lot_id is not None)
     unit_label = (
         (product.child_unit_name if is_loose else product.parent_unit_name)
@@ -101,3 +147,35 @@ def sync_lot_quantity_for_item(session, item: Item, *, ts: Optional[str] = None)
     lot.updated_at = ts or now_ts()
     session.add(lot)
     return lot
+
+
+def _adjust_quantity(session, row, column, delta: int) -> bool:
+    # One conditional UPDATE instead of read-check-write: a decrement only
+    # applies while enough is left, so two counters selling the last pack at
+    # once cannot both succeed. The statement also takes SQLite's write lock,
+    # so the rest of the caller's transaction sees a settled value.
+    current = func.coalesce(column, 0)
+    stmt = (
+        update(type(row))
+        .where(type(row).id == int(row.id))
+        .values({column.key: current + int(delta)})
+        .execution_options(synchronize_session=False)
+    )
+    if delta < 0:
+        stmt = stmt.where(current >= -int(delta))
+    applied = session.exec(stmt).rowcount == 1
+    session.refresh(row, attribute_names=[column.key])
+    return applied
+
+
+def adjust_item_stock(session, item: Item, delta: int) -> bool:
+    """Atomically move ``item.stock`` by ``delta``; False if a decrement would go negative.
+
+    ``item.stock`` is reloaded from the database either way.
+    """
+    return _adjust_quantity(session, item, Item.stock, delta)
+
+
+def adjust_lot_quantity(session, lot: InventoryLot, delta: int, *, loose: bool = False) -> bool:
+    """``adjust_item_stock`` for a lot's sealed (or loose) quantity."""
+    return _adjust_quantity(session, lot, InventoryLot.loose_qty if loose else InventoryLot.sealed_qty, delta)
@@ -0,0 +1,209 @@
+"""Daily debit/credit totals per ledger behind trial balance and statements.
+
+``ledgerbalancedaily`` holds one row per (ledger_id, balance_date) with the
+summed DR and CR amounts of live (non-deleted) vouchers dated that day.
+SQLite triggers on ``voucherentry`` and ``voucher`` keep it current, so the
+rows change in the same transaction as ``upsert_voucher``,
+``mark_voucher_deleted`` or the manual journal endpoints, whichever wrote the
+entries. A balance as of any date is then a sum over at most one row per
+ledger per day instead of over every voucher entry.
+"""
+
+from typing import Dict, List, Optional
+
+from sqlalchemy import case, func, text, true
+from sqlmodel import select
+
+from backend.models import Ledger, LedgerBalanceDaily, LedgerGroup, Voucher, VoucherEntry
+
+
+def _entry_sql(ref: str, sign: str) -> str:
+    # One voucherentry row (ref "new"/"old"), counted only while its voucher is live.
+    return (
+        f"INSERT INTO ledgerbalancedaily (ledger_id, balance_date, dr_total, cr_total) "
+        f"SELECT {ref}.ledger_id, v.voucher_date, "
+        f"ROUND(CASE WHEN UPPER({ref}.entry_type) = 'DR' THEN {sign}{ref}.amount ELSE 0 END, 2), "
+        f"ROUND(CASE WHEN UPPER({ref}.entry_type) = 'DR' THEN 0 ELSE {sign}{ref}.amount END, 2) "
+        f"FROM voucher v WHERE v.id = {ref}.voucher_id AND COALESCE(v.is_deleted, 0) = 0 "
+        "ON CONFLICT(ledger_id, balance_date) DO UPDATE SET "
+        "dr_total = ROUND(dr_total + excluded.dr_total, 2), "
+        "cr_total = ROUND(cr_total + excluded.cr_total, 2);"
+    )
+
+
+def _voucher_sql(ref: str, sign: str) -> str:
+    # Every entry of one voucher (ref "new"/"old" on voucher), if that state is live.
+    return (
+        "INSERT INTO ledgerbalancedaily (ledger_id, balance_date, dr_total, cr_total) "
+        f"SELECT e.ledger_id, {ref}.voucher_date, "
+        f"ROUND(SUM(CASE WHEN UPPER(e.entry_type) = 'DR' THEN {sign}e.amount ELSE 0 END), 2), "
+        f"ROUND(SUM(CASE WHEN UPPER(e.entry_type) = 'DR' THEN 0 ELSE {sign}e.amount END), 2) "
+        f"FROM voucherentry e WHERE e.voucher_id = {ref}.id AND COALESCE({ref}.is_deleted, 0) = 0 "
+        "GROUP BY e.ledger_id "
+        "ON CONFLICT(ledger_id, balance_date) DO UPDATE SET "
+        "dr_total = ROUND(dr_total + excluded.dr_total, 2), "
+        "cr_total = ROUND(cr_total + excluded.cr_total, 2);"
+    )
+
+
+_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS voucherentry_balance_ai AFTER INSERT ON voucherentry "
+    f"BEGIN {_entry_sql('new', '')} END",
+    "CREATE TRIGGER IF NOT EXISTS voucherentry_balance_ad AFTER DELETE ON voucherentry "
+    f"BEGIN {_entry_sql('old', '-')} END",
+    "CREATE TRIGGER IF NOT EXISTS voucherentry_balance_au "
+    "AFTER UPDATE OF voucher_id, ledger_id, entry_type, amount ON voucherentry "
+    f"BEGIN {_entry_sql('old', '-')} {_entry_sql('new', '')} END",
+    "CREATE TRIGGER IF NOT EXISTS voucher_balance_au AFTER UPDATE OF is_deleted, voucher_date ON voucher "
+    f"BEGIN {_voucher_sql('old', '-')} {_voucher_sql('new', '')} END",
+    "CREATE TRIGGER IF NOT EXISTS voucher_balance_ad AFTER DELETE ON voucher "
+    f"BEGIN {_voucher_sql('old', '-')} END",
+]
+
+_REBUILD_SQL = """
+    INSERT INTO ledgerbalancedaily (ledger_id, balance_date, dr_total, cr_total)
+    SELECT e.ledger_id,
+           v.voucher_date,
+           ROUND(SUM(CASE WHEN UPPER(e.entry_type) = 'DR' THEN e.amount ELSE 0 END), 2),
+           ROUND(SUM(CASE WHEN UPPER(e.entry_type) = 'DR' THEN 0 ELSE e.amount END), 2)
+    FROM voucherentry e
+    JOIN voucher v ON v.id = e.voucher_id
+    WHERE COALESCE(v.is_deleted, 0) = 0
+    GROUP BY e.ledger_id, v.voucher_date
+"""
+
+
+def install_ledger_balance_triggers(conn) -> None:
+    for ddl in _TRIGGERS:
+        conn.execute(text(ddl))
+
+
+def rebuild_ledger_balances(conn) -> None:
+    conn.execute(text("DELETE FROM ledgerbalancedaily"))
+    conn.execute(text(_REBUILD_SQL))
+
+
+def _round2(x: float) -> float:
+    return float(f"{float(x or 0):.2f}")
+
+
+def ledger_period_totals(
+    session,
+    *,
+    from_date: Optional[str],
+    to_date: str,
+    ledger_ids: Optional[List[int]] = None,
+) -> Dict[int, dict]:
+    """Opening balance before ``from_date`` and DR/CR within the period, per ledger.
+
+    Balances are signed DR minus CR. Without ``from_date`` everything up to
+    ``to_date`` counts as period movement and the opening is zero.
+    """
+    row = LedgerBalanceDaily
+    in_period = row.balance_date >= from_date if from_date else true()
+    stmt = (
+        select(
+            row.ledger_id,
+            func.coalesce(func.sum(case((in_period, 0), else_=row.dr_total - row.cr_total)), 0),
+            func.coalesce(func.sum(case((in_period, row.dr_total), else_=0)), 0),
+            func.coalesce(func.sum(case((in_period, row.cr_total), else_=0)), 0),
+        )
+        .where(row.balance_date <= to_date)
+        .group_by(row.ledger_id)
+    )
+    if ledger_ids is not None:
+        stmt = stmt.where(row.ledger_id.in_(ledger_ids))
+    totals: Dict[int, dict] = {}
+    for ledger_id, opening, debit, credit in session.exec(stmt).all():
+        opening = _round2(opening)
+        debit = _round2(debit)
+        credit = _round2(credit)
+        totals[int(ledger_id)] = {
+            "opening_balance": opening,
+            "debit": debit,
+            "credit": credit,
+            "closing_balance": _round2(opening + debit - credit),
+        }
+    return totals
+
+
+def trial_balance(session, *, from_date: Optional[str], to_date: str) -> dict:
+    totals = ledger_period_totals(session, from_date=from_date, to_date=to_date)
+    ledgers = session.exec(select(Ledger).order_by(Ledger.name.asc(), Ledger.id.asc())).all()
+    groups = {int(g.id): g for g in session.exec(select(LedgerGroup)).all()}
+    zero = {"opening_balance": 0.0, "debit": 0.0, "credit": 0.0, "closing_balance": 0.0}
+
+    rows = []
+    group_rows: Dict[int, dict] = {}
+    for ledger in ledgers:
+        values = totals.get(int(ledger.id))
+        if values is None:
+            continue
+        group = groups.get(int(ledger.group_id))
+        rows.append({
+            "ledger_id": int(ledger.id),
+            "ledger_name": ledger.name,
+            "group_id": int(ledger.group_id),
+            "group_name": group.name if group else None,
+            **values,
+        })
+        bucket = group_rows.setdefault(int(ledger.group_id), {
+            "group_id": int(ledger.group_id),
+            "group_name": group.name if group else None,
+            "nature": group.nature if group else None,
+            **zero,
+        })
+        for key in zero:
+            bucket[key] = _round2(bucket[key] + values[key])
+
+    return {
+        "from_date": from_date,
+        "to_date": to_date,
+        "rows": rows,
+        "groups": sorted(group_rows.values(), key=lambda g: (g["group_name"] or "", g["group_id"])),
+        "total_debit": _round2(sum(r["debit"] for r in rows)),
+        "total_credit": _round2(sum(r["credit"] for r in rows)),
+        "closing_debit": _round2(sum(r["closing_balance"] for r in rows if r["closing_balance"] > 0)),
+        "closing_credit": _round2(-sum(r["closing_balance"] for r in rows if r["closing_balance"] < 0)),
+    }
+
+
+def ledger_statement(session, ledger_id: int, *, from_date: str, to_date: str) -> dict:
+    """Opening balance from the daily table plus the entries within the period."""
+    values = ledger_period_totals(session, from_date=from_date, to_date=to_date, ledger_ids=[ledger_id])
+    opening = values.get(ledger_id, {}).get("opening_balance", 0.0)
+    entries = session.exec(
+        select(VoucherEntry, Voucher)
+        .join(Voucher, Voucher.id == VoucherEntry.voucher_id)
+        .where(
+            VoucherEntry.ledger_id == ledger_id,
+            Voucher.is_deleted == False,  # noqa: E712
+            Voucher.voucher_date >= from_date,
+            Voucher.voucher_date <= to_date,
+        )
+        .order_by(Voucher.voucher_date, Voucher.id, VoucherEntry.sort_order)
+    ).all()
+    balance = opening
+    rows = []
+    for entry, voucher in entries:
+        is_debit = str(entry.entry_type).upper() == "DR"
+        amount = _round2(entry.amount)
+        balance = _round2(balance + (amount if is_debit else -amount))
+        rows.append({
+            "voucher_id": int(voucher.id),
+            "voucher_date": voucher.voucher_date,
+            "voucher_type": voucher.voucher_type,
+            "voucher_no": voucher.voucher_no,
+            "narration": entry.narration or voucher.narration,
+            "debit": amount if is_debit else 0.0,
+            "credit": 0.0 if is_debit else amount,
+            "balance": balance,
+        })
+    return {
+        "ledger_id": ledger_id,
+        "from_date": from_date,
+        "to_date": to_date,
+        "opening_balance": opening,
+        "closing_balance": balance,
+        "rows": rows,
+    }
@@ -0,0 +1,136 @@
+"""Process-level registry of the accounting chart.
+
+Voucher posting only needs the ids of the system ledger groups, the system
+ledgers and each party's ledger. Those rows are created once and never
+deleted, so instead of re-selecting them on every posting the ids are kept
+here, per engine, as plain ``LedgerRef`` tuples that are safe to share
+between sessions and threads.
+
+Entries a session discovers or creates are staged on that session and only
+published to the registry when it commits; a rollback drops them, so an id
+from an aborted transaction is never served. Code that moves or renames
+ledgers calls ``invalidate_ledger_registry`` after committing.
+"""
+
+import threading
+import weakref
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+
+_PENDING_KEY = "ledger_registry_pending"
+
+
+class LedgerRef(NamedTuple):
+    id: int
+    name: str
+    group_id: int
+    system_key: Optional[str] = None
+    party_id: Optional[int] = None
+
+
+class _Chart:
+    def __init__(self) -> None:
+        self.groups: Dict[str, int] = {}
+        self.ledgers: Dict[str, LedgerRef] = {}
+        self.party_ledgers: Dict[int, LedgerRef] = {}
+
+    def merge(self, other: "_Chart") -> None:
+        self.groups.update(other.groups)
+        self.ledgers.update(other.ledgers)
+        self.party_ledgers.update(other.party_ledgers)
+
+
+_charts: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def _engine(session):
+    bind = session.get_bind()
+    return getattr(bind, "engine", bind)
+
+
+def _pending(session) -> _Chart:
+    entry = session.info.get(_PENDING_KEY)
+    if entry is None:
+        entry = (_engine(session), _Chart())
+        session.info[_PENDING_KEY] = entry
+    return entry[1]
+
+
+def _committed(session) -> Optional[_Chart]:
+    return _charts.get(_engine(session))
+
+
+def lookup_group(session, system_key: str) -> Optional[int]:
+    pending = session.info.get(_PENDING_KEY)
+    if pending and system_key in pending[1].groups:
+        return pending[1].groups[system_key]
+    chart = _committed(session)
+    return chart.groups.get(system_key) if chart else None
+
+
+def lookup_ledger(session, system_key: str) -> Optional[LedgerRef]:
+    pending = session.info.get(_PENDING_KEY)
+    if pending and system_key in pending[1].ledgers:
+        return pending[1].ledgers[system_key]
+    chart = _committed(session)
+    return chart.ledgers.get(system_key) if chart else None
+
+
+def lookup_party_ledger(session, party_id: int) -> Optional[LedgerRef]:
+    pending = session.info.get(_PENDING_KEY)
+    if pending and party_id in pending[1].party_ledgers:
+        return pending[1].party_ledgers[party_id]
+    chart = _committed(session)
+    return chart.party_ledgers.get(party_id) if chart else None
+
+
+def remember_group(session, system_key: str, group_id: int) -> None:
+    _pending(session).groups[system_key] = int(group_id)
+
+
+def remember_ledger(session, ref: LedgerRef) -> None:
+    pending = _pending(session)
+    if ref.system_key:
+        pending.ledgers[ref.system_key] = ref
+    elif ref.party_id is not None:
+        pending.party_ledgers[int(ref.party_id)] = ref
+
+
+def invalidate_ledger_registry(session, *, party_ids: Optional[Iterable[int]] = None) -> None:
+    """Forget cached chart entries for the session's engine.
+
+    With ``party_ids`` only those parties' ledgers are dropped; otherwise the
+    whole chart is reloaded on the next posting.
+    """
+    session.info.pop(_PENDING_KEY, None)
+    engine = _engine(session)
+    with _lock:
+        chart = _charts.get(engine)
+        if chart is None:
+            return
+        if party_ids is None:
+            del _charts[engine]
+            return
+        for party_id in party_ids:
+            chart.party_ledgers.pop(int(party_id), None)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _publish_pending(session) -> None:
+    entry = session.info.pop(_PENDING_KEY, None)
+    if entry is None:
+        return
+    engine, pending = entry
+    with _lock:
+        chart = _charts.get(engine)
+        if chart is None:
+            chart = _charts[engine] = _Chart()
+        chart.merge(pending)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard_pending(session) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -3,12 +3,17 @@ import os
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import text
 from sqlmodel import Session
-from backend.accounting import sync_existing_vouchers
+from backend.accounting import warm_ledger_registry
 from backend import models
 from backend.db import engine
+from backend.migrations import ensure_database_ready
+from backend.bill_payment_state import start_payment_state_check
+from backend.book_balances import refresh_book_balances
+from backend.posting_queue import start_posting_worker, stop_posting_worker
 from backend.security import set_request_actor, verify_session_token
+from backend.stock_checkpoints import refresh_stock_checkpoints
+from backend.voucher_resync import start_voucher_resync
 from backend.routers import inventory, billing
 from backend.routers import returns as returns_router
 from backend.routers import requested_items  # 👈 NEW
@@ -68,28 +73,35 @@ async def bind_request_actor(request: Request, call_next):
 
 
 
-def _sync_existing_vouchers_once() -> None:
+@app.on_event("startup")
+def on_startup():
+    # Pending schema/data migrations run here (a single schema_version read when
+    # the database is current). Deploys can pre-apply them with
+    # `python -m backend.migrations`.
+    ensure_database_ready()
+    # Load the accounting chart once so voucher posting does no chart lookups.
+    with Session(engine, expire_on_commit=False) as session:
+        warm_ledger_registry(session)
+    # Vouchers for bills, receipts, purchases and book entries are posted here,
+    # off the request path (see backend.posting_queue).
+    start_posting_worker(engine)
+    # The historical accounting backfill runs once per database, in the
+    # background and resumable; progress is at /vouchers/resync-progress.
+    start_voucher_resync(engine)
+    # Reads trust the bill payment columns; this logs any bill whose columns
+    # disagree with its payments (backend.bill_payment_state).
+    start_payment_state_check(engine)
+    # Month-end stock checkpoints for months closed (or invalidated) since the last run.
     with Session(engine, expire_on_commit=False) as session:
-        key = "accounting_existing_vouchers_synced_v2_purchase_return_refunds"
-        row = session.exec(text("SELECT value FROM appmeta WHERE key = :key").bindparams(key=key)).first()
-        if row and str(row[0]) == "done":
-            return
-        sync_existing_vouchers(session)
-        session.exec(
-            text("""
-                INSERT INTO appmeta (key, value, updated_at)
-                VALUES (:key, 'done', datetime('now'))
-                ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
-            """).bindparams(key=key)
-        )
-        session.commit()
+        refresh_stock_checkpoints(session)
+    # Cash/bank book day balances for days closed (or invalidated) since the last run.
+    with Session(engine, expire_on_commit=False) as session:
+        refresh_book_balances(session)
 
 
-@app.on_event("startup")
-def on_startup():
-    # backend.db already creates tables and applies schema/data migrations on import.
-    # Keep startup light: only run the historical accounting backfill once per database.
-    _sync_existing_vouchers_once()
+@app.on_event("shutdown")
+def on_shutdown():
+    stop_posting_worker()
 
 
 # Routers
@@ -0,0 +1,357 @@
+"""Versioned schema and data migrations for the shop SQLite database.
+
+Every step is listed once in ``MIGRATIONS`` with a strictly increasing version
+and is recorded in the ``schema_version`` table after it succeeds. Steps must be
+idempotent: a step interrupted half-way is simply run again on the next attempt.
+
+Run pending migrations ahead of a deploy with::
+
+    python -m backend.migrations            # apply pending steps
+    python -m backend.migrations --status   # show applied/pending steps
+
+The API also calls ``run_pending_migrations()`` on startup. When the database is
+already current that is a single primary-key read of ``schema_version``. Set
+``MEDICAL_SHOP_SKIP_MIGRATIONS=1`` on extra workers so they never migrate and
+instead refuse to start against an out-of-date database.
+"""
+
+import argparse
+from datetime import datetime
+import logging
+import os
+import threading
+from typing import Callable, List, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, SQLModel
+
+from backend import db as backend_db
+from backend.book_balances import install_book_balance_triggers, refresh_book_balances
+from backend.customer_parties import backfill_customer_parties
+from backend.index_catalog import apply_index_catalog
+from backend.inventory_group_stock import install_group_stock_triggers, rebuild_group_stock
+from backend.ledger_balances import install_ledger_balance_triggers, rebuild_ledger_balances
+from backend.models import (
+    BillClientKey,
+    BookDayBalance,
+    InventoryGroupStock,
+    LedgerBalanceDaily,
+    StockBalanceCheckpoint,
+    VoucherPostingJob,
+    debtor_key,
+    search_key,
+)
+from backend.search_index import create_search_index
+from backend.stock_checkpoints import install_stock_checkpoint_triggers, refresh_stock_checkpoints
+
+logger = logging.getLogger("db.migrations")
+
+_migration_lock = threading.Lock()
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[Engine], None]
+
+
+def _now_ts() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _create_model_tables(engine: Engine) -> None:
+    SQLModel.metadata.create_all(engine)
+
+
+def _legacy_migrate_db(engine: Engine) -> None:
+    # The historical column backfills and one-time repairs. They guard
+    # themselves with PRAGMA probes and appmeta markers, so re-running on a
+    # database that already had them applied is safe.
+    backend_db.migrate_db()
+
+
+def _apply_index_catalog(engine: Engine) -> None:
+    with engine.begin() as conn:
+        created = apply_index_catalog(conn)
+    if created:
+        logger.info("Created indexes: %s", ", ".join(created))
+
+
+def _add_search_key_columns(engine: Engine) -> None:
+    # name_key / brand_key on item and product. New rows get them from the
+    # ORM flush hook in backend.models; this backfills rows written before.
+    with engine.begin() as conn:
+        for table in ("item", "product"):
+            cols = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table})")).all()}
+            for column in ("name_key", "brand_key"):
+                if column not in cols:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} TEXT NOT NULL DEFAULT ''"))
+            rows = conn.execute(text(f"SELECT id, name, brand, name_key, brand_key FROM {table}")).all()
+            updates = [
+                {"id": int(row[0]), "name_key": search_key(row[1]), "brand_key": search_key(row[2])}
+                for row in rows
+                if (row[3], row[4]) != (search_key(row[1]), search_key(row[2]))
+            ]
+            if updates:
+                conn.execute(
+                    text(f"UPDATE {table} SET name_key = :name_key, brand_key = :brand_key WHERE id = :id"),
+                    updates,
+                )
+            logger.info("Backfilled search keys on %s rows of %s", len(updates), table)
+
+
+def _create_search_index(engine: Engine) -> None:
+    with engine.begin() as conn:
+        if not create_search_index(conn):
+            logger.warning("SQLite has no FTS5 trigram tokenizer; searches keep using LIKE")
+
+
+def _create_inventory_group_stock(engine: Engine) -> None:
+    SQLModel.metadata.create_all(engine, tables=[InventoryGroupStock.__table__])
+    with engine.begin() as conn:
+        install_group_stock_triggers(conn)
+        rebuild_group_stock(conn)
+
+
+def _create_stock_checkpoints(engine: Engine) -> None:
+    SQLModel.metadata.create_all(engine, tables=[StockBalanceCheckpoint.__table__])
+    with engine.begin() as conn:
+        install_stock_checkpoint_triggers(conn)
+    with Session(engine) as session:
+        written = refresh_stock_checkpoints(session)
+    logger.info("Wrote %s stock balance checkpoints", written)
+
+
+def _create_voucher_posting_queue(engine: Engine) -> None:
+    SQLModel.metadata.create_all(engine, tables=[VoucherPostingJob.__table__])
+
+
+def _create_ledger_balances(engine: Engine) -> None:
+    SQLModel.metadata.create_all(engine, tables=[LedgerBalanceDaily.__table__])
+    with engine.begin() as conn:
+        install_ledger_balance_triggers(conn)
+        rebuild_ledger_balances(conn)
+
+
+def _create_bill_client_keys(engine: Engine) -> None:
+    SQLModel.metadata.create_all(engine, tables=[BillClientKey.__table__])
+
+
+def _create_book_balances(engine: Engine) -> None:
+    SQLModel.metadata.create_all(engine, tables=[BookDayBalance.__table__])
+    with engine.begin() as conn:
+        install_book_balance_triggers(conn)
+    with Session(engine) as session:
+        written = refresh_book_balances(session)
+    logger.info("Wrote %s cash/bank book day balances", written)
+
+
+def _backfill_customer_parties(engine: Engine) -> None:
+    # Party reads used to link customers to debtor parties on every request;
+    # customer writes do it now, so existing customers are linked once here.
+    with Session(engine) as session:
+        written = backfill_customer_parties(session)
+    logger.info("Linked %s customer debtor parties", written)
+
+
+def _add_bill_debtor_keys(engine: Engine) -> None:
+    # bill.debtor_key is kept by the ORM flush hook in backend.models; this
+    # backfills bills written before it existed.
+    with engine.begin() as conn:
+        cols = {row[1] for row in conn.execute(text("PRAGMA table_info(bill)")).all()}
+        if "debtor_key" not in cols:
+            conn.execute(text("ALTER TABLE bill ADD COLUMN debtor_key TEXT NOT NULL DEFAULT ''"))
+        rows = conn.execute(text("SELECT id, notes, debtor_key FROM bill")).all()
+        updates = [{"id": int(row[0]), "debtor_key": debtor_key(row[1])} for row in rows if row[2] != debtor_key(row[1])]
+        if updates:
+            conn.execute(text("UPDATE bill SET debtor_key = :debtor_key WHERE id = :id"), updates)
+        logger.info("Backfilled debtor keys on %s bills", len(updates))
+
+
+def _add_party_name_keys(engine: Engine) -> None:
+    # party.name_key is kept by the ORM flush hook in backend.models; this
+    # backfills parties written before it existed.
+    with engine.begin() as conn:
+        cols = {row[1] for row in conn.execute(text("PRAGMA table_info(party)")).all()}
+        if "name_key" not in cols:
+            conn.execute(text("ALTER TABLE party ADD COLUMN name_key TEXT NOT NULL DEFAULT ''"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_party_name_key ON party (name_key)"))
+        rows = conn.execute(text("SELECT id, name, name_key FROM party")).all()
+        updates = [{"id": int(row[0]), "name_key": search_key(row[1])} for row in rows if row[2] != search_key(row[1])]
+        if updates:
+            conn.execute(text("UPDATE party SET name_key = :name_key WHERE id = :id"), updates)
+        logger.info("Backfilled name keys on %s parties", len(updates))
+
+
+def _add_posting_retry_column(engine: Engine) -> None:
+    with engine.begin() as conn:
+        cols = {row[1] for row in conn.execute(text("PRAGMA table_info(voucherpostingjob)")).all()}
+        if "next_attempt_at" not in cols:
+            conn.execute(text("ALTER TABLE voucherpostingjob ADD COLUMN next_attempt_at VARCHAR"))
+        conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_voucherpostingjob_next_attempt_at "
+                "ON voucherpostingjob (next_attempt_at)"
+            )
+        )
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "create_model_tables", _create_model_tables),
+    Migration(2, "legacy_migrate_db", _legacy_migrate_db),
+    # Re-add this step (with a new version) whenever REQUIRED_INDEXES grows.
+    Migration(3, "index_catalog_v1", _apply_index_catalog),
+    Migration(4, "item_product_search_keys", _add_search_key_columns),
+    Migration(5, "index_catalog_v2", _apply_index_catalog),
+    Migration(6, "fts_search_index", _create_search_index),
+    Migration(7, "inventory_group_stock", _create_inventory_group_stock),
+    Migration(8, "index_catalog_v3", _apply_index_catalog),
+    Migration(9, "stock_balance_checkpoints", _create_stock_checkpoints),
+    Migration(10, "voucher_posting_queue", _create_voucher_posting_queue),
+    Migration(11, "ledger_balance_daily", _create_ledger_balances),
+    Migration(12, "book_day_balances", _create_book_balances),
+    Migration(13, "bill_client_keys", _create_bill_client_keys),
+    Migration(14, "customer_debtor_parties", _backfill_customer_parties),
+    Migration(15, "bill_debtor_keys", _add_bill_debtor_keys),
+    Migration(16, "index_catalog_v4", _apply_index_catalog),
+    # Installs the bill_fts trigger for item brand edits and rebuilds the index.
+    Migration(17, "fts_search_index_v2", _create_search_index),
+    Migration(18, "voucher_posting_retry", _add_posting_retry_column),
+    Migration(19, "party_name_keys", _add_party_name_keys),
+]
+
+
+def latest_version() -> int:
+    return max((m.version for m in MIGRATIONS), default=0)
+
+
+def _ensure_version_table(engine: Engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TEXT NOT NULL
+            )
+        """))
+
+
+def current_version(engine: Optional[Engine] = None) -> int:
+    engine = engine or backend_db.engine
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(text("SELECT MAX(version) FROM schema_version")).first()
+    except OperationalError:
+        # Fresh database, or one created before versioned migrations existed.
+        return 0
+    return int(row[0] or 0) if row else 0
+
+
+def applied_versions(engine: Optional[Engine] = None) -> dict:
+    engine = engine or backend_db.engine
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT version, name, applied_at FROM schema_version ORDER BY version")).all()
+    except OperationalError:
+        return {}
+    return {int(row[0]): {"name": str(row[1]), "applied_at": str(row[2])} for row in rows}
+
+
+def pending_migrations(engine: Optional[Engine] = None) -> List[Migration]:
+    done = applied_versions(engine)
+    return [m for m in MIGRATIONS if m.version not in done]
+
+
+def _record(engine: Engine, migration: Migration) -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            text("""
+                INSERT INTO schema_version (version, name, applied_at)
+                VALUES (:version, :name, :ts)
+                ON CONFLICT(version) DO UPDATE SET name = excluded.name, applied_at = excluded.applied_at
+            """),
+            {"version": migration.version, "name": migration.name, "ts": _now_ts()},
+        )
+
+
+def apply_migration(migration: Migration, engine: Optional[Engine] = None) -> None:
+    engine = engine or backend_db.engine
+    _ensure_version_table(engine)
+    logger.info("Applying migration %s (%s)", migration.version, migration.name)
+    migration.apply(engine)
+    _record(engine, migration)
+
+
+def run_pending_migrations(engine: Optional[Engine] = None) -> List[Migration]:
+    """Apply every pending step in order and return the ones that ran."""
+    engine = engine or backend_db.engine
+    if current_version(engine) >= latest_version():
+        return []
+    with _migration_lock:
+        ran: List[Migration] = []
+        for migration in pending_migrations(engine):
+            apply_migration(migration, engine)
+            ran.append(migration)
+        return ran
+
+
+def _skip_requested() -> bool:
+    return str(os.environ.get("MEDICAL_SHOP_SKIP_MIGRATIONS") or "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def ensure_database_ready(engine: Optional[Engine] = None) -> None:
+    """Startup hook: migrate, or with MEDICAL_SHOP_SKIP_MIGRATIONS only verify."""
+    engine = engine or backend_db.engine
+    if not _skip_requested():
+        run_pending_migrations(engine)
+        return
+    version = current_version(engine)
+    expected = latest_version()
+    if version < expected:
+        raise RuntimeError(
+            f"Database schema is at version {version} but this build expects {expected}. "
+            "Run `python -m backend.migrations` before starting the API."
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Apply pending medical shop database migrations.")
+    parser.add_argument("--status", action="store_true", help="Only print applied and pending migrations.")
+    parser.add_argument(
+        "--reapply",
+        type=int,
+        action="append",
+        default=[],
+        help="Run an already-applied (idempotent) migration version again. Can repeat.",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    engine = backend_db.engine
+    print(f"DB: {backend_db.DB_FILE}")
+    if args.status:
+        done = applied_versions(engine)
+        for migration in MIGRATIONS:
+            applied = done.get(migration.version)
+            state = f"applied {applied['applied_at']}" if applied else "pending"
+            print(f"{migration.version:>4}  {migration.name:<40} {state}")
+        return 0
+
+    by_version = {m.version: m for m in MIGRATIONS}
+    for version in args.reapply:
+        if version not in by_version:
+            raise SystemExit(f"Unknown migration version: {version}")
+        apply_migration(by_version[version], engine)
+        print(f"Re-applied {version} ({by_version[version].name})")
+
+    ran = run_pending_migrations(engine)
+    for migration in ran:
+        print(f"Applied {migration.version} ({migration.name})")
+    print(f"Schema version: {current_version(engine)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
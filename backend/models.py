@@ -1,5 +1,6 @@
 from typing import Optional, List
 from datetime import datetime
+from sqlalchemy import event
 from sqlmodel import SQLModel, Field, Column, String
 
 # ---------- DB Tables ----------
@@ -7,6 +8,10 @@ class Item(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str = Field(index=True)
     brand: Optional[str] = Field(default=None, index=True)
+    # Lower-cased, whitespace-collapsed copies of name/brand kept in sync on
+    # flush (see search_key below) so group lookups are index seeks.
+    name_key: str = Field(default="")
+    brand_key: str = Field(default="", index=True)
     product_id: Optional[int] = Field(default=None, index=True)
     category_id: Optional[int] = Field(default=None, index=True)
     # batch_no: REMOVED
@@ -38,6 +43,9 @@ class Bill(SQLModel, table=True):
     payment_cash: float = 0.0
     payment_online: float = 0.0
     notes: Optional[str] = None
+    # search_key of the customer named on the leading "Customer: ..." note line,
+    # so debtor ledgers match unlinked bills by indexed equality instead of LIKE.
+    debtor_key: str = Field(default="")
 
     # ✅ credit bill tracking
     is_credit: bool = Field(default=False, index=True)              # true if credit
@@ -51,8 +59,8 @@ class Bill(SQLModel, table=True):
 
 class BillItem(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    bill_id: int
-    item_id: int
+    bill_id: int = Field(index=True)
+    item_id: int = Field(index=True)
     item_name: str                      # denormalized for easy printing later
     mrp: float
     quantity: int
@@ -90,10 +98,18 @@ class BillPayment(SQLModel, table=True):
 
 
 # ---------- Returns (DB) ----------
+class BillClientKey(SQLModel, table=True):
+    # Idempotency key a counter terminal generated for a bill it queued offline;
+    # replaying the key returns the bill instead of selling again.
+    client_key: str = Field(primary_key=True)
+    bill_id: int = Field(index=True)
+    created_at: str = Field(default_factory=lambda: datetime.now().isoformat(timespec="seconds"))
+
+
 class Return(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     date_time: str = Field(default_factory=lambda: datetime.now().isoformat(timespec="seconds"))
-    source_bill_id: Optional[int] = None   # can be null for “no bill”
+    source_bill_id: Optional[int] = Field(default=None, index=True)   # can be null for “no bill”
     subtotal_return: float                 # sum of (qty * mrp) being returned
     credit_amount: float = 0.0
     refund_cash: float = 0.0
@@ -105,8 +121,8 @@ class Return(SQLModel, table=True):
 
 class ReturnItem(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    return_id: int
-    item_id: int
+    return_id: int = Field(index=True)
+    item_id: int = Field(index=True)
     item_name: str
     mrp: float
     quantity: int
@@ -116,7 +132,7 @@ class ReturnItem(SQLModel, table=True):
 class ExchangeRecord(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     created_at: str = Field(default_factory=lambda: datetime.now().isoformat(timespec="seconds"), index=True)
-    source_bill_id: Optional[int] = None
+    source_bill_id: Optional[int] = Field(default=None, index=True)
     return_id: int = Field(index=True)
     new_bill_id: int = Field(index=True)
     theoretical_net: float = 0.0
@@ -179,6 +195,8 @@ class Product(SQLModel, table=True):
     name: str = Field(index=True)
     alias: Optional[str] = Field(default=None, index=True)
     brand: Optional[str] = Field(default=None, index=True)
+    name_key: str = Field(default="")
+    brand_key: str = Field(default="", index=True)
     category_id: Optional[int] = Field(default=None, index=True)
     default_rack_number: int = Field(default=0, index=True)
     printed_price: float = 0.0
@@ -208,6 +226,26 @@ class InventoryLot(SQLModel, table=True):
     updated_at: str = Field(default_factory=lambda: datetime.now().isoformat(timespec="seconds"))
 
 
+class InventoryGroupStock(SQLModel, table=True):
+    # One row per (name_key, brand_key) item group, maintained by SQLite
+    # triggers on item (see backend.inventory_group_stock).
+    name_key: str = Field(primary_key=True)
+    brand_key: str = Field(primary_key=True)
+    batch_count: int = 0
+    active_batch_count: int = 0          # batches with is_archived = 0
+    total_stock: int = 0
+    active_stock: int = 0
+    earliest_expiry: Optional[str] = Field(default=None, sa_column=Column(String(10)))
+
+
+class StockBalanceCheckpoint(SQLModel, table=True):
+    # Cumulative StockMovement delta per item through period_end (a month end),
+    # by effective timestamp. See backend.stock_checkpoints.
+    item_id: int = Field(primary_key=True)
+    period_end: str = Field(sa_column=Column(String(10), primary_key=True))
+    balance: int = 0
+
+
 class AppUser(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str = Field(index=True)
@@ -218,6 +256,36 @@ class AppUser(SQLModel, table=True):
     updated_at: str = Field(default_factory=lambda: datetime.now().isoformat(timespec="seconds"))
 
 
+# ---------- Search keys ----------
+def search_key(value: Optional[str]) -> str:
+    """Case- and whitespace-insensitive form stored in name_key / brand_key."""
+    return " ".join(str(value or "").split()).lower()
+
+
+@event.listens_for(Item, "before_insert")
+@event.listens_for(Item, "before_update")
+@event.listens_for(Product, "before_insert")
+@event.listens_for(Product, "before_update")
+def _sync_search_keys(_mapper, _connection, target) -> None:
+    target.name_key = search_key(target.name)
+    target.brand_key = search_key(target.brand)
+
+
+def debtor_key(notes: Optional[str]) -> str:
+    """search_key of the name in a bill note's leading ``Customer: name | ...`` line, else ""."""
+    text = str(notes or "").strip()
+    if not text.lower().startswith("customer:"):
+        return ""
+    first_line = text.split("|", 1)[0].splitlines()[0]
+    return search_key(first_line.split(":", 1)[1])
+
+
+@event.listens_for(Bill, "before_insert")
+@event.listens_for(Bill, "before_update")
+def _sync_debtor_key(_mapper, _connection, target) -> None:
+    target.debtor_key = debtor_key(target.notes)
+
+
 # ---------- Schemas (requests / responses) ----------
 class ItemCreate(SQLModel):
     name: str
@@ -822,11 +890,19 @@ class Party(SQLModel, table=True):
     opening_balance: float = 0.0
     opening_balance_type: str = Field(default="DR")
     legacy_customer_id: Optional[int] = Field(default=None, index=True)
+    # search_key(name), kept by _sync_party_name_key; matched against Bill.debtor_key.
+    name_key: str = Field(default="", index=True)
     is_active: bool = Field(default=True, index=True)
     created_at: str = Field(default_factory=lambda: datetime.now().isoformat(timespec="seconds"))
     updated_at: str = Field(default_factory=lambda: datetime.now().isoformat(timespec="seconds"))
 
 
+@event.listens_for(Party, "before_insert")
+@event.listens_for(Party, "before_update")
+def _sync_party_name_key(_mapper, _connection, target) -> None:
+    target.name_key = search_key(target.name)
+
+
 class FinancialYear(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     label: str = Field(index=True)
@@ -1048,6 +1124,46 @@ class VoucherEntry(SQLModel, table=True):
     created_at: str = Field(default_factory=lambda: datetime.now().isoformat(timespec="seconds"))
 
 
+class LedgerBalanceDaily(SQLModel, table=True):
+    # DR/CR totals of live vouchers per ledger per voucher_date, maintained by
+    # SQLite triggers (see backend.ledger_balances).
+    ledger_id: int = Field(primary_key=True)
+    balance_date: str = Field(sa_column=Column(String(10), primary_key=True))
+    dr_total: float = 0.0
+    cr_total: float = 0.0
+
+
+class BookDayBalance(SQLModel, table=True):
+    # Opening, flows and closing of the cash or bank book per day, contiguous from
+    # the first day with activity; triggers drop rows from a changed day onward
+    # (see backend.book_balances).
+    book: str = Field(primary_key=True)  # CASH | BANK
+    balance_date: str = Field(sa_column=Column(String(10), primary_key=True))
+    opening_balance: float = 0.0
+    receipts: float = 0.0
+    withdrawals: float = 0.0
+    expenses: float = 0.0
+    charges: float = 0.0
+    entry_count: int = 0
+    closing_balance: float = 0.0
+
+
+class VoucherPostingJob(SQLModel, table=True):
+    # Outbox row: (re)post the vouchers of one source document.
+    # See backend.posting_queue.
+    source_type: str = Field(primary_key=True)  # BILL | BILL_PAYMENT | PARTY_RECEIPT | PURCHASE | ...
+    source_id: int = Field(primary_key=True)
+    status: str = Field(default="PENDING", index=True)  # PENDING | DONE | FAILED
+    revision: int = 1
+    attempts: int = 0
+    last_error: Optional[str] = None
+    enqueued_at: str = Field(default_factory=lambda: datetime.now().isoformat(timespec="seconds"), index=True)
+    updated_at: str = Field(default_factory=lambda: datetime.now().isoformat(timespec="seconds"))
+    posted_at: Optional[str] = None
+    # A failed job waits until then before its next attempt (exponential backoff).
+    next_attempt_at: Optional[str] = Field(default=None, index=True)
+
+
 class PartyCreate(SQLModel):
     name: str
     party_group: str
@@ -1587,6 +1703,60 @@ class VoucherDayBookOut(SQLModel):
     to_date: str
     rows: List[VoucherDayBookRow]
     summary: VoucherDayBookSummary
+    next_cursor: Optional[str] = None
+
+
+class TrialBalanceRow(SQLModel):
+    ledger_id: int
+    ledger_name: str
+    group_id: int
+    group_name: Optional[str] = None
+    opening_balance: float
+    debit: float
+    credit: float
+    closing_balance: float
+
+
+class TrialBalanceGroup(SQLModel):
+    group_id: int
+    group_name: Optional[str] = None
+    nature: Optional[str] = None
+    opening_balance: float
+    debit: float
+    credit: float
+    closing_balance: float
+
+
+class TrialBalanceOut(SQLModel):
+    from_date: Optional[str] = None
+    to_date: str
+    rows: List[TrialBalanceRow]
+    groups: List[TrialBalanceGroup]
+    total_debit: float
+    total_credit: float
+    closing_debit: float
+    closing_credit: float
+
+
+class LedgerStatementRow(SQLModel):
+    voucher_id: int
+    voucher_date: str
+    voucher_type: str
+    voucher_no: str
+    narration: Optional[str] = None
+    debit: float
+    credit: float
+    balance: float
+
+
+class LedgerStatementOut(SQLModel):
+    ledger_id: int
+    ledger_name: str
+    from_date: str
+    to_date: str
+    opening_balance: float
+    closing_balance: float
+    rows: List[LedgerStatementRow]
 
 
 class LedgerGroupOut(SQLModel):
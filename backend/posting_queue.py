@@ -0,0 +1,415 @@
+"""Outbox and background worker for voucher posting.
+
+Endpoints on the counter path no longer post vouchers themselves. They call
+``enqueue_posting`` with the source document in the same transaction that
+saves it, which writes one ``VoucherPostingJob`` row keyed by
+(source_type, source_id). A worker thread started on app startup drains the
+table through the ``backend.accounting`` posting functions.
+
+Every handler rebuilds the voucher from the source row as it is when the job
+runs, so posting the same job twice is harmless. Edit, delete and restore
+paths still re-post synchronously in their own transaction; a job takes the
+write lock (BEGIN IMMEDIATE) before reading its source, so such a commit lands
+either wholly before the job's read or after its post, never in between. Enqueueing a key that already has a row resets it to
+PENDING and bumps ``revision``; the worker only marks a job DONE when the
+revision it posted is still current, so an edit that lands mid-post is
+picked up on the next pass. A failed job waits ``RETRY_BASE_SECONDS``,
+doubling per attempt up to ``RETRY_MAX_SECONDS``, before it is tried again;
+after ``MAX_ATTEMPTS`` it is left as FAILED for the status endpoint.
+``requeue_failed_postings`` puts FAILED jobs back in the queue; the worker
+does so on startup and ``POST /vouchers/posting-queue/retry`` on demand.
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import event, or_, text
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+
+from backend.accounting import (
+    deleted_voucher,
+    mark_voucher_deleted,
+    post_bill_payment_voucher,
+    post_loan_adjustment_voucher,
+    post_loan_voucher,
+    post_party_receipt_voucher,
+    post_purchase_payment_voucher,
+    sync_bill_vouchers,
+    sync_purchase_vouchers,
+    sync_suspense_book_voucher,
+)
+from backend.db import begin_immediate
+from backend.models import (
+    BankbookEntry,
+    Bill,
+    BillPayment,
+    CashbookEntry,
+    LoanAdjustment,
+    Party,
+    PartyReceipt,
+    Purchase,
+    PurchasePayment,
+    ReceiptBillAdjustment,
+    VoucherPostingJob,
+)
+
+logger = logging.getLogger("accounting.posting_queue")
+
+MAX_ATTEMPTS = 8
+RETRY_BASE_SECONDS = 10
+RETRY_MAX_SECONDS = 600
+POLL_SECONDS = 2.0
+BATCH_SIZE = 100
+
+_WAKE_KEY = "posting_queue_wake"
+_wake = threading.Event()
+
+
+def _now_ts() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _retry_at(attempts: int) -> str:
+    delay = min(RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1), RETRY_MAX_SECONDS)
+    return (datetime.now() + timedelta(seconds=delay)).isoformat(timespec="seconds")
+
+
+_ENQUEUE_SQL = text("""
+    INSERT INTO voucherpostingjob
+        (source_type, source_id, status, revision, attempts, last_error, enqueued_at, updated_at, posted_at, next_attempt_at)
+    VALUES (:source_type, :source_id, 'PENDING', 1, 0, NULL, :ts, :ts, NULL, NULL)
+    ON CONFLICT(source_type, source_id) DO UPDATE SET
+        status = 'PENDING',
+        revision = voucherpostingjob.revision + 1,
+        attempts = 0,
+        last_error = NULL,
+        next_attempt_at = NULL,
+        enqueued_at = CASE WHEN voucherpostingjob.status = 'PENDING'
+                           THEN voucherpostingjob.enqueued_at ELSE excluded.enqueued_at END,
+        updated_at = excluded.updated_at
+""")
+
+
+def enqueue_posting(session, source_type: str, source_id: int) -> None:
+    """Ask the worker to (re)post the voucher for one source document.
+
+    Runs inside the caller's transaction; nothing is queued if it rolls back.
+    """
+    enqueue_postings(session, source_type, [source_id])
+
+
+def enqueue_postings(session, source_type: str, source_ids: Iterable[int]) -> None:
+    """``enqueue_posting`` for many documents of one type in a single executemany."""
+    if source_type not in POSTING_HANDLERS:
+        raise ValueError(f"No voucher posting handler for {source_type}")
+    ts = _now_ts()
+    params = [{"source_type": source_type, "source_id": int(source_id), "ts": ts} for source_id in source_ids]
+    if not params:
+        return
+    session.exec(_ENQUEUE_SQL, params=params)
+    session.info[_WAKE_KEY] = True
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _wake_worker(session) -> None:
+    if session.info.pop(_WAKE_KEY, False):
+        _wake.set()
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _forget_wake(session) -> None:
+    session.info.pop(_WAKE_KEY, None)
+
+
+# ---------- Handlers: rebuild one source document's vouchers ----------
+
+def _post_bill(session, bill_id: int) -> None:
+    bill = session.get(Bill, bill_id)
+    if not bill:
+        mark_voucher_deleted(session, source_type="BILL", source_id=bill_id)
+        return
+    sync_bill_vouchers(session, bill)
+
+
+def _post_bill_payment(session, payment_id: int) -> None:
+    payment = session.get(BillPayment, payment_id)
+    bill = session.get(Bill, payment.bill_id) if payment else None
+    if not payment or not bill:
+        mark_voucher_deleted(session, source_type="BILL_PAYMENT", source_id=payment_id)
+        return
+    if str(payment.note or "").strip().lower() == "auto: payment at bill creation":
+        # Settled inside the sales voucher of the bill itself.
+        return
+    receipt_managed = session.exec(
+        select(ReceiptBillAdjustment.id).where(ReceiptBillAdjustment.bill_payment_id == payment_id)
+    ).first()
+    if receipt_managed or bool(payment.is_deleted) or bool(bill.is_deleted):
+        mark_voucher_deleted(session, source_type="BILL_PAYMENT", source_id=payment_id)
+        return
+    post_bill_payment_voucher(
+        session,
+        bill,
+        int(payment.id),
+        payment.received_at,
+        float(payment.cash_amount or 0),
+        float(payment.online_amount or 0),
+        float(getattr(payment, "writeoff_amount", 0) or 0),
+        bool(getattr(payment, "is_writeoff", False)),
+        payment.note,
+    )
+
+
+def _post_party_receipt(session, receipt_id: int) -> None:
+    receipt = session.get(PartyReceipt, receipt_id)
+    party = session.get(Party, receipt.party_id) if receipt else None
+    if not receipt or not party or bool(receipt.is_deleted):
+        mark_voucher_deleted(session, source_type="PARTY_RECEIPT", source_id=receipt_id)
+        return
+    post_party_receipt_voucher(
+        session,
+        int(receipt.id),
+        party,
+        receipt.received_at,
+        float(receipt.total_amount or 0),
+        float(receipt.cash_amount or 0),
+        float(receipt.online_amount or 0),
+        receipt.note,
+    )
+
+
+def _post_purchase(session, purchase_id: int) -> None:
+    purchase = session.get(Purchase, purchase_id)
+    party = session.get(Party, purchase.party_id) if purchase else None
+    if not purchase or not party:
+        mark_voucher_deleted(session, source_type="PURCHASE", source_id=purchase_id)
+        return
+    sync_purchase_vouchers(session, purchase, party)
+    payments = session.exec(select(PurchasePayment).where(PurchasePayment.purchase_id == purchase_id)).all()
+    for payment in payments:
+        source_type = "PURCHASE_WRITEOFF" if bool(payment.is_writeoff) else "PURCHASE_PAYMENT"
+        is_deleted = bool(payment.is_deleted) or bool(purchase.is_deleted)
+        if is_deleted and deleted_voucher(session, source_type=source_type, source_id=int(payment.id or 0)):
+            continue
+        post_purchase_payment_voucher(
+            session,
+            purchase,
+            party,
+            int(payment.id or 0),
+            float(payment.amount or 0),
+            bool(payment.is_writeoff),
+            payment.note,
+            payment.paid_at,
+            float(getattr(payment, "cash_amount", 0) or 0),
+            float(getattr(payment, "online_amount", 0) or 0),
+            getattr(payment, "bank_mode", None),
+            float(getattr(payment, "txn_charges", 0) or 0),
+            getattr(payment, "transaction_id", None),
+        )
+        if is_deleted:
+            mark_voucher_deleted(session, source_type=source_type, source_id=int(payment.id or 0))
+
+
+def _book_entry_handler(model, book: str) -> Callable[[object, int], None]:
+    loan_book = "CASH" if book == "CASHBOOK" else "BANK"
+
+    def _post_book_entry(session, entry_id: int) -> None:
+        row = session.get(model, entry_id)
+        if not row:
+            mark_voucher_deleted(session, source_type=f"{loan_book}_LOAN", source_id=entry_id)
+            mark_voucher_deleted(session, source_type=f"{book}_SUSPENSE", source_id=entry_id)
+            return
+        party = session.get(Party, row.party_id) if row.party_id else None
+        if str(row.entry_type or "").upper() == "LOAN" and party:
+            post_loan_voucher(session, row, party, book=loan_book)
+        else:
+            mark_voucher_deleted(session, source_type=f"{loan_book}_LOAN", source_id=entry_id)
+        sync_suspense_book_voucher(session, row, book=book)
+
+    return _post_book_entry
+
+
+def _post_loan_adjustment(session, adjustment_id: int) -> None:
+    adjustment = session.get(LoanAdjustment, adjustment_id)
+    party = session.get(Party, adjustment.party_id) if adjustment else None
+    if not adjustment or not party or bool(adjustment.is_deleted):
+        mark_voucher_deleted(session, source_type="LOAN_ADJUSTMENT", source_id=adjustment_id)
+        return
+    post_loan_adjustment_voucher(session, adjustment, party)
+
+
+POSTING_HANDLERS: Dict[str, Callable[[object, int], None]] = {
+    "BILL": _post_bill,
+    "BILL_PAYMENT": _post_bill_payment,
+    "PARTY_RECEIPT": _post_party_receipt,
+    "PURCHASE": _post_purchase,
+    "CASHBOOK": _book_entry_handler(CashbookEntry, "CASHBOOK"),
+    "BANKBOOK": _book_entry_handler(BankbookEntry, "BANKBOOK"),
+    "LOAN_ADJUSTMENT": _post_loan_adjustment,
+}
+
+
+# ---------- Draining ----------
+
+def _pending_jobs(engine, limit: int) -> List[VoucherPostingJob]:
+    with Session(engine, expire_on_commit=False) as session:
+        return session.exec(
+            select(VoucherPostingJob)
+            .where(VoucherPostingJob.status == "PENDING")
+            .where(or_(VoucherPostingJob.next_attempt_at.is_(None), VoucherPostingJob.next_attempt_at <= _now_ts()))
+            .order_by(VoucherPostingJob.enqueued_at, VoucherPostingJob.source_type, VoucherPostingJob.source_id)
+            .limit(limit)
+        ).all()
+
+
+def _run_job(engine, job: VoucherPostingJob) -> bool:
+    key = {"source_type": job.source_type, "source_id": int(job.source_id), "revision": int(job.revision)}
+    try:
+        with Session(engine, expire_on_commit=False) as session:
+            # Edit, delete and restore paths still post synchronously; holding the
+            # write lock from the first read keeps their commits out of this post.
+            begin_immediate(session)
+            POSTING_HANDLERS[job.source_type](session, int(job.source_id))
+            session.exec(
+                text("""
+                    UPDATE voucherpostingjob
+                    SET status = 'DONE', last_error = NULL, posted_at = :ts, updated_at = :ts
+                    WHERE source_type = :source_type AND source_id = :source_id AND revision = :revision
+                """).bindparams(ts=_now_ts(), **key)
+            )
+            session.commit()
+        return True
+    except Exception as exc:
+        logger.exception("Voucher posting failed for %s #%s", job.source_type, job.source_id)
+        with Session(engine) as session:
+            session.exec(
+                text("""
+                    UPDATE voucherpostingjob
+                    SET attempts = attempts + 1,
+                        status = CASE WHEN attempts + 1 >= :max_attempts THEN 'FAILED' ELSE 'PENDING' END,
+                        last_error = :error,
+                        updated_at = :ts,
+                        next_attempt_at = :next_at
+                    WHERE source_type = :source_type AND source_id = :source_id AND revision = :revision
+                """).bindparams(
+                    max_attempts=MAX_ATTEMPTS,
+                    error=str(exc)[:500],
+                    ts=_now_ts(),
+                    next_at=_retry_at(int(job.attempts) + 1),
+                    **key,
+                )
+            )
+            session.commit()
+        return False
+
+
+def drain_posting_queue(engine, *, limit: int = BATCH_SIZE) -> int:
+    """Post up to ``limit`` pending jobs, each in its own transaction.
+
+    Returns the number of jobs attempted.
+    """
+    jobs = _pending_jobs(engine, limit)
+    for job in jobs:
+        _run_job(engine, job)
+    return len(jobs)
+
+
+def requeue_failed_postings(session) -> int:
+    """Return every FAILED job to the queue with a fresh attempt budget; the caller commits."""
+    result = session.exec(
+        text("""
+            UPDATE voucherpostingjob
+            SET status = 'PENDING', attempts = 0, next_attempt_at = NULL, updated_at = :ts
+            WHERE status = 'FAILED'
+        """).bindparams(ts=_now_ts())
+    )
+    if result.rowcount:
+        session.info[_WAKE_KEY] = True
+    return int(result.rowcount or 0)
+
+
+def posting_queue_status(session, *, failed_limit: int = 50) -> dict:
+    counts = {
+        str(status): int(count)
+        for status, count in session.exec(
+            text("SELECT status, COUNT(*) FROM voucherpostingjob GROUP BY status")
+        ).all()
+    }
+    oldest = session.exec(
+        text("SELECT MIN(enqueued_at) FROM voucherpostingjob WHERE status = 'PENDING'")
+    ).first()
+    failed = session.exec(
+        select(VoucherPostingJob)
+        .where(VoucherPostingJob.status == "FAILED")
+        .order_by(VoucherPostingJob.updated_at.desc())
+        .limit(failed_limit)
+    ).all()
+    return {
+        "pending": counts.get("PENDING", 0),
+        "done": counts.get("DONE", 0),
+        "failed": counts.get("FAILED", 0),
+        "oldest_pending_at": oldest[0] if oldest else None,
+        "failed_jobs": failed,
+    }
+
+
+# ---------- Worker thread ----------
+
+class PostingWorker:
+    def __init__(self, engine, *, poll_seconds: float = POLL_SECONDS) -> None:
+        self.engine = engine
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="voucher-posting", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        _wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            _wake.clear()
+            try:
+                attempted = drain_posting_queue(self.engine)
+            except Exception:
+                logger.exception("Voucher posting worker pass failed")
+                attempted = 0
+            if attempted >= BATCH_SIZE:
+                continue
+            _wake.wait(self.poll_seconds)
+
+
+_worker: Optional[PostingWorker] = None
+
+
+def start_posting_worker(engine) -> PostingWorker:
+    global _worker
+    # Jobs that ran out of attempts before a restart get another run.
+    with Session(engine) as session:
+        requeued = requeue_failed_postings(session)
+        session.commit()
+    if requeued:
+        logger.info("Requeued %s failed voucher postings", requeued)
+    if _worker is None:
+        _worker = PostingWorker(engine)
+    _worker.start()
+    return _worker
+
+
+def stop_posting_worker() -> None:
+    global _worker
+    if _worker is not None:
+        _worker.stop()
+        _worker = None
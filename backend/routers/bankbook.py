@@ -6,22 +6,15 @@ from sqlalchemy import text
 from sqlmodel import select
 
 from backend.accounting import mark_voucher_deleted, post_loan_voucher, sync_suspense_book_voucher
+from backend.book_balances import book_days
+from backend.cash_flow_aggregates import BANK_FLOWS, combine, flow_components, flow_totals
 from backend.controls import assert_financial_year_unlocked
-from backend.db import get_session
+from backend.db import get_read_session, get_session
+from backend.posting_queue import enqueue_posting
 from backend.models import (
     BankbookCreate,
     BankbookEntry,
     BankbookOut,
-    Bill,
-    BillPayment,
-    CashbookEntry,
-    ExchangeRecord,
-    PartyReceipt,
-    Purchase,
-    PurchasePayment,
-    PurchaseReturn,
-    ReceiptBillAdjustment,
-    Return,
     Party,
     LoanAdjustment,
 )
@@ -31,6 +24,8 @@ router = APIRouter()
 
 VALID_ENTRY_TYPES = {"RECEIPT", "WITHDRAWAL", "EXPENSE", "OPENING", "CONTRA", "LOAN", "LOAN_REPAYMENT"}
 VALID_MODES = {"UPI", "NEFT", "RTGS", "IMPS", "BANK_DEPOSIT"}
+# The range summary has never counted purchase-return refunds; the day views do.
+SUMMARY_FLOWS = {**BANK_FLOWS, "receipts": tuple(name for name in BANK_FLOWS["receipts"] if name != "purchase_return_online")}
 ENTRY_TYPE_ALIASES = {
     "DEPOSIT": "RECEIPT",
     "DEPOSITS": "RECEIPT",
@@ -76,260 +71,38 @@ def _normalize_entry_type(value: Optional[str]) -> str:
     return et
 
 
-def _sum_rows(rows: List[BankbookEntry]):
-    receipts = 0.0
-    withdrawals = 0.0
-    expenses = 0.0
-    charges = 0.0
-    for r in rows:
-        et = (r.entry_type or "").upper()
-        amt = float(r.amount or 0)
-        txn_charges = float(getattr(r, "txn_charges", 0) or 0)
-        charges += txn_charges
-        if et == "OPENING":
-            continue
-        if et in {"RECEIPT", "LOAN_REPAYMENT"}:
-            receipts += amt
-        elif et in ("WITHDRAWAL", "CONTRA", "LOAN"):
-            withdrawals += amt
-        else:
-            expenses += amt
-
-    bank_out = withdrawals + expenses + charges
-    net_change = receipts - bank_out
+def _summary(figures: dict, count: int):
+    bank_out = round(figures["withdrawals"] + figures["expenses"] + figures["charges"], 2)
     return {
-        "bank_out": round(bank_out, 2),
-        "withdrawals": round(withdrawals, 2),
-        "expenses": round(expenses, 2),
-        "receipts": round(receipts, 2),
-        "charges": round(charges, 2),
-        "net_change": round(net_change, 2),
-        "count": len(rows),
+        "bank_out": bank_out,
+        "withdrawals": figures["withdrawals"],
+        "expenses": figures["expenses"],
+        "receipts": figures["receipts"],
+        "charges": figures["charges"],
+        "net_change": round(figures["receipts"] - bank_out, 2),
+        "count": count,
     }
 
 
-def _sum_bill_online(session, *, start_iso: Optional[str] = None, end_iso: Optional[str] = None) -> float:
-    receipt_adjustment_payment_ids = {
-        int(row.bill_payment_id)
-        for row in session.exec(
-            select(ReceiptBillAdjustment)
-            .join(PartyReceipt, PartyReceipt.id == ReceiptBillAdjustment.receipt_id)
-            .where(ReceiptBillAdjustment.bill_payment_id.is_not(None))
-            .where(PartyReceipt.is_deleted == False)  # noqa: E712
-        ).all()
-        if row.bill_payment_id is not None
+def _snapshot(date: str, day: dict):
+    return {
+        "date": date,
+        "opening_balance": day["opening_balance"],
+        "closing_balance": day["closing_balance"],
+        "summary": _summary(day, day["entry_count"]),
     }
-    stmt = (
-        select(BillPayment)
-        .join(Bill, Bill.id == BillPayment.bill_id)
-        .where(Bill.is_deleted == False)  # noqa: E712
-        .where(BillPayment.is_deleted == False)  # noqa: E712
-    )
-    if start_iso:
-        stmt = stmt.where(BillPayment.received_at >= start_iso)
-    if end_iso:
-        stmt = stmt.where(BillPayment.received_at <= end_iso)
-    rows = session.exec(stmt).all()
-    total = 0.0
-    for p in rows:
-        if int(getattr(p, "id", 0) or 0) in receipt_adjustment_payment_ids:
-            continue
-        total += float(getattr(p, "online_amount", 0) or 0)
-
-    receipt_stmt = select(PartyReceipt).where(PartyReceipt.is_deleted == False)  # noqa: E712
-    if start_iso:
-        receipt_stmt = receipt_stmt.where(PartyReceipt.received_at >= start_iso)
-    if end_iso:
-        receipt_stmt = receipt_stmt.where(PartyReceipt.received_at <= end_iso)
-    for receipt in session.exec(receipt_stmt).all():
-        total += float(getattr(receipt, "online_amount", 0) or 0)
-    return round(total, 2)
-
-
-def _sum_purchase_online_out(session, *, start_iso: Optional[str] = None, end_iso: Optional[str] = None) -> float:
-    stmt = (
-        select(PurchasePayment)
-        .where(PurchasePayment.is_deleted == False)  # noqa: E712
-        .where(PurchasePayment.is_writeoff == False)  # noqa: E712
-    )
-    if start_iso:
-        stmt = stmt.where(PurchasePayment.paid_at >= start_iso)
-    if end_iso:
-        stmt = stmt.where(PurchasePayment.paid_at <= end_iso)
-    rows = session.exec(stmt).all()
-    total = 0.0
-    for payment in rows:
-        if int(getattr(payment, "purchase_id", 0) or 0) > 0:
-            purchase = session.get(Purchase, payment.purchase_id)
-            if not purchase or purchase.is_deleted:
-                continue
-        total += float(getattr(payment, "online_amount", 0) or 0)
-    return round(total, 2)
-
-
-def _sum_purchase_return_online(session, *, start_iso: Optional[str] = None, end_iso: Optional[str] = None) -> float:
-    stmt = select(PurchaseReturn).where(PurchaseReturn.is_deleted == False)  # noqa: E712
-    if start_iso:
-        stmt = stmt.where(PurchaseReturn.return_date >= start_iso[:10])
-    if end_iso:
-        stmt = stmt.where(PurchaseReturn.return_date <= end_iso[:10])
-    return round(sum(float(row.refund_online or 0) for row in session.exec(stmt).all()), 2)
-
-
-def _sum_purchase_bank_charges(session, *, start_iso: Optional[str] = None, end_iso: Optional[str] = None) -> float:
-    stmt = (
-        select(PurchasePayment)
-        .where(PurchasePayment.is_deleted == False)  # noqa: E712
-        .where(PurchasePayment.is_writeoff == False)  # noqa: E712
-    )
-    if start_iso:
-        stmt = stmt.where(PurchasePayment.paid_at >= start_iso)
-    if end_iso:
-        stmt = stmt.where(PurchasePayment.paid_at <= end_iso)
-    rows = session.exec(stmt).all()
-    total = 0.0
-    for payment in rows:
-        if int(getattr(payment, "purchase_id", 0) or 0) > 0:
-            purchase = session.get(Purchase, payment.purchase_id)
-            if not purchase or purchase.is_deleted:
-                continue
-        if float(getattr(payment, "online_amount", 0) or 0) <= 0:
-            continue
-        total += float(getattr(payment, "txn_charges", 0) or 0)
-    return round(total, 2)
-
-
-def _sum_return_online(session, *, start_iso: Optional[str] = None, end_iso: Optional[str] = None) -> float:
-    stmt = select(Return)
-    if start_iso:
-        stmt = stmt.where(Return.date_time >= start_iso)
-    if end_iso:
-        stmt = stmt.where(Return.date_time <= end_iso)
-    rows = session.exec(stmt).all()
-    total = 0.0
-    for r in rows:
-        total += float(getattr(r, "refund_online", 0) or 0)
-    return round(total, 2)
-
-
-def _sum_exchange_online_in(session, *, start_iso: Optional[str] = None, end_iso: Optional[str] = None) -> float:
-    stmt = select(ExchangeRecord)
-    if start_iso:
-        stmt = stmt.where(ExchangeRecord.created_at >= start_iso)
-    if end_iso:
-        stmt = stmt.where(ExchangeRecord.created_at <= end_iso)
-    rows = session.exec(stmt).all()
-    total = 0.0
-    for r in rows:
-        total += float(getattr(r, "payment_online", 0) or 0)
-    return round(total, 2)
-
-
-def _sum_exchange_online_out(session, *, start_iso: Optional[str] = None, end_iso: Optional[str] = None) -> float:
-    stmt = select(ExchangeRecord)
-    if start_iso:
-        stmt = stmt.where(ExchangeRecord.created_at >= start_iso)
-    if end_iso:
-        stmt = stmt.where(ExchangeRecord.created_at <= end_iso)
-    rows = session.exec(stmt).all()
-    total = 0.0
-    for r in rows:
-        total += float(getattr(r, "refund_online", 0) or 0)
-    return round(total, 2)
-
-
-def _sum_cashbook_contra(session, *, start_iso: Optional[str] = None, end_iso: Optional[str] = None) -> float:
-    stmt = select(CashbookEntry).where(CashbookEntry.entry_type == "CONTRA")
-    if start_iso:
-        stmt = stmt.where(CashbookEntry.created_at >= start_iso)
-    if end_iso:
-        stmt = stmt.where(CashbookEntry.created_at <= end_iso)
-    rows = session.exec(stmt).all()
-    total = 0.0
-    for r in rows:
-        total += float(getattr(r, "amount", 0) or 0)
-    return round(total, 2)
-
-
-def _opening_anchor(session, *, day_end: str):
-    return session.exec(
-        select(BankbookEntry)
-        .where(BankbookEntry.entry_type == "OPENING")
-        .where(BankbookEntry.created_at <= day_end)
-        .order_by(BankbookEntry.created_at.desc(), BankbookEntry.id.desc())
-    ).first()
 
 
 def _day_snapshot(session, date: str, *, include_entries: bool = False):
-    day_dt = _parse_ymd(date)
-    prev_date = (day_dt - timedelta(days=1)).date().isoformat()
-
-    day_start = f"{date}T00:00:00"
-    day_end = f"{date}T23:59:59.999999"
-    prev_end = f"{prev_date}T23:59:59.999999"
-
-    anchor = _opening_anchor(session, day_end=day_end)
-    anchor_amount = float(getattr(anchor, "amount", 0) or 0) if anchor else 0.0
-    anchor_ts = str(getattr(anchor, "created_at", "") or "") if anchor else None
-    anchor_effective_start = f"{anchor_ts[:10]}T00:00:00" if anchor_ts and len(anchor_ts) >= 10 else None
-
-    opening_stmt = select(BankbookEntry).where(BankbookEntry.created_at <= prev_end)
-    if anchor_effective_start:
-        opening_stmt = opening_stmt.where(BankbookEntry.created_at >= anchor_effective_start)
-    opening_rows = session.exec(opening_stmt).all()
-    opening_summary = _sum_rows(opening_rows)
-    opening_balance = (
-        anchor_amount
-        + opening_summary["net_change"]
-        + _sum_bill_online(session, start_iso=anchor_effective_start, end_iso=prev_end)
-        + _sum_exchange_online_in(session, start_iso=anchor_effective_start, end_iso=prev_end)
-        + _sum_purchase_return_online(session, start_iso=anchor_effective_start, end_iso=prev_end)
-        + _sum_cashbook_contra(session, start_iso=anchor_effective_start, end_iso=prev_end)
-        - _sum_return_online(session, start_iso=anchor_effective_start, end_iso=prev_end)
-        - _sum_purchase_online_out(session, start_iso=anchor_effective_start, end_iso=prev_end)
-        - _sum_purchase_bank_charges(session, start_iso=anchor_effective_start, end_iso=prev_end)
-        - _sum_exchange_online_out(session, start_iso=anchor_effective_start, end_iso=prev_end)
-    )
-
-    day_rows = session.exec(
-        select(BankbookEntry)
-        .where(BankbookEntry.created_at >= day_start)
-        .where(BankbookEntry.created_at <= day_end)
-        .order_by(BankbookEntry.id.desc())
-    ).all()
-    day_summary = _sum_rows(day_rows)
-    bill_online_today = _sum_bill_online(session, start_iso=day_start, end_iso=day_end)
-    exchange_online_in_today = _sum_exchange_online_in(session, start_iso=day_start, end_iso=day_end)
-    cashbook_contra_today = _sum_cashbook_contra(session, start_iso=day_start, end_iso=day_end)
-    return_online_today = _sum_return_online(session, start_iso=day_start, end_iso=day_end)
-    purchase_online_today = _sum_purchase_online_out(session, start_iso=day_start, end_iso=day_end)
-    purchase_return_online_today = _sum_purchase_return_online(session, start_iso=day_start, end_iso=day_end)
-    purchase_bank_charges_today = _sum_purchase_bank_charges(session, start_iso=day_start, end_iso=day_end)
-    exchange_online_out_today = _sum_exchange_online_out(session, start_iso=day_start, end_iso=day_end)
-    day_summary["receipts"] = round(
-        float(day_summary["receipts"]) + bill_online_today + exchange_online_in_today + purchase_return_online_today + cashbook_contra_today,
-        2,
-    )
-    day_summary["withdrawals"] = round(
-        float(day_summary["withdrawals"]) + return_online_today + purchase_online_today + exchange_online_out_today,
-        2,
-    )
-    day_summary["charges"] = round(float(day_summary["charges"]) + purchase_bank_charges_today, 2)
-    day_summary["bank_out"] = round(
-        float(day_summary["withdrawals"]) + float(day_summary["expenses"]) + float(day_summary["charges"]),
-        2,
-    )
-    day_summary["net_change"] = round(float(day_summary["receipts"]) - float(day_summary["bank_out"]), 2)
-
-    closing_balance = round(opening_balance + day_summary["net_change"], 2)
-    out = {
-        "date": date,
-        "opening_balance": round(opening_balance, 2),
-        "closing_balance": closing_balance,
-        "summary": day_summary,
-    }
+    _parse_ymd(date)
+    out = _snapshot(date, book_days(session, "BANK", [date])[date])
     if include_entries:
-        out["entries"] = day_rows
+        out["entries"] = session.exec(
+            select(BankbookEntry)
+            .where(BankbookEntry.created_at >= f"{date}T00:00:00")
+            .where(BankbookEntry.created_at <= f"{date}T23:59:59.999999")
+            .order_by(BankbookEntry.id.desc())
+        ).all()
     return out
 
 
@@ -391,9 +164,7 @@ def create_entry(payload: BankbookCreate):
         )
         session.add(row)
         session.flush()
-        if et == "LOAN":
-            post_loan_voucher(session, row, party, book="BANK")
-        sync_suspense_book_voucher(session, row, book="BANKBOOK")
+        enqueue_posting(session, "BANKBOOK", int(row.id))
         session.commit()
         session.refresh(row)
         return row
@@ -504,26 +275,10 @@ def summary(
 ):
     start_iso, end_iso = _range_bounds(from_date, to_date)
 
-    with get_session() as session:
-        base = select(BankbookEntry)
-        if start_iso and end_iso:
-            base = base.where(BankbookEntry.created_at >= start_iso).where(BankbookEntry.created_at <= end_iso)
-
-        rows = session.exec(base).all()
-        out = _sum_rows(rows)
-        bill_online = _sum_bill_online(session, start_iso=start_iso, end_iso=end_iso)
-        exchange_online_in = _sum_exchange_online_in(session, start_iso=start_iso, end_iso=end_iso)
-        cashbook_contra = _sum_cashbook_contra(session, start_iso=start_iso, end_iso=end_iso)
-        return_online = _sum_return_online(session, start_iso=start_iso, end_iso=end_iso)
-        purchase_online = _sum_purchase_online_out(session, start_iso=start_iso, end_iso=end_iso)
-        purchase_bank_charges = _sum_purchase_bank_charges(session, start_iso=start_iso, end_iso=end_iso)
-        exchange_online_out = _sum_exchange_online_out(session, start_iso=start_iso, end_iso=end_iso)
-        out["receipts"] = round(float(out["receipts"]) + bill_online + exchange_online_in + cashbook_contra, 2)
-        out["withdrawals"] = round(float(out["withdrawals"]) + return_online + purchase_online + exchange_online_out, 2)
-        out["charges"] = round(float(out["charges"]) + purchase_bank_charges, 2)
-        out["bank_out"] = round(float(out["withdrawals"]) + float(out["expenses"]) + float(out["charges"]), 2)
-        out["net_change"] = round(float(out["receipts"]) - float(out["bank_out"]), 2)
-        return out
+    with get_read_session() as session:
+        totals = flow_totals(session, flow_components(SUMMARY_FLOWS), start_iso=start_iso, end_iso=end_iso)
+    figures = combine(totals, SUMMARY_FLOWS)
+    return _summary(figures, figures["entries"])
 
 
 @router.get("/daily-summary")
@@ -542,13 +297,14 @@ def daily_summary(
     for date in requested_dates:
         _parse_ymd(date)
 
-    with get_session() as session:
-        return [_day_snapshot(session, date, include_entries=False) for date in requested_dates]
+    with get_read_session() as session:
+        days = book_days(session, "BANK", requested_dates)
+        return [_snapshot(date, days[date]) for date in requested_dates]
 
 
 @router.get("/day")
 def day_bankbook(date: str = Query(..., description="YYYY-MM-DD")):
-    with get_session() as session:
+    with get_read_session() as session:
         return _day_snapshot(session, date, include_entries=True)
 
 
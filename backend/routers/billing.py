@@ -6,19 +6,34 @@ from datetime import datetime
 import re
 from pydantic import BaseModel
 from sqlmodel import select
-from sqlalchemy import or_, exists, func, cast
-from sqlalchemy.types import Integer, Float
+from sqlalchemy import or_, exists, func, cast, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.types import Integer, Float, String
 from backend.accounting import mark_voucher_deleted, post_bill_payment_voucher, post_party_receipt_voucher, sync_bill_vouchers
+from backend.bill_payment_state import BATCH_SIZE as PAYMENT_STATE_BATCH_SIZE, scan_payment_state_page
 from backend.controls import assert_financial_year_unlocked, get_active_financial_year, log_audit, normalize_ymd
 from backend.utils.archive_rules import apply_archive_rules
-from backend.db import get_session
+from backend.db import get_read_session, get_session
+from backend.posting_queue import enqueue_posting, enqueue_postings
 from backend.models import (
-    Item, Category, Bill, BillItem, BillPayment, Return, ExchangeRecord,
+    Item, Category, Bill, BillClientKey, BillItem, BillPayment, Return, ExchangeRecord,
     BillCreate, BillOut, BillItemOut,
     AppUser, Customer, Party, PartyReceipt, ReceiptBillAdjustment,
     StockMovement,  # ✅ NEW
+    debtor_key,
+    search_key,
 )
-from backend.inventory_lot_sync import item_stock_kind, item_stock_meta, sync_lot_quantity_for_item
+from backend.inventory_lot_sync import (
+    IN_CHUNK_SIZE,
+    adjust_item_stock,
+    chunked,
+    item_stock_kind,
+    item_stock_meta,
+    item_stock_meta_from,
+    item_stock_meta_map,
+    sync_lot_quantity_for_item,
+)
+from backend.search_index import match_rowids
 from backend.security import get_request_actor_id, require_min_role
 
 router = APIRouter()
@@ -97,30 +112,37 @@ def allocate_bill_line_totals(
 
 
 def bill_credit_return_total(session, bill_id: int) -> float:
-    exchange_return_ids = {
-        int(return_id)
-        for return_id in session.exec(
-            select(ExchangeRecord.return_id).where(ExchangeRecord.source_bill_id == bill_id)
-        ).all()
-        if return_id is not None
-    }
-    total = 0.0
-    for row in session.exec(select(Return).where(Return.source_bill_id == bill_id)).all():
+    return bill_credit_return_totals(session, [bill_id]).get(int(bill_id), 0.0)
+
+
+def bill_credit_return_totals(session, bill_ids: List[int]) -> Dict[int, float]:
+    wanted = sorted({int(x) for x in bill_ids if x})
+    exchange_return_ids = set()
+    returns: List[Return] = []
+    for chunk in chunked(wanted):
+        exchange_return_ids.update(
+            int(return_id)
+            for return_id in session.exec(
+                select(ExchangeRecord.return_id).where(ExchangeRecord.source_bill_id.in_(chunk))
+            ).all()
+            if return_id is not None
+        )
+        returns.extend(session.exec(select(Return).where(Return.source_bill_id.in_(chunk))).all())
+
+    totals: Dict[int, float] = {bill_id: 0.0 for bill_id in wanted}
+    for row in returns:
         if row.id is None or int(row.id) in exchange_return_ids:
             continue
+        bill_id = int(row.source_bill_id)
         credit = round2(as_f(getattr(row, "credit_amount", 0.0)))
         if credit > 0:
-            total += credit
+            totals[bill_id] += credit
             continue
         cash = round2(as_f(getattr(row, "refund_cash", 0.0)))
         online = round2(as_f(getattr(row, "refund_online", 0.0)))
         if cash <= 0 and online <= 0:
-            total += as_f(getattr(row, "subtotal_return", 0.0))
-    return round2(total)
-
-
-def bill_original_total(session, bill: Bill) -> float:
-    return round2(as_f(bill.total_amount) + bill_credit_return_total(session, int(bill.id or 0)))
+            totals[bill_id] += as_f(getattr(row, "subtotal_return", 0.0))
+    return {bill_id: round2(total) for bill_id, total in totals.items()}
 
 
 def iso_date(s: Optional[str]) -> str:
@@ -275,12 +297,12 @@ def resolve_bill_party_links(session, *, customer_id: Optional[int], party_id: O
     note_lines = str(notes or "").splitlines()
     first = note_lines[0].strip() if note_lines else ""
     if first.lower().startswith("customer:"):
-        name = normalize_name(first.split(":", 1)[1].split("|", 1)[0])
-        if name:
+        name_key = search_key(first.split(":", 1)[1].split("|", 1)[0])
+        if name_key:
             party = session.exec(
                 select(Party).where(
                     Party.party_group == "SUNDRY_DEBTOR",
-                    func.lower(func.trim(func.coalesce(Party.name, ""))) == name.lower(),
+                    Party.name_key == name_key,
                 )
             ).first()
             if party:
@@ -465,9 +487,7 @@ def add_movement(
     )
 
 
-def bill_item_to_out(session, row: BillItem) -> BillItemOut:
-    item = session.get(Item, int(row.item_id or 0)) if row.item_id else None
-    category = session.get(Category, int(item.category_id)) if item and item.category_id else None
+def bill_item_to_out(row: BillItem, item: Optional[Item], category: Optional[Category], stock_meta: dict) -> BillItemOut:
     return BillItemOut(
         item_id=row.item_id,
         item_name=row.item_name,
@@ -478,10 +498,86 @@ def bill_item_to_out(session, row: BillItem) -> BillItemOut:
         mrp=row.mrp,
         quantity=row.quantity,
         line_total=row.line_total,
-        **item_stock_meta(session, int(row.item_id or 0)),
+        **stock_meta,
     )
 
 
+def bills_to_out(session, bills: List[Bill], *, include_return_totals: bool = False) -> List[BillOut]:
+    """
+    Build BillOut rows for a page of bills with a fixed number of IN-queries
+    (bill items, items, categories, lots, products and optionally returns)
+    instead of several lookups per bill line.
+    """
+    bill_ids = [int(b.id) for b in bills if b.id is not None]
+
+    lines_by_bill: Dict[int, List[BillItem]] = {bill_id: [] for bill_id in bill_ids}
+    for chunk in chunked(bill_ids):
+        for line in session.exec(
+            select(BillItem).where(BillItem.bill_id.in_(chunk)).order_by(BillItem.id.asc())
+        ).all():
+            lines_by_bill[int(line.bill_id)].append(line)
+
+    item_ids = sorted({int(line.item_id) for lines in lines_by_bill.values() for line in lines if line.item_id})
+    items_by_id: Dict[int, Item] = {}
+    for chunk in chunked(item_ids):
+        for item in session.exec(select(Item).where(Item.id.in_(chunk))).all():
+            items_by_id[int(item.id)] = item
+
+    category_ids = sorted({int(item.category_id) for item in items_by_id.values() if item.category_id})
+    categories_by_id: Dict[int, Category] = {}
+    for chunk in chunked(category_ids):
+        for category in session.exec(select(Category).where(Category.id.in_(chunk))).all():
+            categories_by_id[int(category.id)] = category
+
+    meta_by_item = item_stock_meta_map(session, items_by_id.values())
+    empty_meta = item_stock_meta_from(None, None)
+    return_totals = bill_credit_return_totals(session, bill_ids) if include_return_totals else {}
+
+    def line_out(line: BillItem) -> BillItemOut:
+        item = items_by_id.get(int(line.item_id or 0))
+        category = categories_by_id.get(int(item.category_id)) if item and item.category_id else None
+        meta = meta_by_item.get(int(item.id), empty_meta) if item else empty_meta
+        return bill_item_to_out(line, item, category, meta)
+
+    out: List[BillOut] = []
+    for b in bills:
+        lines = lines_by_bill.get(int(b.id), [])
+        credit_return_total = return_totals.get(int(b.id), 0.0)
+        out.append(BillOut(
+            id=b.id,
+            bill_number=getattr(b, "bill_number", None) or str(b.id),
+            date_time=b.date_time,
+            customer_id=getattr(b, "customer_id", None),
+            party_id=getattr(b, "party_id", None),
+            discount_percent=b.discount_percent,
+            subtotal=b.subtotal,
+            total_amount=b.total_amount,
+            original_total_amount=(
+                round2(as_f(b.total_amount) + credit_return_total) if include_return_totals else None
+            ),
+            credit_return_total=credit_return_total,
+            payment_mode=b.payment_mode,
+            payment_cash=b.payment_cash,
+            payment_online=b.payment_online,
+            notes=b.notes,
+
+            is_credit=b.is_credit,
+            payment_status=b.payment_status,
+            paid_amount=b.paid_amount,
+            writeoff_amount=getattr(b, "writeoff_amount", 0.0),
+            paid_at=b.paid_at,
+            is_deleted=b.is_deleted,
+            deleted_at=b.deleted_at,
+
+            items=[line_out(line) for line in lines],
+        ))
+    return out
+
+
+def bill_to_out(session, b: Bill) -> BillOut:
+    return bills_to_out(session, [b], include_return_totals=True)[0]
+
+
 # -------------------- Response Models --------------------
 
 class BillPageOut(BaseModel):
@@ -536,35 +632,7 @@ def list_bills(
         stmt = stmt.order_by(Bill.id.desc()).limit(limit).offset(offset)
         rows = session.exec(stmt).all()
 
-        out: List[BillOut] = []
-        for b in rows:
-            items = session.exec(select(BillItem).where(BillItem.bill_id == b.id)).all()
-            out.append(BillOut(
-                id=b.id,
-                bill_number=getattr(b, "bill_number", None) or str(b.id),
-                date_time=b.date_time,
-                customer_id=getattr(b, "customer_id", None),
-                party_id=getattr(b, "party_id", None),
-                discount_percent=b.discount_percent,
-                subtotal=b.subtotal,
-                total_amount=b.total_amount,
-                payment_mode=b.payment_mode,
-                payment_cash=b.payment_cash,
-                payment_online=b.payment_online,
-                notes=b.notes,
-
-                # ✅ credit fields
-                is_credit=b.is_credit,
-                payment_status=b.payment_status,
-                paid_amount=b.paid_amount,
-                writeoff_amount=getattr(b, "writeoff_amount", 0.0),
-                paid_at=b.paid_at,
-                is_deleted=b.is_deleted,
-                deleted_at=b.deleted_at,
-
-                items=[bill_item_to_out(session, i) for i in items]
-            ))
-        return out
+        return bills_to_out(session, rows)
 
 
 @router.get("/paged", response_model=BillPageOut)
@@ -612,7 +680,14 @@ def list_bills_paged(
 
         # ✅ Search filter in SQL (id OR notes OR item_name)
         qq = (q or "").strip()
-        if qq:
+        bill_hits = match_rowids(session, "bill_fts", qq) if qq else None
+        if bill_hits is not None:
+            text_match = Bill.id.in_(select(bill_hits.subquery().c.id))
+            if qq.isdigit():
+                stmt = stmt.where(or_(Bill.id == int(qq), text_match))
+            else:
+                stmt = stmt.where(text_match)
+        elif qq:
             like = f"%{qq.lower()}%"
 
             id_filter = None
@@ -646,33 +721,7 @@ def list_bills_paged(
         if has_more:
             rows = rows[:limit]
 
-        out: List[BillOut] = []
-        for b in rows:
-            items = session.exec(select(BillItem).where(BillItem.bill_id == b.id)).all()
-            out.append(BillOut(
-                id=b.id,
-                bill_number=getattr(b, "bill_number", None) or str(b.id),
-                date_time=b.date_time,
-                customer_id=getattr(b, "customer_id", None),
-                party_id=getattr(b, "party_id", None),
-                discount_percent=b.discount_percent,
-                subtotal=b.subtotal,
-                total_amount=b.total_amount,
-                payment_mode=b.payment_mode,
-                payment_cash=b.payment_cash,
-                payment_online=b.payment_online,
-                notes=b.notes,
-
-                is_credit=b.is_credit,
-                payment_status=b.payment_status,
-                paid_amount=b.paid_amount,
-                writeoff_amount=getattr(b, "writeoff_amount", 0.0),
-                paid_at=b.paid_at,
-                is_deleted=b.is_deleted,
-                deleted_at=b.deleted_at,
-
-                items=[bill_item_to_out(session, i) for i in items]
-            ))
+        out = bills_to_out(session, rows)
 
         next_offset = (offset + limit) if has_more else None
         return {"items": out, "next_offset": next_offset}
@@ -680,7 +729,7 @@ def list_bills_paged(
 
 @router.get("/credit-pending-total")
 def credit_pending_total():
-    with get_session() as session:
+    with get_read_session() as session:
         outstanding_expr = (
             func.coalesce(Bill.total_amount, 0)
             - func.coalesce(Bill.paid_amount, 0)
@@ -719,7 +768,7 @@ def report_item_sales(
     qq = (q or "").strip().lower()
     like = f"%{qq}%"
 
-    with get_session() as session:
+    with get_read_session() as session:
         try:
             qty_expr = func.coalesce(func.sum(cast(BillItem.quantity, Integer)), 0)
             gross_expr = func.coalesce(
@@ -852,39 +901,25 @@ def get_bill(bill_id: str):
             b = session.get(Bill, int(key))
         if not b:
             raise HTTPException(status_code=404, detail="Bill not found")
-        items = session.exec(select(BillItem).where(BillItem.bill_id == b.id)).all()
-        return BillOut(
-            id=b.id,
-            bill_number=getattr(b, "bill_number", None) or str(b.id),
-            date_time=b.date_time,
-            customer_id=getattr(b, "customer_id", None),
-            party_id=getattr(b, "party_id", None),
-            discount_percent=b.discount_percent,
-            subtotal=b.subtotal,
-            total_amount=b.total_amount,
-            original_total_amount=bill_original_total(session, b),
-            credit_return_total=bill_credit_return_total(session, int(b.id or 0)),
-            payment_mode=b.payment_mode,
-            payment_cash=b.payment_cash,
-            payment_online=b.payment_online,
-            notes=b.notes,
+        return bill_to_out(session, b)
 
-            is_credit=b.is_credit,
-            payment_status=b.payment_status,
-            paid_amount=b.paid_amount,
-            writeoff_amount=getattr(b, "writeoff_amount", 0.0),
-            paid_at=b.paid_at,
-            is_deleted=b.is_deleted,
-            deleted_at=b.deleted_at,
 
-            items=[bill_item_to_out(session, i) for i in items]
-        )
+# -------------------- Create Bill --------------------
 
+def _load_items(session, item_ids) -> Dict[int, Item]:
+    items: Dict[int, Item] = {}
+    for chunk in chunked(sorted({int(iid) for iid in item_ids})):
+        for itm in session.exec(select(Item).where(Item.id.in_(chunk))).all():
+            items[int(itm.id)] = itm
+    return items
 
-# -------------------- Create Bill --------------------
 
-@router.post("/", response_model=BillOut, status_code=201)
-def create_bill(payload: BillCreate):
+def _prepare_bill(session, payload: BillCreate, items: Dict[int, Item], stock_left: Dict[int, int]) -> Dict[str, Any]:
+    """Validate and price one BillCreate against loaded items and the stock still unsold.
+
+    Raises HTTPException on the first problem. Nothing is written except the
+    debtor party resolve_bill_party_links may create for a linked customer.
+    """
     if not payload.items:
         raise HTTPException(status_code=400, detail="Bill must have at least one item")
     if payload.discount_percent < 0 or payload.discount_percent > 100:
@@ -902,139 +937,166 @@ def create_bill(payload: BillCreate):
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid final_amount")
 
-    with get_session() as session:
-        # 1) Load items and validate stock
-        db_items: Dict[int, Item] = {}
-        line_price_by_item: Dict[int, float] = {}
-        requested_line_total_by_item: Dict[int, float] = {}
-        subtotal = 0.0
-
-        for line in payload.items:
-            itm = session.get(Item, line.item_id)
-            if not itm:
-                raise HTTPException(status_code=404, detail=f"Item {line.item_id} not found")
-            if line.quantity <= 0:
-                raise HTTPException(status_code=400, detail="Quantity must be > 0")
-            if itm.stock < line.quantity:
-                raise HTTPException(status_code=400, detail=f"Insufficient stock for {itm.name}")
-
-            db_items[line.item_id] = itm
-            line_price = bill_line_unit_price(line, itm)
-            line_price_by_item[line.item_id] = line_price
-            requested_line_total = getattr(line, "line_total", None)
-            if requested_line_total is not None:
-                if as_f(requested_line_total) < 0:
-                    raise HTTPException(status_code=400, detail="line_total cannot be negative")
-                requested_line_total_by_item[line.item_id] = round2(as_f(requested_line_total))
-            subtotal += (as_i(line.quantity) * line_price)
+    # 1) Validate items and stock
+    line_price_by_item: Dict[int, float] = {}
+    requested_line_total_by_item: Dict[int, float] = {}
+    quantities: Dict[int, int] = {}
+    subtotal = 0.0
+
+    for line in payload.items:
+        itm = items.get(int(line.item_id))
+        if not itm:
+            raise HTTPException(status_code=404, detail=f"Item {line.item_id} not found")
+        if line.quantity <= 0:
+            raise HTTPException(status_code=400, detail="Quantity must be > 0")
+        quantities[itm.id] = quantities.get(itm.id, 0) + as_i(line.quantity)
+        if stock_left.get(itm.id, 0) < quantities[itm.id]:
+            raise HTTPException(status_code=400, detail=f"Insufficient stock for {itm.name}")
+
+        line_price = bill_line_unit_price(line, itm)
+        line_price_by_item[line.item_id] = line_price
+        requested_line_total = getattr(line, "line_total", None)
+        if requested_line_total is not None:
+            if as_f(requested_line_total) < 0:
+                raise HTTPException(status_code=400, detail="line_total cannot be negative")
+            requested_line_total_by_item[line.item_id] = round2(as_f(requested_line_total))
+        subtotal += (as_i(line.quantity) * line_price)
+
+    subtotal = round2(subtotal)
+    computed_total = round2(subtotal * (1 - as_f(payload.discount_percent) / 100.0))
+
+    # 2) Use manual override if provided; else computed total
+    total = manual_final if manual_final is not None else computed_total
+    saved_line_totals = allocate_bill_line_totals(
+        {line.item_id: as_i(line.quantity) for line in payload.items},
+        line_price_by_item,
+        total,
+        requested_line_total_by_item,
+    )
 
-        subtotal = round2(subtotal)
-        computed_total = round2(subtotal * (1 - as_f(payload.discount_percent) / 100.0))
+    # 3) Validate payment split (against chosen total) — hardened for None inputs
+    pay_cash_in = round2(as_f(getattr(payload, "payment_cash", 0.0)))
+    pay_online_in = round2(as_f(getattr(payload, "payment_online", 0.0)))
+    pay_credit_in = round2(as_f(getattr(payload, "payment_credit", 0.0)))
+
+    if total <= 0:
+        cash, online, credit = 0.0, 0.0, 0.0
+        stored_payment_mode = "cash"
+    elif payload.payment_mode == "credit":
+        cash, online, credit = 0.0, 0.0, total
+        stored_payment_mode = payload.payment_mode
+    elif payload.payment_mode == "cash":
+        if round2(pay_cash_in) != total:
+            raise HTTPException(status_code=400, detail="payment_cash must equal total_amount")
+        cash, online, credit = total, 0.0, 0.0
+        stored_payment_mode = payload.payment_mode
+    elif payload.payment_mode == "online":
+        if round2(pay_online_in) != total:
+            raise HTTPException(status_code=400, detail="payment_online must equal total_amount")
+        cash, online, credit = 0.0, total, 0.0
+        stored_payment_mode = payload.payment_mode
+    else:  # split
+        if pay_credit_in < 0:
+            raise HTTPException(status_code=400, detail="payment_credit cannot be negative")
+        if round2(pay_cash_in + pay_online_in + pay_credit_in) != total:
+            raise HTTPException(
+                status_code=400,
+                detail="Cash + Online + Credit must equal total_amount"
+            )
+        cash, online, credit = round2(pay_cash_in), round2(pay_online_in), round2(pay_credit_in)
+        stored_payment_mode = payload.payment_mode
 
-        # 2) Use manual override if provided; else computed total
-        total = manual_final if manual_final is not None else computed_total
-        saved_line_totals = allocate_bill_line_totals(
-            {line.item_id: as_i(line.quantity) for line in payload.items},
-            line_price_by_item,
-            total,
-            requested_line_total_by_item,
-        )
+    # 4) Dates, payment state and party links
+    now_iso = now_ts()
+    bill_ts = normalize_bill_ts(getattr(payload, "date_time", None), now_iso)
+    assert_financial_year_unlocked(session, bill_ts, context="Bill creation")
+
+    paid_now = round2(cash + online)
+    if total <= 0:
+        status = "PAID"
+        paid_at = bill_ts
+    elif paid_now <= 0:
+        status = "UNPAID"
+        paid_at = None
+    elif paid_now + 0.0001 < total:
+        status = "PARTIAL"
+        paid_at = bill_ts
+    else:
+        status = "PAID"
+        paid_at = bill_ts
+    has_credit_component = round2(total - paid_now) > 0
+    is_credit = False if total <= 0 else payload.payment_mode == "credit" or has_credit_component
+    linked_customer_id, linked_party_id = resolve_bill_party_links(
+        session,
+        customer_id=getattr(payload, "customer_id", None),
+        party_id=getattr(payload, "party_id", None),
+        notes=getattr(payload, "notes", None),
+    )
 
-        # 3) Validate payment split (against chosen total) — hardened for None inputs
-        pay_cash_in = round2(as_f(getattr(payload, "payment_cash", 0.0)))
-        pay_online_in = round2(as_f(getattr(payload, "payment_online", 0.0)))
-        pay_credit_in = round2(as_f(getattr(payload, "payment_credit", 0.0)))
+    lines = []
+    for line in payload.items:
+        itm = items[int(line.item_id)]
+        qty = as_i(line.quantity)
+        line_total = saved_line_totals.get(itm.id, round2(qty * as_f(line_price_by_item.get(itm.id, itm.mrp))))
+        lines.append((itm, qty, line_total))
 
-        if total <= 0:
-            cash, online, credit = 0.0, 0.0, 0.0
-            stored_payment_mode = "cash"
-        elif payload.payment_mode == "credit":
-            cash, online, credit = 0.0, 0.0, total
-            stored_payment_mode = payload.payment_mode
-        elif payload.payment_mode == "cash":
-            if round2(pay_cash_in) != total:
-                raise HTTPException(status_code=400, detail="payment_cash must equal total_amount")
-            cash, online, credit = total, 0.0, 0.0
-            stored_payment_mode = payload.payment_mode
-        elif payload.payment_mode == "online":
-            if round2(pay_online_in) != total:
-                raise HTTPException(status_code=400, detail="payment_online must equal total_amount")
-            cash, online, credit = 0.0, total, 0.0
-            stored_payment_mode = payload.payment_mode
-        else:  # split
-            if pay_credit_in < 0:
-                raise HTTPException(status_code=400, detail="payment_credit cannot be negative")
-            if round2(pay_cash_in + pay_online_in + pay_credit_in) != total:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Cash + Online + Credit must equal total_amount"
-                )
-            cash, online, credit = round2(pay_cash_in), round2(pay_online_in), round2(pay_credit_in)
-            stored_payment_mode = payload.payment_mode
+    return {
+        "bill": {
+            "date_time": bill_ts,
+            "customer_id": linked_customer_id,
+            "party_id": linked_party_id,
+            "discount_percent": payload.discount_percent,
+            "subtotal": subtotal,
+            "total_amount": total,
+            "payment_mode": stored_payment_mode,
+            "payment_cash": cash,
+            "payment_online": online,
+            "notes": getattr(payload, "notes", None),
+            # ✅ credit tracking
+            "is_credit": is_credit,
+            "payment_status": status,
+            "paid_amount": paid_now,
+            "writeoff_amount": 0.0,
+            "paid_at": paid_at,
+            "is_deleted": False,
+            "deleted_at": None,
+        },
+        "lines": lines,
+        "quantities": quantities,
+        # ✅ If not credit, a BillPayment for reporting "Collected Today"
+        "payment": {
+            "received_at": bill_ts,
+            "mode": stored_payment_mode,  # cash/online/split
+            "cash_amount": cash,
+            "online_amount": online,
+            "writeoff_amount": 0.0,
+            "note": "auto: payment at bill creation",
+            "is_writeoff": False,
+        } if paid_now > 0 else None,
+    }
 
-        # 4) Create Bill + BillItems and deduct stock (✅ single transaction)
-        now_iso = now_ts()
-        bill_ts = normalize_bill_ts(getattr(payload, "date_time", None), now_iso)
-        assert_financial_year_unlocked(session, bill_ts, context="Bill creation")
 
-        paid_now = round2(cash + online)
-        if total <= 0:
-            status = "PAID"
-            paid_at = bill_ts
-            is_credit = False
-        elif paid_now <= 0:
-            status = "UNPAID"
-            paid_at = None
-        elif paid_now + 0.0001 < total:
-            status = "PARTIAL"
-            paid_at = bill_ts
-        else:
-            status = "PAID"
-            paid_at = bill_ts
-        has_credit_component = round2(total - paid_now) > 0
-        is_credit = False if total <= 0 else payload.payment_mode == "credit" or has_credit_component
-        paid_amount = paid_now
-        linked_customer_id, linked_party_id = resolve_bill_party_links(
-            session,
-            customer_id=getattr(payload, "customer_id", None),
-            party_id=getattr(payload, "party_id", None),
-            notes=getattr(payload, "notes", None),
-        )
+@router.post("/", response_model=BillOut, status_code=201)
+def create_bill(payload: BillCreate):
+    with get_session() as session:
+        # 1) Load items, validate stock and payment split
+        items = _load_items(session, [line.item_id for line in payload.items])
+        prepared = _prepare_bill(session, payload, items, {iid: as_i(itm.stock) for iid, itm in items.items()})
+        bill_ts = prepared["bill"]["date_time"]
 
+        # 2) Create Bill + BillItems and deduct stock (✅ single transaction)
         try:
-            b = Bill(
-                date_time=bill_ts,
-                customer_id=linked_customer_id,
-                party_id=linked_party_id,
-                discount_percent=payload.discount_percent,
-                subtotal=subtotal,
-                total_amount=total,
-                payment_mode=stored_payment_mode,
-                payment_cash=cash,
-                payment_online=online,
-                notes=getattr(payload, "notes", None),
-
-                # ✅ credit tracking
-                is_credit=is_credit,
-                payment_status=status,
-                paid_amount=paid_amount,
-                writeoff_amount=0.0,
-                paid_at=paid_at,
-                is_deleted=False,
-                deleted_at=None,
-            )
+            b = Bill(**prepared["bill"])
 
             session.add(b)
             session.flush()  # ✅ ensures b.id is available without committing
             assign_bill_number(session, b)
 
             # Deduct stock & create line items + SALE ledger
-            for line in payload.items:
-                itm = db_items[line.item_id]
-                qty = as_i(line.quantity)
-
-                itm.stock = as_i(itm.stock) - qty
-                session.add(itm)
+            for itm, qty, line_total in prepared["lines"]:
+                # Re-checked in the UPDATE itself: another counter may have sold it since we loaded it.
+                if not adjust_item_stock(session, itm, -qty):
+                    raise HTTPException(status_code=400, detail=f"Insufficient stock for {itm.name}")
                 # ✅ archive sold-out duplicate batches
                 apply_archive_rules(session, itm)
                 sync_lot_quantity_for_item(session, itm, ts=bill_ts)
@@ -1044,7 +1106,7 @@ def create_bill(payload: BillCreate):
                     item_name=itm.name,
                     mrp=as_f(itm.mrp),
                     quantity=qty,
-                    line_total=saved_line_totals.get(itm.id, round2(qty * as_f(line_price_by_item.get(itm.id, itm.mrp))))
+                    line_total=line_total,
                 )
                 session.add(bi)
 
@@ -1059,24 +1121,12 @@ def create_bill(payload: BillCreate):
                     note=f"Bill #{b.id}",
                 )
 
-            # ✅ If not credit, create a BillPayment for reporting "Collected Today"
-            if paid_now > 0:
-                p = BillPayment(
-                    bill_id=b.id,
-                    received_at=bill_ts,
-                    mode=stored_payment_mode,  # cash/online/split
-                    cash_amount=cash,
-                    online_amount=online,
-                    writeoff_amount=0.0,
-                    note="auto: payment at bill creation",
-                    is_writeoff=False,
-                )
-                session.add(p)
+            if prepared["payment"]:
+                session.add(BillPayment(bill_id=b.id, **prepared["payment"]))
 
+            enqueue_posting(session, "BILL", int(b.id))
             session.commit()
             session.refresh(b)
-            sync_bill_vouchers(session, b)
-            session.commit()
 
         except HTTPException:
             session.rollback()
@@ -1085,31 +1135,166 @@ def create_bill(payload: BillCreate):
             session.rollback()
             raise HTTPException(status_code=500, detail=f"Failed to create bill: {e}")
 
-        items = session.exec(select(BillItem).where(BillItem.bill_id == b.id)).all()
-        return BillOut(
-            id=b.id,
-            bill_number=getattr(b, "bill_number", None) or str(b.id),
-            date_time=b.date_time,
-            customer_id=getattr(b, "customer_id", None),
-            party_id=getattr(b, "party_id", None),
-            discount_percent=b.discount_percent,
-            subtotal=b.subtotal,
-            total_amount=b.total_amount,
-            payment_mode=b.payment_mode,
-            payment_cash=b.payment_cash,
-            payment_online=b.payment_online,
-            notes=b.notes,
+        return bill_to_out(session, b)
 
-            is_credit=b.is_credit,
-            payment_status=b.payment_status,
-            paid_amount=b.paid_amount,
-            writeoff_amount=getattr(b, "writeoff_amount", 0.0),
-            paid_at=b.paid_at,
-            is_deleted=b.is_deleted,
-            deleted_at=b.deleted_at,
 
-            items=[bill_item_to_out(session, i) for i in items]
-        )
+# -------------------- Batch / offline sync --------------------
+
+MAX_BATCH_BILLS = 500
+
+
+class BillBatchEntryIn(BaseModel):
+    client_key: str  # generated by the terminal when it queued the sale
+    bill: BillCreate
+
+
+class BillBatchIn(BaseModel):
+    bills: List[BillBatchEntryIn]
+
+
+class BillBatchResultOut(BaseModel):
+    client_key: str
+    status: str  # CREATED | DUPLICATE | FAILED
+    bill: Optional[BillOut] = None
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+
+
+class BillBatchOut(BaseModel):
+    results: List[BillBatchResultOut]
+
+
+class _StockChanged(Exception):
+    """Another sale took stock this batch had counted on; the batch is re-run."""
+
+
+def _create_bill_batch(session, entries: List[BillBatchEntryIn]) -> List[BillBatchResultOut]:
+    keys = [str(entry.client_key or "").strip() for entry in entries]
+    bill_by_key: Dict[str, int] = {}
+    for chunk in chunked(sorted({key for key in keys if key})):
+        for row in session.exec(select(BillClientKey).where(BillClientKey.client_key.in_(chunk))).all():
+            bill_by_key[row.client_key] = int(row.bill_id)
+
+    # One pass over the whole batch: every bill is checked against the stock the
+    # bills before it left over, and a failed bill does not stop the rest.
+    items = _load_items(session, [line.item_id for entry in entries for line in entry.bill.items])
+    loaded_stock = {iid: as_i(itm.stock) for iid, itm in items.items()}
+    stock_left = dict(loaded_stock)
+    results: List[BillBatchResultOut] = []
+    accepted: List[tuple] = []
+    for key, entry in zip(keys, entries):
+        if not key:
+            results.append(BillBatchResultOut(client_key=key, status="FAILED", status_code=400, error="client_key is required"))
+            continue
+        if key in bill_by_key or any(key == accepted_key for accepted_key, _ in accepted):
+            results.append(BillBatchResultOut(client_key=key, status="DUPLICATE"))
+            continue
+        try:
+            prepared = _prepare_bill(session, entry.bill, items, stock_left)
+        except HTTPException as exc:
+            results.append(BillBatchResultOut(client_key=key, status="FAILED", status_code=exc.status_code, error=str(exc.detail)))
+            continue
+        for iid, qty in prepared["quantities"].items():
+            stock_left[iid] -= qty
+        accepted.append((key, prepared))
+        results.append(BillBatchResultOut(client_key=key, status="CREATED"))
+
+    if accepted:
+        bill_ids = session.exec(
+            insert(Bill).returning(Bill.id, sort_by_parameter_order=True),
+            # Core INSERT skips the ORM hook that keeps debtor_key in step with notes.
+            params=[{**prepared["bill"], "debtor_key": debtor_key(prepared["bill"].get("notes"))} for _, prepared in accepted],
+        ).scalars().all()
+        for chunk in chunked(bill_ids):
+            session.exec(update(Bill).where(Bill.id.in_(chunk)).values(bill_number=cast(Bill.id, String)))
+
+        ts = now_ts()
+        item_rows, movement_rows, payment_rows, key_rows = [], [], [], []
+        last_sale_ts: Dict[int, str] = {}
+        for (key, prepared), bill_id in zip(accepted, bill_ids):
+            bill_by_key[key] = int(bill_id)
+            key_rows.append({"client_key": key, "bill_id": bill_id, "created_at": ts})
+            for itm, qty, line_total in prepared["lines"]:
+                item_rows.append({
+                    "bill_id": bill_id,
+                    "item_id": itm.id,
+                    "item_name": itm.name,
+                    "mrp": as_f(itm.mrp),
+                    "quantity": qty,
+                    "line_total": line_total,
+                })
+                movement_rows.append({
+                    "item_id": itm.id,
+                    "ts": ts,
+                    "delta": -qty,
+                    "reason": "SALE",
+                    "ref_type": "BILL",
+                    "ref_id": bill_id,
+                    "note": f"Bill #{bill_id}",
+                })
+                last_sale_ts[itm.id] = prepared["bill"]["date_time"]
+            if prepared["payment"]:
+                payment_rows.append({"bill_id": bill_id, **prepared["payment"]})
+
+        session.exec(insert(BillClientKey), params=key_rows)
+        session.exec(insert(BillItem), params=item_rows)
+        session.exec(insert(StockMovement), params=movement_rows)
+        if payment_rows:
+            session.exec(insert(BillPayment), params=payment_rows)
+
+        # Stock, archive rules and lot quantities once per item, not once per line.
+        archived_groups = set()
+        for iid, bill_ts in last_sale_ts.items():
+            itm = items[iid]
+            if not adjust_item_stock(session, itm, stock_left[iid] - loaded_stock[iid]):
+                raise _StockChanged(itm.name)
+            group = (itm.name_key, itm.brand_key)
+            if group not in archived_groups:
+                archived_groups.add(group)
+                apply_archive_rules(session, itm)
+            sync_lot_quantity_for_item(session, itm, ts=bill_ts)
+
+        enqueue_postings(session, "BILL", bill_ids)
+    session.commit()
+
+    bills: List[Bill] = []
+    for chunk in chunked(sorted(set(bill_by_key.values()))):
+        bills.extend(session.exec(select(Bill).where(Bill.id.in_(chunk))).all())
+    out_by_id = {int(row.id): row for row in bills_to_out(session, bills, include_return_totals=True)}
+    for result in results:
+        if result.status != "FAILED":
+            result.bill = out_by_id.get(bill_by_key.get(result.client_key, 0))
+    return results
+
+
+@router.post("/batch", response_model=BillBatchOut)
+def create_bills_batch(payload: BillBatchIn):
+    """Create many bills at once, e.g. sales a counter terminal queued while offline.
+
+    Each bill carries a client_key; a key seen before returns its existing bill
+    as DUPLICATE, so replaying a batch after a network blip never sells twice.
+    """
+    if not payload.bills:
+        raise HTTPException(status_code=400, detail="Batch must have at least one bill")
+    if len(payload.bills) > MAX_BATCH_BILLS:
+        raise HTTPException(status_code=400, detail=f"Batch can have at most {MAX_BATCH_BILLS} bills")
+
+    with get_session() as session:
+        for attempt in range(2):
+            try:
+                return BillBatchOut(results=_create_bill_batch(session, payload.bills))
+            except (IntegrityError, _StockChanged):
+                # A concurrent replay claimed one of these keys first, or a concurrent sale took
+                # stock; the retry reports those bills as DUPLICATE or FAILED.
+                session.rollback()
+                if attempt:
+                    raise HTTPException(status_code=409, detail="Batch conflicts with a concurrent sync; retry")
+            except HTTPException:
+                session.rollback()
+                raise
+            except Exception as e:
+                session.rollback()
+                raise HTTPException(status_code=500, detail=f"Failed to create bills: {e}")
 
 
 class BillEditItemIn(BaseModel):
@@ -1140,34 +1325,6 @@ class BillCustomerMapIn(BaseModel):
     notes: Optional[str] = None
 
 
-def bill_to_out(session, b: Bill) -> BillOut:
-    items = session.exec(select(BillItem).where(BillItem.bill_id == b.id)).all()
-    return BillOut(
-        id=b.id,
-        bill_number=getattr(b, "bill_number", None) or str(b.id),
-        date_time=b.date_time,
-        customer_id=getattr(b, "customer_id", None),
-        party_id=getattr(b, "party_id", None),
-        discount_percent=b.discount_percent,
-        subtotal=b.subtotal,
-        total_amount=b.total_amount,
-        original_total_amount=bill_original_total(session, b),
-        credit_return_total=bill_credit_return_total(session, int(b.id or 0)),
-        payment_mode=b.payment_mode,
-        payment_cash=b.payment_cash,
-        payment_online=b.payment_online,
-        notes=b.notes,
-        is_credit=b.is_credit,
-        payment_status=b.payment_status,
-        paid_amount=b.paid_amount,
-        writeoff_amount=getattr(b, "writeoff_amount", 0.0),
-        paid_at=b.paid_at,
-        is_deleted=b.is_deleted,
-        deleted_at=b.deleted_at,
-        items=[bill_item_to_out(session, i) for i in items],
-    )
-
-
 @router.patch("/{bill_id}/customer", response_model=BillOut)
 def map_unmapped_credit_bill_customer(bill_id: int, payload: BillCustomerMapIn):
     require_min_role("MANAGER", context="Credit bill customer mapping")
@@ -1349,8 +1506,8 @@ def update_bill(bill_id: int, payload: BillUpdateIn):
 
             candidates = session.exec(
                 select(Item).where(
-                    func.lower(Item.name) == func.lower(group_name),
-                    func.lower(func.coalesce(Item.brand, "")) == func.lower(group_brand),
+                    Item.name_key == search_key(group_name),
+                    Item.brand_key == search_key(group_brand),
                 )
             ).all()
             seed_kind = _stock_kind(seed)
@@ -1561,8 +1718,8 @@ def update_bill(bill_id: int, payload: BillUpdateIn):
                 if stock_delta == 0:
                     continue
 
-                itm.stock = as_i(itm.stock) + stock_delta
-                session.add(itm)
+                if not adjust_item_stock(session, itm, stock_delta):
+                    raise HTTPException(status_code=400, detail=f"Insufficient stock for {itm.name} (item #{iid})")
                 apply_archive_rules(session, itm)
                 sync_lot_quantity_for_item(session, itm, ts=now_iso)
 
@@ -1675,7 +1832,6 @@ def update_bill(bill_id: int, payload: BillUpdateIn):
             session.rollback()
             raise HTTPException(status_code=500, detail=f"Failed to edit bill: {e}")
 
-        items = session.exec(select(BillItem).where(BillItem.bill_id == b.id)).all()
         return bill_to_out(session, b)
 
 
@@ -1704,8 +1860,7 @@ def soft_delete_bill(bill_id: int):
             itm = session.get(Item, iid)
             if not itm:
                 continue
-            itm.stock = as_i(itm.stock) + as_i(qty)
-            session.add(itm)
+            adjust_item_stock(session, itm, as_i(qty))
             apply_archive_rules(session, itm)
             sync_lot_quantity_for_item(session, itm)
             add_movement(
@@ -1765,8 +1920,11 @@ def recover_bill(bill_id: int):
             itm = session.get(Item, iid)
             if not itm:
                 continue
-            itm.stock = as_i(itm.stock) - as_i(qty)
-            session.add(itm)
+            if not adjust_item_stock(session, itm, -as_i(qty)):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Cannot recover bill. Insufficient stock for {itm.name}",
+                )
             apply_archive_rules(session, itm)
             sync_lot_quantity_for_item(session, itm)
             add_movement(
@@ -1883,24 +2041,14 @@ def receive_payment(bill_id: int, payload: ReceivePaymentIn):
             is_writeoff=is_writeoff,
         )
         session.add(p)
+        session.flush()
+        enqueue_posting(session, "BILL_PAYMENT", int(p.id))
         session.commit()
 
         # 2) Recalculate totals from all BillPayment rows (prevents future inconsistencies)
         result = recalculate_bill_payment_state(session, b)
         session.add(b)
         session.commit()
-        post_bill_payment_voucher(
-            session,
-            b,
-            int(p.id),
-            p.received_at,
-            float(p.cash_amount or 0),
-            float(p.online_amount or 0),
-            float(getattr(p, "writeoff_amount", 0) or 0),
-            bool(getattr(p, "is_writeoff", False)),
-            p.note,
-        )
-        session.commit()
         return result
 
 
@@ -2133,7 +2281,7 @@ def payments_summary(
     - credit bill receipts (receive-payment)
     So we aggregate from BillPayment.received_at (NOT from Bill rows).
     """
-    with get_session() as session:
+    with get_read_session() as session:
         receipt_adjustment_payment_ids = _receipt_adjustment_payment_ids(session)
         stmt = (
             select(BillPayment)
@@ -2200,7 +2348,7 @@ def payments_aggregate(
     start_ts = f"{from_date}T00:00:00"
     end_ts = f"{to_date}T23:59:59"
 
-    with get_session() as session:
+    with get_read_session() as session:
         if group_by == "month":
             period_expr = func.substr(BillPayment.received_at, 1, 7)  # YYYY-MM
             receipt_period_expr = func.substr(PartyReceipt.received_at, 1, 7)
@@ -2311,7 +2459,7 @@ def sales_aggregate(
     start_ts = f"{from_date}T00:00:00"
     end_ts = f"{to_date}T23:59:59"
 
-    with get_session() as session:
+    with get_read_session() as session:
         if group_by == "month":
             period_expr = func.substr(Bill.date_time, 1, 7)  # YYYY-MM
         else:
@@ -2352,3 +2500,16 @@ def sales_aggregate(
             })
 
         return out
+
+
+@router.get("/payments/state-check")
+def payment_state_check(
+    after_id: int = Query(0, ge=0, description="Resume after this bill id (next_after_id of the previous page)"),
+    batch_size: int = Query(PAYMENT_STATE_BATCH_SIZE, ge=1, le=IN_CHUNK_SIZE),
+) -> Dict[str, Any]:
+    """
+    Bills whose stored payment columns disagree with their active payments,
+    one bounded page per call. Read-only; the startup check logs the same.
+    """
+    with get_read_session() as session:
+        return scan_payment_state_page(session, after_id=after_id, batch_size=batch_size)
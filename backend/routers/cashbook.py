@@ -7,24 +7,17 @@ from sqlmodel import select
 from sqlalchemy import text  # ✅ use sqlalchemy.text (NOT sqlmodel.text)
 
 from backend.accounting import mark_voucher_deleted, post_loan_voucher, sync_suspense_book_voucher
+from backend.book_balances import book_days
+from backend.cash_flow_aggregates import CASH_FLOWS, combine, flow_components, flow_totals
 from backend.controls import assert_financial_year_unlocked
-from backend.db import get_session
+from backend.db import get_read_session, get_session
+from backend.posting_queue import enqueue_posting
 from backend.models import (
-    BankbookEntry,
-    Bill,
-    BillPayment,
     CashbookCreate,
     CashbookEntry,
     CashbookOut,
-    ExchangeRecord,
-    PartyReceipt,
     Party,
     LoanAdjustment,
-    Purchase,
-    PurchasePayment,
-    PurchaseReturn,
-    ReceiptBillAdjustment,
-    Return,
 )
 from backend.security import require_min_role
 
@@ -53,33 +46,8 @@ def _range_bounds(from_date: Optional[str], to_date: Optional[str]):
 
 VALID_ENTRY_TYPES = {"RECEIPT", "WITHDRAWAL", "EXPENSE", "CONTRA", "OPENING", "LOAN", "LOAN_REPAYMENT"}
 
-
-def _sum_rows(rows: List[CashbookEntry]):
-    receipts = 0.0
-    withdrawals = 0.0
-    expenses = 0.0
-    for r in rows:
-        et = (r.entry_type or "").upper()
-        amt = float(r.amount or 0)
-        if et == "OPENING":
-            continue
-        if et in {"RECEIPT", "LOAN_REPAYMENT"}:
-            receipts += amt
-        elif et in ("WITHDRAWAL", "CONTRA", "LOAN"):
-            withdrawals += amt
-        else:
-            expenses += amt
-
-    cash_out = withdrawals + expenses
-    net_change = receipts - cash_out
-    return {
-        "cash_out": round(cash_out, 2),
-        "withdrawals": round(withdrawals, 2),
-        "expenses": round(expenses, 2),
-        "receipts": round(receipts, 2),
-        "net_change": round(net_change, 2),
-        "count": len(rows),
-    }
+# The range summary has never counted purchase-return refunds; the day views do.
+SUMMARY_FLOWS = {**CASH_FLOWS, "receipts": tuple(name for name in CASH_FLOWS["receipts"] if name != "purchase_return_cash")}
 
 
 def _parse_ymd(date_str: str) -> datetime:
@@ -89,196 +57,37 @@ def _parse_ymd(date_str: str) -> datetime:
         raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
 
 
-def _sum_bill_cash(session, *, start_iso: Optional[str] = None, end_iso: Optional[str] = None) -> float:
-    receipt_adjustment_payment_ids = {
-        int(row.bill_payment_id)
-        for row in session.exec(
-            select(ReceiptBillAdjustment)
-            .join(PartyReceipt, PartyReceipt.id == ReceiptBillAdjustment.receipt_id)
-            .where(ReceiptBillAdjustment.bill_payment_id.is_not(None))
-            .where(PartyReceipt.is_deleted == False)  # noqa: E712
-        ).all()
-        if row.bill_payment_id is not None
+def _summary(figures: dict, count: int):
+    cash_out = round(figures["withdrawals"] + figures["expenses"], 2)
+    return {
+        "cash_out": cash_out,
+        "withdrawals": figures["withdrawals"],
+        "expenses": figures["expenses"],
+        "receipts": figures["receipts"],
+        "net_change": round(figures["receipts"] - cash_out, 2),
+        "count": count,
     }
-    stmt = (
-        select(BillPayment)
-        .join(Bill, Bill.id == BillPayment.bill_id)
-        .where(Bill.is_deleted == False)  # noqa: E712
-        .where(BillPayment.is_deleted == False)  # noqa: E712
-    )
-    if start_iso:
-        stmt = stmt.where(BillPayment.received_at >= start_iso)
-    if end_iso:
-        stmt = stmt.where(BillPayment.received_at <= end_iso)
-    rows = session.exec(stmt).all()
-    total = 0.0
-    for p in rows:
-        if int(getattr(p, "id", 0) or 0) in receipt_adjustment_payment_ids:
-            continue
-        total += float(getattr(p, "cash_amount", 0) or 0)
-
-    receipt_stmt = select(PartyReceipt).where(PartyReceipt.is_deleted == False)  # noqa: E712
-    if start_iso:
-        receipt_stmt = receipt_stmt.where(PartyReceipt.received_at >= start_iso)
-    if end_iso:
-        receipt_stmt = receipt_stmt.where(PartyReceipt.received_at <= end_iso)
-    for receipt in session.exec(receipt_stmt).all():
-        total += float(getattr(receipt, "cash_amount", 0) or 0)
-    return round(total, 2)
-
-
-def _sum_purchase_cash_out(session, *, start_iso: Optional[str] = None, end_iso: Optional[str] = None) -> float:
-    stmt = (
-        select(PurchasePayment)
-        .where(PurchasePayment.is_deleted == False)  # noqa: E712
-        .where(PurchasePayment.is_writeoff == False)  # noqa: E712
-    )
-    if start_iso:
-        stmt = stmt.where(PurchasePayment.paid_at >= start_iso)
-    if end_iso:
-        stmt = stmt.where(PurchasePayment.paid_at <= end_iso)
-    rows = session.exec(stmt).all()
-    total = 0.0
-    for payment in rows:
-        if int(getattr(payment, "purchase_id", 0) or 0) > 0:
-            purchase = session.get(Purchase, payment.purchase_id)
-            if not purchase or purchase.is_deleted:
-                continue
-        total += float(getattr(payment, "cash_amount", 0) or 0)
-    return round(total, 2)
-
-
-def _sum_purchase_return_cash(session, *, start_iso: Optional[str] = None, end_iso: Optional[str] = None) -> float:
-    stmt = select(PurchaseReturn).where(PurchaseReturn.is_deleted == False)  # noqa: E712
-    if start_iso:
-        stmt = stmt.where(PurchaseReturn.return_date >= start_iso[:10])
-    if end_iso:
-        stmt = stmt.where(PurchaseReturn.return_date <= end_iso[:10])
-    return round(sum(float(row.refund_cash or 0) for row in session.exec(stmt).all()), 2)
-
-
-def _sum_return_cash(session, *, start_iso: Optional[str] = None, end_iso: Optional[str] = None) -> float:
-    stmt = select(Return)
-    if start_iso:
-        stmt = stmt.where(Return.date_time >= start_iso)
-    if end_iso:
-        stmt = stmt.where(Return.date_time <= end_iso)
-    rows = session.exec(stmt).all()
-    total = 0.0
-    for r in rows:
-        total += float(getattr(r, "refund_cash", 0) or 0)
-    return round(total, 2)
-
-
-def _sum_exchange_cash_in(session, *, start_iso: Optional[str] = None, end_iso: Optional[str] = None) -> float:
-    stmt = select(ExchangeRecord)
-    if start_iso:
-        stmt = stmt.where(ExchangeRecord.created_at >= start_iso)
-    if end_iso:
-        stmt = stmt.where(ExchangeRecord.created_at <= end_iso)
-    rows = session.exec(stmt).all()
-    total = 0.0
-    for r in rows:
-        total += float(getattr(r, "payment_cash", 0) or 0)
-    return round(total, 2)
-
-
-def _sum_bankbook_contra(session, *, start_iso: Optional[str] = None, end_iso: Optional[str] = None):
-    stmt = select(BankbookEntry).where(BankbookEntry.mode == "BANK_DEPOSIT")
-    if start_iso:
-        stmt = stmt.where(BankbookEntry.created_at >= start_iso)
-    if end_iso:
-        stmt = stmt.where(BankbookEntry.created_at <= end_iso)
-    rows = session.exec(stmt).all()
-    out = {"receipts": 0.0, "withdrawals": 0.0, "expenses": 0.0}
-    for row in rows:
-        entry_type = str(getattr(row, "entry_type", "") or "").upper()
-        amount = float(getattr(row, "amount", 0) or 0)
-        if entry_type == "RECEIPT":
-            out["withdrawals"] += amount
-        elif entry_type in ("WITHDRAWAL", "CONTRA"):
-            out["receipts"] += amount
-        else:
-            out["expenses"] += amount
-    return {key: round(value, 2) for key, value in out.items()}
 
 
-def _opening_anchor(session, *, day_end: str):
-    return session.exec(
-        select(CashbookEntry)
-        .where(CashbookEntry.entry_type == "OPENING")
-        .where(CashbookEntry.created_at <= day_end)
-        .order_by(CashbookEntry.created_at.desc(), CashbookEntry.id.desc())
-    ).first()
+def _snapshot(date: str, day: dict):
+    return {
+        "date": date,
+        "opening_balance": day["opening_balance"],
+        "closing_balance": day["closing_balance"],
+        "summary": _summary(day, day["entry_count"]),
+    }
 
 
 def _day_snapshot(session, date: str, *, include_entries: bool = False):
-    day_dt = _parse_ymd(date)
-    prev_date = (day_dt - timedelta(days=1)).date().isoformat()
-
-    day_start = f"{date}T00:00:00"
-    day_end = f"{date}T23:59:59.999999"
-    prev_end = f"{prev_date}T23:59:59.999999"
-
-    anchor = _opening_anchor(session, day_end=day_end)
-    anchor_amount = float(getattr(anchor, "amount", 0) or 0) if anchor else 0.0
-    anchor_ts = str(getattr(anchor, "created_at", "") or "") if anchor else None
-    anchor_effective_start = f"{anchor_ts[:10]}T00:00:00" if anchor_ts and len(anchor_ts) >= 10 else None
-
-    opening_stmt = select(CashbookEntry).where(CashbookEntry.created_at <= prev_end)
-    if anchor_effective_start:
-        opening_stmt = opening_stmt.where(CashbookEntry.created_at >= anchor_effective_start)
-    opening_rows = session.exec(opening_stmt).all()
-    opening_balance = (
-        anchor_amount
-        + _sum_rows(opening_rows)["net_change"]
-        + _sum_bill_cash(session, start_iso=anchor_effective_start, end_iso=prev_end)
-        + _sum_exchange_cash_in(session, start_iso=anchor_effective_start, end_iso=prev_end)
-        + _sum_purchase_return_cash(session, start_iso=anchor_effective_start, end_iso=prev_end)
-        - _sum_return_cash(session, start_iso=anchor_effective_start, end_iso=prev_end)
-        - _sum_purchase_cash_out(session, start_iso=anchor_effective_start, end_iso=prev_end)
-    )
-    bankbook_contra_opening = _sum_bankbook_contra(session, start_iso=anchor_effective_start, end_iso=prev_end)
-    opening_balance += (
-        float(bankbook_contra_opening["receipts"])
-        - float(bankbook_contra_opening["withdrawals"])
-        - float(bankbook_contra_opening["expenses"])
-    )
-
-    day_rows = session.exec(
-        select(CashbookEntry)
-        .where(CashbookEntry.created_at >= day_start)
-        .where(CashbookEntry.created_at <= day_end)
-        .order_by(CashbookEntry.id.desc())
-    ).all()
-    day_summary = _sum_rows(day_rows)
-    bill_cash_today = _sum_bill_cash(session, start_iso=day_start, end_iso=day_end)
-    exchange_cash_in_today = _sum_exchange_cash_in(session, start_iso=day_start, end_iso=day_end)
-    return_cash_today = _sum_return_cash(session, start_iso=day_start, end_iso=day_end)
-    purchase_cash_today = _sum_purchase_cash_out(session, start_iso=day_start, end_iso=day_end)
-    purchase_return_cash_today = _sum_purchase_return_cash(session, start_iso=day_start, end_iso=day_end)
-    bankbook_contra_today = _sum_bankbook_contra(session, start_iso=day_start, end_iso=day_end)
-    day_summary["receipts"] = round(
-        float(day_summary["receipts"]) + bill_cash_today + exchange_cash_in_today + purchase_return_cash_today + float(bankbook_contra_today["receipts"]),
-        2,
-    )
-    day_summary["withdrawals"] = round(
-        float(day_summary["withdrawals"]) + return_cash_today + purchase_cash_today + float(bankbook_contra_today["withdrawals"]),
-        2,
-    )
-    day_summary["expenses"] = round(float(day_summary["expenses"]) + float(bankbook_contra_today["expenses"]), 2)
-    day_summary["cash_out"] = round(float(day_summary["withdrawals"]) + float(day_summary["expenses"]), 2)
-    day_summary["net_change"] = round(float(day_summary["receipts"]) - float(day_summary["cash_out"]), 2)
-
-    closing_balance = round(opening_balance + day_summary["net_change"], 2)
-    out = {
-        "date": date,
-        "opening_balance": round(opening_balance, 2),
-        "closing_balance": closing_balance,
-        "summary": day_summary,
-    }
+    _parse_ymd(date)
+    out = _snapshot(date, book_days(session, "CASH", [date])[date])
     if include_entries:
-        out["entries"] = day_rows
+        out["entries"] = session.exec(
+            select(CashbookEntry)
+            .where(CashbookEntry.created_at >= f"{date}T00:00:00")
+            .where(CashbookEntry.created_at <= f"{date}T23:59:59.999999")
+            .order_by(CashbookEntry.id.desc())
+        ).all()
     return out
 
 
@@ -331,9 +140,7 @@ def create_entry(payload: CashbookCreate):
         )
         session.add(row)
         session.flush()
-        if et == "LOAN":
-            post_loan_voucher(session, row, party, book="CASH")
-        sync_suspense_book_voucher(session, row, book="CASHBOOK")
+        enqueue_posting(session, "CASHBOOK", int(row.id))
         session.commit()
         session.refresh(row)
         return row
@@ -438,25 +245,10 @@ def summary(
 ):
     start_iso, end_iso = _range_bounds(from_date, to_date)
 
-    with get_session() as session:
-        base = select(CashbookEntry)
-        if start_iso and end_iso:
-            base = base.where(CashbookEntry.created_at >= start_iso).where(CashbookEntry.created_at <= end_iso)
-
-        rows = session.exec(base).all()
-        out = _sum_rows(rows)
-        bill_cash = _sum_bill_cash(session, start_iso=start_iso, end_iso=end_iso)
-        exchange_cash_in = _sum_exchange_cash_in(session, start_iso=start_iso, end_iso=end_iso)
-        return_cash = _sum_return_cash(session, start_iso=start_iso, end_iso=end_iso)
-        purchase_cash = _sum_purchase_cash_out(session, start_iso=start_iso, end_iso=end_iso)
-        bankbook_contra = _sum_bankbook_contra(session, start_iso=start_iso, end_iso=end_iso)
-        out["receipts"] = round(float(out["receipts"]) + bill_cash + exchange_cash_in + float(bankbook_contra["receipts"]), 2)
-        out["withdrawals"] = round(float(out["withdrawals"]) + return_cash + purchase_cash + float(bankbook_contra["withdrawals"]), 2)
-        out["expenses"] = round(float(out["expenses"]) + float(bankbook_contra["expenses"]), 2)
-        out["cash_out"] = round(float(out["withdrawals"]) + float(out["expenses"]), 2)
-        out["net_change"] = round(float(out["receipts"]) - float(out["cash_out"]), 2)
-
-        return out
+    with get_read_session() as session:
+        totals = flow_totals(session, flow_components(SUMMARY_FLOWS), start_iso=start_iso, end_iso=end_iso)
+    figures = combine(totals, SUMMARY_FLOWS)
+    return _summary(figures, figures["entries"])
 
 
 @router.get("/daily-summary")
@@ -475,13 +267,14 @@ def daily_summary(
     for date in requested_dates:
         _parse_ymd(date)
 
-    with get_session() as session:
-        return [_day_snapshot(session, date, include_entries=False) for date in requested_dates]
+    with get_read_session() as session:
+        days = book_days(session, "CASH", requested_dates)
+        return [_snapshot(date, days[date]) for date in requested_dates]
 
 
 @router.get("/day")
 def day_cashbook(date: str = Query(..., description="YYYY-MM-DD")):
-    with get_session() as session:
+    with get_read_session() as session:
         return _day_snapshot(session, date, include_entries=True)
 
 
@@ -1,14 +1,16 @@
 from datetime import datetime
 from math import isfinite
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from fastapi import APIRouter, HTTPException, Query, Response
 from sqlalchemy import or_, func
 from pydantic import BaseModel
 from sqlmodel import select
 
-from backend.db import get_session
-from backend.inventory_lot_sync import item_stock_meta
+from backend.customer_parties import link_customer_party
+from backend.db import get_read_session, get_session
+from backend.inventory_lot_sync import IN_CHUNK_SIZE, chunked, item_stock_meta
+from backend.ledger_registry import invalidate_ledger_registry
 from backend.controls import log_audit
 from backend.models import (
     Bill,
@@ -24,6 +26,7 @@ from backend.models import (
     Party,
     PartyReceipt,
     ReceiptBillAdjustment,
+    search_key,
 )
 
 router = APIRouter()
@@ -44,31 +47,25 @@ def _normalize_name(v: Optional[str]) -> str:
     return " ".join(str(v or "").strip().split())
 
 
-def _customer_note_conditions(customer: Customer):
+def _customer_note_base(customer: Customer) -> Tuple[str, Tuple[str, ...]]:
+    """Lower-cased note line that opens a customer's unlinked bills, and what may follow it."""
     name = _normalize_name(customer.name).lower()
     phone = str(customer.phone or "").strip()
     address = _normalize_name(getattr(customer, "address_line", None)).lower()
-    note = func.lower(func.ltrim(func.coalesce(Bill.notes, "")))
-
     if phone:
-        base = f"customer: {name} | {phone}"
-        return or_(
-            note == base,
-            note.like(f"{base} |%"),
-            note.like(f"{base}\n%"),
-        )
+        return f"customer: {name} | {phone}", (" |", "\n")
     if address:
-        base = f"customer: {name} | {address}"
-        return or_(
-            note == base,
-            note.like(f"{base}\n%"),
-        )
-    else:
-        base = f"customer: {name}"
-        return or_(
-            note == base,
-            note.like(f"{base}\n%"),
-        )
+        return f"customer: {name} | {address}", ("\n",)
+    return f"customer: {name}", ("\n",)
+
+
+def _customer_note_conditions(customer: Customer):
+    base, suffixes = _customer_note_base(customer)
+    note = func.lower(func.ltrim(func.coalesce(Bill.notes, "")))
+    # The indexed debtor_key narrows to bills naming this customer before the LIKEs check phone/address.
+    return (Bill.debtor_key == search_key(customer.name)) & or_(
+        note == base, *[note.like(f"{base}{suffix}%") for suffix in suffixes]
+    )
 
 
 def _customer_unlinked_note_candidate_condition(
@@ -227,78 +224,173 @@ def _balance_type(amount: float) -> str:
     return "CR" if _round2(amount) < 0 else "DR"
 
 
-def _active_receipt_adjusted_amount(session, receipt: PartyReceipt) -> float:
-    if not receipt or not receipt.id:
-        return 0.0
-    rows = session.exec(
-        select(ReceiptBillAdjustment).where(ReceiptBillAdjustment.receipt_id == int(receipt.id))
-    ).all()
-    total = 0.0
-    for row in rows:
-        if row.bill_payment_id is not None:
-            payment = session.get(BillPayment, int(row.bill_payment_id))
-            if payment and bool(getattr(payment, "is_deleted", False)):
-                continue
-        total += float(row.adjusted_amount or 0.0)
-    return _round2(total)
+def _customer_party_ids(session, customers: List[Customer]) -> Dict[int, int]:
+    """Batched ``_customer_party_id``: debtor party id per customer id."""
+    out: Dict[int, int] = {}
+    for chunk in chunked([int(c.id) for c in customers if c and c.id]):
+        for party_id, customer_id in session.exec(
+            select(Party.id, Party.legacy_customer_id)
+            .where(Party.party_group == "SUNDRY_DEBTOR", Party.legacy_customer_id.in_(chunk))
+            .order_by(Party.id.asc())
+        ).all():
+            out.setdefault(int(customer_id), int(party_id))
 
+    by_name: Dict[str, List[int]] = {}
+    for customer in customers:
+        name = _normalize_name(customer.name).lower() if customer and customer.id else ""
+        if name and int(customer.id) not in out:
+            by_name.setdefault(name, []).append(int(customer.id))
+    party_name = func.lower(func.trim(func.coalesce(Party.name, "")))
+    for chunk in chunked(sorted(by_name)):
+        for party_id, name in session.exec(
+            select(Party.id, party_name)
+            .where(Party.party_group == "SUNDRY_DEBTOR", party_name.in_(chunk))
+            .order_by(Party.id.asc())
+        ).all():
+            for customer_id in by_name.get(name, []):
+                out.setdefault(customer_id, int(party_id))
+    return out
 
-def _customer_account_balance_out(session, customer: Customer) -> CustomerOut:
-    party_id = _customer_party_id(session, customer)
-    party = session.get(Party, int(party_id)) if party_id is not None else None
-    bills = session.exec(
-        select(Bill)
-        .where(_customer_bill_conditions(session, customer))
-        .where(Bill.is_deleted == False)  # noqa: E712
-    ).all()
-    outstanding = _round2(
-        sum(
-            max(
-                0.0,
-                float(bill.total_amount or 0.0)
-                - float(bill.paid_amount or 0.0)
-                - float(getattr(bill, "writeoff_amount", 0.0) or 0.0),
-            )
-            for bill in bills
-        )
+
+_BILL_OUTSTANDING = func.max(
+    0.0,
+    func.coalesce(Bill.total_amount, 0.0) - func.coalesce(Bill.paid_amount, 0.0) - func.coalesce(Bill.writeoff_amount, 0.0),
+)
+
+# Customers per note-matching query; each adds up to three bound parameters.
+_NOTE_CHUNK_SIZE = 200
+
+
+def _linked_outstanding(session, customer_ids: List[int], party_ids: Dict[int, int]) -> Dict[int, float]:
+    # Grouped by (customer_id, party_id): a group belongs to its customer and to
+    # every customer whose debtor party it is, counted once per customer.
+    customers_by_party: Dict[int, List[int]] = {}
+    for customer_id, party_id in party_ids.items():
+        customers_by_party.setdefault(party_id, []).append(customer_id)
+    groups: Dict[Tuple[Optional[int], Optional[int]], float] = {}
+    for chunk in chunked(customer_ids, size=IN_CHUNK_SIZE // 2):
+        chunk_party_ids = sorted({party_ids[cid] for cid in chunk if cid in party_ids})
+        rows = session.exec(
+            select(Bill.customer_id, Bill.party_id, func.sum(_BILL_OUTSTANDING))
+            .where(Bill.is_deleted == False)  # noqa: E712
+            .where(or_(Bill.customer_id.in_(chunk), Bill.party_id.in_(chunk_party_ids)))
+            .group_by(Bill.customer_id, Bill.party_id)
+        ).all()
+        for customer_id, party_id, amount in rows:
+            groups[(customer_id, party_id)] = float(amount or 0.0)
+
+    wanted = set(customer_ids)
+    out: Dict[int, float] = {}
+    for (customer_id, party_id), amount in groups.items():
+        owners = {int(customer_id)} & wanted if customer_id is not None else set()
+        owners.update(customers_by_party.get(int(party_id), []) if party_id is not None else [])
+        for owner in owners:
+            out[owner] = out.get(owner, 0.0) + amount
+    return out
+
+
+def _note_outstanding(session, customers: List[Customer]) -> Dict[int, float]:
+    # Unlinked bills that name the customer in their note line, grouped by note.
+    note = func.lower(func.ltrim(func.coalesce(Bill.notes, "")))
+    by_note: Dict[str, float] = {}
+    for start in range(0, len(customers), _NOTE_CHUNK_SIZE):
+        chunk = customers[start:start + _NOTE_CHUNK_SIZE]
+        rows = session.exec(
+            select(note, func.sum(_BILL_OUTSTANDING))
+            .where(_unlinked_bill_filter())
+            .where(or_(*[_customer_note_conditions(customer) for customer in chunk]))
+            .group_by(note)
+        ).all()
+        by_note.update({str(text): float(amount or 0.0) for text, amount in rows})
+
+    by_base: Dict[str, List[Tuple[int, Tuple[str, ...]]]] = {}
+    for customer in customers:
+        base, suffixes = _customer_note_base(customer)
+        by_base.setdefault(base, []).append((int(customer.id), suffixes))
+    out: Dict[int, float] = {}
+    for text, amount in by_note.items():
+        first_line = text.split("\n", 1)[0]
+        # A base is the whole first line or the part before one of its " |" separators.
+        bases = {first_line} | {first_line[:i] for i in range(len(first_line)) if first_line.startswith(" |", i)}
+        for base in bases:
+            for customer_id, suffixes in by_base.get(base, []):
+                if text == base or any(text.startswith(base + suffix) for suffix in suffixes):
+                    out[customer_id] = out.get(customer_id, 0.0) + amount
+    return out
+
+
+def _party_advances(session, party_ids: List[int]) -> Dict[int, float]:
+    # Unapplied receipt amount per party; adjustments against deleted bill payments no longer count.
+    adjusted = (
+        select(func.coalesce(func.sum(ReceiptBillAdjustment.adjusted_amount), 0.0))
+        .select_from(ReceiptBillAdjustment)
+        .outerjoin(BillPayment, BillPayment.id == ReceiptBillAdjustment.bill_payment_id)
+        .where(ReceiptBillAdjustment.receipt_id == PartyReceipt.id)
+        .where(func.coalesce(BillPayment.is_deleted, False) == False)  # noqa: E712
+        .correlate(PartyReceipt)
+        .scalar_subquery()
     )
-    advance = 0.0
-    if party_id is not None:
-        receipts = session.exec(
-            select(PartyReceipt)
-            .where(PartyReceipt.party_id == int(party_id))
+    unapplied = func.max(0.0, func.coalesce(PartyReceipt.total_amount, 0.0) - func.round(adjusted, 2))
+    out: Dict[int, float] = {}
+    for chunk in chunked(party_ids):
+        for party_id, amount in session.exec(
+            select(PartyReceipt.party_id, func.sum(unapplied))
+            .where(PartyReceipt.party_id.in_(chunk))
             .where(PartyReceipt.is_deleted == False)  # noqa: E712
-        ).all()
-        advance = _round2(
-            sum(
-                max(
-                    0.0,
-                    float(receipt.total_amount or 0.0) - _active_receipt_adjusted_amount(session, receipt),
-                )
-                for receipt in receipts
+            .group_by(PartyReceipt.party_id)
+        ).all():
+            out[int(party_id)] = float(amount or 0.0)
+    return out
+
+
+def _customer_balance_outs(session, customers: List[Customer]) -> List[CustomerOut]:
+    """CustomerOut with opening, outstanding, advance and closing balances for many customers.
+
+    A handful of grouped queries per page instead of several per customer.
+    """
+    customers = [customer for customer in customers if customer and customer.id]
+    party_ids = _customer_party_ids(session, customers)
+    parties: Dict[int, Party] = {}
+    for chunk in chunked(sorted(set(party_ids.values()))):
+        parties.update({int(p.id): p for p in session.exec(select(Party).where(Party.id.in_(chunk))).all()})
+    linked = _linked_outstanding(session, [int(c.id) for c in customers], party_ids)
+    noted = _note_outstanding(session, customers)
+    advances = _party_advances(session, sorted(set(party_ids.values())))
+
+    out: List[CustomerOut] = []
+    for customer in customers:
+        customer_id = int(customer.id)
+        party_id = party_ids.get(customer_id)
+        outstanding = _round2(linked.get(customer_id, 0.0) + noted.get(customer_id, 0.0))
+        advance = _round2(advances.get(party_id, 0.0)) if party_id is not None else 0.0
+        opening = _signed_opening_balance(parties.get(party_id) if party_id is not None else None)
+        closing = _round2(opening + outstanding - advance)
+        out.append(
+            CustomerOut(
+                id=customer_id,
+                name=customer.name,
+                phone=customer.phone,
+                address_line=customer.address_line,
+                created_at=customer.created_at,
+                updated_at=customer.updated_at,
+                is_active=bool(getattr(customer, "is_active", True)),
+                merged_into_customer_id=getattr(customer, "merged_into_customer_id", None),
+                merged_at=getattr(customer, "merged_at", None),
+                deleted_at=getattr(customer, "deleted_at", None),
+                party_id=party_id,
+                opening_balance=abs(_round2(opening)),
+                opening_balance_type=_balance_type(opening),
+                outstanding_amount=outstanding,
+                advance_amount=advance,
+                closing_balance=abs(closing),
+                closing_balance_type=_balance_type(closing),
             )
         )
-    opening = _signed_opening_balance(party)
-    closing = _round2(opening + outstanding - advance)
-    return CustomerOut(
-        id=int(customer.id or 0),
-        name=customer.name,
-        phone=customer.phone,
-        address_line=customer.address_line,
-        created_at=customer.created_at,
-        updated_at=customer.updated_at,
-        is_active=bool(getattr(customer, "is_active", True)),
-        merged_into_customer_id=getattr(customer, "merged_into_customer_id", None),
-        merged_at=getattr(customer, "merged_at", None),
-        deleted_at=getattr(customer, "deleted_at", None),
-        party_id=int(party_id) if party_id is not None else None,
-        opening_balance=abs(_round2(opening)),
-        opening_balance_type=_balance_type(opening),
-        outstanding_amount=outstanding,
-        advance_amount=advance,
-        closing_balance=abs(closing),
-        closing_balance_type=_balance_type(closing),
-    )
+    return out
+
+
+def _customer_account_balance_out(session, customer: Customer) -> CustomerOut:
+    return _customer_balance_outs(session, [customer])[0]
 
 
 class CustomerSummaryTotalsOut(BaseModel):
@@ -371,69 +463,6 @@ def _has_bills_for_customer(session, customer: Customer) -> bool:
     return session.exec(stmt.limit(1)).first() is not None
 
 
-def _ensure_customer_party(session, customer: Customer) -> Party:
-    party = session.exec(
-        select(Party)
-        .where(
-            Party.party_group == "SUNDRY_DEBTOR",
-            Party.legacy_customer_id == int(customer.id or 0),
-        )
-        .order_by(Party.id.asc())
-    ).first()
-    now = datetime.now().isoformat(timespec="seconds")
-    if party:
-        changed = False
-        if not party.is_active:
-            party.is_active = True
-            changed = True
-        if party.name != customer.name:
-            party.name = customer.name
-            changed = True
-        if party.phone != customer.phone:
-            party.phone = customer.phone
-            changed = True
-        if party.address_line != customer.address_line:
-            party.address_line = customer.address_line
-            changed = True
-        if changed:
-            party.updated_at = now
-            session.add(party)
-            session.flush()
-        return party
-
-    party = session.exec(
-        select(Party)
-        .where(
-            Party.party_group == "SUNDRY_DEBTOR",
-            func.lower(func.trim(func.coalesce(Party.name, ""))) == _normalize_name(customer.name).lower(),
-        )
-        .order_by(Party.id.asc())
-    ).first()
-    if party:
-        party.legacy_customer_id = int(customer.id or 0)
-        party.is_active = True
-        party.updated_at = now
-        session.add(party)
-        session.flush()
-        return party
-
-    party = Party(
-        name=_normalize_name(customer.name) or f"Customer #{customer.id}",
-        party_group="SUNDRY_DEBTOR",
-        phone=customer.phone,
-        address_line=customer.address_line,
-        opening_balance=0.0,
-        opening_balance_type="DR",
-        legacy_customer_id=int(customer.id or 0),
-        is_active=True,
-        created_at=now,
-        updated_at=now,
-    )
-    session.add(party)
-    session.flush()
-    return party
-
-
 @router.post("/", response_model=CustomerOut, status_code=201)
 def create_customer(payload: CustomerCreate) -> CustomerOut:
     name = _normalize_name(payload.name)
@@ -461,7 +490,7 @@ def create_customer(payload: CustomerCreate) -> CustomerOut:
         )
         session.add(row)
         session.flush()
-        party = _ensure_customer_party(session, row)
+        party = link_customer_party(session, row)
         opening_balance = _round2(float(payload.opening_balance or 0.0))
         if not isfinite(opening_balance):
             raise HTTPException(status_code=400, detail="Opening balance must be a valid amount")
@@ -480,7 +509,7 @@ def list_customers(
     offset: int = Query(0, ge=0),
     archived_only: bool = Query(False),
 ) -> List[CustomerOut]:
-    with get_session() as session:
+    with get_read_session() as session:
         stmt = select(Customer)
         if archived_only:
             stmt = stmt.where(Customer.is_active == False)  # noqa: E712
@@ -505,7 +534,7 @@ def list_customers(
             .limit(limit)
         )
         rows = session.exec(stmt).all()
-        return [_customer_account_balance_out(session, row) for row in rows]
+        return _customer_balance_outs(session, rows)
 
 
 @router.patch("/{customer_id}", response_model=CustomerOut)
@@ -531,11 +560,12 @@ def update_customer(customer_id: int, payload: CustomerUpdate) -> CustomerOut:
             addr = data.get("address_line")
             row.address_line = str(addr).strip() if addr is not None and str(addr).strip() != "" else None
 
+        # Name/phone/address edits flow to the debtor party here rather than on every party read.
+        party = link_customer_party(session, row)
         if "opening_balance" in data:
             opening_balance = _round2(float(data.get("opening_balance") or 0.0))
             if not isfinite(opening_balance):
                 raise HTTPException(status_code=400, detail="Opening balance must be a valid amount")
-            party = _ensure_customer_party(session, row)
             party.opening_balance = abs(opening_balance)
             party.opening_balance_type = _balance_type(opening_balance)
             party.updated_at = datetime.now().isoformat(timespec="seconds")
@@ -611,7 +641,7 @@ def get_customer_summary(
     customer_id: int,
     include_unlinked_notes: bool = Query(True),
 ) -> CustomerSummaryOut:
-    with get_session() as session:
+    with get_read_session() as session:
         customer = session.get(Customer, customer_id)
         if not customer:
             raise HTTPException(status_code=404, detail="Customer not found")
@@ -714,7 +744,7 @@ def merge_customers(payload: MergeCustomersIn) -> MergeCustomersOut:
             raise HTTPException(status_code=400, detail="Remove customer is already archived")
 
         now = datetime.now().isoformat(timespec="seconds")
-        keep_party = _ensure_customer_party(session, keep)
+        keep_party = link_customer_party(session, keep)
         remove_party = session.exec(
             select(Party)
             .where(
@@ -847,6 +877,8 @@ def merge_customers(payload: MergeCustomersIn) -> MergeCustomersOut:
         session.add(remove)
 
         session.commit()
+        if moved_ledgers:
+            invalidate_ledger_registry(session, party_ids=[int(keep_party.id or 0), int(remove_party.id)])
         return MergeCustomersOut(
             keep_customer_id=keep_id,
             removed_customer_id=remove_id,
@@ -7,15 +7,15 @@ import re
 from fastapi import APIRouter, HTTPException, Query, Request, Response
 from sqlmodel import select
 from datetime import date, datetime
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from pydantic import BaseModel
 from backend.utils.archive_rules import apply_archive_rules
-from sqlalchemy import and_, case, func, literal, or_, exists
+from sqlalchemy import and_, case, func, literal, or_, exists, union_all
 from sqlalchemy.orm import aliased
 
 from backend.accounting import sync_bill_vouchers
 from backend.controls import log_audit
-from backend.db import create_data_repair_backup, get_session
+from backend.db import create_data_repair_backup, get_read_session, get_session
 from backend.models import (
     Bill,
     BillItem,
@@ -34,8 +34,17 @@ from backend.models import (
     StockAudit,
     StockAuditItem,
     StockMovement,
+    search_key,
+)
+from backend.inventory_group_stock import dashboard_totals
+from backend.inventory_lot_sync import IN_CHUNK_SIZE, chunked, ensure_lot_for_inventory_item, sync_lot_quantity_for_item
+from backend.search_index import match_rowids
+from backend.stock_checkpoints import (
+    cumulative_deltas,
+    future_deltas,
+    purchase_stock_movement_join_condition,
+    stock_movement_effective_ts_expr,
 )
-from backend.inventory_lot_sync import ensure_lot_for_inventory_item, sync_lot_quantity_for_item
 from backend.security import require_min_role
 
 logger = logging.getLogger("api.items")
@@ -306,6 +315,12 @@ class StockReconciliationReportOut(BaseModel):
     items: List[StockReconciliationRowOut]
 
 
+class StockReconciliationScanOut(BaseModel):
+    items: List[StockReconciliationRowOut]
+    scanned_items: int
+    next_after_id: Optional[int] = None
+
+
 class StockReconciliationApplyIn(BaseModel):
     item_ids: Optional[List[int]] = None
     q: Optional[str] = None
@@ -432,12 +447,7 @@ def _brand_key(value: Optional[str]) -> str:
 def _same_group_stmt(name: Optional[str], brand: Optional[str]):
     n = _norm_str(name) or ""
     b = _norm_str(brand)
-    stmt = select(Item).where(func.lower(Item.name) == func.lower(n))
-    if b is None:
-        stmt = stmt.where(or_(Item.brand.is_(None), func.trim(Item.brand) == ""))
-    else:
-        stmt = stmt.where(func.lower(func.coalesce(Item.brand, "")) == func.lower(b))
-    return stmt
+    return select(Item).where(Item.name_key == search_key(n), Item.brand_key == search_key(b))
 
 
 def _group_key(name: Optional[str], brand: Optional[str]) -> str:
@@ -449,10 +459,8 @@ def _apply_default_visibility(stmt):
     visible_row = or_(Item.is_archived == False, Item.is_archived.is_(None))  # noqa: E712
     same_group_visible_exists = exists(
         select(peer.id).where(
-            func.lower(func.trim(func.coalesce(peer.name, "")))
-            == func.lower(func.trim(func.coalesce(Item.name, ""))),
-            func.lower(func.trim(func.coalesce(peer.brand, "")))
-            == func.lower(func.trim(func.coalesce(Item.brand, ""))),
+            peer.name_key == Item.name_key,
+            peer.brand_key == Item.brand_key,
             or_(peer.is_archived == False, peer.is_archived.is_(None)),  # noqa: E712
         )
     )
@@ -541,12 +549,7 @@ def _load_group_batches(session, *, name: Optional[str], brand: Optional[str]) -
         raise HTTPException(status_code=400, detail="name is required")
 
     b = _norm_str(brand)
-    stmt = select(Item)
-    if b is None:
-        stmt = stmt.where(or_(Item.brand.is_(None), func.trim(Item.brand) == ""))
-    else:
-        stmt = stmt.where(func.lower(func.coalesce(Item.brand, "")) == b.lower())
-    candidates = session.exec(stmt).all()
+    candidates = session.exec(select(Item).where(Item.brand_key == search_key(b))).all()
     wanted_key = _item_name_key(n)
     batches = [row for row in candidates if _item_name_key(row.name) == wanted_key]
     batches.sort(
@@ -592,31 +595,34 @@ def _load_reconciliation_items(
     include_archived: bool,
     item_ids: Optional[List[int]] = None,
 ) -> List[Item]:
-    stmt = select(Item)
     if item_ids:
-        stmt = stmt.where(Item.id.in_([int(x) for x in item_ids]))
-    else:
-        if not include_archived:
-            stmt = stmt.where(or_(Item.is_archived == False, Item.is_archived.is_(None)))  # noqa: E712
-        qq = _norm_str(q)
-        if qq:
-            like = f"%{qq.lower()}%"
-            if qq.isdigit():
-                stmt = stmt.where(
-                    or_(
-                        func.lower(func.coalesce(Item.name, "")).like(like),
-                        func.lower(func.coalesce(Item.brand, "")).like(like),
-                        Item.id == int(qq),
-                    )
+        items: List[Item] = []
+        for chunk in chunked(sorted({int(x) for x in item_ids})):
+            items.extend(session.exec(select(Item).where(Item.id.in_(chunk)).order_by(Item.id.asc())).all())
+        return items
+
+    stmt = select(Item)
+    if not include_archived:
+        stmt = stmt.where(or_(Item.is_archived == False, Item.is_archived.is_(None)))  # noqa: E712
+    qq = _norm_str(q)
+    if qq:
+        like = f"%{qq.lower()}%"
+        if qq.isdigit():
+            stmt = stmt.where(
+                or_(
+                    func.lower(func.coalesce(Item.name, "")).like(like),
+                    func.lower(func.coalesce(Item.brand, "")).like(like),
+                    Item.id == int(qq),
                 )
-            else:
-                stmt = stmt.where(
-                    or_(
-                        func.lower(func.coalesce(Item.name, "")).like(like),
-                        func.lower(func.coalesce(Item.brand, "")).like(like),
-                    )
+            )
+        else:
+            stmt = stmt.where(
+                or_(
+                    func.lower(func.coalesce(Item.name, "")).like(like),
+                    func.lower(func.coalesce(Item.brand, "")).like(like),
                 )
-        stmt = stmt.order_by(func.lower(Item.name).asc(), func.lower(func.coalesce(Item.brand, "")).asc(), Item.id.asc())
+            )
+    stmt = stmt.order_by(Item.name_key.asc(), Item.brand_key.asc(), Item.id.asc())
     return session.exec(stmt).all()
 
 
@@ -643,18 +649,8 @@ def _add_expected(
         }
 
 
-def _build_stock_reconciliation(
-    session,
-    *,
-    q: Optional[str],
-    include_archived: bool,
-    include_balanced: bool,
-    item_ids: Optional[List[int]] = None,
-) -> List[StockReconciliationRowOut]:
-    items = _load_reconciliation_items(session, q=q, include_archived=include_archived, item_ids=item_ids)
-    if not items:
-        return []
-
+def _reconcile_item_chunk(session, items: List[Item], *, include_balanced: bool) -> List[StockReconciliationRowOut]:
+    # One pass of source/ledger aggregates for at most IN_CHUNK_SIZE items.
     target_item_ids = [int(item.id) for item in items if item.id is not None]
     expected: Dict[ReconciliationKey, int] = defaultdict(int)
     meta: Dict[ReconciliationKey, Dict[str, Optional[str]]] = {}
@@ -671,18 +667,12 @@ def _build_stock_reconciliation(
         .where(StockMovement.item_id.in_(target_item_ids))
         .group_by(StockMovement.item_id, StockMovement.reason, StockMovement.ref_type, StockMovement.ref_id)
     ).all()
+    actual_total_by_item: Dict[int, int] = defaultdict(int)
     for row in actual_rows:
         key = _movement_key(int(row[0]), str(row[1] or ""), row[2], row[3])
-        actual_by_key[key] = int(row[4] or 0)
-
-    actual_total_by_item: Dict[int, int] = defaultdict(int)
-    total_rows = session.exec(
-        select(StockMovement.item_id, func.coalesce(func.sum(StockMovement.delta), 0))
-        .where(StockMovement.item_id.in_(target_item_ids))
-        .group_by(StockMovement.item_id)
-    ).all()
-    for row in total_rows:
-        actual_total_by_item[int(row[0])] = int(row[1] or 0)
+        # Keys normalise case, so raw groups can collapse onto one key.
+        actual_by_key[key] += int(row[4] or 0)
+        actual_total_by_item[int(row[0])] += int(row[4] or 0)
 
     sale_rows = session.exec(
         select(
@@ -919,6 +909,10 @@ def _build_stock_reconciliation(
             note=f"Audit discrepancy for audit #{audit_id}",
         )
 
+    keys_by_item: Dict[int, List[ReconciliationKey]] = defaultdict(list)
+    for key in expected:
+        keys_by_item[key[0]].append(key)
+
     rows_out: List[StockReconciliationRowOut] = []
     for item in items:
         item_id = int(item.id)
@@ -926,7 +920,7 @@ def _build_stock_reconciliation(
         entries: List[StockReconciliationEntryOut] = []
         deterministic_gap = 0
 
-        item_keys = [key for key in expected.keys() if key[0] == item_id]
+        item_keys = keys_by_item.get(item_id, [])
         item_keys.sort(key=lambda key: ((meta.get(key) or {}).get("source_ts") or "", key[1], key[3] or 0))
 
         for key in item_keys:
@@ -987,7 +981,24 @@ def _build_stock_reconciliation(
                 missing_entries=entries,
             )
         )
+    return rows_out
+
+
+def _iter_stock_reconciliation(session, items: List[Item], *, include_balanced: bool) -> Iterator[StockReconciliationRowOut]:
+    for start in range(0, len(items), IN_CHUNK_SIZE):
+        yield from _reconcile_item_chunk(session, items[start:start + IN_CHUNK_SIZE], include_balanced=include_balanced)
+
 
+def _build_stock_reconciliation(
+    session,
+    *,
+    q: Optional[str],
+    include_archived: bool,
+    include_balanced: bool,
+    item_ids: Optional[List[int]] = None,
+) -> List[StockReconciliationRowOut]:
+    items = _load_reconciliation_items(session, q=q, include_archived=include_archived, item_ids=item_ids)
+    rows_out = list(_iter_stock_reconciliation(session, items, include_balanced=include_balanced))
     rows_out.sort(
         key=lambda row: (
             row.status == "BALANCED",
@@ -999,38 +1010,8 @@ def _build_stock_reconciliation(
     return rows_out
 
 
-def _purchase_stock_movement_join_condition():
-    return and_(
-        func.upper(func.coalesce(StockMovement.ref_type, "")) == "PURCHASE",
-        StockMovement.ref_id == Purchase.id,
-    )
-
-
-def _stock_movement_effective_ts_expr():
-    return case(
-        (
-            and_(
-                func.upper(func.coalesce(StockMovement.ref_type, "")) == "PURCHASE",
-                Purchase.invoice_date.isnot(None),
-            ),
-            Purchase.invoice_date + literal("T00:00:00"),
-        ),
-        else_=StockMovement.ts,
-    )
-
-
 def _future_delta_after_effective_ts(session, item_ids: List[int], to_ts: Optional[str]) -> int:
-    if not to_ts:
-        return 0
-    movement_ts = _stock_movement_effective_ts_expr()
-    stmt = (
-        select(func.coalesce(func.sum(StockMovement.delta), 0))
-        .select_from(StockMovement)
-        .outerjoin(Purchase, _purchase_stock_movement_join_condition())
-        .where(StockMovement.item_id.in_(item_ids))
-        .where(movement_ts > to_ts)
-    )
-    return int(session.exec(stmt).one() or 0)
+    return sum(future_deltas(session, item_ids, to_ts).values())
 
 
 def _build_group_summary(
@@ -1054,7 +1035,7 @@ def _build_group_summary(
     from_ts = f"{from_date}T00:00:00" if from_date else None
     to_ts = f"{to_date}T23:59:59" if to_date else None
 
-    movement_ts = _stock_movement_effective_ts_expr()
+    movement_ts = stock_movement_effective_ts_expr()
     period_net_expr = StockMovement.delta
     period_in_expr = case((StockMovement.delta > 0, StockMovement.delta), else_=0)
     period_out_expr = case((StockMovement.delta < 0, -StockMovement.delta), else_=0)
@@ -1066,7 +1047,7 @@ def _build_group_summary(
             func.count(StockMovement.id),
         )
         .select_from(StockMovement)
-        .outerjoin(Purchase, _purchase_stock_movement_join_condition())
+        .outerjoin(Purchase, purchase_stock_movement_join_condition())
         .where(StockMovement.item_id.in_(item_ids))
     )
     if from_ts:
@@ -1079,31 +1060,19 @@ def _build_group_summary(
     outward_qty = int(period_row[2] or 0)
     movement_count = int(period_row[3] or 0)
 
+    ledger_total = sum(cumulative_deltas(session, item_ids).values())
     future_delta = 0
     if to_ts:
-        future_stmt = (
-            select(func.coalesce(func.sum(StockMovement.delta), 0))
-            .select_from(StockMovement)
-            .outerjoin(Purchase, _purchase_stock_movement_join_condition())
-            .where(StockMovement.item_id.in_(item_ids))
-            .where(movement_ts > to_ts)
-        )
-        future_delta = int(session.exec(future_stmt).one() or 0)
+        future_delta = ledger_total - sum(cumulative_deltas(session, item_ids, to_ts).values())
 
     closing_stock = int(current_stock) - future_delta
     opening_stock = closing_stock - net_qty
 
-    ledger_total_stmt = (
-        select(func.coalesce(func.sum(StockMovement.delta), 0))
-        .where(StockMovement.item_id.in_(item_ids))
-    )
-    ledger_total = int(session.exec(ledger_total_stmt).one() or 0)
-
     def _max_ts_for_reasons(reasons: List[str]) -> Optional[str]:
         stmt = (
             select(func.max(movement_ts))
             .select_from(StockMovement)
-            .outerjoin(Purchase, _purchase_stock_movement_join_condition())
+            .outerjoin(Purchase, purchase_stock_movement_join_condition())
             .where(StockMovement.item_id.in_(item_ids))
             .where(func.upper(StockMovement.reason).in_([reason.upper() for reason in reasons]))
         )
@@ -1112,7 +1081,7 @@ def _build_group_summary(
     last_movement_ts = session.exec(
         select(func.max(movement_ts))
         .select_from(StockMovement)
-        .outerjoin(Purchase, _purchase_stock_movement_join_condition())
+        .outerjoin(Purchase, purchase_stock_movement_join_condition())
         .where(StockMovement.item_id.in_(item_ids))
     ).one()
 
@@ -1145,62 +1114,89 @@ def dashboard_stats(
     low_stock_threshold: int = Query(2, ge=0),
     expiry_window_days: int = Query(60, ge=0),
 ) -> InventoryDashboardStatsOut:
-    with get_session() as session:
-        rows = session.exec(_apply_default_visibility(select(Item))).all()
-
-        groups: Dict[str, Dict[str, Any]] = {}
-        total_qty = 0
-        today = date.today()
-        expiring_soon_count = 0
-        expired_count = 0
-
-        for item in rows:
-            name = str(getattr(item, "name", "") or "").strip()
-            brand = str(getattr(item, "brand", "") or "").strip()
-            if not name:
-                continue
-
-            stock = int(getattr(item, "stock", 0) or 0)
-            total_qty += stock
-            key = f"{name.lower()}|{brand.lower()}"
-            if key not in groups:
-                groups[key] = {"stock": 0}
-            groups[key]["stock"] = int(groups[key]["stock"] or 0) + stock
-
-            expiry_raw = str(getattr(item, "expiry_date", "") or "").strip()[:10]
-            if expiry_raw:
-                try:
-                    expiry = date.fromisoformat(expiry_raw)
-                except ValueError:
-                    expiry = None
-                if expiry:
-                    days_left = (expiry - today).days
-                    if days_left < 0:
-                        expired_count += 1
-                    elif days_left <= expiry_window_days:
-                        expiring_soon_count += 1
-
-        zero_stock_types = 0
-        available_types = 0
-        low_stock_count = 0
-        for group in groups.values():
-            stock = int(group["stock"] or 0)
-            if stock > 0:
-                available_types += 1
-            else:
-                zero_stock_types += 1
-            if stock <= low_stock_threshold:
-                low_stock_count += 1
-
-        return InventoryDashboardStatsOut(
-            inventory_total_qty=total_qty,
-            inventory_total_types_all=len(groups),
-            inventory_available_types=available_types,
-            zero_stock_types_count=zero_stock_types,
-            low_stock_count=low_stock_count,
-            expiring_soon_count=expiring_soon_count,
-            expired_count=expired_count,
+    with get_read_session() as session:
+        totals = dashboard_totals(
+            session,
+            low_stock_threshold=low_stock_threshold,
+            expiry_window_days=expiry_window_days,
+        )
+        return InventoryDashboardStatsOut(**totals)
+
+
+def _like_item_search_terms(like: str, numeric_search_id: Optional[int]) -> list:
+    movement_search_terms = [
+        StockMovement.reason.ilike(like),
+        func.coalesce(StockMovement.ref_type, "").ilike(like),
+        func.coalesce(StockMovement.note, "").ilike(like),
+    ]
+    if numeric_search_id is not None:
+        movement_search_terms.append(StockMovement.ref_id == numeric_search_id)
+
+    matching_movement_exists = exists(
+        select(StockMovement.id).where(
+            StockMovement.item_id == Item.id,
+            or_(*movement_search_terms),
+        )
+    )
+    matching_product_exists = exists(
+        select(Product.id).where(
+            Product.id == Item.product_id,
+            or_(
+                Product.name.ilike(like),
+                Product.alias.ilike(like),
+                Product.brand.ilike(like),
+            ),
         )
+    )
+    matching_lot_product_exists = exists(
+        select(InventoryLot.id)
+        .join(Product, Product.id == InventoryLot.product_id)
+        .where(
+            InventoryLot.legacy_item_id == Item.id,
+            or_(
+                Product.name.ilike(like),
+                Product.alias.ilike(like),
+                Product.brand.ilike(like),
+            ),
+        )
+    )
+    item_search_terms = [
+        Item.name.ilike(like),
+        Item.brand.ilike(like),
+        matching_movement_exists,
+        matching_product_exists,
+        matching_lot_product_exists,
+    ]
+    if numeric_search_id is not None:
+        item_search_terms.append(Item.id == numeric_search_id)
+    return item_search_terms
+
+
+def _indexed_item_hits(item_hits, product_hits, movement_hits, numeric_search_id: Optional[int]):
+    """Same matches as _like_item_search_terms, answered from the FTS tables.
+
+    Returns a subquery of (id, rank): rank is the FTS score for direct
+    name/brand hits and NULL for items matched through a product, lot or
+    stock movement. Driving the page query from this set keeps it a
+    primary-key join instead of a scan of the item table.
+    """
+    matching_product_ids = select(product_hits.c.id)
+    no_rank = literal(None).label("rank")
+    sources = [
+        select(item_hits.c.id, item_hits.c.rank),
+        select(Item.id, no_rank).where(Item.product_id.in_(matching_product_ids)),
+        select(InventoryLot.legacy_item_id, no_rank).where(
+            InventoryLot.product_id.in_(matching_product_ids),
+            InventoryLot.legacy_item_id.is_not(None),
+        ),
+        select(StockMovement.item_id, no_rank).where(StockMovement.id.in_(select(movement_hits.c.id))),
+    ]
+    if numeric_search_id is not None:
+        sources.append(select(StockMovement.item_id, no_rank).where(StockMovement.ref_id == numeric_search_id))
+        sources.append(select(literal(numeric_search_id), no_rank))
+    hits = union_all(*sources).subquery()
+    id_col = list(hits.c)[0]
+    return select(id_col.label("id"), func.min(hits.c.rank).label("rank")).group_by(id_col).subquery()
 
 
 @router.get("/", response_model=ItemPageOut)
@@ -1233,6 +1229,7 @@ def list_items(
         if not include_archived:
             base_stmt = _apply_default_visibility(base_stmt)
 
+        rank_hits = None
         if q:
             search_text = q.strip()
             like = f"%{search_text}%"
@@ -1241,59 +1238,22 @@ def list_items(
             if id_text.isdigit():
                 numeric_search_id = int(id_text)
 
-            movement_search_terms = [
-                StockMovement.reason.ilike(like),
-                func.coalesce(StockMovement.ref_type, "").ilike(like),
-                func.coalesce(StockMovement.note, "").ilike(like),
-            ]
-            if numeric_search_id is not None:
-                movement_search_terms.append(StockMovement.ref_id == numeric_search_id)
-
-            matching_movement_exists = exists(
-                select(StockMovement.id).where(
-                    StockMovement.item_id == Item.id,
-                    or_(*movement_search_terms),
-                )
-            )
-            matching_product_exists = exists(
-                select(Product.id).where(
-                    Product.id == Item.product_id,
-                    or_(
-                        Product.name.ilike(like),
-                        Product.alias.ilike(like),
-                        Product.brand.ilike(like),
-                    ),
+            item_hits = match_rowids(session, "item_fts", search_text)
+            product_hits = match_rowids(session, "product_fts", search_text)
+            movement_hits = match_rowids(session, "movement_fts", search_text)
+            if item_hits is not None and product_hits is not None and movement_hits is not None:
+                rank_hits = _indexed_item_hits(
+                    item_hits.subquery(), product_hits.subquery(), movement_hits.subquery(), numeric_search_id
                 )
-            )
-            matching_lot_product_exists = exists(
-                select(InventoryLot.id)
-                .join(Product, Product.id == InventoryLot.product_id)
-                .where(
-                    InventoryLot.legacy_item_id == Item.id,
-                    or_(
-                        Product.name.ilike(like),
-                        Product.alias.ilike(like),
-                        Product.brand.ilike(like),
-                    ),
+                base_stmt = base_stmt.join(rank_hits, rank_hits.c.id == Item.id)
+            else:
+                base_stmt = base_stmt.where(
+                    or_(*_like_item_search_terms(like, numeric_search_id))
                 )
-            )
-            item_search_terms = [
-                Item.name.ilike(like),
-                Item.brand.ilike(like),
-                matching_movement_exists,
-                matching_product_exists,
-                matching_lot_product_exists,
-            ]
-            if numeric_search_id is not None:
-                item_search_terms.append(Item.id == numeric_search_id)
-
-            base_stmt = base_stmt.where(
-                or_(*item_search_terms)
-            )
         if rack_number is not None:
             base_stmt = base_stmt.where(Item.rack_number == rack_number)
         if brand:
-            base_stmt = base_stmt.where(func.lower(func.coalesce(Item.brand, "")) == brand.strip().lower())
+            base_stmt = base_stmt.where(Item.brand_key == search_key(brand))
         if category_id is not None:
             product_category_exists = exists(
                 select(Product.id).where(
@@ -1358,8 +1318,14 @@ def list_items(
                 )
             )
         # If ONLY q is present (client didn't pass limit/offset), return ALL matches
+        order_by = [Item.name, Item.id]
+        if rank_hits is not None:
+            # Direct name/brand hits first, best match first; product or
+            # movement-only hits follow in name order.
+            order_by = [rank_hits.c.rank.is_(None), rank_hits.c.rank, *order_by]
+
         if q and limit is None and offset is None:
-            stmt = base_stmt.order_by(Item.name, Item.id)
+            stmt = base_stmt.order_by(*order_by)
             items = session.exec(stmt).all()
             _attach_last_incoming(session, items)
             _attach_lot_metadata(session, items)
@@ -1375,7 +1341,7 @@ def list_items(
         total = session.exec(count_stmt).one()
 
         page_stmt = (
-            base_stmt.order_by(Item.name, Item.id).limit(page_limit).offset(page_offset)
+            base_stmt.order_by(*order_by).limit(page_limit).offset(page_offset)
         )
         items = session.exec(page_stmt).all()
         _attach_last_incoming(session, items)
@@ -1401,11 +1367,11 @@ def list_incoming_stock_entries(
     offset: int = Query(0, ge=0),
 ):
     with get_session() as session:
-        movement_ts = _stock_movement_effective_ts_expr()
+        movement_ts = stock_movement_effective_ts_expr()
         stmt = (
             select(StockMovement, Item, movement_ts.label("effective_ts"))
             .join(Item, Item.id == StockMovement.item_id)
-            .outerjoin(Purchase, _purchase_stock_movement_join_condition())
+            .outerjoin(Purchase, purchase_stock_movement_join_condition())
             .where(StockMovement.delta > 0)
         )
 
@@ -1586,7 +1552,7 @@ def get_item_group_summary(
     from_date: Optional[str] = Query(None, description="YYYY-MM-DD"),
     to_date: Optional[str] = Query(None, description="YYYY-MM-DD (inclusive)"),
 ):
-    with get_session() as session:
+    with get_read_session() as session:
         return _build_group_summary(
             session,
             name=name,
@@ -1607,7 +1573,7 @@ def group_ledger(
     to_date: Optional[str] = Query(None, description="YYYY-MM-DD (inclusive)"),
     reason: Optional[str] = Query(None, description="Filter by reason"),
 ):
-    with get_session() as session:
+    with get_read_session() as session:
         n, b, batches = _load_group_batches(session, name=name, brand=brand)
 
         all_item_ids = [int(x.id) for x in batches]
@@ -1622,11 +1588,11 @@ def group_ledger(
         current_stock = sum(int(x.stock or 0) for x in ledger_batches)
         key = _group_key(n, b)
 
-        movement_ts = _stock_movement_effective_ts_expr()
+        movement_ts = stock_movement_effective_ts_expr()
         stmt = (
             select(StockMovement, movement_ts.label("effective_ts"))
             .select_from(StockMovement)
-            .outerjoin(Purchase, _purchase_stock_movement_join_condition())
+            .outerjoin(Purchase, purchase_stock_movement_join_condition())
             .where(StockMovement.item_id.in_(item_ids))
         )
 
@@ -1705,7 +1671,7 @@ def stock_ledger_reconciliation(
     limit: int = Query(200, ge=1, le=1000),
     offset: int = Query(0, ge=0),
 ):
-    with get_session() as session:
+    with get_read_session() as session:
         all_rows = _build_stock_reconciliation(
             session,
             q=q,
@@ -1726,6 +1692,31 @@ def stock_ledger_reconciliation(
         )
 
 
+@router.get("/ledger/reconciliation/scan", response_model=StockReconciliationScanOut)
+def stock_ledger_reconciliation_scan(
+    after_id: int = Query(0, ge=0, description="Resume after this item id (next_after_id of the previous page)"),
+    batch_size: int = Query(500, ge=1, le=IN_CHUNK_SIZE),
+    include_archived: bool = Query(True),
+    include_balanced: bool = Query(False),
+):
+    """
+    Full-store reconciliation in item-id order, one bounded batch per call.
+    Each page costs the same no matter how far into the store it is; keep
+    calling with next_after_id until it comes back null.
+    """
+    with get_read_session() as session:
+        stmt = select(Item).where(Item.id > after_id)
+        if not include_archived:
+            stmt = stmt.where(or_(Item.is_archived == False, Item.is_archived.is_(None)))  # noqa: E712
+        items = session.exec(stmt.order_by(Item.id.asc()).limit(batch_size)).all()
+        rows = _reconcile_item_chunk(session, items, include_balanced=include_balanced) if items else []
+        return StockReconciliationScanOut(
+            items=rows,
+            scanned_items=len(items),
+            next_after_id=int(items[-1].id) if len(items) == batch_size else None,
+        )
+
+
 @router.post("/ledger/reconciliation/apply", response_model=StockReconciliationApplyOut)
 def apply_stock_ledger_reconciliation(payload: StockReconciliationApplyIn) -> StockReconciliationApplyOut:
     with get_session() as session:
@@ -4838,16 +4829,16 @@ def item_ledger(
     to_date: Optional[str] = Query(None, description="YYYY-MM-DD (inclusive)"),
     reason: Optional[str] = Query(None, description="Filter by reason"),
 ):
-    with get_session() as session:
+    with get_read_session() as session:
         item = session.get(Item, item_id)
         if not item:
             raise HTTPException(status_code=404, detail="Item not found")
 
-        movement_ts = _stock_movement_effective_ts_expr()
+        movement_ts = stock_movement_effective_ts_expr()
         stmt = (
             select(StockMovement, movement_ts.label("effective_ts"))
             .select_from(StockMovement)
-            .outerjoin(Purchase, _purchase_stock_movement_join_condition())
+            .outerjoin(Purchase, purchase_stock_movement_join_condition())
             .where(StockMovement.item_id == item_id)
         )
 
@@ -9,6 +9,7 @@ from sqlmodel import select
 from backend.accounting import mark_voucher_deleted, post_loan_adjustment_voucher, post_loan_voucher, post_opening_loan_voucher
 from backend.controls import assert_financial_year_unlocked
 from backend.db import get_session
+from backend.posting_queue import enqueue_posting
 from backend.models import BankbookEntry, Bill, CashbookEntry, LoanAccountOut, LoanAdjustment, LoanAdjustmentCreate, LoanAdjustmentUpdate, LoanOpening, LoanOpeningCreate, LoanReconcileCreate, OpeningLoanReturnCreate, Party
 from backend.security import require_min_role
 
@@ -276,7 +277,7 @@ def add_adjustment(loan_book: str, loan_entry_id: int, payload: LoanAdjustmentCr
         )
         session.add(row)
         session.flush()
-        post_loan_adjustment_voucher(session, row, party)
+        enqueue_posting(session, "LOAN_ADJUSTMENT", int(row.id))
         if kind == "MONEY" and settlement_book == "CASH":
             cash = CashbookEntry(entry_type="LOAN_REPAYMENT", amount=amount, created_at=adjusted_at,
                                  party_id=int(loan.party_id), note=payload.note or f"Loan repayment from {party.name}")
@@ -17,7 +17,7 @@ from backend.models import (
     Product,
     StockMovement,
 )
-from backend.inventory_lot_sync import ensure_lot_for_inventory_item
+from backend.inventory_lot_sync import adjust_item_stock, ensure_lot_for_inventory_item
 from backend.security import get_request_actor_name
 from backend.utils.archive_rules import apply_archive_rules
 
@@ -219,7 +219,8 @@ def open_pack(payload: LotOpenCreate) -> PackOpenEventOut:
         source_item = session.get(Item, source_lot.legacy_item_id) if source_lot.legacy_item_id else None
         if not source_item:
             raise HTTPException(status_code=400, detail="Legacy item link is missing for this lot")
-        if int(source_item.stock or 0) < packs_opened:
+        # Take the packs first so a sale racing this request cannot sell them too.
+        if not adjust_item_stock(session, source_item, -packs_opened):
             raise HTTPException(status_code=400, detail="Not enough sealed stock to open")
 
         loose_units_created = packs_opened * conversion_qty
@@ -239,7 +240,7 @@ def open_pack(payload: LotOpenCreate) -> PackOpenEventOut:
             loose_item = session.get(Item, loose_lot.legacy_item_id) if loose_lot.legacy_item_id else None
             if not loose_item:
                 raise HTTPException(status_code=400, detail="Loose stock legacy item is missing")
-            loose_item.stock = int(loose_item.stock or 0) + loose_units_created
+            adjust_item_stock(session, loose_item, loose_units_created)
             loose_item.mrp = loose_mrp
             loose_item.cost_price = float(loose_cost_price or 0)
             loose_item.updated_at = ts
@@ -264,8 +265,7 @@ def open_pack(payload: LotOpenCreate) -> PackOpenEventOut:
                 updated_at=ts,
             )
             session.add(loose_item)
-            session.commit()
-            session.refresh(loose_item)
+            session.flush()
 
             loose_lot = InventoryLot(
                 product_id=product.id,
@@ -284,7 +284,6 @@ def open_pack(payload: LotOpenCreate) -> PackOpenEventOut:
             )
             session.add(loose_lot)
 
-        source_item.stock = int(source_item.stock or 0) - packs_opened
         source_item.updated_at = ts
         apply_archive_rules(session, source_item)
         source_lot.sealed_qty = max(0, int(source_item.stock or 0))
@@ -378,16 +377,15 @@ def close_pack(payload: LotCloseCreate) -> PackOpenEventOut:
             raise HTTPException(status_code=400, detail="Loose stock item is missing")
 
         loose_units_used = packs_closed * conversion_qty
-        if int(loose_item.stock or 0) < loose_units_used:
+        if not adjust_item_stock(session, loose_item, -loose_units_used):
             raise HTTPException(status_code=400, detail="Not enough loose stock to close into parent units")
 
         ts = now_ts()
         note = clean_text(payload.note)
         close_note = note or f"Closed {loose_units_used} loose unit(s) into {packs_closed} pack(s)"
 
-        source_item.stock = int(source_item.stock or 0) + packs_closed
+        adjust_item_stock(session, source_item, packs_closed)
         source_item.updated_at = ts
-        loose_item.stock = int(loose_item.stock or 0) - loose_units_used
         loose_item.updated_at = ts
         apply_archive_rules(session, source_item)
         apply_archive_rules(session, loose_item)
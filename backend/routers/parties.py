@@ -7,7 +7,8 @@ from sqlmodel import select
 
 from backend.accounting import mark_voucher_deleted, post_party_receipt_voucher
 from backend.controls import assert_financial_year_unlocked, log_audit
-from backend.db import get_session
+from backend.db import get_read_session, get_session
+from backend.posting_queue import enqueue_posting
 from backend.models import (
     Bill,
     BillPayment,
@@ -31,7 +32,9 @@ from backend.models import (
     ReturnItem,
     ReceiptBillAdjustment,
     ReceiptBillAdjustmentOut,
+    search_key,
 )
+from backend.search_index import match_rowids
 from backend.security import require_min_role
 
 router = APIRouter()
@@ -75,24 +78,14 @@ def _party_exists(session, *, name: str, party_group: str, exclude_id: Optional[
     return session.exec(stmt.limit(1)).first() is not None
 
 
-def _customer_note_matches_expr(name: str):
-    normalized = _normalize_name(name).lower()
-    note = func.lower(func.ltrim(func.coalesce(Bill.notes, "")))
-    base = f"customer: {normalized}"
-    return or_(
-        note == base,
-        note.like(f"{base} |%"),
-        note.like(f"{base}\n%"),
-    )
-
-
 def _bill_matches_party_expr(party: Party, customer_name: str):
-    matches = [
-        _customer_note_matches_expr(customer_name),
-        Bill.party_id == int(party.id or 0),
-    ]
+    # Equality on indexed columns only; debtor_key carries the customer named in the bill note.
+    matches = [Bill.party_id == int(party.id or 0)]
     if party.legacy_customer_id is not None:
         matches.append(Bill.customer_id == int(party.legacy_customer_id))
+    name_key = search_key(customer_name)
+    if name_key:
+        matches.append(Bill.debtor_key == name_key)
     return or_(*matches)
 
 
@@ -315,69 +308,6 @@ def _party_receipt_out(session, receipt: PartyReceipt) -> PartyReceiptOut:
     return _party_receipt_outs(session, [receipt])[0]
 
 
-def _sync_customer_debtor_parties(session) -> None:
-    customers = session.exec(select(Customer).order_by(Customer.id.asc())).all()
-    dirty = False
-    ts = datetime.now().isoformat(timespec="seconds")
-    for customer in customers:
-        customer_name = _normalize_name(customer.name)
-        if not customer_name:
-            continue
-        party = session.exec(
-            select(Party).where(
-                Party.party_group == "SUNDRY_DEBTOR",
-                Party.legacy_customer_id == int(customer.id),
-            )
-        ).first()
-        if not party:
-            party = session.exec(
-                select(Party).where(
-                    Party.party_group == "SUNDRY_DEBTOR",
-                    func.lower(func.trim(func.coalesce(Party.name, ""))) == customer_name.lower(),
-                )
-            ).first()
-        next_phone = _normalize_phone(customer.phone)
-        next_address = _normalize_text(customer.address_line)
-        if not party:
-            session.add(
-                Party(
-                    name=customer_name,
-                    party_group="SUNDRY_DEBTOR",
-                    phone=next_phone,
-                    address_line=next_address,
-                    gst_number=None,
-                    notes=None,
-                    opening_balance=0.0,
-                    opening_balance_type="DR",
-                    legacy_customer_id=int(customer.id),
-                    is_active=True,
-                    created_at=ts,
-                    updated_at=ts,
-                )
-            )
-            dirty = True
-            continue
-        changed = False
-        if int(getattr(party, "legacy_customer_id", 0) or 0) != int(customer.id):
-            party.legacy_customer_id = int(customer.id)
-            changed = True
-        if _normalize_name(party.name) != customer_name:
-            party.name = customer_name
-            changed = True
-        if _normalize_phone(party.phone) != next_phone:
-            party.phone = next_phone
-            changed = True
-        if _normalize_text(party.address_line) != next_address:
-            party.address_line = next_address
-            changed = True
-        if changed:
-            party.updated_at = ts
-            session.add(party)
-            dirty = True
-    if dirty:
-        session.commit()
-
-
 def _party_customer_name(session, party: Party) -> str:
     customer_id = int(getattr(party, "legacy_customer_id", 0) or 0)
     if customer_id > 0:
@@ -492,15 +422,17 @@ def list_parties(
     limit: int = Query(200, ge=1, le=1000),
     offset: int = Query(0, ge=0),
 ) -> List[PartyOut]:
-    with get_session() as session:
-        _sync_customer_debtor_parties(session)
+    with get_read_session() as session:
         stmt = select(Party)
         if party_group:
             stmt = stmt.where(Party.party_group == _normalize_group(party_group))
         if is_active is not None:
             stmt = stmt.where(Party.is_active == is_active)
         qq = _normalize_text(q)
-        if qq:
+        party_hits = match_rowids(session, "party_fts", qq) if qq else None
+        if party_hits is not None:
+            stmt = stmt.where(Party.id.in_(select(party_hits.subquery().c.id)))
+        elif qq:
             like = f"%{qq.lower()}%"
             stmt = stmt.where(
                 or_(
@@ -516,8 +448,7 @@ def list_parties(
 
 @router.get("/lookup/{party_id}", response_model=PartyOut)
 def get_party(party_id: int) -> PartyOut:
-    with get_session() as session:
-        _sync_customer_debtor_parties(session)
+    with get_read_session() as session:
         row = session.get(Party, party_id)
         if not row:
             raise HTTPException(status_code=404, detail="Party not found")
@@ -596,8 +527,7 @@ def deactivate_party(party_id: int) -> Response:
 
 @router.get("/{party_id}/debtor-ledger", response_model=List[DebtorLedgerRow])
 def debtor_ledger(party_id: int) -> List[DebtorLedgerRow]:
-    with get_session() as session:
-        _sync_customer_debtor_parties(session)
+    with get_read_session() as session:
         party = session.get(Party, party_id)
         if not party or party.party_group != "SUNDRY_DEBTOR":
             raise HTTPException(status_code=404, detail="Debtor party not found")
@@ -610,7 +540,6 @@ def debtor_ledger(party_id: int) -> List[DebtorLedgerRow]:
             .order_by(Bill.date_time.desc(), Bill.id.desc())
         )
         rows = session.exec(stmt).all()
-        _sync_bill_payment_states(session, rows)
         out: List[DebtorLedgerRow] = []
         for bill in rows:
             total = float(bill.total_amount or 0)
@@ -636,8 +565,7 @@ def debtor_ledger(party_id: int) -> List[DebtorLedgerRow]:
 
 @router.get("/{party_id}/open-bills", response_model=List[OpenBillOut])
 def debtor_open_bills(party_id: int) -> List[OpenBillOut]:
-    with get_session() as session:
-        _sync_customer_debtor_parties(session)
+    with get_read_session() as session:
         party = session.get(Party, party_id)
         if not party or party.party_group != "SUNDRY_DEBTOR":
             raise HTTPException(status_code=404, detail="Debtor party not found")
@@ -649,7 +577,6 @@ def debtor_open_bills(party_id: int) -> List[OpenBillOut]:
             .where(_bill_matches_party_expr(party, customer_name))
             .order_by(Bill.date_time.desc(), Bill.id.desc())
         ).all()
-        _sync_bill_payment_states(session, rows)
         out: List[OpenBillOut] = []
         for bill in rows:
             total = float(bill.total_amount or 0)
@@ -676,8 +603,7 @@ def debtor_open_bills(party_id: int) -> List[OpenBillOut]:
 
 @router.get("/{party_id}/returns", response_model=List[CustomerReturnLedgerRow])
 def debtor_returns(party_id: int) -> List[CustomerReturnLedgerRow]:
-    with get_session() as session:
-        _sync_customer_debtor_parties(session)
+    with get_read_session() as session:
         party = session.get(Party, party_id)
         if not party or party.party_group != "SUNDRY_DEBTOR":
             raise HTTPException(status_code=404, detail="Debtor party not found")
@@ -749,8 +675,7 @@ def list_party_receipts(
     party_id: int,
     deleted_filter: str = Query("active", pattern="^(active|deleted|all)$"),
 ) -> List[PartyReceiptOut]:
-    with get_session() as session:
-        _sync_customer_debtor_parties(session)
+    with get_read_session() as session:
         party = session.get(Party, party_id)
         if not party or party.party_group != "SUNDRY_DEBTOR":
             raise HTTPException(status_code=404, detail="Debtor party not found")
@@ -770,8 +695,7 @@ def list_receipts(
     limit: int = Query(500, ge=1, le=1000),
     offset: int = Query(0, ge=0),
 ) -> List[PartyReceiptOut]:
-    with get_session() as session:
-        _sync_customer_debtor_parties(session)
+    with get_read_session() as session:
         stmt = (
             select(PartyReceipt)
             .where(PartyReceipt.is_deleted == False)  # noqa: E712
@@ -789,8 +713,7 @@ def list_receipts(
 
 @router.get("/{party_id}/receipt-adjustments", response_model=List[ReceiptBillAdjustmentOut])
 def list_receipt_adjustments(party_id: int) -> List[ReceiptBillAdjustmentOut]:
-    with get_session() as session:
-        _sync_customer_debtor_parties(session)
+    with get_read_session() as session:
         party = session.get(Party, party_id)
         if not party or party.party_group != "SUNDRY_DEBTOR":
             raise HTTPException(status_code=404, detail="Debtor party not found")
@@ -812,7 +735,6 @@ def list_receipt_adjustments(party_id: int) -> List[ReceiptBillAdjustmentOut]:
 @router.post("/{party_id}/receipts", response_model=PartyReceiptOut, status_code=201)
 def create_party_receipt(party_id: int, payload: PartyReceiptCreate) -> PartyReceiptOut:
     with get_session() as session:
-        _sync_customer_debtor_parties(session)
         party = session.get(Party, party_id)
         if not party or party.party_group != "SUNDRY_DEBTOR":
             raise HTTPException(status_code=404, detail="Debtor party not found")
@@ -867,16 +789,7 @@ def create_party_receipt(party_id: int, payload: PartyReceiptCreate) -> PartyRec
         )
         session.add(receipt)
         session.flush()
-        post_party_receipt_voucher(
-            session,
-            int(receipt.id),
-            party,
-            receipt.received_at,
-            float(receipt.total_amount or 0),
-            float(receipt.cash_amount or 0),
-            float(receipt.online_amount or 0),
-            receipt.note,
-        )
+        enqueue_posting(session, "PARTY_RECEIPT", int(receipt.id))
         log_audit(
             session,
             entity_type="PARTY_RECEIPT",
@@ -925,7 +838,6 @@ def create_party_receipt(party_id: int, payload: PartyReceiptCreate) -> PartyRec
 @router.post("/{party_id}/receipts/{receipt_id}/apply", response_model=PartyReceiptOut)
 def apply_party_receipt(party_id: int, receipt_id: int, payload: PartyReceiptApply) -> PartyReceiptOut:
     with get_session() as session:
-        _sync_customer_debtor_parties(session)
         party = session.get(Party, party_id)
         if not party or party.party_group != "SUNDRY_DEBTOR":
             raise HTTPException(status_code=404, detail="Debtor party not found")
@@ -1040,7 +952,6 @@ def apply_party_receipt(party_id: int, receipt_id: int, payload: PartyReceiptApp
 def update_party_receipt(party_id: int, receipt_id: int, payload: PartyReceiptUpdate) -> PartyReceiptOut:
     require_min_role("MANAGER", context="Customer receipt edit")
     with get_session() as session:
-        _sync_customer_debtor_parties(session)
         party = session.get(Party, party_id)
         if not party or party.party_group != "SUNDRY_DEBTOR":
             raise HTTPException(status_code=404, detail="Debtor party not found")
@@ -1181,7 +1092,6 @@ def update_party_receipt(party_id: int, receipt_id: int, payload: PartyReceiptUp
 def recover_party_receipt(party_id: int, receipt_id: int) -> PartyReceiptOut:
     require_min_role("MANAGER", context="Customer receipt recover")
     with get_session() as session:
-        _sync_customer_debtor_parties(session)
         party = session.get(Party, party_id)
         if not party or party.party_group != "SUNDRY_DEBTOR":
             raise HTTPException(status_code=404, detail="Debtor party not found")
@@ -1270,7 +1180,6 @@ def recover_party_receipt(party_id: int, receipt_id: int) -> PartyReceiptOut:
 def delete_party_receipt(party_id: int, receipt_id: int) -> PartyReceiptOut:
     require_min_role("MANAGER", context="Customer receipt delete")
     with get_session() as session:
-        _sync_customer_debtor_parties(session)
         party = session.get(Party, party_id)
         if not party or party.party_group != "SUNDRY_DEBTOR":
             raise HTTPException(status_code=404, detail="Debtor party not found")
@@ -9,6 +9,7 @@ from sqlmodel import select
 
 from backend.controls import log_audit
 from backend.db import create_data_repair_backup, get_session
+from backend.search_index import match_rowids
 from backend.models import (
     Brand,
     BrandCreate,
@@ -25,6 +26,7 @@ from backend.models import (
     ProductUpdate,
     Item,
     PurchaseItem,
+    search_key,
 )
 
 router = APIRouter()
@@ -66,6 +68,18 @@ def _category_key(v: Optional[int]) -> int:
     return int(v or 0)
 
 
+def _product_search_filter(session, qq: str):
+    hits = match_rowids(session, "product_fts", qq)
+    if hits is not None:
+        return Product.id.in_(select(hits.subquery().c.id))
+    like = f"%{qq.lower()}%"
+    return or_(
+        func.lower(func.coalesce(Product.name, "")).like(like),
+        func.lower(func.coalesce(Product.alias, "")).like(like),
+        func.lower(func.coalesce(Product.brand, "")).like(like),
+    )
+
+
 def _now() -> str:
     return datetime.now().isoformat(timespec="seconds")
 
@@ -153,11 +167,7 @@ def _sync_product_to_inventory_items(
     previous_name_key = _product_name_key(previous_name)
     previous_brand_key = _brand_key(previous_brand)
     if previous_name_key:
-        legacy_stmt = select(Item).where(Item.product_id.is_(None))
-        if previous_brand_key:
-            legacy_stmt = legacy_stmt.where(func.lower(func.coalesce(Item.brand, "")) == previous_brand_key)
-        else:
-            legacy_stmt = legacy_stmt.where(or_(Item.brand.is_(None), func.trim(func.coalesce(Item.brand, "")) == ""))
+        legacy_stmt = select(Item).where(Item.product_id.is_(None), Item.brand_key == previous_brand_key)
         legacy_candidates = session.exec(legacy_stmt).all()
         target_ids.update(
             int(item.id)
@@ -428,17 +438,10 @@ def list_products(
             stmt = stmt.where(Product.category_id == category_id)
         brand_name = _clean(brand)
         if brand_name:
-            stmt = stmt.where(func.lower(func.coalesce(Product.brand, "")) == brand_name.lower())
+            stmt = stmt.where(Product.brand_key == search_key(brand_name))
         qq = _clean(q)
         if qq:
-            like = f"%{qq.lower()}%"
-            stmt = stmt.where(
-                or_(
-                    func.lower(func.coalesce(Product.name, "")).like(like),
-                    func.lower(func.coalesce(Product.alias, "")).like(like),
-                    func.lower(func.coalesce(Product.brand, "")).like(like),
-                )
-            )
+            stmt = stmt.where(_product_search_filter(session, qq))
 
         stmt = stmt.order_by(func.lower(Product.name).asc(), Product.id.asc()).offset(offset).limit(limit)
         return session.exec(stmt).all()
@@ -467,17 +470,10 @@ def list_products_page(
             filters.append(Product.category_id == category_id)
         brand_name = _clean(brand)
         if brand_name:
-            filters.append(func.lower(func.coalesce(Product.brand, "")) == brand_name.lower())
+            filters.append(Product.brand_key == search_key(brand_name))
         qq = _clean(q)
         if qq:
-            like = f"%{qq.lower()}%"
-            filters.append(
-                or_(
-                    func.lower(func.coalesce(Product.name, "")).like(like),
-                    func.lower(func.coalesce(Product.alias, "")).like(like),
-                    func.lower(func.coalesce(Product.brand, "")).like(like),
-                )
-            )
+            filters.append(_product_search_filter(session, qq))
 
         total_stmt = select(func.count()).select_from(Product)
         rows_stmt = select(Product)
@@ -514,7 +510,7 @@ def create_product(payload: ProductCreate) -> ProductOut:
         if payload.category_id is not None and not session.get(Category, payload.category_id):
             raise HTTPException(status_code=400, detail="Category not found")
 
-        existing_stmt = select(Product).where(func.lower(func.coalesce(Product.brand, "")) == (brand or "").lower())
+        existing_stmt = select(Product).where(Product.brand_key == search_key(brand))
         if payload.category_id is None:
             existing_stmt = existing_stmt.where(Product.category_id.is_(None))
         else:
@@ -657,7 +653,7 @@ def update_product(product_id: int, payload: ProductUpdate) -> ProductOut:
         )
         if row.is_active and unique_key_changed:
             duplicate_stmt = select(Product).where(
-                func.lower(func.coalesce(Product.brand, "")) == func.lower(row.brand or ""),
+                Product.brand_key == search_key(row.brand),
                 Product.id != product_id,
                 Product.is_active == True,  # noqa: E712
             )
@@ -8,6 +8,7 @@ from sqlmodel import select
 from backend.accounting import mark_voucher_deleted, post_purchase_return_voucher
 from backend.controls import assert_financial_year_unlocked, log_audit
 from backend.db import get_session
+from backend.inventory_lot_sync import adjust_item_stock, adjust_lot_quantity
 from backend.purchase_return_settlement import recalculate_purchase_return_settlements
 from backend.models import (
     AuditLog,
@@ -348,10 +349,11 @@ def create_purchase_return(payload: PurchaseReturnCreate) -> PurchaseReturnOut:
             taxable_amount = round2(quantity * unit_cost)
             gst_amount = round2(taxable_amount * gst_percent / 100.0)
             line_total = round2(taxable_amount + gst_amount)
-            inventory_item.stock = int(inventory_item.stock or 0) - quantity
+            if not adjust_item_stock(session, inventory_item, -quantity) or not adjust_lot_quantity(session, lot, -quantity):
+                available = min(int(inventory_item.stock or 0), int(lot.sealed_qty or 0))
+                raise HTTPException(status_code=400, detail=f"Only {available} unit(s) of {product_name} are currently in stock; sold or opened units cannot be returned")
             inventory_item.is_archived = inventory_item.stock <= 0
             inventory_item.updated_at = now_ts()
-            lot.sealed_qty = int(lot.sealed_qty or 0) - quantity
             lot.is_active = lot.sealed_qty > 0 or int(lot.loose_qty or 0) > 0
             lot.updated_at = inventory_item.updated_at
             session.add(inventory_item)
@@ -484,10 +486,10 @@ def update_purchase_return(return_id: int, payload: PurchaseReturnUpdate) -> Pur
             if not inventory_item or not lot or int(lot.legacy_item_id or 0) != int(inventory_item.id):
                 raise HTTPException(status_code=400, detail=f"Cannot edit {old_item.product_name}; inventory linkage is missing")
             quantity = int(old_item.quantity or 0)
-            inventory_item.stock = int(inventory_item.stock or 0) + quantity
+            adjust_item_stock(session, inventory_item, quantity)
             inventory_item.is_archived = False
             inventory_item.updated_at = now_ts()
-            lot.sealed_qty = int(lot.sealed_qty or 0) + quantity
+            adjust_lot_quantity(session, lot, quantity)
             lot.is_active = True
             lot.updated_at = inventory_item.updated_at
             session.add(inventory_item)
@@ -569,10 +571,11 @@ def update_purchase_return(return_id: int, payload: PurchaseReturnUpdate) -> Pur
             taxable_amount = round2(quantity * unit_cost)
             gst_amount = round2(taxable_amount * gst_percent / 100.0)
             line_total = round2(taxable_amount + gst_amount)
-            inventory_item.stock = int(inventory_item.stock or 0) - quantity
+            if not adjust_item_stock(session, inventory_item, -quantity) or not adjust_lot_quantity(session, lot, -quantity):
+                available = min(int(inventory_item.stock or 0), int(lot.sealed_qty or 0))
+                raise HTTPException(status_code=400, detail=f"Only {available} unit(s) of {product_name} are currently in stock; sold or opened units cannot be returned")
             inventory_item.is_archived = inventory_item.stock <= 0
             inventory_item.updated_at = now_ts()
-            lot.sealed_qty = int(lot.sealed_qty or 0) - quantity
             lot.is_active = lot.sealed_qty > 0 or int(lot.loose_qty or 0) > 0
             lot.updated_at = inventory_item.updated_at
             session.add(inventory_item)
@@ -682,10 +685,10 @@ def cancel_purchase_return(return_id: int) -> PurchaseReturnOut:
             if not inventory_item or not lot or int(lot.legacy_item_id or 0) != int(inventory_item.id):
                 raise HTTPException(status_code=400, detail=f"Cannot restore {returned.product_name}; inventory linkage is missing")
             quantity = int(returned.quantity or 0)
-            inventory_item.stock = int(inventory_item.stock or 0) + quantity
+            adjust_item_stock(session, inventory_item, quantity)
             inventory_item.is_archived = False
             inventory_item.updated_at = now_ts()
-            lot.sealed_qty = int(lot.sealed_qty or 0) + quantity
+            adjust_lot_quantity(session, lot, quantity)
             lot.is_active = True
             lot.updated_at = inventory_item.updated_at
             session.add(inventory_item)
@@ -1,14 +1,16 @@
 from datetime import datetime
 import re
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import APIRouter, HTTPException, Query
-from sqlalchemy import and_, func, or_
+from sqlalchemy import and_, case, func, or_
 from sqlmodel import SQLModel, select
 
 from backend.accounting import mark_voucher_deleted, post_purchase_payment_voucher, post_purchase_return_voucher, sync_purchase_vouchers
 from backend.controls import assert_financial_year_unlocked, log_audit
-from backend.db import get_session
+from backend.db import get_read_session, get_session
+from backend.inventory_lot_sync import IN_CHUNK_SIZE, chunked
+from backend.posting_queue import enqueue_posting
 from backend.purchase_return_settlement import recalculate_purchase_return_settlements
 from backend.models import (
     AuditLog,
@@ -34,6 +36,7 @@ from backend.models import (
     PurchaseUpdate,
     StockMovement,
     SupplierLedgerSummary,
+    search_key,
 )
 from backend.security import require_min_role
 
@@ -371,7 +374,7 @@ def ensure_product(
     name_key = product_name_key(name)
     existing_products = session.exec(
         select(Product)
-        .where(func.lower(func.coalesce(Product.brand, "")) == (normalized_brand or "").lower())
+        .where(Product.brand_key == search_key(normalized_brand))
         .order_by(Product.id.asc())
     ).all()
     for existing in existing_products:
@@ -687,48 +690,87 @@ def convert_opening_placeholder_to_purchase(
     return inventory_lot
 
 
-def make_purchase_out(session, row: Purchase) -> PurchaseOut:
-    items = session.exec(select(PurchaseItem).where(PurchaseItem.purchase_id == row.id).order_by(PurchaseItem.id.asc())).all()
-    payments = session.exec(
-        select(PurchasePayment).where(PurchasePayment.purchase_id == row.id).order_by(PurchasePayment.id.asc())
-    ).all()
-    return_total = round2(session.exec(
-        select(func.coalesce(func.sum(PurchaseReturn.total_amount), 0)).where(
-            purchase_return_allocation_clause(int(row.id)),
-            PurchaseReturn.is_deleted == False,  # noqa: E712
-        )
-    ).one() or 0)
-    returned_settlement = round2(session.exec(
-        select(func.coalesce(func.sum(
-            PurchaseReturn.refund_cash + PurchaseReturn.refund_online + PurchaseReturn.writeoff_reversal
-        ), 0)).where(
-            purchase_return_allocation_clause(int(row.id)),
-            PurchaseReturn.is_deleted == False,  # noqa: E712
-        )
-    ).one() or 0)
-    return PurchaseOut(
-        id=row.id,
-        party_id=row.party_id,
-        invoice_number=row.invoice_number,
-        invoice_date=row.invoice_date,
-        notes=row.notes,
-        subtotal_amount=row.subtotal_amount,
-        discount_amount=row.discount_amount,
-        gst_amount=row.gst_amount,
-        rounding_adjustment=row.rounding_adjustment,
-        total_amount=row.total_amount,
-        paid_amount=row.paid_amount,
-        writeoff_amount=row.writeoff_amount,
-        payment_status=row.payment_status,
-        is_deleted=row.is_deleted,
-        deleted_at=row.deleted_at,
-        created_at=row.created_at,
-        updated_at=row.updated_at,
-        items=[purchase_item_output(session, item) for item in items],
-        payments=[PurchasePaymentOut(**payment.dict()) for payment in payments],
-        return_total=return_total,
-        net_amount=round2(float(row.total_amount or 0) - return_total + returned_settlement),
+def purchase_return_totals(session, purchase_ids: List[int]) -> Dict[int, Tuple[float, float]]:
+    """(return_total, returned_settlement) per purchase, summed like purchase_return_allocation_clause."""
+    # A return counts against its settlement purchase, or its own purchase when unsettled.
+    allocated_to = case(
+        (PurchaseReturn.settlement_purchase_id == 0, PurchaseReturn.purchase_id),
+        else_=PurchaseReturn.settlement_purchase_id,
     )
+    out: Dict[int, Tuple[float, float]] = {}
+    for chunk in chunked(sorted({int(pid) for pid in purchase_ids}), IN_CHUNK_SIZE):
+        rows = session.exec(
+            select(
+                allocated_to,
+                func.coalesce(func.sum(PurchaseReturn.total_amount), 0),
+                func.coalesce(func.sum(
+                    PurchaseReturn.refund_cash + PurchaseReturn.refund_online + PurchaseReturn.writeoff_reversal
+                ), 0),
+            )
+            .where(
+                or_(
+                    PurchaseReturn.settlement_purchase_id.in_(chunk),
+                    and_(PurchaseReturn.purchase_id.in_(chunk), PurchaseReturn.settlement_purchase_id == 0),
+                ),
+                PurchaseReturn.is_deleted == False,  # noqa: E712
+            )
+            .group_by(allocated_to)
+        ).all()
+        for purchase_id, return_total, returned_settlement in rows:
+            out[int(purchase_id)] = (round2(return_total or 0), round2(returned_settlement or 0))
+    return out
+
+
+def make_purchase_outs(session, rows: List[Purchase]) -> List[PurchaseOut]:
+    """PurchaseOut for each row, with items, payments and return totals fetched per page."""
+    ids = [int(row.id) for row in rows]
+    items_by_purchase: Dict[int, List[PurchaseItem]] = {pid: [] for pid in ids}
+    payments_by_purchase: Dict[int, List[PurchasePayment]] = {pid: [] for pid in ids}
+    for chunk in chunked(sorted(set(ids)), IN_CHUNK_SIZE):
+        for item in session.exec(
+            select(PurchaseItem).where(PurchaseItem.purchase_id.in_(chunk)).order_by(PurchaseItem.id.asc())
+        ).all():
+            items_by_purchase[int(item.purchase_id)].append(item)
+        for payment in session.exec(
+            select(PurchasePayment).where(PurchasePayment.purchase_id.in_(chunk)).order_by(PurchasePayment.id.asc())
+        ).all():
+            payments_by_purchase[int(payment.purchase_id)].append(payment)
+    item_outs = purchase_item_outputs(session, [item for pid in ids for item in items_by_purchase[pid]])
+    return_totals = purchase_return_totals(session, ids)
+
+    out: List[PurchaseOut] = []
+    for row in rows:
+        return_total, returned_settlement = return_totals.get(int(row.id), (0.0, 0.0))
+        out.append(
+            PurchaseOut(
+                id=row.id,
+                party_id=row.party_id,
+                invoice_number=row.invoice_number,
+                invoice_date=row.invoice_date,
+                notes=row.notes,
+                subtotal_amount=row.subtotal_amount,
+                discount_amount=row.discount_amount,
+                gst_amount=row.gst_amount,
+                rounding_adjustment=row.rounding_adjustment,
+                total_amount=row.total_amount,
+                paid_amount=row.paid_amount,
+                writeoff_amount=row.writeoff_amount,
+                payment_status=row.payment_status,
+                is_deleted=row.is_deleted,
+                deleted_at=row.deleted_at,
+                created_at=row.created_at,
+                updated_at=row.updated_at,
+                items=[item_outs[int(item.id)] for item in items_by_purchase[int(row.id)]],
+                payments=[PurchasePaymentOut(**payment.dict()) for payment in payments_by_purchase[int(row.id)]],
+                return_total=return_total,
+                net_amount=round2(float(row.total_amount or 0) - return_total + returned_settlement),
+            )
+        )
+    return out
+
+
+def make_purchase_out(session, row: Purchase) -> PurchaseOut:
+    return make_purchase_outs(session, [row])[0]
 
 
 def assert_purchase_has_no_active_returns(session, purchase_id: int, *, context: str) -> None:
@@ -749,16 +791,32 @@ def make_purchase_payment_out(payment: PurchasePayment, party_id: Optional[int]
 
 
 def purchase_item_output(session, item: PurchaseItem) -> PurchaseItemOut:
-    data = item.model_dump()
-    if not clean_date(data.get("expiry_date")):
-        lot = session.get(InventoryLot, int(item.lot_id)) if item.lot_id else None
-        inventory_item = session.get(Item, int(item.inventory_item_id)) if item.inventory_item_id else None
-        data["expiry_date"] = (
-            clean_date(getattr(lot, "expiry_date", None))
-            or clean_date(getattr(inventory_item, "expiry_date", None))
-            or data.get("expiry_date")
-        )
-    return PurchaseItemOut(**data)
+    return purchase_item_outputs(session, [item])[int(item.id)]
+
+
+def purchase_item_outputs(session, items: List[PurchaseItem]) -> Dict[int, PurchaseItemOut]:
+    """PurchaseItemOut by line id; lines without an expiry take it from their lot or item."""
+    undated = [item for item in items if not clean_date(item.expiry_date)]
+    lot_ids = sorted({int(item.lot_id) for item in undated if item.lot_id})
+    item_ids = sorted({int(item.inventory_item_id) for item in undated if item.inventory_item_id})
+    lot_expiry: Dict[int, Optional[str]] = {}
+    item_expiry: Dict[int, Optional[str]] = {}
+    for chunk in chunked(lot_ids, IN_CHUNK_SIZE):
+        lot_expiry.update(session.exec(select(InventoryLot.id, InventoryLot.expiry_date).where(InventoryLot.id.in_(chunk))).all())
+    for chunk in chunked(item_ids, IN_CHUNK_SIZE):
+        item_expiry.update(session.exec(select(Item.id, Item.expiry_date).where(Item.id.in_(chunk))).all())
+
+    out: Dict[int, PurchaseItemOut] = {}
+    for item in items:
+        data = item.model_dump()
+        if not clean_date(data.get("expiry_date")):
+            data["expiry_date"] = (
+                clean_date(lot_expiry.get(int(item.lot_id)) if item.lot_id else None)
+                or clean_date(item_expiry.get(int(item.inventory_item_id)) if item.inventory_item_id else None)
+                or data.get("expiry_date")
+            )
+        out[int(item.id)] = PurchaseItemOut(**data)
+    return out
 
 
 def purchase_item_total_qty(item: PurchaseItem) -> int:
@@ -1489,27 +1547,9 @@ def create_purchase(payload: PurchaseCreate) -> PurchaseOut:
             note=f"Created purchase #{purchase.id}",
             details={"after": purchase_snapshot(session, purchase)},
         )
+        enqueue_posting(session, "PURCHASE", int(purchase.id))
         session.commit()
         session.refresh(purchase)
-        sync_purchase_vouchers(session, purchase, supplier)
-        payments = session.exec(select(PurchasePayment).where(PurchasePayment.purchase_id == purchase.id)).all()
-        for payment in payments:
-            post_purchase_payment_voucher(
-                session,
-                purchase,
-                supplier,
-                int(payment.id or 0),
-                float(payment.amount or 0),
-                bool(payment.is_writeoff),
-                payment.note,
-                payment.paid_at,
-                float(getattr(payment, "cash_amount", 0) or 0),
-                float(getattr(payment, "online_amount", 0) or 0),
-                getattr(payment, "bank_mode", None),
-                float(getattr(payment, "txn_charges", 0) or 0),
-                getattr(payment, "transaction_id", None),
-            )
-        session.commit()
         return make_purchase_out(session, purchase)
 
 
@@ -1592,7 +1632,7 @@ def list_purchases(
     limit: int = Query(100, ge=1, le=500),
     offset: int = Query(0, ge=0),
 ) -> List[PurchaseOut]:
-    with get_session() as session:
+    with get_read_session() as session:
         stmt = select(Purchase).where(Purchase.is_deleted == False)  # noqa: E712
         if party_id is not None:
             stmt = stmt.where(Purchase.party_id == party_id)
@@ -1601,7 +1641,7 @@ def list_purchases(
         if to_date:
             stmt = stmt.where(Purchase.invoice_date <= clean_date(to_date))
         rows = session.exec(stmt.order_by(Purchase.id.desc()).offset(offset).limit(limit)).all()
-        return [make_purchase_out(session, row) for row in rows]
+        return make_purchase_outs(session, rows)
 
 
 @router.get("/payments", response_model=List[PurchasePaymentBookRow])
@@ -1689,7 +1729,7 @@ def list_purchase_payments(
 
 @router.get("/{purchase_id}", response_model=PurchaseOut)
 def get_purchase(purchase_id: int) -> PurchaseOut:
-    with get_session() as session:
+    with get_read_session() as session:
         row = session.get(Purchase, purchase_id)
         if not row or row.is_deleted:
             raise HTTPException(status_code=404, detail="Purchase not found")
@@ -1711,29 +1751,17 @@ def get_purchase_history(purchase_id: int) -> List[AuditLogOut]:
 
 @router.get("/ledger/{party_id}", response_model=List[PurchaseLedgerRow])
 def supplier_ledger(party_id: int) -> List[PurchaseLedgerRow]:
-    with get_session() as session:
+    with get_read_session() as session:
         ensure_supplier(session, party_id)
         rows = session.exec(
             select(Purchase)
             .where(Purchase.party_id == party_id, Purchase.is_deleted == False)  # noqa: E712
             .order_by(Purchase.invoice_date.desc(), Purchase.id.desc())
         ).all()
+        return_totals = purchase_return_totals(session, [int(row.id) for row in rows])
         out: List[PurchaseLedgerRow] = []
         for row in rows:
-            return_amount = round2(session.exec(
-                select(func.coalesce(func.sum(PurchaseReturn.total_amount), 0)).where(
-                    purchase_return_allocation_clause(int(row.id)),
-                    PurchaseReturn.is_deleted == False,  # noqa: E712
-                )
-            ).one() or 0)
-            returned_settlement = round2(session.exec(
-                select(func.coalesce(func.sum(
-                    PurchaseReturn.refund_cash + PurchaseReturn.refund_online + PurchaseReturn.writeoff_reversal
-                ), 0)).where(
-                    purchase_return_allocation_clause(int(row.id)),
-                    PurchaseReturn.is_deleted == False,  # noqa: E712
-                )
-            ).one() or 0)
+            return_amount, returned_settlement = return_totals.get(int(row.id), (0.0, 0.0))
             net_amount = round2(float(row.total_amount or 0) - return_amount + returned_settlement)
             outstanding = round2(net_amount - float(row.paid_amount or 0) - float(row.writeoff_amount or 0))
             out.append(
@@ -2063,7 +2091,7 @@ def add_supplier_payment(party_id: int, payload: SupplierPaymentCreate) -> List[
             charges_remaining = round2(charges_remaining - charge_share)
 
         session.commit()
-        return [make_purchase_out(session, purchases_by_id[purchase_id]) for purchase_id, _amount in allocations]
+        return make_purchase_outs(session, [purchases_by_id[purchase_id] for purchase_id, _amount in allocations])
 
 
 def supplier_payment_context(session, party_id: int, payment_id: int) -> tuple[Party, PurchasePayment, Optional[Purchase]]:
@@ -2976,7 +3004,7 @@ def cancel_purchase(purchase_id: int) -> PurchaseOut:
 
 @router.get("/supplier-summary/{party_id}", response_model=SupplierLedgerSummary)
 def supplier_summary(party_id: int) -> SupplierLedgerSummary:
-    with get_session() as session:
+    with get_read_session() as session:
         ensure_supplier(session, party_id)
         rows = session.exec(
             select(Purchase).where(Purchase.party_id == party_id, Purchase.is_deleted == False)  # noqa: E712
@@ -3002,13 +3030,17 @@ def supplier_summary(party_id: int) -> SupplierLedgerSummary:
                 PurchasePayment.is_deleted == False,  # noqa: E712
             )
         ).all()
-        active_payments: List[PurchasePayment] = []
-        for payment in payments:
-            if int(payment.purchase_id or 0) > 0:
-                purchase = session.get(Purchase, payment.purchase_id)
-                if not purchase or purchase.is_deleted:
-                    continue
-            active_payments.append(payment)
+        linked_ids = sorted({int(payment.purchase_id) for payment in payments if int(payment.purchase_id or 0) > 0})
+        live_ids: set[int] = set()
+        for chunk in chunked(linked_ids, IN_CHUNK_SIZE):
+            live_ids.update(
+                session.exec(
+                    select(Purchase.id).where(Purchase.id.in_(chunk), Purchase.is_deleted == False)  # noqa: E712
+                ).all()
+            )
+        active_payments = [
+            payment for payment in payments if int(payment.purchase_id or 0) <= 0 or int(payment.purchase_id) in live_ids
+        ]
         total_paid = round2(sum(float(row.amount or 0) for row in active_payments if not bool(row.is_writeoff)))
         total_writeoff = round2(sum(float(row.amount or 0) for row in active_payments if bool(row.is_writeoff)))
         outstanding = round2(total_purchases - total_returns - total_paid - total_writeoff + returned_settlement)
@@ -9,7 +9,7 @@ from backend.accounting import sync_bill_vouchers
 from backend.controls import assert_financial_year_unlocked, log_audit
 from backend.security import require_min_role
 from backend.utils.archive_rules import apply_archive_rules
-from backend.db import get_session
+from backend.db import get_read_session, get_session
 from backend.models import (
     Item, Bill, BillItem, BillPayment,
     Return, ReturnItem,
@@ -19,7 +19,7 @@ from backend.models import (
     ExchangeRecord,
     StockMovement,
 )
-from backend.inventory_lot_sync import item_stock_meta, sync_lot_quantity_for_item
+from backend.inventory_lot_sync import adjust_item_stock, item_stock_meta, sync_lot_quantity_for_item
 
 router = APIRouter()
 
@@ -592,7 +592,7 @@ def returns_dashboard_summary(
     from_date: Optional[str] = Query(None, description="YYYY-MM-DD"),
     to_date: Optional[str] = Query(None, description="YYYY-MM-DD (inclusive)"),
 ):
-    with get_session() as session:
+    with get_read_session() as session:
         stmt = select(Return)
         if from_date:
             stmt = stmt.where(Return.date_time >= f"{from_date}T00:00:00")
@@ -1059,8 +1059,7 @@ def create_return(payload: ReturnCreate):
                 qty = int(line.quantity)
 
                 # restock
-                itm.stock += qty
-                session.add(itm)
+                adjust_item_stock(session, itm, qty)
                 # ✅ unarchive if stock came back
                 apply_archive_rules(session, itm)
                 sync_lot_quantity_for_item(session, itm)
@@ -1350,8 +1349,7 @@ def create_exchange(payload: ExchangeCreate):
 
         # return items: stock IN + ledger
         for itm, qty in ret_items_map.values():
-            itm.stock += qty
-            session.add(itm)
+            adjust_item_stock(session, itm, qty)
             apply_archive_rules(session, itm)
             sync_lot_quantity_for_item(session, itm)
 
@@ -1423,10 +1421,8 @@ def create_exchange(payload: ExchangeCreate):
 
         # new items: stock OUT + ledger
         for itm, qty in new_items_map.values():
-            if itm.stock < qty:
+            if not adjust_item_stock(session, itm, -qty):
                 raise HTTPException(status_code=400, detail=f"Insufficient stock during exchange for {itm.name}")
-            itm.stock -= qty
-            session.add(itm)
             apply_archive_rules(session, itm)
             sync_lot_quantity_for_item(session, itm)
 
@@ -6,7 +6,17 @@ from sqlalchemy import func, or_
 from sqlmodel import select
 
 from backend.controls import log_audit
-from backend.db import get_session
+from backend.db import (
+    DB_FILE,
+    READ_POOL_SIZE,
+    READ_SQLITE_PRAGMAS,
+    SQLITE_PRAGMAS,
+    get_read_session,
+    get_session,
+    read_engine,
+    read_sqlite_runtime,
+)
+from backend.index_catalog import REQUIRED_INDEXES, explain_hot_queries, missing_indexes, unbuildable_indexes
 from backend.models import (
     AuditLog,
     AuditLogOut,
@@ -203,3 +213,45 @@ def list_audit_logs(
             )
         rows = session.exec(stmt.order_by(AuditLog.id.desc()).offset(offset).limit(limit)).all()
         return [AuditLogOut(**row.dict()) for row in rows]
+
+
+@router.get("/db-runtime")
+def db_runtime():
+    with get_session() as session:
+        active = read_sqlite_runtime(session)
+    with get_read_session() as session:
+        read_active = read_sqlite_runtime(session, READ_SQLITE_PRAGMAS)
+    return {
+        "db_path": str(DB_FILE),
+        "configured": dict(SQLITE_PRAGMAS),
+        "active": active,
+        "read_pool_size": READ_POOL_SIZE,
+        "read_configured": dict(READ_SQLITE_PRAGMAS),
+        "read_active": read_active,
+    }
+
+
+@router.get("/db-health")
+def db_health():
+    with read_engine.connect() as conn:
+        missing = missing_indexes(conn)
+        skipped = unbuildable_indexes(conn)
+        plans = explain_hot_queries(conn)
+    full_scans = [row for row in plans if row["full_scan"]]
+    failed_probes = [row for row in plans if row.get("error")]
+    return {
+        "ok": not missing and not skipped and not full_scans and not failed_probes,
+        "required_index_count": len(REQUIRED_INDEXES),
+        "missing_indexes": [
+            {"name": spec.name, "table": spec.table, "columns": list(spec.columns)}
+            for spec in missing
+        ],
+        # Their table or columns are absent, usually a migration that has not run.
+        "skipped_indexes": [
+            {"name": spec.name, "table": spec.table, "columns": list(spec.columns)}
+            for spec in skipped
+        ],
+        "unindexed_query_plans": full_scans,
+        "failed_query_plans": failed_probes,
+        "query_plans": plans,
+    }
@@ -9,7 +9,11 @@ from sqlmodel import delete, select
 
 from backend.accounting import ensure_accounting_setup, mark_voucher_deleted, sync_bill_vouchers
 from backend.controls import assert_financial_year_unlocked, log_audit
-from backend.db import get_session
+from backend.daybook import daybook_page, decode_cursor
+from backend.db import get_read_session, get_session
+from backend.ledger_balances import ledger_statement, trial_balance
+from backend.ledger_registry import invalidate_ledger_registry
+from backend.posting_queue import posting_queue_status, requeue_failed_postings
 from backend.models import (
     Bill,
     BillItem,
@@ -17,21 +21,14 @@ from backend.models import (
     BankbookEntry,
     CashbookEntry,
     Category,
-    ExchangeRecord,
     Item,
     Ledger,
     LedgerGroup,
     LedgerGroupOut,
     LedgerOut,
-    PackOpenEvent,
-    Party,
-    PartyReceipt,
-    Purchase,
-    PurchasePayment,
-    PurchaseReturn,
-    ReceiptBillAdjustment,
-    Return,
+    LedgerStatementOut,
     StockMovement,
+    TrialBalanceOut,
     Voucher,
     VoucherEntry,
     VoucherEntryOut,
@@ -41,6 +38,8 @@ from backend.models import (
     VoucherOut,
 )
 from backend.security import require_min_role
+from backend.stock_checkpoints import future_deltas
+from backend.voucher_resync import voucher_resync_progress
 
 router = APIRouter()
 
@@ -103,6 +102,37 @@ class SuspenseSaleOut(BaseModel):
     total_amount: float
 
 
+class PostingJobOut(BaseModel):
+    source_type: str
+    source_id: int
+    status: str
+    attempts: int
+    last_error: Optional[str] = None
+    enqueued_at: str
+    updated_at: str
+    next_attempt_at: Optional[str] = None
+
+
+class PostingQueueOut(BaseModel):
+    pending: int
+    done: int
+    failed: int
+    oldest_pending_at: Optional[str] = None
+    failed_jobs: List[PostingJobOut]
+
+
+class VoucherResyncOut(BaseModel):
+    status: str
+    phase: Optional[str] = None
+    last_id: int = 0
+    processed: int = 0
+    total: int = 0
+    started_at: Optional[str] = None
+    updated_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    error: Optional[str] = None
+
+
 class DatedStockOut(BaseModel):
     item_id: int
     product_id: Optional[int] = None
@@ -119,26 +149,31 @@ class DatedStockOut(BaseModel):
 def suspense_stock_availability(date: str = Query(..., description="YYYY-MM-DD")):
     normalized = _normalize_ymd(date, default_to_today=False)
     end_ts = f"{normalized}T23:59:59.999999"
-    with get_session() as session:
+    with get_read_session() as session:
         # Item.stock is the authoritative current balance. Some migrated client
         # databases do not have an OPENING movement for their legacy stock, so
         # summing movements from zero incorrectly hides otherwise valid batches.
         # Rewind the current balance instead, using the same effective-date logic
         # as the inventory stock ledger (including backdated purchase invoices).
-        from backend.routers.inventory import _future_delta_after_effective_ts
-
         rows = []
         # Do not filter archived batches here: a batch that is empty/archived now
         # may legitimately have had stock on the requested historical date.
-        for item in session.exec(select(Item).order_by(Item.name, Item.expiry_date, Item.id)).all():
+        items = session.exec(select(Item).order_by(Item.name, Item.expiry_date, Item.id)).all()
+        future_by_item = future_deltas(session, [int(item.id) for item in items], end_ts)
+        category_ids = {int(item.category_id) for item in items if item.category_id}
+        categories = {
+            int(category.id): category
+            for category in session.exec(select(Category).where(Category.id.in_(category_ids))).all()
+        } if category_ids else {}
+        for item in items:
             current_available = max(0, int(item.stock or 0))
-            historical_available = current_available - _future_delta_after_effective_ts(session, [int(item.id)], end_ts)
+            historical_available = current_available - future_by_item.get(int(item.id), 0)
             # Converting the missed sale also deducts stock now, so the selectable
             # amount cannot exceed either the historical or current balance.
             available = min(current_available, historical_available)
             if available <= 0:
                 continue
-            category = session.get(Category, int(item.category_id)) if item.category_id else None
+            category = categories.get(int(item.category_id)) if item.category_id else None
             rows.append(DatedStockOut(
                 item_id=int(item.id),
                 product_id=item.product_id,
@@ -166,20 +201,6 @@ def _round2(x: float) -> float:
     return float(f"{float(x or 0):.2f}")
 
 
-def _parse_note_party(notes: Optional[str]) -> Optional[str]:
-    raw = str(notes or "").strip()
-    if not raw:
-        return None
-    lowered = raw.lower()
-    if lowered.startswith("customer:"):
-        first_lines = raw.split("|", 1)[0].splitlines()
-        first = first_lines[0] if first_lines else ""
-        if ":" not in first:
-            return None
-        return first.split(":", 1)[1].strip() or None
-    return None
-
-
 @router.post("/suspense/{source_type}/{source_id}/sale", response_model=SuspenseSaleOut)
 def convert_suspense_receipt_to_sale(source_type: str, source_id: int, payload: SuspenseSaleIn):
     require_min_role("MANAGER", context="Convert suspense receipt to sale")
@@ -239,14 +260,9 @@ def convert_suspense_receipt_to_sale(source_type: str, source_id: int, payload:
         # starts from authoritative current stock and rewinds later movements, so
         # it also works for migrated databases whose legacy opening stock has no
         # corresponding StockMovement row.
-        from backend.routers.inventory import _future_delta_after_effective_ts
-
+        future_by_item = future_deltas(session, [int(item.id) for item, *_rest in prepared], bill_ts)
         for item, quantity, _unit_price, _line_total in prepared:
-            available_at_sale = int(item.stock or 0) - _future_delta_after_effective_ts(
-                session,
-                [int(item.id)],
-                bill_ts,
-            )
+            available_at_sale = int(item.stock or 0) - future_by_item[int(item.id)]
             if quantity > available_at_sale:
                 raise HTTPException(
                     status_code=400,
@@ -254,6 +270,7 @@ def convert_suspense_receipt_to_sale(source_type: str, source_id: int, payload:
                 )
 
         from backend.routers.billing import assign_bill_number, resolve_bill_party_links
+        from backend.inventory_lot_sync import adjust_item_stock
         from backend.routers.inventory import sync_lot_quantity_for_item
         from backend.utils.archive_rules import apply_archive_rules
 
@@ -287,8 +304,8 @@ def convert_suspense_receipt_to_sale(source_type: str, source_id: int, payload:
         session.flush()
         bill_number = assign_bill_number(session, bill, backdated=True)
         for item, quantity, unit_price, line_total in prepared:
-            item.stock = int(item.stock or 0) - quantity
-            session.add(item)
+            if not adjust_item_stock(session, item, -quantity):
+                raise HTTPException(status_code=400, detail=f"Invalid quantity for {item.name}; available stock is {item.stock}")
             apply_archive_rules(session, item)
             sync_lot_quantity_for_item(session, item, ts=bill_ts)
             session.add(BillItem(
@@ -346,23 +363,6 @@ def _normalize_ymd(value: Optional[str], *, default_to_today: bool) -> str:
         raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
 
 
-def _row_matches(row: VoucherDayBookRow, q: str, voucher_type: Optional[str]) -> bool:
-    if voucher_type and row.voucher_type != voucher_type:
-        return False
-    if not q:
-        return True
-    haystack = " | ".join(
-        [
-            str(row.voucher_no or ""),
-            str(row.party_name or ""),
-            str(row.narration or ""),
-            str(row.source_type or ""),
-            str(row.voucher_type or ""),
-        ]
-    ).lower()
-    return q in haystack
-
-
 def _voucher_out(session, voucher: Voucher) -> VoucherOut:
     entries = session.exec(
         select(VoucherEntry).where(VoucherEntry.voucher_id == voucher.id).order_by(VoucherEntry.sort_order.asc(), VoucherEntry.id.asc())
@@ -501,6 +501,37 @@ def list_ledgers(
         return [LedgerOut(**row.dict()) for row in rows]
 
 
+@router.get("/trial-balance", response_model=TrialBalanceOut)
+def get_trial_balance(
+    from_date: Optional[str] = Query(None, description="YYYY-MM-DD; omit for balances since inception"),
+    to_date: Optional[str] = Query(None, description="YYYY-MM-DD; defaults to today"),
+):
+    normalized_from = _normalize_ymd(from_date, default_to_today=False) if from_date else None
+    normalized_to = _normalize_ymd(to_date, default_to_today=True)
+    if normalized_from and normalized_from > normalized_to:
+        raise HTTPException(status_code=400, detail="From date cannot be after To date")
+    with get_read_session() as session:
+        return TrialBalanceOut(**trial_balance(session, from_date=normalized_from, to_date=normalized_to))
+
+
+@router.get("/ledgers/{ledger_id}/statement", response_model=LedgerStatementOut)
+def get_ledger_statement(
+    ledger_id: int,
+    from_date: Optional[str] = Query(None, description="YYYY-MM-DD; defaults to today"),
+    to_date: Optional[str] = Query(None, description="YYYY-MM-DD; defaults to today"),
+):
+    normalized_from = _normalize_ymd(from_date, default_to_today=True)
+    normalized_to = _normalize_ymd(to_date, default_to_today=True)
+    if normalized_from > normalized_to:
+        raise HTTPException(status_code=400, detail="From date cannot be after To date")
+    with get_read_session() as session:
+        ledger = session.get(Ledger, ledger_id)
+        if not ledger:
+            raise HTTPException(status_code=404, detail="Ledger not found")
+        statement = ledger_statement(session, int(ledger.id), from_date=normalized_from, to_date=normalized_to)
+        return LedgerStatementOut(**statement, ledger_name=ledger.name)
+
+
 @router.post("/ledgers", response_model=LedgerOut)
 def create_ledger(payload: LedgerCreateIn):
     require_min_role("MANAGER", context="Ledger creation")
@@ -545,6 +576,7 @@ def create_ledger(payload: LedgerCreateIn):
             details={"group_id": int(group.id), "group_name": group.name},
         )
         session.commit()
+        invalidate_ledger_registry(session)
         session.refresh(row)
         return LedgerOut(**row.dict())
 
@@ -560,10 +592,9 @@ def suspense_statement(
         raise HTTPException(status_code=400, detail="From date cannot be after To date")
 
     with get_session() as session:
-        ledgers = ensure_accounting_setup(session)
-        suspense = ledgers["SUSPENSE_ACCOUNT"]
+        suspense_id = ensure_accounting_setup(session)["SUSPENSE_ACCOUNT"].id
         session.commit()
-        session.refresh(suspense)
+        suspense = session.get(Ledger, suspense_id)
 
         opening_balance = 0.0
         if normalized_from:
@@ -900,387 +931,68 @@ def daybook(
     q: Optional[str] = Query(None, description="Search by voucher no, party, narration"),
     deleted_filter: str = Query("active", pattern="^(active|deleted|all)$"),
     include_stock_journal: bool = Query(True),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(200, ge=1, le=1000),
 ):
     start_date = _normalize_ymd(from_date, default_to_today=True)
     end_date = _normalize_ymd(to_date or start_date, default_to_today=False)
     if start_date > end_date:
         raise HTTPException(status_code=400, detail="from_date cannot be after to_date")
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-    start_iso = f"{start_date}T00:00:00"
-    end_iso = f"{end_date}T23:59:59"
-    query_text = str(q or "").strip().lower()
-    normalized_voucher_type = str(voucher_type or "").strip().upper() or None
-
-    with get_session() as session:
-        party_map = {
-            int(p.id): str(p.name or "").strip()
-            for p in session.exec(select(Party)).all()
-            if p.id is not None
-        }
-        receipt_adjustment_payment_ids = {
-            int(row.bill_payment_id)
-            for row in session.exec(select(ReceiptBillAdjustment)).all()
-            if row.bill_payment_id is not None
-        }
-
-        rows: List[VoucherDayBookRow] = []
-
-        bill_stmt = select(Bill).where(Bill.date_time >= start_iso, Bill.date_time <= end_iso)
-        if deleted_filter == "active":
-            bill_stmt = bill_stmt.where(Bill.is_deleted == False)  # noqa: E712
-        elif deleted_filter == "deleted":
-            bill_stmt = bill_stmt.where(Bill.is_deleted == True)  # noqa: E712
-        for bill in session.exec(bill_stmt).all():
-            rows.append(
-                VoucherDayBookRow(
-                    ts=bill.date_time,
-                    voucher_type="SALE",
-                    source_type="BILL",
-                    source_id=int(bill.id or 0),
-                    voucher_no=f"S-{bill.id}",
-                    party_name=_parse_note_party(bill.notes),
-                    narration=bill.notes or f"Sales bill #{bill.id}",
-                    amount=_round2(bill.total_amount),
-                    cash_amount=_round2(bill.payment_cash),
-                    online_amount=_round2(bill.payment_online),
-                    status=bill.payment_status,
-                    is_deleted=bool(bill.is_deleted),
-                )
-            )
-
-        receipt_stmt = select(BillPayment).where(
-            BillPayment.received_at >= start_iso,
-            BillPayment.received_at <= end_iso,
-        )
-        if deleted_filter == "active":
-            receipt_stmt = receipt_stmt.where(BillPayment.is_deleted == False)  # noqa: E712
-        elif deleted_filter == "deleted":
-            receipt_stmt = receipt_stmt.where(BillPayment.is_deleted == True)  # noqa: E712
-        for payment in session.exec(receipt_stmt).all():
-            bill = session.get(Bill, payment.bill_id)
-            if not bill:
-                continue
-            is_deleted = bool(payment.is_deleted) or bool(bill.is_deleted)
-            if deleted_filter == "active" and is_deleted:
-                continue
-            if deleted_filter == "deleted" and not is_deleted:
-                continue
-            auto_note = str(payment.note or "").strip().lower()
-            if auto_note == "auto: payment at bill creation":
-                continue
-            if int(payment.id or 0) in receipt_adjustment_payment_ids:
-                continue
-            rows.append(
-                VoucherDayBookRow(
-                    ts=payment.received_at,
-                    voucher_type="WRITE_OFF" if bool(getattr(payment, "is_writeoff", False)) else "RECEIPT",
-                    source_type="BILL_PAYMENT",
-                    source_id=int(payment.id or 0),
-                    voucher_no=f"{'BW' if bool(getattr(payment, 'is_writeoff', False)) else 'BR'}-{payment.id}",
-                    party_name=_parse_note_party(bill.notes),
-                    narration=payment.note or (
-                        f"Write-off against bill #{payment.bill_id}"
-                        if bool(getattr(payment, "is_writeoff", False))
-                        else f"Receipt against bill #{payment.bill_id}"
-                    ),
-                    amount=_round2(
-                        float(getattr(payment, "writeoff_amount", 0) or 0)
-                        if bool(getattr(payment, "is_writeoff", False))
-                        else float(payment.cash_amount or 0) + float(payment.online_amount or 0)
-                    ),
-                    cash_amount=0.0 if bool(getattr(payment, "is_writeoff", False)) else _round2(payment.cash_amount),
-                    online_amount=0.0 if bool(getattr(payment, "is_writeoff", False)) else _round2(payment.online_amount),
-                    status="DELETED" if is_deleted else bill.payment_status,
-                    is_deleted=is_deleted,
-                )
-            )
-
-        purchase_stmt = select(Purchase).where(Purchase.created_at >= start_iso, Purchase.created_at <= end_iso)
-        if deleted_filter == "active":
-            purchase_stmt = purchase_stmt.where(Purchase.is_deleted == False)  # noqa: E712
-        elif deleted_filter == "deleted":
-            purchase_stmt = purchase_stmt.where(Purchase.is_deleted == True)  # noqa: E712
-        for purchase in session.exec(purchase_stmt).all():
-            rows.append(
-                VoucherDayBookRow(
-                    ts=purchase.created_at,
-                    voucher_type="PURCHASE",
-                    source_type="PURCHASE",
-                    source_id=int(purchase.id or 0),
-                    voucher_no=f"P-{purchase.id}",
-                    party_name=party_map.get(int(purchase.party_id or 0)),
-                    narration=purchase.notes or f"Purchase invoice {purchase.invoice_number}",
-                    amount=_round2(purchase.total_amount),
-                    cash_amount=0.0,
-                    online_amount=0.0,
-                    status=purchase.payment_status,
-                    is_deleted=bool(purchase.is_deleted),
-                )
-            )
-
-        purchase_return_stmt = select(PurchaseReturn).where(
-            PurchaseReturn.return_date >= start_date,
-            PurchaseReturn.return_date <= end_date,
+    with get_read_session() as session:
+        rows, summary, next_cursor = daybook_page(
+            session,
+            start_date=start_date,
+            end_date=end_date,
+            voucher_type=str(voucher_type or "").strip().upper() or None,
+            q=str(q or "").strip().lower(),
+            deleted_filter=deleted_filter,
+            include_stock_journal=include_stock_journal,
+            cursor=after,
+            limit=limit,
         )
-        if deleted_filter == "active":
-            purchase_return_stmt = purchase_return_stmt.where(PurchaseReturn.is_deleted == False)  # noqa: E712
-        elif deleted_filter == "deleted":
-            purchase_return_stmt = purchase_return_stmt.where(PurchaseReturn.is_deleted == True)  # noqa: E712
-        for purchase_return in session.exec(purchase_return_stmt).all():
-            rows.append(
-                VoucherDayBookRow(
-                    ts=f"{purchase_return.return_date}T00:00:00",
-                    voucher_type="PURCHASE_RETURN",
-                    source_type="PURCHASE_RETURN",
-                    source_id=int(purchase_return.id or 0),
-                    voucher_no=purchase_return.return_number,
-                    party_name=party_map.get(int(purchase_return.party_id or 0)),
-                    narration=purchase_return.notes or f"Purchase return {purchase_return.return_number}",
-                    amount=_round2(purchase_return.total_amount),
-                    cash_amount=_round2(purchase_return.refund_cash),
-                    online_amount=_round2(purchase_return.refund_online),
-                    status="DELETED" if purchase_return.is_deleted else "POSTED",
-                    is_deleted=bool(purchase_return.is_deleted),
-                )
-            )
-
-        journal_stmt = select(Voucher).where(
-            Voucher.voucher_type == "JOURNAL",
-            Voucher.source_type == "MANUAL_JOURNAL",
-            Voucher.voucher_date >= start_date,
-            Voucher.voucher_date <= end_date,
+        return VoucherDayBookOut(
+            from_date=start_date,
+            to_date=end_date,
+            rows=[VoucherDayBookRow(**row) for row in rows],
+            summary=VoucherDayBookSummary(**summary),
+            next_cursor=next_cursor,
         )
-        if deleted_filter == "active":
-            journal_stmt = journal_stmt.where(Voucher.is_deleted == False)  # noqa: E712
-        elif deleted_filter == "deleted":
-            journal_stmt = journal_stmt.where(Voucher.is_deleted == True)  # noqa: E712
-        for voucher in session.exec(journal_stmt).all():
-            rows.append(
-                VoucherDayBookRow(
-                    ts=f"{voucher.voucher_date}T00:00:00",
-                    voucher_type="JOURNAL",
-                    source_type="MANUAL_JOURNAL",
-                    source_id=int(voucher.id or 0),
-                    voucher_no=voucher.voucher_no,
-                    narration=voucher.narration or "Journal entry",
-                    amount=_round2(voucher.total_amount),
-                    cash_amount=0.0,
-                    online_amount=0.0,
-                    status="DELETED" if bool(voucher.is_deleted) else "POSTED",
-                    is_deleted=bool(voucher.is_deleted),
-                )
-            )
 
-        purchase_payment_stmt = select(PurchasePayment).where(
-            PurchasePayment.paid_at >= start_iso,
-            PurchasePayment.paid_at <= end_iso,
-        )
-        if deleted_filter == "active":
-            purchase_payment_stmt = purchase_payment_stmt.where(PurchasePayment.is_deleted == False)  # noqa: E712
-        elif deleted_filter == "deleted":
-            purchase_payment_stmt = purchase_payment_stmt.where(PurchasePayment.is_deleted == True)  # noqa: E712
-        for payment in session.exec(purchase_payment_stmt).all():
-            purchase = session.get(Purchase, payment.purchase_id) if int(payment.purchase_id or 0) > 0 else None
-            payment_party_id = int(purchase.party_id or 0) if purchase else int(getattr(payment, "party_id", 0) or 0)
-            if not payment_party_id:
-                continue
-            is_deleted = bool(payment.is_deleted) or bool(getattr(purchase, "is_deleted", False))
-            if deleted_filter == "active" and is_deleted:
-                continue
-            if deleted_filter == "deleted" and not is_deleted:
-                continue
-            transaction_suffix = f" | Txn {payment.transaction_id}" if getattr(payment, "transaction_id", None) else ""
-            rows.append(
-                VoucherDayBookRow(
-                    ts=payment.paid_at,
-                    voucher_type="WRITE_OFF" if bool(payment.is_writeoff) else "PAYMENT",
-                    source_type="PURCHASE_PAYMENT",
-                    source_id=int(payment.id or 0),
-                    voucher_no=f"PP-{payment.id}",
-                    party_name=party_map.get(payment_party_id),
-                    narration=(payment.note or (
-                        f"Payment for purchase {purchase.invoice_number}"
-                        if purchase
-                        else "Supplier payment without purchase"
-                    )) + transaction_suffix,
-                    amount=_round2(payment.amount),
-                    cash_amount=0.0 if bool(payment.is_writeoff) else _round2(getattr(payment, "cash_amount", 0.0)),
-                    online_amount=0.0 if bool(payment.is_writeoff) else _round2(getattr(payment, "online_amount", 0.0)),
-                    status="DELETED" if is_deleted else (purchase.payment_status if purchase else "PAID"),
-                    is_deleted=is_deleted,
-                )
-            )
-            bank_charges = _round2(float(getattr(payment, "txn_charges", 0) or 0))
-            if not bool(payment.is_writeoff) and bank_charges > 0 and float(getattr(payment, "online_amount", 0) or 0) > 0:
-                rows.append(
-                    VoucherDayBookRow(
-                        ts=payment.paid_at,
-                        voucher_type="EXPENSE",
-                        source_type="PURCHASE_PAYMENT_CHARGE",
-                        source_id=int(payment.id or 0),
-                        voucher_no=f"PBC-{payment.id}",
-                        party_name=party_map.get(payment_party_id),
-                        narration=(payment.note or (
-                            f"Bank charges for purchase {purchase.invoice_number}"
-                            if purchase
-                            else "Bank charges for supplier payment"
-                        )) + transaction_suffix,
-                        amount=bank_charges,
-                        cash_amount=0.0,
-                        online_amount=bank_charges,
-                        status="DELETED" if is_deleted else "POSTED",
-                        is_deleted=is_deleted,
-                    )
-                )
 
-        party_receipt_stmt = select(PartyReceipt).where(
-            PartyReceipt.received_at >= start_iso,
-            PartyReceipt.received_at <= end_iso,
-        )
-        if deleted_filter == "active":
-            party_receipt_stmt = party_receipt_stmt.where(PartyReceipt.is_deleted == False)  # noqa: E712
-        elif deleted_filter == "deleted":
-            party_receipt_stmt = party_receipt_stmt.where(PartyReceipt.is_deleted == True)  # noqa: E712
-        for receipt in session.exec(party_receipt_stmt).all():
-            rows.append(
-                VoucherDayBookRow(
-                    ts=receipt.received_at,
-                    voucher_type="RECEIPT",
-                    source_type="PARTY_RECEIPT",
-                    source_id=int(receipt.id or 0),
-                    voucher_no=f"R-{receipt.id}",
-                    party_name=party_map.get(int(receipt.party_id or 0)),
-                    narration=receipt.note or "Customer receipt",
-                    amount=_round2(receipt.total_amount),
-                    cash_amount=_round2(receipt.cash_amount),
-                    online_amount=_round2(receipt.online_amount),
-                    status="ON_ACCOUNT" if _round2(receipt.unallocated_amount) > 0 else "ADJUSTED",
-                    is_deleted=bool(receipt.is_deleted),
-                )
-            )
+def _posting_queue_out(session) -> PostingQueueOut:
+    status = posting_queue_status(session)
+    return PostingQueueOut(
+        **{key: value for key, value in status.items() if key != "failed_jobs"},
+        failed_jobs=[PostingJobOut(**job.dict()) for job in status["failed_jobs"]],
+    )
 
-        return_stmt = select(Return).where(Return.date_time >= start_iso, Return.date_time <= end_iso)
-        for row in session.exec(return_stmt).all():
-            rows.append(
-                VoucherDayBookRow(
-                    ts=row.date_time,
-                    voucher_type="RETURN",
-                    source_type="RETURN",
-                    source_id=int(row.id or 0),
-                    voucher_no=f"RET-{row.id}",
-                    narration=row.notes or (f"Return against bill #{row.source_bill_id}" if row.source_bill_id else "Return"),
-                    amount=_round2(row.subtotal_return),
-                    cash_amount=_round2(row.refund_cash),
-                    online_amount=_round2(row.refund_online),
-                    status=None,
-                    is_deleted=False,
-                )
-            )
 
-        exchange_stmt = select(ExchangeRecord).where(
-            ExchangeRecord.created_at >= start_iso,
-            ExchangeRecord.created_at <= end_iso,
-        )
-        for row in session.exec(exchange_stmt).all():
-            amount = _round2(abs(float(row.net_due or 0))) if float(row.net_due or 0) else _round2(row.theoretical_net)
-            rows.append(
-                VoucherDayBookRow(
-                    ts=row.created_at,
-                    voucher_type="EXCHANGE",
-                    source_type="EXCHANGE",
-                    source_id=int(row.id or 0),
-                    voucher_no=f"EX-{row.id}",
-                    narration=row.notes or (f"Exchange against bill #{row.source_bill_id}" if row.source_bill_id else "Exchange"),
-                    amount=amount,
-                    cash_amount=_round2(float(row.payment_cash or 0) + float(row.refund_cash or 0)),
-                    online_amount=_round2(float(row.payment_online or 0) + float(row.refund_online or 0)),
-                    status=None,
-                    is_deleted=False,
-                )
-            )
+@router.get("/posting-queue", response_model=PostingQueueOut)
+def posting_queue():
+    with get_read_session() as session:
+        return _posting_queue_out(session)
 
-        cashbook_stmt = select(CashbookEntry).where(
-            CashbookEntry.created_at >= start_iso,
-            CashbookEntry.created_at <= end_iso,
-        )
-        for entry in session.exec(cashbook_stmt).all():
-            entry_type = str(entry.entry_type or "").upper()
-            rows.append(
-                VoucherDayBookRow(
-                    ts=entry.created_at,
-                    voucher_type="EXPENSE" if entry_type == "EXPENSE" else entry_type,
-                    source_type="CASHBOOK",
-                    source_id=int(entry.id or 0),
-                    voucher_no=f"CB-{entry.id}",
-                    narration=entry.note or f"Cashbook {entry_type.lower()}",
-                    amount=_round2(entry.amount),
-                    cash_amount=_round2(entry.amount) if entry_type == "RECEIPT" else 0.0,
-                    online_amount=0.0,
-                    status=None,
-                    is_deleted=False,
-                )
-            )
 
-        if include_stock_journal:
-            pack_open_stmt = select(PackOpenEvent).where(
-                PackOpenEvent.created_at >= start_iso,
-                PackOpenEvent.created_at <= end_iso,
-            )
-            for event in session.exec(pack_open_stmt).all():
-                rows.append(
-                    VoucherDayBookRow(
-                        ts=event.created_at,
-                        voucher_type="STOCK_JOURNAL",
-                        source_type="PACK_OPEN",
-                        source_id=int(event.id or 0),
-                        voucher_no=f"SJ-{event.id}",
-                        narration=event.note or f"Opened {event.packs_opened} pack(s) into {event.loose_units_created} loose units",
-                        amount=_round2(event.loose_units_created),
-                        cash_amount=0.0,
-                        online_amount=0.0,
-                        status=None,
-                        is_deleted=False,
-                    )
-                )
+@router.post("/posting-queue/retry", response_model=PostingQueueOut)
+def retry_failed_postings():
+    require_min_role("MANAGER", context="Voucher posting retry")
+    with get_session() as session:
+        requeue_failed_postings(session)
+        session.commit()
+        return _posting_queue_out(session)
 
-        filtered_rows = [
-            row for row in rows
-            if _row_matches(row, query_text, normalized_voucher_type)
-        ]
-        filtered_rows.sort(key=lambda row: (row.ts, row.source_id), reverse=True)
-
-        summary = VoucherDayBookSummary(total_rows=len(filtered_rows))
-        for row in filtered_rows:
-            amount = _round2(row.amount)
-            if row.voucher_type == "SALE":
-                summary.sales_total = _round2(summary.sales_total + amount)
-            elif row.voucher_type == "PURCHASE":
-                summary.purchase_total = _round2(summary.purchase_total + amount)
-            elif row.voucher_type == "JOURNAL":
-                summary.journal_total = _round2(summary.journal_total + amount)
-            elif row.voucher_type == "RECEIPT":
-                summary.receipt_total = _round2(summary.receipt_total + amount)
-            elif row.voucher_type == "PAYMENT":
-                summary.payment_total = _round2(summary.payment_total + amount)
-            elif row.voucher_type in {"RETURN", "PURCHASE_RETURN"}:
-                summary.return_total = _round2(summary.return_total + amount)
-            elif row.voucher_type == "EXCHANGE":
-                summary.exchange_total = _round2(summary.exchange_total + amount)
-            elif row.voucher_type == "EXPENSE":
-                summary.expense_total = _round2(summary.expense_total + amount)
-            elif row.voucher_type == "WITHDRAWAL":
-                summary.withdrawal_total = _round2(summary.withdrawal_total + amount)
-            elif row.voucher_type == "STOCK_JOURNAL":
-                summary.stock_journal_count += 1
-            elif row.voucher_type == "WRITE_OFF":
-                summary.writeoff_total = _round2(summary.writeoff_total + amount)
 
-        return VoucherDayBookOut(
-            from_date=start_date,
-            to_date=end_date,
-            rows=filtered_rows,
-            summary=summary,
-        )
+@router.get("/resync-progress", response_model=VoucherResyncOut)
+def voucher_resync():
+    with get_read_session() as session:
+        progress = voucher_resync_progress(session)
+        totals = progress.pop("totals", None) or {}
+        return VoucherResyncOut(**progress, total=sum(totals.values()))
 
 
 @router.get("/{voucher_id}", response_model=VoucherOut)
@@ -0,0 +1,149 @@
+"""SQLite FTS5 (trigram) search tables behind the counter search boxes.
+
+Each ``*_fts`` table mirrors the searchable text of one source table and is
+kept current by SQLite triggers, so every writer (ORM, raw SQL repairs,
+migrations) updates it without extra code. The trigram tokenizer gives the
+same case-insensitive substring semantics as the ``ilike '%q%'`` filters it
+replaces, but answers from the index instead of scanning the table.
+
+Endpoints call ``match_rowids`` and fall back to their LIKE filters when it
+returns ``None``: for queries shorter than one trigram, or on a database the
+``fts_search_index`` migration has not reached yet.
+"""
+
+from typing import List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import column, literal_column, select, table, text
+
+MIN_FTS_QUERY_LEN = 3
+
+
+class FtsSpec(NamedTuple):
+    name: str
+    source: str
+    columns: Tuple[str, ...]
+
+
+# External-content tables: the FTS row id is the source row id and the
+# indexed columns are read straight from the source table.
+CONTENT_FTS: List[FtsSpec] = [
+    FtsSpec("item_fts", "item", ("name", "brand")),
+    FtsSpec("product_fts", "product", ("name", "alias", "brand")),
+    FtsSpec("party_fts", "party", ("name", "phone", "address_line", "gst_number")),
+    FtsSpec("movement_fts", "stockmovement", ("reason", "ref_type", "note")),
+]
+
+# Bills are searched by number, notes and the names/brands of their lines, so
+# bill_fts stores its own text (rowid = bill.id) rebuilt per bill by triggers.
+_BILL_FTS_ROW_SQL = """
+    SELECT b.id,
+           COALESCE(b.bill_number, ''),
+           COALESCE(b.notes, ''),
+           COALESCE((
+               SELECT group_concat(COALESCE(bi.item_name, '') || ' ' || COALESCE(i.brand, ''), ' ')
+               FROM billitem bi LEFT JOIN item i ON i.id = bi.item_id
+               WHERE bi.bill_id = b.id
+           ), '')
+    FROM bill b
+"""
+
+
+def _fts_available(conn) -> bool:
+    try:
+        conn.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS temp._fts_probe USING fts5(x, tokenize='trigram')"))
+        conn.execute(text("DROP TABLE IF EXISTS temp._fts_probe"))
+    except Exception:
+        return False
+    return True
+
+
+def _content_fts_ddl(spec: FtsSpec) -> List[str]:
+    cols = ", ".join(spec.columns)
+    new_vals = ", ".join(f"new.{c}" for c in spec.columns)
+    old_vals = ", ".join(f"old.{c}" for c in spec.columns)
+    delete_old = f"INSERT INTO {spec.name}({spec.name}, rowid, {cols}) VALUES ('delete', old.id, {old_vals});"
+    insert_new = f"INSERT INTO {spec.name}(rowid, {cols}) VALUES (new.id, {new_vals});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {spec.name} USING fts5("
+        f"{cols}, content='{spec.source}', content_rowid='id', tokenize='trigram')",
+        f'CREATE TRIGGER IF NOT EXISTS {spec.name}_ai AFTER INSERT ON "{spec.source}" BEGIN {insert_new} END',
+        f'CREATE TRIGGER IF NOT EXISTS {spec.name}_ad AFTER DELETE ON "{spec.source}" BEGIN {delete_old} END',
+        f'CREATE TRIGGER IF NOT EXISTS {spec.name}_au AFTER UPDATE OF {cols} ON "{spec.source}" '
+        f"BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+def _bill_fts_ddl() -> List[str]:
+    def refresh(bill_id: str) -> str:
+        return (
+            f"DELETE FROM bill_fts WHERE rowid = {bill_id}; "
+            f"INSERT INTO bill_fts(rowid, bill_number, notes, lines) {_BILL_FTS_ROW_SQL} WHERE b.id = {bill_id};"
+        )
+
+    sold_bills = "SELECT DISTINCT bill_id FROM billitem WHERE item_id = new.id"
+
+    return [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS bill_fts USING fts5(bill_number, notes, lines, tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS bill_fts_ai AFTER INSERT ON bill BEGIN {refresh('new.id')} END",
+        f"CREATE TRIGGER IF NOT EXISTS bill_fts_au AFTER UPDATE OF bill_number, notes ON bill BEGIN {refresh('new.id')} END",
+        "CREATE TRIGGER IF NOT EXISTS bill_fts_ad AFTER DELETE ON bill BEGIN DELETE FROM bill_fts WHERE rowid = old.id; END",
+        f"CREATE TRIGGER IF NOT EXISTS bill_fts_line_ai AFTER INSERT ON billitem BEGIN {refresh('new.bill_id')} END",
+        f"CREATE TRIGGER IF NOT EXISTS bill_fts_line_ad AFTER DELETE ON billitem BEGIN {refresh('old.bill_id')} END",
+        "CREATE TRIGGER IF NOT EXISTS bill_fts_line_au AFTER UPDATE OF bill_id, item_id, item_name ON billitem "
+        f"BEGIN {refresh('old.bill_id')} {refresh('new.bill_id')} END",
+        # Line text carries the item's brand, so a rebrand re-indexes every bill that sold the item.
+        "CREATE TRIGGER IF NOT EXISTS bill_fts_item_brand_au AFTER UPDATE OF brand ON item "
+        "WHEN old.brand IS NOT new.brand BEGIN "
+        f"DELETE FROM bill_fts WHERE rowid IN ({sold_bills}); "
+        f"INSERT INTO bill_fts(rowid, bill_number, notes, lines) {_BILL_FTS_ROW_SQL} WHERE b.id IN ({sold_bills}); "
+        "END",
+    ]
+
+
+def create_search_index(conn) -> bool:
+    """Create the FTS tables and triggers and (re)build their contents.
+
+    Returns False without changing anything when this SQLite build has no
+    FTS5 trigram tokenizer; searches then keep using LIKE.
+    """
+    if not _fts_available(conn):
+        return False
+    for spec in CONTENT_FTS:
+        for ddl in _content_fts_ddl(spec):
+            conn.execute(text(ddl))
+    for ddl in _bill_fts_ddl():
+        conn.execute(text(ddl))
+    rebuild_search_index(conn)
+    return True
+
+
+def rebuild_search_index(conn) -> None:
+    for spec in CONTENT_FTS:
+        conn.execute(text(f"INSERT INTO {spec.name}({spec.name}) VALUES ('rebuild')"))
+    conn.execute(text("DELETE FROM bill_fts"))
+    conn.execute(text(f"INSERT INTO bill_fts(rowid, bill_number, notes, lines) {_BILL_FTS_ROW_SQL}"))
+
+
+def fts_query(value: str) -> str:
+    """Quote user input as a single FTS5 phrase (substring match under trigram)."""
+    return '"' + value.replace('"', '""') + '"'
+
+
+def match_rowids(session, name: str, q: Optional[str]):
+    """``SELECT id, rank`` of rows in ``name`` matching ``q``, best first.
+
+    Returns None when the caller should use its LIKE filter instead.
+    """
+    value = str(q or "").strip()
+    if len(value) < MIN_FTS_QUERY_LEN:
+        return None
+    exists = session.exec(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name").bindparams(name=name)
+    ).first()
+    if not exists:
+        return None
+    fts = table(name, column("rowid"), column("rank"))
+    return (
+        select(fts.c.rowid.label("id"), fts.c.rank.label("rank"))
+        .where(literal_column(name).op("MATCH")(fts_query(value)))
+    )
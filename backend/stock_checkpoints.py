@@ -0,0 +1,208 @@
+"""Month-end stock balance checkpoints for the StockMovement ledger.
+
+A ``StockBalanceCheckpoint`` row stores, for one item, the sum of every
+movement whose effective timestamp (purchase invoice date for purchase
+movements, otherwise ``ts``) falls on or before ``period_end``. A "stock as
+of X" lookup is then the latest checkpoint before X plus a short tail sum
+instead of an aggregate over the item's whole history.
+
+Each stored row is correct on its own. SQLite triggers delete the rows a
+backdated movement or an invoice-date change would make stale, and
+``refresh_stock_checkpoints`` (run on startup) fills in months closed since
+the last refresh, reading and writing under one write lock. A missing row only costs a longer tail, never a wrong
+balance.
+"""
+
+import calendar
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, case, func, literal, text
+from sqlmodel import select
+
+from backend.db import begin_immediate
+from backend.inventory_lot_sync import chunked
+from backend.models import Purchase, StockBalanceCheckpoint, StockMovement
+
+# Checkpoints cover every movement stamped on or before this time of period_end.
+DAY_END = "T23:59:59.999999"
+
+
+def purchase_stock_movement_join_condition():
+    return and_(
+        func.upper(func.coalesce(StockMovement.ref_type, "")) == "PURCHASE",
+        StockMovement.ref_id == Purchase.id,
+    )
+
+
+def stock_movement_effective_ts_expr():
+    return case(
+        (
+            and_(
+                func.upper(func.coalesce(StockMovement.ref_type, "")) == "PURCHASE",
+                Purchase.invoice_date.isnot(None),
+            ),
+            Purchase.invoice_date + literal("T00:00:00"),
+        ),
+        else_=StockMovement.ts,
+    )
+
+
+def _month_end(year_month: str) -> str:
+    year, month = int(year_month[:4]), int(year_month[5:7])
+    return f"{year_month}-{calendar.monthrange(year, month)[1]:02d}"
+
+
+def _last_closed_month_end(today: date) -> str:
+    year, month = (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+    return _month_end(f"{year:04d}-{month:02d}")
+
+
+def _latest_checkpoints(session, item_ids: List[int], before_date: Optional[str]) -> Dict[int, StockBalanceCheckpoint]:
+    latest_stmt = (
+        select(StockBalanceCheckpoint.item_id, func.max(StockBalanceCheckpoint.period_end).label("period_end"))
+        .where(StockBalanceCheckpoint.item_id.in_(item_ids))
+        .group_by(StockBalanceCheckpoint.item_id)
+    )
+    if before_date:
+        latest_stmt = latest_stmt.where(StockBalanceCheckpoint.period_end < before_date)
+    latest = latest_stmt.subquery()
+    rows = session.exec(
+        select(StockBalanceCheckpoint).join(
+            latest,
+            and_(
+                latest.c.item_id == StockBalanceCheckpoint.item_id,
+                latest.c.period_end == StockBalanceCheckpoint.period_end,
+            ),
+        )
+    ).all()
+    return {int(row.item_id): row for row in rows}
+
+
+def cumulative_deltas(session, item_ids: Iterable[int], through_ts: Optional[str] = None) -> Dict[int, int]:
+    """Per item, the sum of movement deltas effective on or before ``through_ts``.
+
+    With ``through_ts=None`` this is the item's whole ledger total.
+    """
+    ids = sorted({int(item_id) for item_id in item_ids})
+    totals: Dict[int, int] = {item_id: 0 for item_id in ids}
+    movement_ts = stock_movement_effective_ts_expr()
+    before_date = through_ts[:10] if through_ts else None
+    for chunk in chunked(ids):
+        checkpoints = _latest_checkpoints(session, chunk, before_date)
+        by_boundary: Dict[Optional[str], List[int]] = defaultdict(list)
+        for item_id in chunk:
+            checkpoint = checkpoints.get(item_id)
+            if checkpoint is not None:
+                totals[item_id] = int(checkpoint.balance or 0)
+            by_boundary[checkpoint.period_end if checkpoint is not None else None].append(item_id)
+
+        for boundary, boundary_ids in by_boundary.items():
+            tail_stmt = (
+                select(StockMovement.item_id, func.coalesce(func.sum(StockMovement.delta), 0))
+                .select_from(StockMovement)
+                .outerjoin(Purchase, purchase_stock_movement_join_condition())
+                .where(StockMovement.item_id.in_(boundary_ids))
+                .group_by(StockMovement.item_id)
+            )
+            if boundary:
+                tail_stmt = tail_stmt.where(movement_ts > f"{boundary}{DAY_END}")
+            if through_ts:
+                tail_stmt = tail_stmt.where(movement_ts <= through_ts)
+            for item_id, delta in session.exec(tail_stmt).all():
+                totals[int(item_id)] += int(delta or 0)
+    return totals
+
+
+def future_deltas(session, item_ids: Iterable[int], to_ts: Optional[str]) -> Dict[int, int]:
+    """Per item, the net movement effective after ``to_ts`` (0 when no date)."""
+    ids = [int(item_id) for item_id in item_ids]
+    if not to_ts:
+        return {item_id: 0 for item_id in ids}
+    ledger_totals = cumulative_deltas(session, ids)
+    through = cumulative_deltas(session, ids, to_ts)
+    return {item_id: ledger_totals[item_id] - through[item_id] for item_id in ids}
+
+
+def refresh_stock_checkpoints(session, today: Optional[date] = None) -> int:
+    """Write the missing month-end checkpoints up to the last closed month."""
+    last_closed = _last_closed_month_end(today or date.today())
+    # The trigger invalidations are deletes; holding the write lock from the
+    # first read keeps one from landing between the read and the inserts.
+    begin_immediate(session)
+    latest = (
+        select(StockBalanceCheckpoint.item_id, func.max(StockBalanceCheckpoint.period_end).label("period_end"))
+        .group_by(StockBalanceCheckpoint.item_id)
+        .subquery()
+    )
+    movement_ts = stock_movement_effective_ts_expr()
+    month = func.substr(movement_ts, 1, 7)
+    rows = session.exec(
+        select(StockMovement.item_id, month, func.sum(StockMovement.delta))
+        .select_from(StockMovement)
+        .outerjoin(Purchase, purchase_stock_movement_join_condition())
+        .outerjoin(latest, latest.c.item_id == StockMovement.item_id)
+        .where(movement_ts <= f"{last_closed}{DAY_END}")
+        .where((latest.c.period_end.is_(None)) | (movement_ts > latest.c.period_end + DAY_END))
+        .group_by(StockMovement.item_id, month)
+        .order_by(StockMovement.item_id, month)
+    ).all()
+    if not rows:
+        session.commit()
+        return 0
+
+    months_by_item: Dict[int, List[tuple]] = defaultdict(list)
+    for item_id, year_month, delta in rows:
+        if year_month:
+            months_by_item[int(item_id)].append((str(year_month), int(delta or 0)))
+
+    written = 0
+    for chunk in chunked(sorted(months_by_item)):
+        checkpoints = _latest_checkpoints(session, chunk, None)
+        for item_id in chunk:
+            checkpoint = checkpoints.get(item_id)
+            running = int(checkpoint.balance or 0) if checkpoint is not None else 0
+            for year_month, delta in months_by_item[item_id]:
+                running += delta
+                session.add(StockBalanceCheckpoint(item_id=item_id, period_end=_month_end(year_month), balance=running))
+                written += 1
+    session.commit()
+    return written
+
+
+def _effective_date_sql(ref: str) -> str:
+    return (
+        f"COALESCE((SELECT p.invoice_date FROM purchase p WHERE p.id = {ref}.ref_id "
+        f"AND UPPER(COALESCE({ref}.ref_type, '')) = 'PURCHASE'), SUBSTR({ref}.ts, 1, 10))"
+    )
+
+
+def _invalidate_sql(ref: str) -> str:
+    return (
+        f"DELETE FROM stockbalancecheckpoint WHERE item_id = {ref}.item_id "
+        f"AND period_end >= {_effective_date_sql(ref)};"
+    )
+
+
+_PURCHASE_MOVEMENTS = "FROM stockmovement sm WHERE UPPER(COALESCE(sm.ref_type, '')) = 'PURCHASE' AND sm.ref_id = new.id"
+
+_TRIGGERS = [
+    f"CREATE TRIGGER IF NOT EXISTS stock_checkpoint_ai AFTER INSERT ON stockmovement BEGIN {_invalidate_sql('new')} END",
+    f"CREATE TRIGGER IF NOT EXISTS stock_checkpoint_ad AFTER DELETE ON stockmovement BEGIN {_invalidate_sql('old')} END",
+    "CREATE TRIGGER IF NOT EXISTS stock_checkpoint_au "
+    "AFTER UPDATE OF item_id, delta, ts, ref_type, ref_id ON stockmovement "
+    f"BEGIN {_invalidate_sql('old')} {_invalidate_sql('new')} END",
+    "CREATE TRIGGER IF NOT EXISTS stock_checkpoint_purchase_au AFTER UPDATE OF invoice_date ON purchase BEGIN "
+    "DELETE FROM stockbalancecheckpoint "
+    f"WHERE item_id IN (SELECT sm.item_id {_PURCHASE_MOVEMENTS}) "
+    "AND period_end >= MIN("
+    "COALESCE(old.invoice_date, '9999-12-31'), COALESCE(new.invoice_date, '9999-12-31'), "
+    f"COALESCE((SELECT MIN(SUBSTR(sm.ts, 1, 10)) {_PURCHASE_MOVEMENTS}), '9999-12-31')); "
+    "END",
+]
+
+
+def install_stock_checkpoint_triggers(conn) -> None:
+    for ddl in _TRIGGERS:
+        conn.execute(text(ddl))
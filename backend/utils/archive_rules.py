@@ -1,9 +1,8 @@
 from typing import Optional
 
-from sqlalchemy import func, or_
 from sqlmodel import select
 
-from backend.models import Item
+from backend.models import Item, search_key
 
 
 def _norm(s: Optional[str]) -> str:
@@ -27,11 +26,7 @@ def apply_archive_rules(session, item: Item) -> bool:
     n = _norm(item.name)
     b = _norm(item.brand)  # treat None/"" same
 
-    group_stmt = select(Item).where(func.lower(Item.name) == func.lower(n))
-    if b == "":
-        group_stmt = group_stmt.where(or_(Item.brand.is_(None), func.trim(Item.brand) == ""))
-    else:
-        group_stmt = group_stmt.where(func.lower(func.coalesce(Item.brand, "")) == func.lower(b))
+    group_stmt = select(Item).where(Item.name_key == search_key(n), Item.brand_key == search_key(b))
 
     group = session.exec(group_stmt).all()
     if not group:
@@ -0,0 +1,396 @@
+"""Resumable re-posting of every historical voucher.
+
+Walks bills, purchases, purchase returns, purchase payments, customer
+receipts, bill payments and cashbook/bankbook entries in id order,
+``CHUNK_SIZE`` rows at a time. Each chunk preloads its existing vouchers and
+entries, the parties it references and the related bills/purchases/payments
+in a handful of IN-queries, re-posts through the ``backend.accounting``
+functions, and commits together with a cursor in ``appmeta``. A restart
+resumes from the last committed chunk.
+
+``upsert_voucher`` leaves vouchers whose header and lines are unchanged
+untouched, and sources that are deleted and already have a deleted voucher
+are skipped, so a run over an up-to-date database writes almost nothing.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import func, text
+from sqlmodel import Session, select
+
+from backend.accounting import (
+    clear_voucher_prefetch,
+    ensure_accounting_setup,
+    mark_voucher_deleted,
+    post_bill_payment_voucher,
+    post_party_receipt_voucher,
+    post_purchase_payment_voucher,
+    post_purchase_return_voucher,
+    post_purchase_voucher,
+    post_sales_voucher,
+    prefetch_vouchers,
+    round2,
+    sync_suspense_book_voucher,
+)
+from backend.models import (
+    BankbookEntry,
+    Bill,
+    BillPayment,
+    CashbookEntry,
+    Party,
+    PartyReceipt,
+    Purchase,
+    PurchasePayment,
+    PurchaseReturn,
+    ReceiptBillAdjustment,
+)
+
+logger = logging.getLogger("accounting.voucher_resync")
+
+CHUNK_SIZE = 500
+MAX_CHUNK_RETRIES = 5
+# Existing databases that finished the old one-shot sync keep this marker.
+DONE_KEY = "accounting_existing_vouchers_synced_v2_purchase_return_refunds"
+CURSOR_KEY = "accounting_voucher_resync_cursor"
+
+AUTO_PAYMENT_NOTE = "auto: payment at bill creation"
+
+
+def _now_ts() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _parties(session, ids) -> Dict[int, Party]:
+    wanted = sorted({int(i) for i in ids if int(i or 0) > 0})
+    if not wanted:
+        return {}
+    return {int(p.id): p for p in session.exec(select(Party).where(Party.id.in_(wanted))).all()}
+
+
+def _skip_deleted(found: Dict[tuple, object], source_type: str, source_id: int, is_deleted: bool) -> bool:
+    voucher = found.get((source_type, int(source_id)))
+    return bool(is_deleted and voucher is not None and voucher.is_deleted)
+
+
+# ---------- Phases: re-post one chunk of source rows ----------
+
+def _bills(session, rows: List[Bill]) -> None:
+    ids = [int(b.id) for b in rows]
+    found = prefetch_vouchers(session, ["BILL"], ids)
+    _parties(session, [b.party_id or 0 for b in rows])
+    payments: Dict[int, List[BillPayment]] = defaultdict(list)
+    for payment in session.exec(
+        select(BillPayment).where(BillPayment.bill_id.in_(ids), BillPayment.is_deleted == False)  # noqa: E712
+    ).all():
+        payments[int(payment.bill_id)].append(payment)
+    for bill in rows:
+        if _skip_deleted(found, "BILL", bill.id, bool(bill.is_deleted)):
+            continue
+        post_sales_voucher(session, bill, payments=payments[int(bill.id)])
+        if bool(bill.is_deleted):
+            mark_voucher_deleted(session, source_type="BILL", source_id=int(bill.id))
+
+
+def _purchases(session, rows: List[Purchase]) -> None:
+    found = prefetch_vouchers(session, ["PURCHASE"], [int(p.id) for p in rows])
+    parties = _parties(session, [p.party_id for p in rows])
+    for purchase in rows:
+        party = parties.get(int(purchase.party_id or 0))
+        if not party or _skip_deleted(found, "PURCHASE", purchase.id, bool(purchase.is_deleted)):
+            continue
+        post_purchase_voucher(session, purchase, party)
+        if bool(purchase.is_deleted):
+            mark_voucher_deleted(session, source_type="PURCHASE", source_id=int(purchase.id))
+
+
+def _purchase_returns(session, rows: List[PurchaseReturn]) -> None:
+    found = prefetch_vouchers(session, ["PURCHASE_RETURN"], [int(r.id) for r in rows])
+    parties = _parties(session, [r.party_id for r in rows])
+    for purchase_return in rows:
+        party = parties.get(int(purchase_return.party_id or 0))
+        if not party or round2(purchase_return.total_amount) <= 0:
+            continue
+        if _skip_deleted(found, "PURCHASE_RETURN", purchase_return.id, bool(purchase_return.is_deleted)):
+            continue
+        post_purchase_return_voucher(session, purchase_return, party)
+        if bool(purchase_return.is_deleted):
+            mark_voucher_deleted(session, source_type="PURCHASE_RETURN", source_id=int(purchase_return.id))
+
+
+def _purchase_payments(session, rows: List[PurchasePayment]) -> None:
+    found = prefetch_vouchers(session, ["PURCHASE_PAYMENT", "PURCHASE_WRITEOFF"], [int(p.id) for p in rows])
+    purchase_ids = sorted({int(p.purchase_id) for p in rows if int(p.purchase_id or 0) > 0})
+    purchases = {
+        int(p.id): p
+        for p in (session.exec(select(Purchase).where(Purchase.id.in_(purchase_ids))).all() if purchase_ids else [])
+    }
+    parties = _parties(
+        session,
+        [purchase.party_id for purchase in purchases.values()] + [p.party_id or 0 for p in rows],
+    )
+    for payment in rows:
+        purchase = purchases.get(int(payment.purchase_id or 0))
+        party_id = int(purchase.party_id or 0) if purchase else int(payment.party_id or 0)
+        party = parties.get(party_id)
+        if not party:
+            continue
+        source_type = "PURCHASE_WRITEOFF" if bool(payment.is_writeoff) else "PURCHASE_PAYMENT"
+        is_deleted = bool(payment.is_deleted) or bool(getattr(purchase, "is_deleted", False))
+        if _skip_deleted(found, source_type, payment.id, is_deleted):
+            continue
+        post_purchase_payment_voucher(
+            session,
+            purchase,
+            party,
+            int(payment.id or 0),
+            float(payment.amount or 0),
+            bool(payment.is_writeoff),
+            payment.note,
+            payment.paid_at,
+            float(getattr(payment, "cash_amount", 0) or 0),
+            float(getattr(payment, "online_amount", 0) or 0),
+            getattr(payment, "bank_mode", None),
+            float(getattr(payment, "txn_charges", 0) or 0),
+            getattr(payment, "transaction_id", None),
+        )
+        if is_deleted:
+            mark_voucher_deleted(session, source_type=source_type, source_id=int(payment.id or 0))
+
+
+def _party_receipts(session, rows: List[PartyReceipt]) -> None:
+    found = prefetch_vouchers(session, ["PARTY_RECEIPT"], [int(r.id) for r in rows])
+    parties = _parties(session, [r.party_id for r in rows])
+    for receipt in rows:
+        party = parties.get(int(receipt.party_id or 0))
+        if not party or _skip_deleted(found, "PARTY_RECEIPT", receipt.id, bool(receipt.is_deleted)):
+            continue
+        post_party_receipt_voucher(
+            session,
+            int(receipt.id or 0),
+            party,
+            receipt.received_at,
+            float(receipt.total_amount or 0),
+            float(receipt.cash_amount or 0),
+            float(receipt.online_amount or 0),
+            receipt.note,
+        )
+        if bool(receipt.is_deleted):
+            mark_voucher_deleted(session, source_type="PARTY_RECEIPT", source_id=int(receipt.id or 0))
+
+
+def _bill_payments(session, rows: List[BillPayment]) -> None:
+    ids = [int(p.id) for p in rows]
+    managed = {
+        int(payment_id)
+        for payment_id in session.exec(
+            select(ReceiptBillAdjustment.bill_payment_id).where(ReceiptBillAdjustment.bill_payment_id.in_(ids))
+        ).all()
+    }
+    rows = [
+        p for p in rows
+        if int(p.id) not in managed and str(p.note or "").strip().lower() != AUTO_PAYMENT_NOTE
+    ]
+    found = prefetch_vouchers(session, ["BILL_PAYMENT"], [int(p.id) for p in rows])
+    bill_ids = sorted({int(p.bill_id) for p in rows})
+    bills = {int(b.id): b for b in (session.exec(select(Bill).where(Bill.id.in_(bill_ids))).all() if bill_ids else [])}
+    _parties(session, [b.party_id or 0 for b in bills.values()])
+    for payment in rows:
+        bill = bills.get(int(payment.bill_id))
+        if not bill:
+            continue
+        is_deleted = bool(payment.is_deleted) or bool(bill.is_deleted)
+        if _skip_deleted(found, "BILL_PAYMENT", payment.id, is_deleted):
+            continue
+        post_bill_payment_voucher(
+            session,
+            bill,
+            int(payment.id or 0),
+            payment.received_at,
+            float(payment.cash_amount or 0),
+            float(payment.online_amount or 0),
+            float(getattr(payment, "writeoff_amount", 0) or 0),
+            bool(getattr(payment, "is_writeoff", False)),
+            payment.note,
+        )
+        if is_deleted:
+            mark_voucher_deleted(session, source_type="BILL_PAYMENT", source_id=int(payment.id or 0))
+
+
+def _book_entries(book: str) -> Callable[[object, list], None]:
+    def _run(session, rows) -> None:
+        prefetch_vouchers(session, [f"{book}_SUSPENSE"], [int(r.id) for r in rows])
+        for row in rows:
+            sync_suspense_book_voucher(session, row, book=book)
+
+    return _run
+
+
+class Phase(NamedTuple):
+    name: str
+    model: type
+    run: Callable[[object, list], None]
+
+
+PHASES: List[Phase] = [
+    Phase("bills", Bill, _bills),
+    Phase("purchases", Purchase, _purchases),
+    Phase("purchase_returns", PurchaseReturn, _purchase_returns),
+    Phase("purchase_payments", PurchasePayment, _purchase_payments),
+    Phase("party_receipts", PartyReceipt, _party_receipts),
+    Phase("bill_payments", BillPayment, _bill_payments),
+    Phase("cashbook", CashbookEntry, _book_entries("CASHBOOK")),
+    Phase("bankbook", BankbookEntry, _book_entries("BANKBOOK")),
+]
+
+
+# ---------- Cursor ----------
+
+def _read_meta(session, key: str) -> Optional[str]:
+    row = session.exec(text("SELECT value FROM appmeta WHERE key = :key").bindparams(key=key)).first()
+    return str(row[0]) if row and row[0] is not None else None
+
+
+def _write_meta(session, key: str, value: str) -> None:
+    session.exec(
+        text("""
+            INSERT INTO appmeta (key, value, updated_at)
+            VALUES (:key, :value, :ts)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+        """).bindparams(key=key, value=value, ts=_now_ts())
+    )
+
+
+def _new_cursor(session) -> dict:
+    totals = {
+        phase.name: int(session.exec(select(func.count()).select_from(phase.model)).one())
+        for phase in PHASES
+    }
+    return {
+        "status": "RUNNING",
+        "phase": PHASES[0].name,
+        "last_id": 0,
+        "processed": 0,
+        "totals": totals,
+        "started_at": _now_ts(),
+        "updated_at": _now_ts(),
+        "finished_at": None,
+        "error": None,
+    }
+
+
+def voucher_resync_progress(session) -> dict:
+    if _read_meta(session, DONE_KEY) == "done":
+        raw = _read_meta(session, CURSOR_KEY)
+        cursor = json.loads(raw) if raw else {}
+        return {**cursor, "status": "DONE"}
+    raw = _read_meta(session, CURSOR_KEY)
+    if not raw:
+        return {"status": "PENDING"}
+    return json.loads(raw)
+
+
+def resync_pending(session) -> bool:
+    return _read_meta(session, DONE_KEY) != "done"
+
+
+def run_voucher_resync_chunk(engine, *, chunk_size: int = CHUNK_SIZE) -> bool:
+    """Re-post one chunk and advance the cursor. Returns True once finished."""
+    with Session(engine, expire_on_commit=False) as session:
+        if not resync_pending(session):
+            return True
+        raw = _read_meta(session, CURSOR_KEY)
+        cursor = json.loads(raw) if raw else None
+        if not cursor or cursor.get("status") == "DONE":
+            cursor = _new_cursor(session)
+        names = [phase.name for phase in PHASES]
+        index = names.index(cursor["phase"]) if cursor["phase"] in names else 0
+        phase = PHASES[index]
+        ensure_accounting_setup(session)
+        rows = session.exec(
+            select(phase.model)
+            .where(phase.model.id > int(cursor["last_id"]))
+            .order_by(phase.model.id)
+            .limit(chunk_size)
+        ).all()
+        try:
+            if rows:
+                phase.run(session, rows)
+        finally:
+            clear_voucher_prefetch(session)
+        cursor["processed"] = int(cursor.get("processed") or 0) + len(rows)
+        cursor["updated_at"] = _now_ts()
+        cursor["error"] = None
+        finished = False
+        if len(rows) == chunk_size:
+            cursor["last_id"] = int(rows[-1].id)
+        elif index + 1 < len(PHASES):
+            cursor["phase"] = PHASES[index + 1].name
+            cursor["last_id"] = 0
+        else:
+            cursor["status"] = "DONE"
+            cursor["finished_at"] = _now_ts()
+            _write_meta(session, DONE_KEY, "done")
+            finished = True
+        _write_meta(session, CURSOR_KEY, json.dumps(cursor))
+        session.commit()
+        return finished
+
+
+def _record_error(engine, error: str) -> None:
+    with Session(engine) as session:
+        raw = _read_meta(session, CURSOR_KEY)
+        if not raw:
+            return
+        cursor = json.loads(raw)
+        cursor["error"] = error[:500]
+        cursor["updated_at"] = _now_ts()
+        _write_meta(session, CURSOR_KEY, json.dumps(cursor))
+        session.commit()
+
+
+def run_voucher_resync(engine, *, chunk_size: int = CHUNK_SIZE, pause_seconds: float = 0.0) -> None:
+    """Run chunks until every source has been re-posted.
+
+    A chunk that fails (for example because a request committed a write
+    between its reads and writes) is rolled back and retried; after
+    ``MAX_CHUNK_RETRIES`` consecutive failures the run stops and the error is
+    left in the cursor for the progress endpoint.
+    """
+    failures = 0
+    while True:
+        try:
+            if run_voucher_resync_chunk(engine, chunk_size=chunk_size):
+                return
+            failures = 0
+        except Exception as exc:
+            failures += 1
+            logger.exception("Voucher resync chunk failed (attempt %s)", failures)
+            if failures >= MAX_CHUNK_RETRIES:
+                _record_error(engine, str(exc))
+                return
+            time.sleep(min(2 ** failures, 30))
+            continue
+        if pause_seconds:
+            time.sleep(pause_seconds)
+
+
+def start_voucher_resync(engine) -> Optional[threading.Thread]:
+    """Start the resync in a daemon thread if this database still needs it."""
+    with Session(engine) as session:
+        if not resync_pending(session):
+            return None
+    thread = threading.Thread(
+        target=run_voucher_resync,
+        args=(engine,),
+        kwargs={"pause_seconds": 0.05},
+        name="voucher-resync",
+        daemon=True,
+    )
+    thread.start()
+    return thread
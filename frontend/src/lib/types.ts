@@ -492,6 +492,7 @@ export interface VoucherDayBook {
   to_date: string
   rows: VoucherDayBookRow[]
   summary: VoucherDayBookSummary
+  next_cursor?: string | null
 }
 
 export interface LedgerGroup {
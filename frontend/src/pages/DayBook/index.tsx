@@ -1,6 +1,7 @@
 import { useMemo, useState } from 'react'
 import {
   Box,
+  Button,
   Checkbox,
   Chip,
   FormControlLabel,
@@ -10,7 +11,7 @@ import {
   TextField,
   Typography,
 } from '@mui/material'
-import { useQuery } from '@tanstack/react-query'
+import { useInfiniteQuery } from '@tanstack/react-query'
 import { fetchVoucherDayBook } from '../../services/vouchers'
 import type { VoucherDayBookRow } from '../../lib/types'
 
@@ -34,6 +35,8 @@ function rowChipColor(type: VoucherDayBookRow['voucher_type']) {
   return 'default'
 }
 
+const PAGE_SIZE = 200
+
 const voucherTypes = [
   '',
   'SALE',
@@ -58,9 +61,10 @@ export default function DayBookPage() {
   const [query, setQuery] = useState('')
   const [includeStockJournal, setIncludeStockJournal] = useState(true)
 
-  const dayBookQ = useQuery({
-    queryKey: ['voucher-day-book', fromDate, toDate, voucherType, query, includeStockJournal],
-    queryFn: () =>
+  const dayBookQ = useInfiniteQuery({
+    queryKey: ['voucher-day-book', fromDate, toDate, voucherType, query, includeStockJournal, PAGE_SIZE],
+    initialPageParam: undefined as string | undefined,
+    queryFn: ({ pageParam }) =>
       fetchVoucherDayBook({
         from_date: fromDate,
         to_date: toDate,
@@ -68,11 +72,17 @@ export default function DayBookPage() {
         deleted_filter: 'active',
         q: query.trim() || undefined,
         include_stock_journal: includeStockJournal,
+        cursor: pageParam,
+        limit: PAGE_SIZE,
       }),
+    getNextPageParam: (lastPage) => lastPage.next_cursor ?? undefined,
   })
 
-  const rows = dayBookQ.data?.rows || []
-  const summary = dayBookQ.data?.summary
+  const rows = useMemo(
+    () => (dayBookQ.data?.pages ?? []).flatMap((page) => page.rows),
+    [dayBookQ.data],
+  )
+  const summary = dayBookQ.data?.pages[0]?.summary
 
   return (
     <Stack gap={2}>
@@ -214,6 +224,17 @@ export default function DayBookPage() {
             </tbody>
           </table>
         </Box>
+        {dayBookQ.hasNextPage && (
+          <Box sx={{ mt: 1.5, display: 'flex', justifyContent: 'center' }}>
+            <Button
+              variant="outlined"
+              onClick={() => dayBookQ.fetchNextPage()}
+              disabled={dayBookQ.isFetchingNextPage}
+            >
+              {dayBookQ.isFetchingNextPage ? 'Loading…' : `Load more (${rows.length} of ${summary?.total_rows ?? 0})`}
+            </Button>
+          </Box>
+        )}
       </Paper>
     </Stack>
   )
@@ -41,6 +41,8 @@ export async function fetchVoucherDayBook(params: {
   q?: string
   deleted_filter?: 'active' | 'deleted' | 'all'
   include_stock_journal?: boolean
+  cursor?: string
+  limit?: number
 }): Promise<VoucherDayBook> {
   const { data } = await api.get<VoucherDayBook>('/vouchers/daybook', { params })
   return data
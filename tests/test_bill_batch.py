@@ -0,0 +1,106 @@
+import unittest
+from contextlib import contextmanager
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend.models import BillCreate, BillItem, BillPayment, FinancialYear, Item, StockMovement, VoucherPostingJob
+from backend.routers import billing
+
+
+class BillBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+        self.session = Session(self.engine, expire_on_commit=False)
+        self.original_get_session = billing.get_session
+
+        @contextmanager
+        def test_session():
+            yield self.session
+
+        billing.get_session = test_session
+        self.session.add(FinancialYear(label="FY 2026", start_date="2026-01-01", end_date="2026-12-31", is_active=True))
+        self.items = [
+            Item(name="Paracetamol", brand="Acme", expiry_date="2027-01-31", mrp=10, cost_price=5, stock=5, rack_number=1),
+            Item(name="Cough Syrup", brand="Acme", expiry_date="2027-03-31", mrp=80, cost_price=50, stock=2, rack_number=2),
+        ]
+        self.session.add_all(self.items)
+        self.session.commit()
+
+    def tearDown(self):
+        billing.get_session = self.original_get_session
+        self.session.close()
+
+    def entry(self, key, lines, mode="cash", **extra):
+        total = sum(self.items[index].mrp * qty for index, qty in lines)
+        bill = BillCreate(
+            items=[{"item_id": self.items[index].id, "quantity": qty} for index, qty in lines],
+            payment_mode=mode,
+            payment_cash=total if mode == "cash" else 0,
+            date_time="2026-05-01T10:00:00",
+            **extra,
+        )
+        return billing.BillBatchEntryIn(client_key=key, bill=bill)
+
+    def sync(self, *entries):
+        out = billing.create_bills_batch(billing.BillBatchIn(bills=list(entries)))
+        return [(result.client_key, result.status) for result in out.results], out.results
+
+    def test_batch_checks_stock_across_bills_and_replays_safely(self):
+        batch = [
+            self.entry("t1-001", [(0, 3), (1, 1)]),
+            self.entry("t1-002", [(0, 3)]),  # only 2 left after t1-001
+            self.entry("t1-003", [(0, 2)], mode="credit"),
+            self.entry("t1-003", [(0, 2)], mode="credit"),
+        ]
+        statuses, results = self.sync(*batch)
+        self.assertEqual(
+            statuses,
+            [("t1-001", "CREATED"), ("t1-002", "FAILED"), ("t1-003", "CREATED"), ("t1-003", "DUPLICATE")],
+        )
+        self.assertEqual(results[1].error, "Insufficient stock for Paracetamol")
+        self.assertEqual(results[3].bill.id, results[2].bill.id)
+        first = results[0].bill
+        self.assertEqual((first.bill_number, first.total_amount, first.payment_status), (str(first.id), 110, "PAID"))
+        self.assertEqual(results[2].bill.payment_status, "UNPAID")
+
+        self.session.expire_all()
+        self.assertEqual([item.stock for item in self.session.exec(select(Item).order_by(Item.id)).all()], [0, 1])
+        self.assertEqual(len(self.session.exec(select(BillItem)).all()), 3)
+        self.assertEqual(sorted(m.delta for m in self.session.exec(select(StockMovement)).all()), [-3, -2, -1])
+        payments = self.session.exec(select(BillPayment)).all()
+        self.assertEqual([(p.bill_id, p.cash_amount) for p in payments], [(first.id, 110)])
+        self.assertEqual(len(self.session.exec(select(VoucherPostingJob)).all()), 2)
+
+        replay, replay_results = self.sync(*batch[:1], self.entry("t1-004", [(1, 1)]))
+        self.assertEqual(replay, [("t1-001", "DUPLICATE"), ("t1-004", "CREATED")])
+        self.assertEqual(replay_results[0].bill.id, first.id)
+        self.session.expire_all()
+        self.assertEqual([item.stock for item in self.session.exec(select(Item).order_by(Item.id)).all()], [0, 0])
+
+    def test_batch_bill_matches_single_create(self):
+        payload = self.entry("t2-001", [(0, 2), (1, 1)], mode="split", discount_percent=10).bill
+        payload.payment_cash, payload.payment_online, payload.payment_credit = 50, 30, 10
+        single = billing.create_bill(payload)
+        _, results = self.sync(billing.BillBatchEntryIn(client_key="t2-002", bill=payload))
+        batched = results[0].bill
+
+        def comparable(bill):
+            data = bill.model_dump()
+            for key in ("id", "bill_number"):
+                data.pop(key, None)
+            for item in data.get("items") or []:
+                item.pop("stock", None)
+            return data
+
+        self.maxDiff = None
+        self.assertEqual(comparable(batched), comparable(single))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+from contextlib import contextmanager
+
+from sqlalchemy import text
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from backend.accounting import ensure_party_ledger, resolve_bill_party_ledger
+from backend.migrations import _add_bill_debtor_keys, _add_party_name_keys
+from backend.models import Bill, Party, debtor_key
+from backend.routers import parties
+
+
+class BillDebtorKeyTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+        self.session = Session(self.engine, expire_on_commit=False)
+        self.original_get_read_session = parties.get_read_session
+
+        @contextmanager
+        def test_session():
+            yield self.session
+
+        parties.get_read_session = test_session
+
+    def tearDown(self):
+        parties.get_read_session = self.original_get_read_session
+        self.session.close()
+
+    def test_key_comes_from_the_leading_customer_line(self):
+        self.assertEqual(debtor_key("Customer:  Asha  RAO | Phone: 98765"), "asha rao")
+        self.assertEqual(debtor_key("customer: Asha Rao\nsecond line"), "asha rao")
+        self.assertEqual(debtor_key("Paid later. Customer: Asha Rao"), "")
+        self.assertEqual(debtor_key(None), "")
+
+        bill = Bill(subtotal=1, total_amount=1, payment_mode="credit", notes="Customer: Asha Rao")
+        self.session.add(bill)
+        self.session.commit()
+        self.assertEqual(bill.debtor_key, "asha rao")
+        bill.notes = "Customer: Ravi Kumar | Address: MG Road"
+        self.session.add(bill)
+        self.session.commit()
+        self.assertEqual(bill.debtor_key, "ravi kumar")
+
+    def test_migration_backfills_existing_bills(self):
+        self.session.add_all([
+            Bill(subtotal=1, total_amount=1, payment_mode="credit", notes="Customer: Asha Rao | Phone: 1"),
+            Bill(subtotal=1, total_amount=1, payment_mode="cash", notes="walk-in"),
+        ])
+        self.session.commit()
+        with self.engine.begin() as conn:
+            conn.execute(text("UPDATE bill SET debtor_key = ''"))
+
+        _add_bill_debtor_keys(self.engine)
+        with self.engine.connect() as conn:
+            keys = conn.execute(text("SELECT debtor_key FROM bill ORDER BY id")).scalars().all()
+        self.assertEqual(keys, ["asha rao", ""])
+
+    def test_debtor_bills_match_by_party_customer_and_note_key(self):
+        s = self.session
+        party = Party(name="Asha Rao", party_group="SUNDRY_DEBTOR", legacy_customer_id=7)
+        s.add(party)
+        s.flush()
+        s.add_all([
+            Bill(subtotal=10, total_amount=10, payment_mode="credit", date_time="2026-05-01T10:00:00", party_id=party.id),
+            Bill(subtotal=20, total_amount=20, payment_mode="credit", date_time="2026-05-02T10:00:00", customer_id=7),
+            Bill(subtotal=30, total_amount=30, payment_mode="credit", date_time="2026-05-03T10:00:00", notes="CUSTOMER: asha  rao | Phone: 1"),
+            Bill(subtotal=40, total_amount=40, payment_mode="credit", date_time="2026-05-04T10:00:00", notes="Customer: Asha Raoji"),
+            Bill(subtotal=50, total_amount=50, payment_mode="credit", date_time="2026-05-05T10:00:00", notes="Customer: Asha Rao", is_deleted=True),
+        ])
+        s.commit()
+
+        rows = parties.debtor_open_bills(party.id)
+        self.assertEqual([row.total_amount for row in rows], [30, 20, 10])
+
+    def test_party_name_key_matches_note_keys_despite_spacing(self):
+        s = self.session
+        party = Party(name="John  Doe", party_group="SUNDRY_DEBTOR")
+        s.add(party)
+        s.commit()
+        self.assertEqual(party.name_key, "john doe")
+        with self.engine.begin() as conn:
+            conn.execute(text("UPDATE party SET name_key = ''"))
+        _add_party_name_keys(self.engine)
+        s.expire_all()
+        self.assertEqual(s.get(Party, party.id).name_key, "john doe")
+
+        bill = Bill(subtotal=10, total_amount=10, payment_mode="credit", notes="Customer: john doe | Phone: 1")
+        s.add(bill)
+        s.flush()
+        ledger = resolve_bill_party_ledger(s, bill)
+        self.assertIsNotNone(ledger)
+        self.assertEqual(ledger.id, ensure_party_ledger(s, party).id)
+
+
+if __name__ == "__main__":
+    unittest.main()
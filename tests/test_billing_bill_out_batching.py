@@ -0,0 +1,120 @@
+import unittest
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend.models import Bill, BillItem, Category, InventoryLot, Item, Product, Return
+from backend.routers import billing
+
+
+class BillOutBatchingTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+        self.session = Session(self.engine, expire_on_commit=False)
+        self.original_get_session = billing.get_session
+        self.statements = []
+
+        @contextmanager
+        def test_session():
+            yield self.session
+
+        @event.listens_for(self.engine, "before_cursor_execute")
+        def count_statement(_conn, _cursor, statement, _params, _context, _executemany):
+            self.statements.append(statement)
+
+        billing.get_session = test_session
+        self.seed_catalog()
+
+    def tearDown(self):
+        billing.get_session = self.original_get_session
+        self.session.close()
+
+    def seed_catalog(self):
+        category = Category(name="Tablets")
+        product = Product(name="Dolo 650", brand="Micro", parent_unit_name="Strip", child_unit_name="Tab")
+        self.session.add(category)
+        self.session.add(product)
+        self.session.commit()
+
+        self.sealed = Item(name="Dolo 650", brand="Micro", product_id=product.id, category_id=category.id, mrp=30, stock=50)
+        self.loose = Item(name="Dolo 650", brand="Micro", product_id=product.id, category_id=category.id, mrp=3, stock=40)
+        self.session.add(self.sealed)
+        self.session.add(self.loose)
+        self.session.commit()
+
+        sealed_lot = InventoryLot(product_id=product.id, mrp=30, sealed_qty=50, conversion_qty=10, legacy_item_id=self.sealed.id)
+        self.session.add(sealed_lot)
+        self.session.commit()
+        self.session.add(
+            InventoryLot(
+                product_id=product.id,
+                mrp=3,
+                loose_qty=40,
+                conversion_qty=10,
+                opened_from_lot_id=sealed_lot.id,
+                legacy_item_id=self.loose.id,
+            )
+        )
+        self.session.commit()
+
+    def seed_bills(self, count):
+        for _ in range(count):
+            bill = Bill(subtotal=33, total_amount=33, payment_mode="cash", payment_cash=33)
+            self.session.add(bill)
+            self.session.commit()
+            self.session.add(BillItem(bill_id=bill.id, item_id=self.sealed.id, item_name="Dolo 650", mrp=30, quantity=1, line_total=30))
+            self.session.add(BillItem(bill_id=bill.id, item_id=self.loose.id, item_name="Dolo 650", mrp=3, quantity=1, line_total=3))
+            self.session.commit()
+
+    def list_bills_query_count(self):
+        self.statements.clear()
+        rows = billing.list_bills(limit=500, offset=0, from_date=None, to_date=None, deleted_filter="active")
+        return rows, len(self.statements)
+
+    def test_list_bills_query_count_does_not_grow_with_page_size(self):
+        self.seed_bills(3)
+        small_rows, small_count = self.list_bills_query_count()
+        self.seed_bills(40)
+        large_rows, large_count = self.list_bills_query_count()
+
+        self.assertEqual(len(small_rows), 3)
+        self.assertEqual(len(large_rows), 43)
+        self.assertEqual(small_count, large_count)
+        # bills, bill items, items, categories, lots, products
+        self.assertLessEqual(large_count, 6)
+
+    def test_batched_lines_keep_item_metadata(self):
+        self.seed_bills(1)
+        rows, _count = self.list_bills_query_count()
+        sealed_line, loose_line = rows[0].items
+
+        self.assertEqual(sealed_line.category_name, "Tablets")
+        self.assertEqual(sealed_line.brand, "Micro")
+        self.assertFalse(sealed_line.is_loose_stock)
+        self.assertEqual(sealed_line.stock_unit_label, "Strip")
+        self.assertTrue(loose_line.is_loose_stock)
+        self.assertEqual(loose_line.stock_unit_label, "Tab")
+        self.assertEqual(loose_line.conversion_qty, 10)
+
+    def test_get_bill_includes_credit_return_totals(self):
+        self.seed_bills(1)
+        bill = self.session.exec(select(Bill)).first()
+        self.session.add(Return(source_bill_id=bill.id, subtotal_return=3, credit_amount=3))
+        self.session.commit()
+
+        out = billing.get_bill(str(bill.id))
+
+        self.assertEqual(out.credit_return_total, 3)
+        self.assertEqual(out.original_total_amount, 36)
+        self.assertEqual(len(out.items), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
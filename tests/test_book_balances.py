@@ -0,0 +1,111 @@
+import unittest
+from contextlib import contextmanager
+from datetime import date
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend.book_balances import install_book_balance_triggers, refresh_book_balances
+from backend.models import BankbookEntry, Bill, BillPayment, BookDayBalance, CashbookEntry, Purchase, PurchasePayment
+from backend.routers import bankbook, cashbook
+
+
+class BookBalanceTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            install_book_balance_triggers(conn)
+        self.session = Session(self.engine, expire_on_commit=False)
+        self.originals = (cashbook.get_read_session, bankbook.get_read_session)
+
+        @contextmanager
+        def test_session():
+            yield self.session
+
+        cashbook.get_read_session = test_session
+        bankbook.get_read_session = test_session
+
+        self.session.add(CashbookEntry(entry_type="OPENING", amount=1000, created_at="2026-04-01T08:00:00"))
+        self.session.add(CashbookEntry(entry_type="EXPENSE", amount=40, created_at="2026-04-01T09:00:00"))
+        self.session.add(CashbookEntry(entry_type="CONTRA", amount=300, created_at="2026-04-03T10:00:00"))
+        self.session.add(BankbookEntry(entry_type="RECEIPT", mode="UPI", amount=500, txn_charges=2, created_at="2026-04-02T10:00:00"))
+        bill = Bill(date_time="2026-04-02T11:00:00", subtotal=250, total_amount=250, payment_mode="split")
+        self.session.add(bill)
+        self.session.flush()
+        self.session.add(BillPayment(bill_id=bill.id, received_at="2026-04-02T11:00:00", mode="split", cash_amount=150, online_amount=100))
+        purchase = Purchase(party_id=1, invoice_number="INV-1", invoice_date="2026-04-02", total_amount=120)
+        self.session.add(purchase)
+        self.session.flush()
+        self.session.add(
+            PurchasePayment(purchase_id=purchase.id, paid_at="2026-04-02T12:00:00", cash_amount=20, online_amount=100, txn_charges=5)
+        )
+        self.session.commit()
+        self.purchase = purchase
+
+    def tearDown(self):
+        cashbook.get_read_session, bankbook.get_read_session = self.originals
+        self.session.close()
+
+    def days(self, router, to_date="2026-04-04"):
+        out = router.daily_summary(from_date="2026-03-31", to_date=to_date, dates=None)
+        return [(day["date"], day["opening_balance"], day["closing_balance"]) for day in out]
+
+    def stored_days(self, book):
+        self.session.expire_all()
+        return [row.balance_date for row in self.session.exec(select(BookDayBalance).where(BookDayBalance.book == book)).all()]
+
+    def test_days_fold_from_openings_and_all_sources(self):
+        expected_cash = [
+            ("2026-03-31", 0, 0),
+            ("2026-04-01", 1000, 960),
+            ("2026-04-02", 960, 1090),
+            ("2026-04-03", 1090, 790),
+            ("2026-04-04", 790, 790),
+        ]
+        expected_bank = [
+            ("2026-03-31", 0, 0),
+            ("2026-04-01", 0, 0),
+            ("2026-04-02", 0, 493),
+            ("2026-04-03", 493, 793),
+            ("2026-04-04", 793, 793),
+        ]
+        self.assertEqual(self.days(cashbook), expected_cash)
+        self.assertEqual(self.days(bankbook), expected_bank)
+
+        day = bankbook.day_bankbook(date="2026-04-02")
+        self.assertEqual(
+            day["summary"],
+            {"bank_out": 107, "withdrawals": 100, "expenses": 0, "receipts": 600, "charges": 7, "net_change": 493, "count": 1},
+        )
+        self.assertEqual([entry.amount for entry in day["entries"]], [500])
+
+        self.assertEqual(refresh_book_balances(self.session, today=date(2026, 4, 4)), 5)
+        self.assertEqual(self.stored_days("CASH"), ["2026-04-01", "2026-04-02", "2026-04-03"])
+        self.assertEqual(self.days(cashbook), expected_cash)
+        self.assertEqual(self.days(bankbook), expected_bank)
+
+    def test_backdated_changes_drop_later_rows(self):
+        refresh_book_balances(self.session, today=date(2026, 4, 4))
+
+        self.session.add(CashbookEntry(entry_type="RECEIPT", amount=10, created_at="2026-04-02T18:00:00"))
+        self.session.commit()
+        self.assertEqual(self.stored_days("CASH"), ["2026-04-01"])
+        self.assertEqual(self.stored_days("BANK"), [])
+        self.assertEqual(self.days(cashbook)[-1], ("2026-04-04", 800, 800))
+
+        refresh_book_balances(self.session, today=date(2026, 4, 4))
+        self.purchase.is_deleted = True
+        self.session.add(self.purchase)
+        self.session.commit()
+        self.assertEqual(self.stored_days("CASH"), ["2026-04-01"])
+        self.assertEqual(self.days(cashbook)[-1], ("2026-04-04", 820, 820))
+        self.assertEqual(self.days(bankbook)[-1], ("2026-04-04", 898, 898))
+
+
+if __name__ == "__main__":
+    unittest.main()
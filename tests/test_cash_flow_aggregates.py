@@ -0,0 +1,200 @@
+import unittest
+from contextlib import contextmanager
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend.cash_flow_aggregates import BANK_FLOWS, CASH_FLOWS, flow_components, flow_totals, flow_totals_by_day
+from backend.models import (
+    BankbookEntry,
+    Bill,
+    BillPayment,
+    CashbookEntry,
+    ExchangeRecord,
+    PartyReceipt,
+    Purchase,
+    PurchasePayment,
+    PurchaseReturn,
+    ReceiptBillAdjustment,
+    Return,
+)
+from backend.routers import bankbook, cashbook
+
+
+class CashFlowAggregateTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+        self.session = Session(self.engine, expire_on_commit=False)
+        self.originals = (cashbook.get_read_session, bankbook.get_read_session)
+
+        @contextmanager
+        def test_session():
+            yield self.session
+
+        cashbook.get_read_session = test_session
+        bankbook.get_read_session = test_session
+
+        s = self.session
+        for n, (entry_type, amount) in enumerate(
+            [("OPENING", 500), ("RECEIPT", 30.25), ("WITHDRAWAL", 12), ("CONTRA", 40), ("EXPENSE", 7.5), ("LOAN", 20)]
+        ):
+            s.add(CashbookEntry(entry_type=entry_type, amount=amount, created_at=f"2026-04-0{1 + n % 3}T10:00:00"))
+        for n, (entry_type, mode) in enumerate(
+            [("RECEIPT", "UPI"), ("RECEIPT", "BANK_DEPOSIT"), ("WITHDRAWAL", "BANK_DEPOSIT"), ("EXPENSE", "BANK_DEPOSIT"), ("OPENING", "NEFT")]
+        ):
+            s.add(BankbookEntry(entry_type=entry_type, mode=mode, amount=100 + n, txn_charges=n, created_at=f"2026-04-0{1 + n % 3}T11:00:00"))
+        live_bill = Bill(subtotal=1, total_amount=1, payment_mode="split")
+        deleted_bill = Bill(subtotal=1, total_amount=1, payment_mode="cash", is_deleted=True)
+        s.add_all([live_bill, deleted_bill])
+        s.flush()
+        payments = [
+            BillPayment(bill_id=live_bill.id, received_at="2026-04-01T12:00:00", mode="split", cash_amount=10.1, online_amount=5),
+            BillPayment(bill_id=live_bill.id, received_at="2026-04-02T12:00:00", mode="cash", cash_amount=20.2),
+            BillPayment(bill_id=live_bill.id, received_at="2026-04-02T13:00:00", mode="cash", cash_amount=40.4),
+            BillPayment(bill_id=live_bill.id, received_at="2026-04-02T14:00:00", mode="cash", cash_amount=80, is_deleted=True),
+            BillPayment(bill_id=deleted_bill.id, received_at="2026-04-01T12:00:00", mode="cash", cash_amount=160),
+        ]
+        s.add_all(payments)
+        live_receipt = PartyReceipt(party_id=1, received_at="2026-04-02T12:00:00", mode="cash", cash_amount=20.2)
+        deleted_receipt = PartyReceipt(party_id=1, received_at="2026-04-02T13:00:00", mode="online", online_amount=40.4, is_deleted=True)
+        s.add_all([live_receipt, deleted_receipt])
+        s.flush()
+        s.add(ReceiptBillAdjustment(receipt_id=live_receipt.id, bill_id=live_bill.id, bill_payment_id=payments[1].id))
+        s.add(ReceiptBillAdjustment(receipt_id=deleted_receipt.id, bill_id=live_bill.id, bill_payment_id=payments[2].id))
+        live_purchase = Purchase(party_id=1, invoice_number="P-1", invoice_date="2026-04-01")
+        deleted_purchase = Purchase(party_id=1, invoice_number="P-2", invoice_date="2026-04-01", is_deleted=True)
+        s.add_all([live_purchase, deleted_purchase])
+        s.flush()
+        for purchase_id, extra in (
+            (live_purchase.id, {}),
+            (deleted_purchase.id, {}),
+            (0, {}),
+            (9999, {}),
+            (live_purchase.id, {"is_writeoff": True}),
+            (live_purchase.id, {"online_amount": 0}),
+        ):
+            s.add(
+                PurchasePayment(
+                    purchase_id=purchase_id,
+                    paid_at="2026-04-03T09:00:00",
+                    cash_amount=3,
+                    online_amount=extra.pop("online_amount", 50),
+                    txn_charges=2.5,
+                    **extra,
+                )
+            )
+        s.add(ExchangeRecord(return_id=1, new_bill_id=1, created_at="2026-04-03T10:00:00", payment_cash=6, payment_online=7, refund_online=8))
+        s.add(Return(subtotal_return=1, date_time="2026-04-01T15:00:00", refund_cash=9, refund_online=11))
+        s.add(PurchaseReturn(party_id=1, return_number="R-1", return_date="2026-04-02", refund_cash=13, refund_online=17))
+        s.add(PurchaseReturn(party_id=1, return_number="R-2", return_date="2026-04-02", refund_cash=19, is_deleted=True))
+        s.commit()
+
+    def tearDown(self):
+        cashbook.get_read_session, bankbook.get_read_session = self.originals
+        self.session.close()
+
+    def reference(self, start_iso=None, end_iso=None):
+        # Row-by-row totals, computed the way the routers did before the SQL aggregates.
+        s = self.session
+
+        def within(ts):
+            return (not start_iso or ts >= start_iso) and (not end_iso or ts <= end_iso)
+
+        out = {}
+
+        def add(name, value):
+            out[name] = round(out.get(name, 0.0) + float(value or 0), 2)
+
+        adjusted = {
+            adj.bill_payment_id
+            for adj in s.exec(select(ReceiptBillAdjustment)).all()
+            if not s.get(PartyReceipt, adj.receipt_id).is_deleted
+        }
+        for payment in s.exec(select(BillPayment)).all():
+            bill = s.get(Bill, payment.bill_id)
+            if within(payment.received_at) and not payment.is_deleted and not bill.is_deleted and payment.id not in adjusted:
+                add("bill_payment_cash", payment.cash_amount)
+                add("bill_payment_online", payment.online_amount)
+        for receipt in s.exec(select(PartyReceipt)).all():
+            if within(receipt.received_at) and not receipt.is_deleted:
+                add("party_receipt_cash", receipt.cash_amount)
+                add("party_receipt_online", receipt.online_amount)
+        for payment in s.exec(select(PurchasePayment)).all():
+            purchase = s.get(Purchase, payment.purchase_id) if payment.purchase_id > 0 else None
+            if payment.purchase_id > 0 and (not purchase or purchase.is_deleted):
+                continue
+            if within(payment.paid_at) and not payment.is_deleted and not payment.is_writeoff:
+                add("purchase_cash", payment.cash_amount)
+                add("purchase_online", payment.online_amount)
+                add("purchase_charges", payment.txn_charges if payment.online_amount > 0 else 0)
+        for row in s.exec(select(ExchangeRecord)).all():
+            if within(row.created_at):
+                add("exchange_cash_in", row.payment_cash)
+                add("exchange_online_in", row.payment_online)
+                add("exchange_online_out", row.refund_online)
+        for row in s.exec(select(Return)).all():
+            if within(row.date_time):
+                add("return_cash", row.refund_cash)
+                add("return_online", row.refund_online)
+        for row in s.exec(select(PurchaseReturn)).all():
+            if within(f"{row.return_date}T00:00:00") and not row.is_deleted:
+                add("purchase_return_cash", row.refund_cash)
+                add("purchase_return_online", row.refund_online)
+        for table, prefix in ((CashbookEntry, "cashbook"), (BankbookEntry, "bankbook")):
+            for row in s.exec(select(table)).all():
+                if not within(row.created_at):
+                    continue
+                add(f"{prefix}_entries", 1)
+                if prefix == "bankbook":
+                    add("bankbook_charges", row.txn_charges)
+                    if row.mode == "BANK_DEPOSIT":
+                        kind = {"RECEIPT": "out", "WITHDRAWAL": "in", "CONTRA": "in"}.get(row.entry_type, "other")
+                        add(f"bank_deposit_{kind}", row.amount)
+                elif row.entry_type == "CONTRA":
+                    add("cashbook_contra", row.amount)
+                if row.entry_type == "OPENING":
+                    kind = "opening"
+                elif row.entry_type in ("RECEIPT", "LOAN_REPAYMENT"):
+                    kind = "receipt"
+                elif row.entry_type in ("WITHDRAWAL", "CONTRA", "LOAN"):
+                    kind = "withdrawal"
+                else:
+                    kind = "expense"
+                add(f"{prefix}_{kind}", row.amount)
+        return out
+
+    def test_components_match_row_by_row_totals(self):
+        components = flow_components(CASH_FLOWS) | flow_components(BANK_FLOWS)
+        for start_iso, end_iso in ((None, None), ("2026-04-02T00:00:00", "2026-04-02T23:59:59.999999")):
+            expected = self.reference(start_iso, end_iso)
+            totals = flow_totals(self.session, components, start_iso=start_iso, end_iso=end_iso)
+            self.assertEqual({k: v for k, v in totals.items() if v}, {k: v for k, v in expected.items() if v})
+
+        by_day = flow_totals_by_day(self.session, ["bill_payment_cash", "purchase_charges"])
+        self.assertEqual(
+            by_day,
+            {
+                "2026-04-01": {"bill_payment_cash": 10.1},
+                "2026-04-02": {"bill_payment_cash": 40.4},  # its receipt was deleted
+                "2026-04-03": {"purchase_charges": 5.0},
+            },
+        )
+
+    def test_summaries(self):
+        self.assertEqual(
+            cashbook.summary(from_date=None, to_date=None),
+            {"cash_out": 301.5, "withdrawals": 191, "expenses": 110.5, "receipts": 208.95, "net_change": -92.55, "count": 6},
+        )
+        self.assertEqual(
+            bankbook.summary(from_date="2026-04-01", to_date="2026-04-01"),
+            {"bank_out": 117, "withdrawals": 11, "expenses": 103, "receipts": 145, "charges": 3, "net_change": 28, "count": 2},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from backend.models import Bill, BillPayment, Customer, Party, PartyReceipt, ReceiptBillAdjustment
+from backend.routers import customers
+
+
+class CustomerBalancesTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+        self.session = Session(self.engine, expire_on_commit=False)
+        self.original_get_read_session = customers.get_read_session
+        self.statements = []
+
+        @contextmanager
+        def test_session():
+            yield self.session
+
+        @event.listens_for(self.engine, "before_cursor_execute")
+        def count_statement(_conn, _cursor, statement, _params, _context, _executemany):
+            self.statements.append(statement)
+
+        customers.get_read_session = test_session
+
+    def tearDown(self):
+        customers.get_read_session = self.original_get_read_session
+        self.session.close()
+
+    def seed(self, count):
+        s = self.session
+        for n in range(count):
+            customer = Customer(name=f"Customer {n:03d}", phone=f"90000{n:05d}")
+            s.add(customer)
+            s.flush()
+            party = Party(
+                name=customer.name,
+                party_group="SUNDRY_DEBTOR",
+                legacy_customer_id=customer.id,
+                opening_balance=25,
+                opening_balance_type="DR",
+            )
+            s.add(party)
+            s.flush()
+            s.add(Bill(subtotal=100, total_amount=100, paid_amount=30, payment_mode="credit", customer_id=customer.id))
+            s.add(Bill(subtotal=50, total_amount=50, writeoff_amount=5, payment_mode="credit", party_id=party.id))
+            s.add(Bill(subtotal=40, total_amount=40, payment_mode="credit", notes=f"Customer: {customer.name} | {customer.phone}\nlegacy"))
+            s.add(Bill(subtotal=80, total_amount=80, payment_mode="credit", customer_id=customer.id, is_deleted=True))
+            receipt = PartyReceipt(party_id=party.id, received_at="2026-04-01T10:00:00", mode="cash", cash_amount=60, total_amount=60)
+            s.add(receipt)
+            s.flush()
+            live = BillPayment(bill_id=1, received_at="2026-04-01T10:00:00", mode="cash", cash_amount=20)
+            dead = BillPayment(bill_id=1, received_at="2026-04-01T10:00:00", mode="cash", cash_amount=15, is_deleted=True)
+            s.add_all([live, dead])
+            s.flush()
+            s.add(ReceiptBillAdjustment(receipt_id=receipt.id, bill_id=1, bill_payment_id=live.id, adjusted_amount=20))
+            s.add(ReceiptBillAdjustment(receipt_id=receipt.id, bill_id=1, bill_payment_id=dead.id, adjusted_amount=15))
+        s.add(Customer(name="Walk In"))
+        s.commit()
+
+    def list_page(self):
+        self.statements.clear()
+        rows = customers.list_customers(q=None, limit=1000, offset=0, archived_only=False)
+        return rows, len(self.statements)
+
+    def test_balances_for_a_page_come_from_a_fixed_number_of_queries(self):
+        self.seed(3)
+        rows, small = self.list_page()
+        by_name = {row.name: row for row in rows}
+        first = by_name["Customer 000"]
+        # 70 + 45 + 40 outstanding, 60 - 20 unapplied, 25 DR opening.
+        self.assertEqual(
+            (first.outstanding_amount, first.advance_amount, first.opening_balance, first.closing_balance, first.closing_balance_type),
+            (155.0, 40.0, 25.0, 140.0, "DR"),
+        )
+        walk_in = by_name["Walk In"]
+        self.assertEqual((walk_in.party_id, walk_in.outstanding_amount, walk_in.closing_balance), (None, 0.0, 0.0))
+
+        self.seed(40)
+        rows, large = self.list_page()
+        self.assertEqual(len(rows), 45)
+        self.assertEqual(large, small)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from contextlib import contextmanager
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend.customer_parties import backfill_customer_parties
+from backend.models import Customer, CustomerUpdate, Party
+from backend.routers import customers, parties
+
+
+class CustomerPartiesTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+        self.session = Session(self.engine, expire_on_commit=False)
+        self.originals = (customers.get_session, parties.get_read_session)
+
+        @contextmanager
+        def test_session():
+            yield self.session
+
+        customers.get_session = test_session
+        parties.get_read_session = test_session
+
+    def tearDown(self):
+        customers.get_session, parties.get_read_session = self.originals
+        self.session.close()
+
+    def debtors(self):
+        self.session.expire_all()
+        rows = self.session.exec(select(Party).where(Party.party_group == "SUNDRY_DEBTOR").order_by(Party.id)).all()
+        return [(row.name, row.phone, row.legacy_customer_id, row.is_active) for row in rows]
+
+    def test_backfill_links_existing_customers_once(self):
+        s = self.session
+        s.add_all([
+            Customer(name="Asha Rao", phone="98765 43210"),
+            Customer(name="Ravi Kumar"),
+            Customer(name="Old Name", is_active=False),
+        ])
+        s.add(Party(name=" asha  rao ", party_group="SUNDRY_DEBTOR"))
+        s.add(Party(name="Ravi Kumar", party_group="SUNDRY_CREDITOR"))
+        s.commit()
+
+        self.assertEqual(backfill_customer_parties(s), 2)
+        self.assertEqual(
+            self.debtors(),
+            [("Asha Rao", "9876543210", 1, True), ("Ravi Kumar", None, 2, True)],
+        )
+        self.assertEqual(backfill_customer_parties(s), 0)
+
+    def test_customer_writes_keep_the_party_current_without_party_reads_writing(self):
+        created = customers.create_customer(customers.CustomerCreate(name="Meena", phone="9000000001"))
+        customers.update_customer(created.id, CustomerUpdate(phone="9000000002", address_line="MG Road"))
+        self.assertEqual(self.debtors(), [("Meena", "9000000002", created.id, True)])
+
+        # Party reads are plain SELECTs now; nothing new to flush or commit.
+        listed = parties.list_parties(q=None, party_group="SUNDRY_DEBTOR", is_active=None, limit=10, offset=0)
+        self.assertEqual([(row.name, row.address_line) for row in listed], [("Meena", "MG Road")])
+        self.assertFalse(self.session.dirty or self.session.new)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import unittest
+from contextlib import contextmanager
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from backend.models import Bill, BillPayment, CashbookEntry, Party, Purchase, PurchasePayment, ReceiptBillAdjustment
+from backend.routers import vouchers
+
+
+class DayBookTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+        self.session = Session(self.engine, expire_on_commit=False)
+        self.original_get_read_session = vouchers.get_read_session
+
+        @contextmanager
+        def test_session():
+            yield self.session
+
+        vouchers.get_read_session = test_session
+
+        supplier = Party(name=" Ravi Traders ", party_group="SUNDRY_CREDITOR")
+        self.session.add(supplier)
+        self.session.flush()
+        bills = []
+        for n in range(4):
+            bill = Bill(
+                date_time=f"2026-04-01T1{n}:00:00",
+                subtotal=100,
+                total_amount=100 + n,
+                payment_mode="cash",
+                payment_cash=100 + n,
+                notes="Customer: Asha | ph 98" if n == 0 else None,
+                is_deleted=n == 3,
+            )
+            self.session.add(bill)
+            bills.append(bill)
+        self.session.flush()
+        for note in ("Auto: payment at bill creation", None, "adjusted"):
+            self.session.add(
+                BillPayment(bill_id=bills[0].id, received_at="2026-04-01T12:30:00", mode="cash", cash_amount=10, note=note)
+            )
+        self.session.flush()
+        self.session.add(ReceiptBillAdjustment(bill_id=bills[0].id, bill_payment_id=3, receipt_id=1, amount=10))
+        purchase = Purchase(
+            party_id=supplier.id,
+            invoice_number="INV-7",
+            invoice_date="2026-04-01",
+            total_amount=500,
+            created_at="2026-04-01T09:00:00",
+        )
+        self.session.add(purchase)
+        self.session.flush()
+        self.session.add(
+            PurchasePayment(
+                purchase_id=purchase.id,
+                paid_at="2026-04-01T09:30:00",
+                amount=200,
+                online_amount=200,
+                txn_charges=5,
+                transaction_id="UTR1",
+            )
+        )
+        self.session.add(CashbookEntry(entry_type="EXPENSE", amount=40, created_at="2026-04-01T08:00:00"))
+        self.session.add(CashbookEntry(entry_type="EXPENSE", amount=99, created_at="2026-04-02T08:00:00"))
+        self.session.commit()
+
+    def tearDown(self):
+        vouchers.get_read_session = self.original_get_read_session
+        self.session.close()
+
+    def book(self, **params):
+        base = dict(
+            from_date="2026-04-01",
+            to_date=None,
+            voucher_type=None,
+            q=None,
+            deleted_filter="active",
+            include_stock_journal=True,
+            cursor=None,
+            limit=200,
+        )
+        base.update(params)
+        return vouchers.daybook(**base)
+
+    def test_rows_and_summary(self):
+        out = self.book()
+        keys = [(row.source_type, row.source_id) for row in out.rows]
+        self.assertEqual(
+            keys,
+            [
+                ("BILL_PAYMENT", 2),
+                ("BILL", 3),
+                ("BILL", 2),
+                ("BILL", 1),
+                ("PURCHASE_PAYMENT_CHARGE", 1),
+                ("PURCHASE_PAYMENT", 1),
+                ("PURCHASE", 1),
+                ("CASHBOOK", 1),
+            ],
+        )
+        rows = {key: row for key, row in zip(keys, out.rows)}
+        self.assertEqual(rows[("BILL", 1)].party_name, "Asha")
+        self.assertEqual(rows[("BILL_PAYMENT", 2)].narration, "Receipt against bill #1")
+        self.assertEqual(rows[("PURCHASE", 1)].party_name, "Ravi Traders")
+        self.assertEqual(rows[("PURCHASE_PAYMENT", 1)].narration, "Payment for purchase INV-7 | Txn UTR1")
+        self.assertEqual(rows[("PURCHASE_PAYMENT_CHARGE", 1)].amount, 5)
+        self.assertEqual(
+            (out.summary.total_rows, out.summary.sales_total, out.summary.receipt_total, out.summary.expense_total),
+            (8, 303, 10, 45),
+        )
+
+        deleted = self.book(deleted_filter="deleted", include_stock_journal=False, voucher_type="SALE")
+        self.assertEqual([(row.source_type, row.source_id) for row in deleted.rows], [("BILL", 4)])
+
+    def test_filters_run_in_the_query(self):
+        self.assertEqual([row.voucher_no for row in self.book(q="asha").rows], ["BR-2", "S-1"])
+        self.assertEqual(
+            [row.source_type for row in self.book(q="ravi").rows],
+            ["PURCHASE_PAYMENT_CHARGE", "PURCHASE_PAYMENT", "PURCHASE"],
+        )
+        expenses = self.book(voucher_type="expense")
+        self.assertEqual([row.source_type for row in expenses.rows], ["PURCHASE_PAYMENT_CHARGE", "CASHBOOK"])
+        self.assertEqual(expenses.summary.total_rows, 2)
+
+    def test_keyset_pages_cover_the_range(self):
+        full = self.book(to_date="2026-04-02")
+        seen, cursor = [], None
+        while True:
+            page = self.book(to_date="2026-04-02", limit=3, cursor=cursor)
+            self.assertEqual(page.summary.total_rows, full.summary.total_rows)
+            seen.extend((row.source_type, row.source_id) for row in page.rows)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(seen, [(row.source_type, row.source_id) for row in full.rows])
+        self.assertEqual(len(seen), 9)
+        self.assertIsNone(full.next_cursor)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+from sqlalchemy.pool import StaticPool
+from sqlalchemy import text
+from sqlmodel import SQLModel, create_engine
+
+from backend.index_catalog import (
+    REQUIRED_INDEXES,
+    apply_index_catalog,
+    explain_hot_queries,
+    missing_indexes,
+    unbuildable_indexes,
+)
+from backend.routers import settings
+
+
+class IndexCatalogTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+
+    def test_apply_creates_missing_indexes_once(self):
+        with self.engine.begin() as conn:
+            apply_index_catalog(conn)
+            self.assertEqual(missing_indexes(conn), [])
+            self.assertEqual(apply_index_catalog(conn), [])
+
+    def test_hot_queries_use_indexes_after_apply(self):
+        with self.engine.begin() as conn:
+            apply_index_catalog(conn)
+            plans = explain_hot_queries(conn)
+
+        self.assertTrue(plans)
+        self.assertEqual([p["name"] for p in plans if p["full_scan"] or p.get("error")], [])
+
+    def test_db_health_reports_indexes_it_cannot_build(self):
+        with self.engine.begin() as conn:
+            apply_index_catalog(conn)
+            conn.execute(text("DROP INDEX ix_bill_debtor_key"))
+            conn.execute(text("ALTER TABLE bill DROP COLUMN debtor_key"))
+            self.assertEqual(missing_indexes(conn), [])
+            self.assertEqual([spec.name for spec in unbuildable_indexes(conn)], ["ix_bill_debtor_key"])
+
+        original = settings.read_engine
+        settings.read_engine = self.engine
+        try:
+            health = settings.db_health()
+        finally:
+            settings.read_engine = original
+        self.assertFalse(health["ok"])
+        self.assertEqual([row["name"] for row in health["skipped_indexes"]], ["ix_bill_debtor_key"])
+        self.assertEqual([row["name"] for row in health["failed_query_plans"]], ["debtor_bills"])
+
+    def test_catalog_names_are_unique(self):
+        names = [spec.name for spec in REQUIRED_INDEXES]
+        self.assertEqual(len(names), len(set(names)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from backend.inventory_group_stock import install_group_stock_triggers, rebuild_group_stock
+from backend.models import InventoryGroupStock, Item
+from backend.routers import inventory
+
+
+class InventoryGroupStockTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            install_group_stock_triggers(conn)
+        self.session = Session(self.engine, expire_on_commit=False)
+        self.original_get_read_session = inventory.get_read_session
+
+        @contextmanager
+        def test_session():
+            yield self.session
+
+        inventory.get_read_session = test_session
+
+    def tearDown(self):
+        inventory.get_read_session = self.original_get_read_session
+        self.session.close()
+
+    def add(self, **fields):
+        item = Item(mrp=10, **fields)
+        self.session.add(item)
+        self.session.commit()
+        return item
+
+    def stats(self):
+        return inventory.dashboard_stats(low_stock_threshold=2, expiry_window_days=60)
+
+    def test_group_rows_follow_item_writes(self):
+        first = self.add(name="Dolo 650", brand="Micro", stock=5, expiry_date="2027-01-01")
+        self.add(name="dolo  650", brand="MICRO", stock=0, expiry_date="2026-06-01", is_archived=True)
+
+        group = self.session.get(InventoryGroupStock, ("dolo 650", "micro"))
+        self.assertEqual((group.batch_count, group.active_batch_count), (2, 1))
+        self.assertEqual((group.total_stock, group.active_stock), (5, 5))
+        self.assertEqual(group.earliest_expiry, "2027-01-01")
+
+        first.stock = 2
+        self.session.add(first)
+        self.session.commit()
+        self.session.refresh(group)
+        self.assertEqual(group.active_stock, 2)
+
+        first.name = "Dolo 500"
+        self.session.add(first)
+        self.session.commit()
+        self.session.expire_all()
+        moved = self.session.get(InventoryGroupStock, ("dolo 500", "micro"))
+        remaining = self.session.get(InventoryGroupStock, ("dolo 650", "micro"))
+        self.assertEqual(moved.batch_count, 1)
+        self.assertEqual((remaining.batch_count, remaining.active_batch_count), (1, 0))
+
+        self.session.delete(first)
+        self.session.commit()
+        self.session.expire_all()
+        self.assertIsNone(self.session.get(InventoryGroupStock, ("dolo 500", "micro")))
+
+    def test_dashboard_stats_match_visible_batches(self):
+        today = date.today()
+        soon = (today + timedelta(days=10)).isoformat()
+        past = (today - timedelta(days=1)).isoformat()
+        later = (today + timedelta(days=400)).isoformat()
+
+        # In stock group: the archived zero-stock batch is hidden.
+        self.add(name="Dolo 650", brand="Micro", stock=5, expiry_date=later)
+        self.add(name="Dolo 650", brand="Micro", stock=0, expiry_date=past, is_archived=True)
+        # Low stock group expiring soon.
+        self.add(name="Crocin", brand="GSK", stock=1, expiry_date=soon)
+        # Fully archived group stays visible with zero stock.
+        self.add(name="Zincovit", brand=None, stock=0, expiry_date=past, is_archived=True)
+        # Blank names are ignored.
+        self.add(name=" ", brand=None, stock=9)
+
+        stats = self.stats()
+
+        self.assertEqual(stats.inventory_total_qty, 6)
+        self.assertEqual(stats.inventory_total_types_all, 3)
+        self.assertEqual(stats.inventory_available_types, 2)
+        self.assertEqual(stats.zero_stock_types_count, 1)
+        self.assertEqual(stats.low_stock_count, 2)
+        self.assertEqual(stats.expiring_soon_count, 1)
+        self.assertEqual(stats.expired_count, 1)
+
+    def test_expiry_window_compares_normalised_dates(self):
+        today = date.today()
+        window_end = (today + timedelta(days=60)).isoformat()
+        beyond = (today + timedelta(days=61)).isoformat()
+
+        self.add(name="Crocin", brand="GSK", stock=5, expiry_date=f"  {beyond}")
+        self.assertEqual(self.stats().expiring_soon_count, 0)
+
+        self.add(name="Dolo 650", brand="Micro", stock=5, expiry_date=f"{window_end}T18:00:00")
+        self.add(name="Zincovit", brand=None, stock=5, expiry_date=f" {window_end} ")
+        stats = self.stats()
+        self.assertEqual((stats.expiring_soon_count, stats.expired_count), (2, 0))
+
+    def test_rebuild_matches_trigger_maintained_rows(self):
+        self.add(name="Dolo 650", brand="Micro", stock=5)
+        self.add(name="Crocin", brand="GSK", stock=0, is_archived=True)
+        before = self.stats()
+
+        with self.engine.begin() as conn:
+            rebuild_group_stock(conn)
+        self.session.expire_all()
+
+        self.assertEqual(self.stats(), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from backend.models import Item, Product
+from backend.utils.archive_rules import apply_archive_rules
+
+
+class ItemSearchKeysTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+        self.session = Session(self.engine, expire_on_commit=False)
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_keys_follow_name_and_brand_on_insert_and_update(self):
+        item = Item(name="  Dolo   650 ", brand="MICRO", mrp=30, stock=1)
+        product = Product(name="Dolo 650", brand=None)
+        self.session.add(item)
+        self.session.add(product)
+        self.session.commit()
+
+        self.assertEqual((item.name_key, item.brand_key), ("dolo 650", "micro"))
+        self.assertEqual((product.name_key, product.brand_key), ("dolo 650", ""))
+
+        item.brand = None
+        self.session.add(item)
+        self.session.commit()
+        self.assertEqual(item.brand_key, "")
+
+    def test_archive_rules_group_by_normalized_keys(self):
+        in_stock = Item(name="Dolo 650", brand="Micro", mrp=30, stock=5, is_archived=True)
+        sold_out = Item(name="dolo  650 ", brand=" micro", mrp=30, stock=0)
+        other_brand = Item(name="Dolo 650", brand="Other", mrp=30, stock=0)
+        for row in (in_stock, sold_out, other_brand):
+            self.session.add(row)
+        self.session.commit()
+
+        self.assertTrue(apply_archive_rules(self.session, sold_out))
+        self.session.commit()
+
+        self.assertFalse(in_stock.is_archived)
+        self.assertTrue(sold_out.is_archived)
+        self.assertFalse(other_brand.is_archived)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+from contextlib import contextmanager
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend.accounting import ensure_accounting_setup, mark_voucher_deleted, upsert_voucher
+from backend.ledger_balances import install_ledger_balance_triggers, rebuild_ledger_balances
+from backend.models import LedgerBalanceDaily, Voucher, VoucherEntry
+from backend.routers import vouchers
+
+
+class LedgerBalanceTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            install_ledger_balance_triggers(conn)
+        self.session = Session(self.engine, expire_on_commit=False)
+        self.ledgers = ensure_accounting_setup(self.session)
+        self.session.commit()
+        self.original_get_read_session = vouchers.get_read_session
+
+        @contextmanager
+        def test_session():
+            yield self.session
+
+        vouchers.get_read_session = test_session
+
+    def tearDown(self):
+        vouchers.get_read_session = self.original_get_read_session
+        self.session.close()
+
+    def sale(self, source_id, day, amount, cash=None):
+        cash = amount if cash is None else cash
+        lines = [{"ledger_id": self.ledgers["CASH_IN_HAND"].id, "entry_type": "DR", "amount": cash, "narration": None}]
+        if amount > cash:
+            lines.append({
+                "ledger_id": self.ledgers["SALES_RECEIVABLE_CONTROL"].id,
+                "entry_type": "DR",
+                "amount": amount - cash,
+                "narration": None,
+            })
+        lines.append({"ledger_id": self.ledgers["SALES_ACCOUNT"].id, "entry_type": "CR", "amount": amount, "narration": None})
+        upsert_voucher(
+            self.session,
+            voucher_type="SALES",
+            source_type="BILL",
+            source_id=source_id,
+            voucher_date=day,
+            voucher_no=f"S-{source_id}",
+            narration=None,
+            total_amount=amount,
+            lines=lines,
+        )
+        self.session.commit()
+
+    def brute_force(self):
+        totals = {}
+        rows = self.session.exec(
+            select(VoucherEntry, Voucher).join(Voucher, Voucher.id == VoucherEntry.voucher_id).where(Voucher.is_deleted == False)  # noqa: E712
+        ).all()
+        for entry, voucher in rows:
+            dr, cr = totals.get((entry.ledger_id, voucher.voucher_date), (0.0, 0.0))
+            if entry.entry_type == "DR":
+                dr += entry.amount
+            else:
+                cr += entry.amount
+            totals[(entry.ledger_id, voucher.voucher_date)] = (round(dr, 2), round(cr, 2))
+        return {key: value for key, value in totals.items() if value != (0.0, 0.0)}
+
+    def stored(self):
+        self.session.expire_all()
+        return {
+            (row.ledger_id, row.balance_date): (row.dr_total, row.cr_total)
+            for row in self.session.exec(select(LedgerBalanceDaily)).all()
+            if (row.dr_total, row.cr_total) != (0.0, 0.0)
+        }
+
+    def test_triggers_follow_upserts_edits_and_deletes(self):
+        self.sale(1, "2026-04-01", 100)
+        self.sale(2, "2026-04-01", 50, cash=20)
+        self.sale(3, "2026-04-02", 80)
+        self.assertEqual(self.stored(), self.brute_force())
+
+        self.sale(2, "2026-04-03", 60)  # re-dated, one line fewer
+        self.sale(3, "2026-04-02", 90, cash=40)  # one line more
+        mark_voucher_deleted(self.session, source_type="BILL", source_id=1)
+        self.session.commit()
+        self.assertEqual(self.stored(), self.brute_force())
+
+        self.sale(1, "2026-04-01", 100)  # restored
+        self.assertEqual(self.stored(), self.brute_force())
+
+        with self.engine.begin() as conn:
+            rebuild_ledger_balances(conn)
+        self.assertEqual(self.stored(), self.brute_force())
+
+    def test_trial_balance_and_statement(self):
+        self.sale(1, "2026-03-31", 100)
+        self.sale(2, "2026-04-01", 50, cash=20)
+        self.sale(3, "2026-04-02", 80)
+
+        tb = vouchers.get_trial_balance(from_date="2026-04-01", to_date="2026-04-30")
+        by_ledger = {row.ledger_id: row for row in tb.rows}
+        cash = by_ledger[self.ledgers["CASH_IN_HAND"].id]
+        self.assertEqual((cash.opening_balance, cash.debit, cash.credit, cash.closing_balance), (100, 100, 0, 200))
+        sales = by_ledger[self.ledgers["SALES_ACCOUNT"].id]
+        self.assertEqual((sales.opening_balance, sales.credit, sales.closing_balance), (-100, 130, -230))
+        self.assertEqual(tb.total_debit, tb.total_credit)
+        self.assertEqual(tb.closing_debit, tb.closing_credit)
+        self.assertEqual(sum(group.closing_balance for group in tb.groups), 0)
+
+        statement = vouchers.get_ledger_statement(
+            self.ledgers["CASH_IN_HAND"].id, from_date="2026-04-01", to_date="2026-04-01"
+        )
+        self.assertEqual(statement.opening_balance, 100)
+        self.assertEqual([(row.voucher_no, row.debit, row.balance) for row in statement.rows], [("S-2", 20, 120)])
+        self.assertEqual(statement.closing_balance, 120)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend.accounting import (
+    ensure_accounting_setup,
+    ensure_party_ledger,
+    post_sales_voucher,
+    warm_ledger_registry,
+)
+from backend.ledger_registry import invalidate_ledger_registry, lookup_party_ledger
+from backend.models import Bill, Ledger, LedgerGroup, Party
+
+
+class LedgerRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+        self.session = Session(self.engine, expire_on_commit=False)
+        self.statements = []
+
+        @event.listens_for(self.engine, "before_cursor_execute")
+        def record(_conn, _cursor, statement, *_args):
+            self.statements.append(statement)
+
+    def tearDown(self):
+        self.session.close()
+
+    def chart_queries(self):
+        return [
+            statement
+            for statement in self.statements
+            if "FROM ledger" in statement or "INTO ledger" in statement
+        ]
+
+    def test_warm_registry_posts_without_chart_lookups(self):
+        party = Party(name="Asha", party_group="SUNDRY_DEBTOR")
+        self.session.add(party)
+        self.session.commit()
+        ensure_party_ledger(self.session, party)
+        self.session.commit()
+        warm_ledger_registry(self.session)
+
+        self.statements.clear()
+        bill = Bill(
+            date_time="2026-04-01T10:00:00",
+            subtotal=100,
+            total_amount=100,
+            payment_mode="cash",
+            payment_cash=40,
+            party_id=party.id,
+        )
+        self.session.add(bill)
+        self.session.flush()
+        voucher = post_sales_voucher(self.session, bill)
+        self.session.commit()
+
+        self.assertEqual(self.chart_queries(), [])
+        self.assertEqual(voucher.total_amount, 100)
+        party_ledger = self.session.exec(select(Ledger).where(Ledger.party_id == party.id)).one()
+        self.assertEqual(ensure_party_ledger(self.session, party).id, party_ledger.id)
+
+    def test_rolled_back_rows_are_not_cached(self):
+        ensure_accounting_setup(self.session)
+        self.session.rollback()
+        self.assertEqual(self.session.exec(select(LedgerGroup)).all(), [])
+
+        ledgers = ensure_accounting_setup(self.session)
+        self.session.commit()
+        for key, ref in ledgers.items():
+            self.assertEqual(self.session.get(Ledger, ref.id).system_key, key)
+
+    def test_invalidation_drops_party_ledgers(self):
+        party = Party(name="Ravi Traders", party_group="SUNDRY_CREDITOR")
+        self.session.add(party)
+        self.session.commit()
+        ref = ensure_party_ledger(self.session, party)
+        self.session.commit()
+        self.assertEqual(lookup_party_ledger(self.session, party.id), ref)
+
+        invalidate_ledger_registry(self.session, party_ids=[party.id])
+        self.assertIsNone(lookup_party_ledger(self.session, party.id))
+        self.assertIsNotNone(ensure_accounting_setup(self.session)["CASH_IN_HAND"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+from contextlib import contextmanager
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend.bill_payment_state import payment_state_drift, run_payment_state_check, scan_payment_state_page
+from backend.models import Bill, BillCreate, BillPayment, FinancialYear, Item, Party
+from backend.routers import billing, parties
+
+
+class PaymentStateCheckTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+        self.session = Session(self.engine, expire_on_commit=False)
+        self.originals = (parties.get_read_session, billing.get_session)
+
+        @contextmanager
+        def test_session():
+            yield self.session
+
+        parties.get_read_session = test_session
+        billing.get_session = test_session
+
+        s = self.session
+        self.party = Party(name="Asha Rao", party_group="SUNDRY_DEBTOR")
+        s.add(self.party)
+        s.flush()
+        cases = [
+            (100, []),
+            (100, [dict(cash_amount=40)]),
+            (100, [dict(cash_amount=60, online_amount=40, received_at="2026-05-03T09:00:00")]),
+            (100, [dict(cash_amount=70), dict(is_writeoff=True, writeoff_amount=30, received_at="2026-05-04T09:00:00")]),
+            (100, [dict(cash_amount=100, is_deleted=True)]),
+            (0, []),
+        ]
+        self.bills = []
+        for total, payments in cases:
+            bill = Bill(
+                subtotal=total,
+                total_amount=total,
+                payment_mode="credit",
+                date_time="2026-05-01T10:00:00",
+                party_id=self.party.id,
+            )
+            s.add(bill)
+            s.flush()
+            for payment in payments:
+                s.add(BillPayment(bill_id=bill.id, mode="cash", **{"received_at": "2026-05-02T09:00:00", **payment}))
+            s.flush()
+            billing.recalculate_bill_payment_state(s, bill)
+            self.bills.append(bill)
+        s.commit()
+
+    def tearDown(self):
+        parties.get_read_session, billing.get_session = self.originals
+        self.session.close()
+
+    def test_recalculated_bills_show_no_drift(self):
+        self.assertEqual(payment_state_drift(self.session, self.bills), [])
+        self.assertEqual(run_payment_state_check(self.engine, batch_size=4), 0)
+
+    def test_bills_written_by_billing_show_no_drift(self):
+        s = self.session
+        s.add(FinancialYear(label="FY 2026", start_date="2026-01-01", end_date="2026-12-31", is_active=True))
+        item = Item(name="Paracetamol", brand="Acme", expiry_date="2027-01-31", mrp=10, cost_price=5, stock=50, rack_number=1)
+        s.add(item)
+        s.commit()
+
+        def payload(mode, cash=0, online=0, credit=0):
+            return BillCreate(
+                items=[{"item_id": item.id, "quantity": 2}],
+                payment_mode=mode,
+                payment_cash=cash,
+                payment_online=online,
+                payment_credit=credit,
+                date_time="2026-05-01T10:00:00",
+            )
+
+        created = [
+            billing.create_bill(payload("cash", cash=20)),
+            billing.create_bill(payload("split", cash=5, credit=15)),
+            billing.create_bill(payload("credit")),
+        ]
+        batch = billing.create_bills_batch(billing.BillBatchIn(bills=[
+            billing.BillBatchEntryIn(client_key="t1-001", bill=payload("split", cash=5, online=5, credit=10)),
+            billing.BillBatchEntryIn(client_key="t1-002", bill=payload("credit")),
+        ]))
+        self.assertEqual([out.payment_status for out in created], ["PAID", "PARTIAL", "UNPAID"])
+        self.assertEqual([result.status for result in batch.results], ["CREATED", "CREATED"])
+
+        s.expire_all()
+        bills = s.exec(select(Bill).order_by(Bill.id)).all()
+        self.assertEqual(len(bills), len(self.bills) + 5)
+        self.assertEqual(payment_state_drift(s, bills), [])
+
+    def test_drift_is_reported_and_debtor_reads_leave_it_alone(self):
+        s = self.session
+        drifted = self.bills[1]
+        drifted.paid_amount, drifted.payment_status = 100, "PAID"
+        s.add(drifted)
+        s.commit()
+
+        self.assertEqual(
+            payment_state_drift(s, self.bills),
+            [
+                {
+                    "bill_id": drifted.id,
+                    "stored": {"paid_amount": 100, "payment_status": "PAID"},
+                    "expected": {"paid_amount": 40, "payment_status": "PARTIAL"},
+                }
+            ],
+        )
+        first = scan_payment_state_page(s, after_id=0, batch_size=4)
+        second = scan_payment_state_page(s, after_id=first["next_after_id"], batch_size=4)
+        self.assertEqual((first["scanned_bills"], second["scanned_bills"], second["next_after_id"]), (4, 2, None))
+        self.assertEqual([row["bill_id"] for row in first["bills"] + second["bills"]], [drifted.id])
+        self.assertEqual(run_payment_state_check(self.engine, batch_size=4), 1)
+
+        ledger = parties.debtor_ledger(self.party.id)
+        open_bills = parties.debtor_open_bills(self.party.id)
+        self.assertFalse(s.dirty or s.new)
+        self.assertEqual({row.bill_id: row.payment_status for row in ledger}[drifted.id], "PAID")
+        self.assertNotIn(drifted.id, [row.bill_id for row in open_bills])
+        s.expire_all()
+        self.assertEqual(s.exec(select(Bill.paid_amount).where(Bill.id == drifted.id)).one(), 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
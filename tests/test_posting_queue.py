@@ -0,0 +1,196 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from sqlalchemy import text
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend import posting_queue
+from backend.accounting import sync_bill_vouchers
+from backend.models import Bill, BillPayment, Voucher, VoucherEntry, VoucherPostingJob
+from backend.posting_queue import (
+    MAX_ATTEMPTS,
+    drain_posting_queue,
+    enqueue_posting,
+    posting_queue_status,
+    requeue_failed_postings,
+)
+
+
+class PostingQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+        self.session = Session(self.engine, expire_on_commit=False)
+
+    def tearDown(self):
+        self.session.close()
+
+    def create_bill(self, total=100.0, cash=100.0):
+        bill = Bill(
+            date_time="2026-04-01T10:00:00",
+            subtotal=total,
+            total_amount=total,
+            payment_mode="cash",
+            payment_cash=cash,
+        )
+        self.session.add(bill)
+        self.session.flush()
+        enqueue_posting(self.session, "BILL", int(bill.id))
+        return bill
+
+    def job(self, source_type, source_id):
+        self.session.expire_all()
+        return self.session.get(VoucherPostingJob, (source_type, source_id))
+
+    def test_job_is_written_with_the_business_row(self):
+        self.create_bill()
+        self.session.rollback()
+        self.assertEqual(self.session.exec(select(VoucherPostingJob)).all(), [])
+
+        bill = self.create_bill()
+        self.session.commit()
+        self.assertEqual(self.job("BILL", bill.id).status, "PENDING")
+        self.assertIsNone(self.session.exec(select(Voucher)).first())
+
+    def test_drain_posts_and_is_idempotent(self):
+        bill = self.create_bill(total=250.0, cash=250.0)
+        self.session.commit()
+
+        self.assertEqual(drain_posting_queue(self.engine), 1)
+        job = self.job("BILL", bill.id)
+        self.assertEqual((job.status, job.attempts), ("DONE", 0))
+        voucher = self.session.exec(select(Voucher).where(Voucher.source_type == "BILL")).one()
+        self.assertEqual(voucher.total_amount, 250.0)
+
+        enqueue_posting(self.session, "BILL", int(bill.id))
+        self.session.commit()
+        self.assertEqual(self.job("BILL", bill.id).revision, 2)
+        drain_posting_queue(self.engine)
+        self.assertEqual(len(self.session.exec(select(Voucher)).all()), 1)
+        self.assertEqual(
+            len(self.session.exec(select(VoucherEntry).where(VoucherEntry.voucher_id == voucher.id)).all()),
+            2,
+        )
+        self.assertEqual(drain_posting_queue(self.engine), 0)
+
+    def test_edit_during_posting_keeps_job_pending(self):
+        bill = self.create_bill()
+        self.session.commit()
+        original = posting_queue.POSTING_HANDLERS["BILL"]
+
+        def post_then_edit(session, bill_id):
+            original(session, bill_id)
+            with Session(self.engine) as other:
+                enqueue_posting(other, "BILL", bill_id)
+                other.commit()
+
+        with mock.patch.dict(posting_queue.POSTING_HANDLERS, {"BILL": post_then_edit}):
+            drain_posting_queue(self.engine)
+        self.assertEqual(self.job("BILL", bill.id).status, "PENDING")
+
+    def test_synchronous_edit_cannot_land_between_read_and_post(self):
+        handle, path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.addCleanup(lambda: [os.remove(path + suffix) for suffix in ("", "-journal") if os.path.exists(path + suffix)])
+        engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 10})
+        self.addCleanup(engine.dispose)
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            bill = Bill(date_time="2026-04-01T10:00:00", subtotal=100, total_amount=100, payment_mode="credit", is_credit=True)
+            session.add(bill)
+            session.flush()
+            enqueue_posting(session, "BILL", int(bill.id))
+            session.commit()
+            bill_id = int(bill.id)
+
+        def edit_bill():
+            # An edit request that re-posts synchronously, as update_bill does.
+            with Session(engine) as other:
+                row = other.get(Bill, bill_id)
+                row.subtotal = row.total_amount = 250
+                other.add(row)
+                other.flush()
+                sync_bill_vouchers(other, row)
+                other.commit()
+
+        editor = threading.Thread(target=edit_bill)
+
+        def post_after_edit_attempt(session, bill):
+            editor.start()
+            editor.join(0.5)  # the edit blocks on the job's write lock
+            sync_bill_vouchers(session, bill)
+
+        with mock.patch.object(posting_queue, "sync_bill_vouchers", post_after_edit_attempt):
+            drain_posting_queue(engine)
+        editor.join()
+
+        with Session(engine) as session:
+            voucher = session.exec(select(Voucher).where(Voucher.source_type == "BILL")).one()
+            self.assertEqual((session.get(Bill, bill_id).total_amount, voucher.total_amount), (250, 250))
+
+    def test_failures_are_retried_then_marked_failed(self):
+        bill = self.create_bill()
+        self.session.commit()
+
+        def broken(_session, _bill_id):
+            raise RuntimeError("ledger missing")
+
+        with mock.patch.dict(posting_queue.POSTING_HANDLERS, {"BILL": broken}):
+            self.assertEqual(drain_posting_queue(self.engine), 1)
+            job = self.job("BILL", bill.id)
+            self.assertEqual((job.status, job.attempts), ("PENDING", 1))
+            self.assertGreater(job.next_attempt_at, posting_queue._now_ts())
+            # Backing off: not retried until next_attempt_at.
+            self.assertEqual(drain_posting_queue(self.engine), 0)
+            for _ in range(MAX_ATTEMPTS - 1):
+                self.session.exec(text("UPDATE voucherpostingjob SET next_attempt_at = NULL"))
+                self.session.commit()
+                drain_posting_queue(self.engine)
+        job = self.job("BILL", bill.id)
+        self.assertEqual((job.status, job.attempts, job.last_error), ("FAILED", MAX_ATTEMPTS, "ledger missing"))
+        self.session.exec(text("UPDATE voucherpostingjob SET next_attempt_at = NULL"))
+        self.session.commit()
+        self.assertEqual(drain_posting_queue(self.engine), 0)
+
+        status = posting_queue_status(self.session)
+        self.assertEqual((status["pending"], status["failed"]), (0, 1))
+        self.assertEqual(status["failed_jobs"][0].source_id, bill.id)
+
+        self.assertEqual(requeue_failed_postings(self.session), 1)
+        self.session.commit()
+        job = self.job("BILL", bill.id)
+        self.assertEqual((job.status, job.attempts, job.next_attempt_at), ("PENDING", 0, None))
+        self.assertEqual(drain_posting_queue(self.engine), 1)
+        self.assertEqual(self.job("BILL", bill.id).status, "DONE")
+
+    def test_auto_payment_is_left_to_the_sales_voucher(self):
+        bill = self.create_bill()
+        payment = BillPayment(
+            bill_id=bill.id,
+            received_at="2026-04-01T10:00:00",
+            mode="cash",
+            cash_amount=100.0,
+            note="auto: payment at bill creation",
+        )
+        self.session.add(payment)
+        self.session.flush()
+        enqueue_posting(self.session, "BILL_PAYMENT", int(payment.id))
+        self.session.commit()
+
+        drain_posting_queue(self.engine)
+        self.assertEqual(
+            [row.source_type for row in self.session.exec(select(Voucher)).all()],
+            ["BILL"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from backend.models import InventoryLot, Item, Party, Purchase, PurchaseItem, PurchasePayment, PurchaseReturn
+from backend.routers import purchases
+
+
+class PurchaseOutBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+        self.session = Session(self.engine, expire_on_commit=False)
+        self.original_get_read_session = purchases.get_read_session
+
+        @contextmanager
+        def test_session():
+            yield self.session
+
+        purchases.get_read_session = test_session
+
+        s = self.session
+        self.supplier = Party(name="Acme Pharma", party_group="SUNDRY_CREDITOR", is_active=True)
+        s.add(self.supplier)
+        s.flush()
+        item = Item(name="Insulin", mrp=10, stock=5, expiry_date="2027-06-30")
+        lot = InventoryLot(product_id=1, expiry_date="2027-03-31")
+        s.add_all([item, lot])
+        s.flush()
+        self.purchases = [
+            Purchase(party_id=self.supplier.id, invoice_number=f"INV-{n}", invoice_date=f"2026-04-0{n + 1}", total_amount=100)
+            for n in range(3)
+        ]
+        s.add_all(self.purchases)
+        s.flush()
+        first, second, third = self.purchases
+        s.add_all([
+            PurchaseItem(purchase_id=first.id, product_id=1, product_name="Insulin", lot_id=lot.id, inventory_item_id=item.id),
+            PurchaseItem(purchase_id=first.id, product_id=1, product_name="Insulin", inventory_item_id=item.id),
+            PurchaseItem(purchase_id=second.id, product_id=1, product_name="Insulin", expiry_date="2026-12-31"),
+            PurchasePayment(purchase_id=second.id, party_id=self.supplier.id, amount=40, paid_at="2026-04-05"),
+            # Settled against the third purchase, so it counts there and not on the first.
+            PurchaseReturn(party_id=self.supplier.id, purchase_id=first.id, settlement_purchase_id=third.id,
+                           return_number="R-1", return_date="2026-04-06", total_amount=30, refund_cash=10),
+            PurchaseReturn(party_id=self.supplier.id, purchase_id=second.id, return_number="R-2",
+                           return_date="2026-04-06", total_amount=20),
+            PurchaseReturn(party_id=self.supplier.id, purchase_id=second.id, return_number="R-3",
+                           return_date="2026-04-06", total_amount=50, is_deleted=True),
+        ])
+        s.commit()
+
+    def tearDown(self):
+        purchases.get_read_session = self.original_get_read_session
+        self.session.close()
+
+    def test_page_is_assembled_with_a_fixed_number_of_queries(self):
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(self.engine, "before_cursor_execute", listener)
+        try:
+            rows = purchases.list_purchases(party_id=None, from_date=None, to_date=None, limit=100, offset=0)
+        finally:
+            event.remove(self.engine, "before_cursor_execute", listener)
+
+        # Purchases, items, payments, lot expiries, item expiries, return totals.
+        self.assertEqual(len(statements), 6)
+        by_invoice = {row.invoice_number: row for row in rows}
+        self.assertEqual([item.expiry_date for item in by_invoice["INV-0"].items], ["2027-03-31", "2027-06-30"])
+        self.assertEqual([payment.amount for payment in by_invoice["INV-1"].payments], [40])
+        self.assertEqual(
+            [(row.invoice_number, row.return_total, row.net_amount) for row in rows],
+            [("INV-2", 30, 80), ("INV-1", 20, 80), ("INV-0", 0, 100)],
+        )
+        self.assertEqual(purchases.get_purchase(self.purchases[2].id), by_invoice["INV-2"])
+
+        ledger = purchases.supplier_ledger(self.supplier.id)
+        self.assertEqual([(row.invoice_number, row.return_amount, row.outstanding_amount) for row in ledger], [
+            ("INV-2", 30, 80), ("INV-1", 20, 80), ("INV-0", 0, 100),
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
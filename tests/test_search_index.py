@@ -0,0 +1,123 @@
+import unittest
+from contextlib import contextmanager
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from backend.models import Bill, BillItem, InventoryLot, Item, Product, StockMovement
+from backend.routers import billing, inventory
+from backend.search_index import create_search_index, match_rowids
+
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            self.assertTrue(create_search_index(conn))
+        self.session = Session(self.engine, expire_on_commit=False)
+        self.originals = (inventory.get_session, billing.get_session)
+
+        @contextmanager
+        def test_session():
+            yield self.session
+
+        inventory.get_session = test_session
+        billing.get_session = test_session
+
+    def tearDown(self):
+        inventory.get_session, billing.get_session = self.originals
+        self.session.close()
+
+    def search_items(self, q):
+        page = inventory.list_items(
+            request=None,
+            q=q,
+            rack_number=None,
+            brand=None,
+            category_id=None,
+            missing_expiry=False,
+            created_from=None,
+            incoming_from=None,
+            limit=None,
+            offset=None,
+            include_archived=True,
+        )
+        return [item.name for item in page["items"]]
+
+    def test_triggers_track_inserts_updates_and_deletes(self):
+        item = Item(name="Dolo 650", brand="Micro", mrp=30, stock=1)
+        self.session.add(item)
+        self.session.commit()
+        self.assertEqual(self.session.exec(match_rowids(self.session, "item_fts", "olo 6")).all()[0][0], item.id)
+
+        item.name = "Paracetamol"
+        self.session.add(item)
+        self.session.commit()
+        self.assertEqual(self.session.exec(match_rowids(self.session, "item_fts", "dolo")).all(), [])
+
+        self.session.delete(item)
+        self.session.commit()
+        self.assertEqual(self.session.exec(match_rowids(self.session, "item_fts", "para")).all(), [])
+
+    def test_item_search_matches_product_alias_and_movement_note_and_ranks_direct_hits_first(self):
+        product = Product(name="Calpol 500", alias="Paracip")
+        self.session.add(product)
+        self.session.commit()
+        via_product = Item(name="Calpol 500", brand="GSK", product_id=product.id, mrp=20, stock=3)
+        direct = Item(name="Paracip Syrup", brand="Cipla", mrp=40, stock=2)
+        via_note = Item(name="Zincovit", brand="Apex", mrp=90, stock=1)
+        unrelated = Item(name="Crocin", brand="GSK", mrp=15, stock=1)
+        for row in (via_product, direct, via_note, unrelated):
+            self.session.add(row)
+        self.session.commit()
+        self.session.add(InventoryLot(product_id=product.id, mrp=20, sealed_qty=3, legacy_item_id=via_product.id))
+        self.session.add(StockMovement(item_id=via_note.id, ts="2026-01-01T10:00:00", delta=1, reason="ADJUST", note="swap for paracip"))
+        self.session.commit()
+
+        self.assertEqual(self.search_items("PARACIP"), ["Paracip Syrup", "Calpol 500", "Zincovit"])
+
+    def test_short_queries_fall_back_to_like(self):
+        self.session.add(Item(name="B12 Drops", brand="Abbott", mrp=10, stock=1))
+        self.session.add(Item(name="Dolo 650", brand="Micro", mrp=30, stock=1))
+        self.session.commit()
+
+        self.assertIsNone(match_rowids(self.session, "item_fts", "12"))
+        self.assertEqual(self.search_items("12"), ["B12 Drops"])
+
+    def test_bill_search_covers_line_names_and_brands(self):
+        item = Item(name="Dolo 650", brand="Micro Labs", mrp=30, stock=5)
+        self.session.add(item)
+        self.session.commit()
+        bills = []
+        for note in ("walk-in", "home delivery"):
+            bill = Bill(subtotal=30, total_amount=30, payment_mode="cash", payment_cash=30, notes=note)
+            self.session.add(bill)
+            self.session.commit()
+            bills.append(bill)
+        self.session.add(BillItem(bill_id=bills[0].id, item_id=item.id, item_name="Dolo 650", mrp=30, quantity=1, line_total=30))
+        self.session.commit()
+
+        def search(q):
+            page = billing.list_bills_paged(
+                limit=50, offset=0, from_date=None, to_date=None, q=q, deleted_filter="active", bill_filter="all"
+            )
+            return [row.id for row in page["items"]]
+
+        self.assertEqual(search("micro lab"), [bills[0].id])
+        self.assertEqual(search("DELIVERY"), [bills[1].id])
+
+        item.brand = "Zenlabs"
+        self.session.add(item)
+        self.session.commit()
+        self.assertEqual(search("micro lab"), [])
+        self.assertEqual(search("zenlabs"), [bills[0].id])
+        self.assertEqual(search("walk-in"), [bills[0].id])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import os
+import tempfile
+import threading
+import unittest
+from datetime import date
+from unittest import mock
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend import stock_checkpoints
+from backend.models import Item, Purchase, StockBalanceCheckpoint, StockMovement
+from backend.stock_checkpoints import (
+    cumulative_deltas,
+    future_deltas,
+    install_stock_checkpoint_triggers,
+    refresh_stock_checkpoints,
+)
+
+TODAY = date(2026, 4, 15)
+PROBES = [
+    "2026-01-09T23:59:59",
+    "2026-01-31T23:59:59",
+    "2026-02-15T23:59:59",
+    "2026-03-31T23:59:59",
+    "2026-04-14T23:59:59",
+]
+
+
+class StockCheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            install_stock_checkpoint_triggers(conn)
+        self.session = Session(self.engine, expire_on_commit=False)
+
+        self.item = Item(name="Dolo 650", mrp=30, stock=0)
+        self.purchase = Purchase(party_id=1, invoice_number="INV-1", invoice_date="2026-01-20")
+        self.session.add(self.item)
+        self.session.add(self.purchase)
+        self.session.commit()
+        self.move("2026-01-10T09:00:00", 10)
+        self.move("2026-02-05T12:00:00", -3)
+        self.move("2026-03-03T18:30:00", 2)
+        # Entered in March against a January invoice.
+        self.move("2026-03-20T10:00:00", 5, ref_type="PURCHASE", ref_id=self.purchase.id)
+        self.move("2026-04-02T10:00:00", -1)
+
+    def tearDown(self):
+        self.session.close()
+
+    def move(self, ts, delta, ref_type=None, ref_id=None):
+        self.session.add(
+            StockMovement(item_id=self.item.id, ts=ts, delta=delta, reason="ADJUST", ref_type=ref_type, ref_id=ref_id)
+        )
+        self.session.commit()
+
+    def brute_force(self, through_ts=None):
+        total = 0
+        for movement in self.session.exec(select(StockMovement)).all():
+            ts = movement.ts
+            if movement.ref_type == "PURCHASE":
+                ts = f"{self.session.get(Purchase, movement.ref_id).invoice_date}T00:00:00"
+            if through_ts is None or ts <= through_ts:
+                total += movement.delta
+        return total
+
+    def checkpoints(self):
+        rows = self.session.exec(select(StockBalanceCheckpoint).order_by(StockBalanceCheckpoint.period_end)).all()
+        return [(row.period_end, row.balance) for row in rows]
+
+    def assert_matches_ledger(self):
+        item_id = self.item.id
+        self.assertEqual(cumulative_deltas(self.session, [item_id])[item_id], self.brute_force())
+        for probe in PROBES:
+            self.assertEqual(cumulative_deltas(self.session, [item_id], probe)[item_id], self.brute_force(probe), probe)
+
+    def test_refresh_writes_closed_month_balances_by_effective_date(self):
+        self.assertEqual(refresh_stock_checkpoints(self.session, TODAY), 3)
+        self.assertEqual(self.checkpoints(), [("2026-01-31", 15), ("2026-02-28", 12), ("2026-03-31", 14)])
+        self.assertEqual(refresh_stock_checkpoints(self.session, TODAY), 0)
+        self.assert_matches_ledger()
+
+    def test_backdated_movement_invalidates_later_checkpoints(self):
+        refresh_stock_checkpoints(self.session, TODAY)
+        self.move("2026-02-10T08:00:00", -4)
+
+        self.assertEqual(self.checkpoints(), [("2026-01-31", 15)])
+        self.assert_matches_ledger()
+
+        refresh_stock_checkpoints(self.session, TODAY)
+        self.assertEqual(self.checkpoints(), [("2026-01-31", 15), ("2026-02-28", 8), ("2026-03-31", 10)])
+        self.assert_matches_ledger()
+
+    def test_invoice_date_change_invalidates_from_earliest_affected_month(self):
+        refresh_stock_checkpoints(self.session, TODAY)
+        self.purchase.invoice_date = "2026-03-25"
+        self.session.add(self.purchase)
+        self.session.commit()
+
+        self.assertEqual(self.checkpoints(), [])
+        self.assert_matches_ledger()
+
+    def test_backdated_movement_cannot_land_between_read_and_insert(self):
+        handle, path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.addCleanup(lambda: [os.remove(path + suffix) for suffix in ("", "-journal") if os.path.exists(path + suffix)])
+        engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 10})
+        self.addCleanup(engine.dispose)
+        SQLModel.metadata.create_all(engine)
+        with engine.begin() as conn:
+            install_stock_checkpoint_triggers(conn)
+        with Session(engine) as session:
+            session.add(StockMovement(item_id=1, ts="2026-01-10T09:00:00", delta=10, reason="ADJUST"))
+            session.add(StockMovement(item_id=1, ts="2026-02-05T12:00:00", delta=-3, reason="ADJUST"))
+            session.commit()
+
+        def backdate():
+            with Session(engine) as other:
+                other.add(StockMovement(item_id=1, ts="2026-01-15T09:00:00", delta=-4, reason="ADJUST"))
+                other.commit()
+
+        writer = threading.Thread(target=backdate)
+        original = stock_checkpoints._latest_checkpoints
+
+        def latest_after_write_attempt(*args):
+            writer.start()
+            writer.join(0.5)  # the backdated movement blocks on the refresh's write lock
+            return original(*args)
+
+        with mock.patch.object(stock_checkpoints, "_latest_checkpoints", latest_after_write_attempt):
+            with Session(engine) as session:
+                refresh_stock_checkpoints(session, TODAY)
+        writer.join()
+
+        with Session(engine) as session:
+            rows = session.exec(select(StockBalanceCheckpoint)).all()
+            self.assertEqual([(row.period_end, row.balance) for row in rows], [])
+            self.assertEqual(cumulative_deltas(session, [1])[1], 3)
+
+    def test_future_deltas_rewind_current_stock(self):
+        refresh_stock_checkpoints(self.session, TODAY)
+        item_id = self.item.id
+        self.assertEqual(future_deltas(self.session, [item_id], None), {item_id: 0})
+        self.assertEqual(
+            future_deltas(self.session, [item_id], "2026-02-15T23:59:59"),
+            {item_id: self.brute_force() - self.brute_force("2026-02-15T23:59:59")},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
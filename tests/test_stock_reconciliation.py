@@ -0,0 +1,86 @@
+import unittest
+from contextlib import contextmanager
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from backend.models import Bill, BillItem, Item, StockMovement
+from backend.routers import inventory as inventory_router
+
+
+class StockReconciliationScanTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+
+        @contextmanager
+        def session_override():
+            with Session(self.engine) as session:
+                yield session
+
+        self.original_get_read_session = inventory_router.get_read_session
+        inventory_router.get_read_session = session_override
+
+        with Session(self.engine) as session:
+            items = [Item(name=f"Item {n:02d}", mrp=10, stock=5) for n in range(7)]
+            session.add_all(items)
+            session.commit()
+            for item in items:
+                session.add(StockMovement(item_id=item.id, ts="2026-01-01T10:00:00", delta=5, reason="OPENING"))
+            self.item_ids = [int(item.id) for item in items]
+
+            # A sale with no SALE movement behind it.
+            bill = Bill(date_time="2026-01-02T10:00:00", subtotal=20, total_amount=20, payment_mode="cash")
+            session.add(bill)
+            session.commit()
+            session.add(BillItem(bill_id=bill.id, item_id=items[3].id, item_name=items[3].name, mrp=10, quantity=2, line_total=20))
+            items[3].stock = 3
+            session.add(items[3])
+            session.commit()
+            self.bill_id = int(bill.id)
+
+    def tearDown(self):
+        inventory_router.get_read_session = self.original_get_read_session
+
+    def scan(self, after_id, batch_size):
+        return inventory_router.stock_ledger_reconciliation_scan(
+            after_id=after_id,
+            batch_size=batch_size,
+            include_archived=True,
+            include_balanced=True,
+        )
+
+    def test_scan_pages_through_every_item_once(self):
+        seen = []
+        after_id = 0
+        while after_id is not None:
+            page = self.scan(after_id, 3)
+            seen.extend(row.item_id for row in page.items)
+            after_id = page.next_after_id
+        self.assertEqual(seen, self.item_ids)
+
+    def test_scan_matches_full_report_for_missing_sale(self):
+        report = inventory_router.stock_ledger_reconciliation(
+            q=None, item_ids=None, include_archived=True, include_balanced=False, limit=200, offset=0
+        )
+        self.assertEqual([row.item_id for row in report.items], [self.item_ids[3]])
+
+        page = inventory_router.stock_ledger_reconciliation_scan(
+            after_id=0, batch_size=10, include_archived=True, include_balanced=False
+        )
+        self.assertIsNone(page.next_after_id)
+        self.assertEqual(page.scanned_items, 7)
+        self.assertEqual(len(page.items), 1)
+        row = page.items[0]
+        self.assertEqual(row.model_dump(), report.items[0].model_dump())
+        sale = [entry for entry in row.missing_entries if entry.reason == "SALE"]
+        self.assertEqual(len(sale), 1)
+        self.assertEqual((sale[0].ref_id, sale[0].missing_delta), (self.bill_id, -2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import threading
+import unittest
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend.db import apply_sqlite_pragmas
+from backend.inventory_lot_sync import adjust_item_stock
+from backend.models import BillCreate, BillItem, FinancialYear, Item, StockMovement
+from backend.routers import billing
+
+
+class StockReservationTest(unittest.TestCase):
+    def setUp(self):
+        # A real file so every counter gets its own connection, as in production.
+        handle, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.engine = create_engine(f"sqlite:///{self.path}", connect_args={"check_same_thread": False, "timeout": 30})
+        pragmas = {"journal_mode": "WAL", "busy_timeout": 30000}
+        event.listen(self.engine, "connect", lambda conn, _record: apply_sqlite_pragmas(conn, pragmas))
+        SQLModel.metadata.create_all(self.engine)
+        self.original_get_session = billing.get_session
+
+        @contextmanager
+        def test_session():
+            with Session(self.engine, expire_on_commit=False) as session:
+                yield session
+
+        billing.get_session = test_session
+        with Session(self.engine) as session:
+            session.add(FinancialYear(label="FY 2026", start_date="2026-01-01", end_date="2026-12-31", is_active=True))
+            item = Item(name="Insulin", brand="Acme", expiry_date="2027-01-31", mrp=10, cost_price=5, stock=5, rack_number=1)
+            session.add(item)
+            session.commit()
+            self.item_id = item.id
+
+    def tearDown(self):
+        billing.get_session = self.original_get_session
+        self.engine.dispose()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+    def test_decrement_only_applies_while_stock_lasts(self):
+        with Session(self.engine) as session:
+            item = session.get(Item, self.item_id)
+            self.assertFalse(adjust_item_stock(session, item, -6))
+            self.assertEqual(item.stock, 5)
+            self.assertTrue(adjust_item_stock(session, item, -5))
+            self.assertEqual(item.stock, 0)
+            self.assertTrue(adjust_item_stock(session, item, 2))
+            self.assertEqual(item.stock, 2)
+
+    def test_parallel_sales_never_oversell(self):
+        counters = 16
+        start = threading.Barrier(counters)
+        outcomes = []
+
+        def sell():
+            payload = BillCreate(
+                items=[{"item_id": self.item_id, "quantity": 1}],
+                payment_mode="cash",
+                payment_cash=10,
+                date_time="2026-05-01T10:00:00",
+            )
+            start.wait()
+            try:
+                billing.create_bill(payload)
+                outcomes.append("sold")
+            except HTTPException as exc:
+                outcomes.append(exc.detail)
+
+        threads = [threading.Thread(target=sell) for _ in range(counters)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count("sold"), 5)
+        self.assertEqual(set(outcomes) - {"sold"}, {"Insufficient stock for Insulin"})
+        with Session(self.engine) as session:
+            self.assertEqual(session.get(Item, self.item_id).stock, 0)
+            self.assertEqual(len(session.exec(select(BillItem)).all()), 5)
+            self.assertEqual(sum(m.delta for m in session.exec(select(StockMovement)).all()), -5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend.accounting import mark_voucher_deleted, sync_bill_vouchers, upsert_voucher
+from backend.models import Bill, Voucher, VoucherEntry
+
+
+def lines(*amounts):
+    return [
+        {"ledger_id": 10 + idx, "entry_type": "DR" if idx == 0 else "CR", "amount": amount, "narration": f"line {idx}"}
+        for idx, amount in enumerate(amounts)
+    ]
+
+
+class UpsertVoucherTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+        self.session = Session(self.engine, expire_on_commit=False)
+        self.writes = []
+
+        @event.listens_for(self.engine, "before_cursor_execute")
+        def record(_conn, _cursor, statement, *_args):
+            verb = statement.lstrip().split(None, 1)[0].upper()
+            if verb in {"INSERT", "UPDATE", "DELETE"}:
+                self.writes.append(" ".join(statement.split()[:3]))
+
+    def tearDown(self):
+        self.session.close()
+
+    def post(self, entry_lines, total=100.0):
+        voucher = upsert_voucher(
+            self.session,
+            voucher_type="SALES",
+            source_type="BILL",
+            source_id=1,
+            voucher_date="2026-04-01",
+            voucher_no="S-1",
+            narration="Sales bill #1",
+            total_amount=total,
+            lines=entry_lines,
+        )
+        self.session.commit()
+        return voucher
+
+    def stored(self):
+        self.session.expire_all()
+        return [
+            (e.ledger_id, e.amount, e.sort_order)
+            for e in self.session.exec(select(VoucherEntry).order_by(VoucherEntry.sort_order)).all()
+        ]
+
+    def test_unchanged_voucher_is_not_written(self):
+        voucher = self.post(lines(100, 100))
+        voucher.updated_at = "2026-01-01T00:00:00"
+        self.session.add(voucher)
+        self.session.commit()
+        self.writes.clear()
+
+        self.post(lines(100, 100))
+        self.assertEqual(self.writes, [])
+        self.assertEqual(self.session.get(Voucher, voucher.id).updated_at, "2026-01-01T00:00:00")
+
+    def test_changed_lines_are_updated_in_place(self):
+        self.post(lines(100, 100))
+        entry_ids = [e.id for e in self.session.exec(select(VoucherEntry)).all()]
+        self.writes.clear()
+
+        self.post(lines(120, 120), total=120)
+        self.assertEqual(self.stored(), [(10, 120, 1), (11, 120, 2)])
+        self.assertEqual([e.id for e in self.session.exec(select(VoucherEntry)).all()], entry_ids)
+        self.assertFalse(any(w.startswith(("INSERT", "DELETE")) for w in self.writes))
+
+    def test_line_count_changes_insert_or_delete_only_the_surplus(self):
+        self.post(lines(100, 60, 40))
+        self.writes.clear()
+        self.post(lines(100, 100))
+        self.assertEqual(self.stored(), [(10, 100, 1), (11, 100, 2)])
+        self.assertEqual(sum(w.startswith("DELETE") for w in self.writes), 1)
+        self.assertFalse(any(w.startswith("INSERT") for w in self.writes))
+
+        self.writes.clear()
+        self.post(lines(100, 70, 30))
+        self.assertEqual(self.stored(), [(10, 100, 1), (11, 70, 2), (12, 30, 3)])
+        self.assertEqual(sum(w.startswith("INSERT") for w in self.writes), 1)
+
+    def test_reposting_a_deleted_voucher_restores_it(self):
+        self.post(lines(100, 100))
+        mark_voucher_deleted(self.session, source_type="BILL", source_id=1)
+        self.session.commit()
+        voucher = self.post(lines(100, 100))
+        self.assertFalse(voucher.is_deleted)
+        self.assertIsNone(voucher.deleted_at)
+
+    def test_syncing_a_deleted_bill_leaves_its_deleted_voucher_alone(self):
+        bill = Bill(subtotal=100, total_amount=100, payment_mode="cash", is_deleted=True)
+        self.session.add(bill)
+        self.session.commit()
+        self.assertEqual(bill.id, 1)
+        self.post(lines(100, 100))
+        mark_voucher_deleted(self.session, source_type="BILL", source_id=1)
+        self.session.commit()
+        deleted_at = self.session.get(Voucher, 1).deleted_at
+        self.writes.clear()
+
+        voucher = sync_bill_vouchers(self.session, bill)
+        self.session.commit()
+        self.assertEqual(self.writes, [])
+        self.assertTrue(voucher.is_deleted)
+        self.assertEqual(voucher.deleted_at, deleted_at)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import json
+import unittest
+
+from sqlalchemy import text
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend.models import Bill, BillPayment, CashbookEntry, Party, Purchase, PurchasePayment, Voucher, VoucherEntry
+from backend.voucher_resync import (
+    CURSOR_KEY,
+    DONE_KEY,
+    run_voucher_resync,
+    run_voucher_resync_chunk,
+    voucher_resync_progress,
+)
+
+
+class VoucherResyncTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(text("CREATE TABLE appmeta (key TEXT PRIMARY KEY, value TEXT, updated_at TEXT)"))
+        self.session = Session(self.engine, expire_on_commit=False)
+
+        customer = Party(name="Asha", party_group="SUNDRY_DEBTOR")
+        supplier = Party(name="Ravi Traders", party_group="SUNDRY_CREDITOR")
+        self.session.add(customer)
+        self.session.add(supplier)
+        self.session.flush()
+        self.bills = []
+        for n in range(5):
+            bill = Bill(
+                date_time=f"2026-04-0{n + 1}T10:00:00",
+                subtotal=100 + n,
+                total_amount=100 + n,
+                payment_mode="credit",
+                payment_cash=0,
+                is_credit=True,
+                party_id=customer.id,
+            )
+            self.session.add(bill)
+            self.bills.append(bill)
+        self.session.flush()
+        self.session.add(
+            BillPayment(bill_id=self.bills[0].id, received_at="2026-04-05T10:00:00", mode="cash", cash_amount=50)
+        )
+        deleted = self.bills[4]
+        deleted.is_deleted = True
+        purchase = Purchase(party_id=supplier.id, invoice_number="INV-1", invoice_date="2026-04-01", total_amount=500)
+        self.session.add(purchase)
+        self.session.flush()
+        self.session.add(PurchasePayment(purchase_id=purchase.id, amount=200, cash_amount=200, paid_at="2026-04-02T10:00:00"))
+        self.session.add(CashbookEntry(entry_type="RECEIPT", amount=75, is_suspense=True, created_at="2026-04-03T09:00:00"))
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def vouchers(self):
+        self.session.expire_all()
+        return {
+            (v.source_type, v.source_id): v
+            for v in self.session.exec(select(Voucher)).all()
+        }
+
+    def test_resync_is_chunked_and_resumable(self):
+        self.assertFalse(run_voucher_resync_chunk(self.engine, chunk_size=2))
+        cursor = voucher_resync_progress(self.session)
+        self.assertEqual((cursor["status"], cursor["phase"], cursor["processed"]), ("RUNNING", "bills", 2))
+        self.assertEqual(cursor["totals"]["bills"], 5)
+        self.assertEqual(len(self.vouchers()), 2)
+
+        run_voucher_resync(self.engine, chunk_size=2)
+        vouchers = self.vouchers()
+        self.assertEqual(voucher_resync_progress(self.session)["status"], "DONE")
+        self.assertEqual(
+            sorted(vouchers),
+            sorted(
+                [("BILL", b.id) for b in self.bills]
+                + [("BILL_PAYMENT", 1), ("PURCHASE", 1), ("PURCHASE_PAYMENT", 1), ("CASHBOOK_SUSPENSE", 1)]
+            ),
+        )
+        self.assertTrue(vouchers[("BILL", self.bills[4].id)].is_deleted)
+        self.assertFalse(vouchers[("BILL", self.bills[0].id)].is_deleted)
+
+    def test_rerun_only_rewrites_changed_vouchers(self):
+        run_voucher_resync(self.engine)
+        before = {key: v.updated_at for key, v in self.vouchers().items()}
+        entry_ids = [e.id for e in self.session.exec(select(VoucherEntry)).all()]
+
+        bill = self.session.get(Bill, self.bills[1].id)
+        bill.total_amount = 999
+        self.session.add(bill)
+        self.session.exec(text("DELETE FROM appmeta WHERE key = :key").bindparams(key=DONE_KEY))
+        for key in list(before):
+            self.session.exec(
+                text("UPDATE voucher SET updated_at = 'old' WHERE source_type = :t AND source_id = :i").bindparams(
+                    t=key[0], i=key[1]
+                )
+            )
+        self.session.commit()
+
+        run_voucher_resync(self.engine)
+        after = self.vouchers()
+        changed = sorted(key for key, v in after.items() if v.updated_at != "old")
+        self.assertEqual(changed, [("BILL", self.bills[1].id)])
+        self.assertEqual(after[("BILL", self.bills[1].id)].total_amount, 999)
+        surviving = {e.id for e in self.session.exec(select(VoucherEntry)).all()}
+        self.assertEqual(surviving, set(entry_ids))
+
+        raw = self.session.exec(text("SELECT value FROM appmeta WHERE key = :key").bindparams(key=CURSOR_KEY)).first()
+        self.assertEqual(json.loads(raw[0])["status"], "DONE")
+
+
+if __name__ == "__main__":
+    unittest.main()